@@ -0,0 +1,104 @@
+# Benchmark - Per-Request Authentication Overhead
+#
+# Signs Clerk-shaped session tokens with a throwaway RSA key and measures the
+# time to authenticate one request:
+#   - clerk sdk   : clerk_sdk.authenticate_request() with JWT_KEY (the previous
+#                   per-request path, networkless)
+#   - local, cold : get_current_user() verifying the signature (new token per call)
+#   - local, warm : get_current_user() answered from the verified-claims LRU
+#                   (the same token on every request until it expires)
+#
+# USAGE (from the backend directory):
+#   python -m benchmarks.auth_bench                # 5,000 requests per variant
+#   python -m benchmarks.auth_bench --requests 50000
+
+import argparse
+import os
+import statistics
+import time
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from starlette.datastructures import Headers
+
+_private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+_public_pem = _private_key.public_key().public_bytes(
+    serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+).decode()
+os.environ["JWT_KEY"] = _public_pem
+
+from src import auth  # noqa: E402
+
+
+class _Request:
+    """Minimal request: headers, cookies and a state object."""
+
+    class _State:
+        pass
+
+    def __init__(self, token: str):
+        self.headers = Headers({"authorization": f"Bearer {token}"})
+        self.cookies = {}
+        self.state = self._State()
+
+
+def _token(user_id: str):
+    now = int(time.time())
+    return jwt.encode(
+        {"sub": user_id, "azp": auth.AUTHORIZED_PARTIES[0], "iat": now, "nbf": now - 5, "exp": now + 60,
+         "sid": "sess_bench"},
+        _private_key, algorithm="RS256", headers={"kid": "ins_bench"}
+    )
+
+
+def _measure(label: str, fn, requests: list):
+    timings = []
+    for request in requests:
+        start = time.perf_counter()
+        fn(request)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{label:<14} {statistics.median(timings) * 1e6:>9.1f} {timings[int(len(timings) * 0.99)] * 1e6:>9.1f} "
+          f"{len(timings) / sum(timings):>12,.0f}")
+
+
+def _clerk_sdk():
+    """The previous path, or None if the SDK is not installed."""
+    try:
+        from clerk_backend_api import Clerk, AuthenticateRequestOptions
+    except ImportError:
+        return None
+    sdk = Clerk(bearer_auth="sk_test_bench")
+    options = AuthenticateRequestOptions(authorized_parties=auth.AUTHORIZED_PARTIES, jwt_key=_public_pem)
+
+    def authenticate(request):
+        state = sdk.authenticate_request(request, options)
+        if not state.is_signed_in:
+            raise RuntimeError(f"Clerk SDK rejected the benchmark token: {state.reason}")
+        return state
+
+    return authenticate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    fresh = [_Request(_token(f"user_{i}")) for i in range(args.requests)]
+    same = [_Request(_token("user_warm"))] * args.requests
+
+    print(f"{'variant':<14} {'p50 us':>9} {'p99 us':>9} {'requests/s':>12}")
+    sdk = _clerk_sdk()
+    if sdk:
+        _measure("clerk sdk", sdk, fresh)
+    auth.claims_cache.clear()
+    _measure("local, cold", auth.get_current_user, fresh)
+    auth.claims_cache.clear()
+    _measure("local, warm", auth.get_current_user, same)
+    print(f"\nclaims cache: {auth.claims_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Benchmark - Streaming History Export
+#
+# Measures GET /challenges/export serialization straight from the database:
+# challenges/second, output MB/second and peak Python memory (tracemalloc)
+# for NDJSON and CSV, plain and gzip.
+#
+# Two users with different history sizes are exported so constant memory is
+# visible: peak memory should be about the same for both.
+#
+# USAGE (from the backend directory):
+#   python -m benchmarks.export_bench                        # 4,000 and 40,000 challenges
+#   python -m benchmarks.export_bench --challenges 200000
+#
+# A throwaway SQLite file is used; the real database is never touched.
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+_tmpdir = tempfile.mkdtemp(prefix="export_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from sqlalchemy import insert  # noqa: E402
+from src.database import models  # noqa: E402
+from src.database.export import stream_history_export  # noqa: E402
+
+VARIANTS = [("ndjson", None), ("ndjson", "gzip"), ("csv", None), ("csv", "gzip")]
+
+
+def _populate(user_id: str, challenges: int):
+    """Two thirds MCQ (every other one answered), one third scenarios with two answers each."""
+    start = datetime.now() - timedelta(days=365)
+    n_interview = challenges * 2 // 3
+    with models.engine.begin() as conn:
+        conn.execute(insert(models.InterviewChallenge), [{
+            "created_by": user_id, "topic": f"Topic {i % 12}", "difficulty": ("Easy", "Medium", "Hard")[i % 3],
+            "title": f"Question {i} " + "x" * 120, "options": ["A option", "B option", "C option", "D option"],
+            "correct_answer_id": i % 4, "explaination": "Because " + "y" * 600,
+            "date_created": start + timedelta(minutes=i * 3),
+        } for i in range(n_interview)])
+        conn.execute(insert(models.ScenarioChallenge), [{
+            "created_by": user_id, "topic": f"Topic {i % 12}", "difficulty": ("Easy", "Medium", "Hard")[i % 3],
+            "title": f"Scenario {i} " + "s" * 300,
+            "questions": [{"prompt": "How?", "explanation": "..."}, {"prompt": "Why?", "explanation": "..."}],
+            "correct_answer": "Ideal " + "c" * 500, "explanation": "Rubric " + "r" * 300,
+            "date_created": start + timedelta(minutes=i * 5 + 1),
+        } for i in range(challenges - n_interview)])
+        interview_ids = [r[0] for r in conn.exec_driver_sql(
+            "SELECT id FROM interview_challenges WHERE created_by = ?", (user_id,))]
+        scenario_ids = [r[0] for r in conn.exec_driver_sql(
+            "SELECT id FROM scenario_challenges WHERE created_by = ?", (user_id,))]
+        conn.execute(insert(models.InterviewAnswer), [{
+            "user_id": user_id, "challenge_id": cid, "user_answer_id": cid % 4,
+            "is_correct": cid % 2 == 0, "date_completed": datetime.now(), "time_taken_seconds": 30,
+        } for cid in interview_ids[::2]])
+        conn.execute(insert(models.ScenarioAnswer), [{
+            "user_id": user_id, "scenario_id": sid, "question_index": q, "user_answer": "Answer " + "a" * 400,
+            "llm_score": 70, "llm_feedback": "Feedback " + "f" * 500, "llm_correct_answer": "Model " + "m" * 500,
+            "created_at": datetime.now(),
+        } for sid in scenario_ids for q in range(2)])
+
+
+def _export(user_id: str, fmt: str, compression: str):
+    db = models.SessionLocal()
+    try:
+        return sum(len(chunk) for chunk in stream_history_export(db, user_id, fmt=fmt, compression=compression))
+    finally:
+        db.close()
+
+
+def _measure(user_id: str, challenges: int, fmt: str, compression: str):
+    start = time.perf_counter()
+    size = _export(user_id, fmt, compression)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    _export(user_id, fmt, compression)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    label = f"{fmt}{'.gz' if compression else ''}"
+    print(f"{challenges:>9,} {label:<10} {challenges / elapsed:>12,.0f} challenges/s "
+          f"{size / elapsed / 1024 / 1024:>8.1f} MiB/s {size / 1024 / 1024:>9.1f} MiB out "
+          f"  peak {peak / 1024 / 1024:>6.2f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--challenges", type=int, default=40_000, help="History size of the large user")
+    args = parser.parse_args()
+
+    sizes = {"small_user": max(1, args.challenges // 10), "large_user": args.challenges}
+    for user_id, challenges in sizes.items():
+        print(f"Populating {challenges:,} challenges for {user_id} ...")
+        _populate(user_id, challenges)
+
+    print()
+    for fmt, compression in VARIANTS:
+        for user_id, challenges in sizes.items():
+            _measure(user_id, challenges, fmt, compression)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# Benchmark - Challenge History Read Path
+#
+# Compares the legacy history build (four ORM queries, Python dict joins and a
+# sort on ISO strings over the WHOLE history) against the single projected
+# Core query that serves one keyset page.
+#
+# Also times the full-text search endpoint query against the same history.
+#
+# Reports latency (median of several runs) and peak Python memory (tracemalloc).
+#
+# USAGE (from the backend directory):
+#   python -m benchmarks.history_bench                        # 12,000 challenges
+#   python -m benchmarks.history_bench --challenges 50000
+#
+# A throwaway SQLite file is used; the real database is never touched.
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+_tmpdir = tempfile.mkdtemp(prefix="history_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from sqlalchemy import insert  # noqa: E402
+from src.database import models, db as db_helpers  # noqa: E402
+from src.database.search import rebuild_search_index  # noqa: E402
+
+BENCH_USER = "bench_user"
+
+
+def _populate(challenges: int, other_users: int):
+    """One heavy user plus `other_users` equally heavy neighbours; ~half answered."""
+    start = datetime.now() - timedelta(days=365)
+    with models.engine.begin() as conn:
+        for u in range(other_users + 1):
+            user_id = BENCH_USER if u == 0 else f"other_{u}"
+            n_interview = challenges * 2 // 3
+            n_scenario = challenges - n_interview
+            conn.execute(insert(models.InterviewChallenge), [{
+                "created_by": user_id, "topic": f"Topic {i % 12}", "difficulty": ("Easy", "Medium", "Hard")[i % 3],
+                "title": f"Question {i} " + "x" * 120, "options": ["A option", "B option", "C option", "D option"],
+                "correct_answer_id": i % 4, "explaination": "Because " + "y" * 600,
+                "date_created": start + timedelta(minutes=i * 3),
+            } for i in range(n_interview)])
+            conn.execute(insert(models.ScenarioChallenge), [{
+                "created_by": user_id, "topic": f"Topic {i % 12}", "difficulty": ("Easy", "Medium", "Hard")[i % 3],
+                "title": f"Scenario {i} " + "s" * 300,
+                "questions": [{"prompt": "How?", "explanation": "..."}, {"prompt": "Why?", "explanation": "..."}],
+                "correct_answer": "Ideal " + "c" * 500, "explanation": "Rubric " + "r" * 300,
+                "date_created": start + timedelta(minutes=i * 5 + 1),
+            } for i in range(n_scenario)])
+            if u:
+                continue
+            interview_ids = [r[0] for r in conn.exec_driver_sql(
+                "SELECT id FROM interview_challenges WHERE created_by = ?", (user_id,))]
+            scenario_ids = [r[0] for r in conn.exec_driver_sql(
+                "SELECT id FROM scenario_challenges WHERE created_by = ?", (user_id,))]
+            conn.execute(insert(models.InterviewAnswer), [{
+                "user_id": user_id, "challenge_id": cid, "user_answer_id": cid % 4,
+                "is_correct": cid % 2 == 0, "date_completed": datetime.now(),
+            } for cid in interview_ids[::2]])
+            conn.execute(insert(models.ScenarioAnswer), [{
+                "user_id": user_id, "scenario_id": sid, "question_index": q, "user_answer": "Answer " + "a" * 400,
+                "llm_score": 70, "llm_feedback": "Feedback " + "f" * 500, "llm_correct_answer": "Model " + "m" * 500,
+                "created_at": datetime.now(),
+            } for sid in scenario_ids[::2] for q in range(2)])
+
+
+def _legacy_history(db):
+    """Baseline GET /challenges/history: everything, four queries, dict joins, string sort."""
+    interview_challenges = db_helpers.get_user_challenges(db, BENCH_USER, "interview")
+    scenario_challenges = db_helpers.get_user_challenges(db, BENCH_USER, "scenario")
+    interview_answers = {a.challenge_id: a for a in db_helpers.get_user_interview_answers(db, BENCH_USER)}
+    scenario_answers = {}
+    for a in db_helpers.get_user_scenario_answers(db, BENCH_USER):
+        scenario_answers.setdefault(a.scenario_id, []).append(a)
+    out = []
+    for c in interview_challenges:
+        a = interview_answers.get(c.id)
+        out.append({"id": c.id, "type": "interview", "topic": c.topic, "difficulty": c.difficulty,
+                    "title": c.title, "date_created": c.date_created.isoformat(), "options": c.options,
+                    "correct_answer_id": c.correct_answer_id, "explanation": c.explaination,
+                    "user_answer": {"user_answer_id": a.user_answer_id, "is_correct": a.is_correct,
+                                    "date_completed": a.date_completed.isoformat(),
+                                    "time_taken_seconds": a.time_taken_seconds} if a else None})
+    for c in scenario_challenges:
+        out.append({"id": c.id, "type": "scenario", "topic": c.topic, "difficulty": c.difficulty,
+                    "title": c.title, "date_created": c.date_created.isoformat(), "questions": c.questions,
+                    "correct_answer": c.correct_answer, "explanation": c.explanation,
+                    "user_answers": [{"question_index": a.question_index, "user_answer": a.user_answer,
+                                      "llm_score": a.llm_score, "llm_feedback": a.llm_feedback,
+                                      "llm_correct_answer": a.llm_correct_answer,
+                                      "created_at": a.created_at.isoformat()}
+                                     for a in scenario_answers.get(c.id, [])]})
+    out.sort(key=lambda x: x["date_created"], reverse=True)
+    return out
+
+
+def _core_page(db, limit, cursor=None):
+    page, next_cursor = db_helpers.get_user_history_page(db, BENCH_USER, limit=limit, cursor=cursor)
+    return page, next_cursor
+
+
+def _core_all_pages(db, limit):
+    cursor, total = None, 0
+    while True:
+        page, cursor = _core_page(db, limit, cursor)
+        total += len(page)
+        if not cursor:
+            return total
+
+
+def _measure(label, fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        db = models.SessionLocal()
+        start = time.perf_counter()
+        fn(db)
+        timings.append(time.perf_counter() - start)
+        db.close()
+    db = models.SessionLocal()
+    tracemalloc.start()
+    fn(db)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.close()
+    print(f"{label:<42} {statistics.median(timings) * 1000:>10.2f} ms   peak {peak / 1024 / 1024:>8.2f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--challenges", type=int, default=12_000)
+    parser.add_argument("--other-users", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"Populating {args.challenges:,} challenges for {BENCH_USER} (+{args.other_users} other users) ...")
+    _populate(args.challenges, args.other_users)
+    db = models.SessionLocal()
+    rebuild_search_index(db)
+    db.close()
+
+    # Cursor deep into the history to show page latency is independent of position
+    db = models.SessionLocal()
+    cursor = None
+    for _ in range(args.challenges // args.page_size // 2):
+        _, cursor = _core_page(db, args.page_size, cursor)
+    db.close()
+
+    print()
+    _measure("legacy full history (4 queries)", _legacy_history, args.repeats)
+    _measure(f"core query, first page ({args.page_size})", lambda db: _core_page(db, args.page_size), args.repeats)
+    _measure(f"core query, middle page ({args.page_size})",
+             lambda db: _core_page(db, args.page_size, cursor), args.repeats)
+    _measure("core query, full walk in pages of 100", lambda db: _core_all_pages(db, 100), max(1, args.repeats // 2))
+    _measure("full-text search, selective term", lambda db: db_helpers.search_user_history(
+        db, BENCH_USER, "question 1234"), args.repeats)
+    _measure("full-text search, common term", lambda db: db_helpers.search_user_history(
+        db, BENCH_USER, "option"), args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Benchmark - MCQ Answer Write Path
+#
+# Compares grading a quiz one answer at a time (POST /interview-answers: one
+# challenge lookup, one INSERT, stats upserts and a commit PER ANSWER) against
+# the bulk path (POST /interview-answers/bulk: one IN query, one multi-row
+# INSERT, one commit).
+#
+# Reports cost per answer (median over quizzes) and SQL statements per answer.
+# Clerk authentication runs once per HTTP request and is NOT included, so the
+# real per-answer saving of the bulk endpoint is larger than shown.
+#
+# USAGE (from the backend directory):
+#   python -m benchmarks.interview_answer_bench                 # 200 quizzes of 7
+#   python -m benchmarks.interview_answer_bench --quiz-size 20 --quizzes 500
+#
+# A throwaway SQLite file is used; the real database is never touched.
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="interview_answer_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from sqlalchemy import event, insert  # noqa: E402
+from src.database import models, db as db_helpers  # noqa: E402
+
+BENCH_USER = "bench_user"
+
+
+class _StatementCounter:
+    """Counts statements sent to the driver (executemany counts once)."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def _populate(challenges: int):
+    with models.engine.begin() as conn:
+        conn.execute(insert(models.InterviewChallenge), [{
+            "created_by": BENCH_USER, "topic": f"Topic {i % 5}", "difficulty": "Medium",
+            "title": f"Question {i}", "options": ["A", "B", "C", "D"],
+            "correct_answer_id": i % 4, "explaination": "Because",
+        } for i in range(challenges)])
+        return [row[0] for row in conn.exec_driver_sql("SELECT id FROM interview_challenges")]
+
+
+def _single(db, quiz):
+    """Current endpoint: one save (and commit) per answer."""
+    for challenge_id, user_answer_id in quiz:
+        db_helpers.save_interview_answer(db, BENCH_USER, challenge_id, user_answer_id, 30)
+
+
+def _bulk(db, quiz):
+    db_helpers.save_interview_answers(db, BENCH_USER, [
+        {"challenge_id": challenge_id, "user_answer_id": user_answer_id, "time_taken_seconds": 30}
+        for challenge_id, user_answer_id in quiz
+    ])
+
+
+def _measure(label, fn, quizzes, quiz_size, counter):
+    timings = []
+    counter.count = 0
+    for quiz in quizzes:
+        db = models.SessionLocal()
+        start = time.perf_counter()
+        fn(db, quiz)
+        timings.append(time.perf_counter() - start)
+        db.close()
+    per_answer = statistics.median(timings) / quiz_size
+    statements = counter.count / (len(quizzes) * quiz_size)
+    print(f"{label:<38} {per_answer * 1000:>8.3f} ms/answer   {statements:>6.2f} statements/answer")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--challenges", type=int, default=2_000)
+    parser.add_argument("--quizzes", type=int, default=200)
+    parser.add_argument("--quiz-size", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"Populating {args.challenges:,} challenges ...")
+    ids = _populate(args.challenges)
+    quizzes = [
+        [(ids[(q * args.quiz_size + i) % len(ids)], i % 4) for i in range(args.quiz_size)]
+        for q in range(args.quizzes)
+    ]
+    counter = _StatementCounter(models.engine)
+
+    print(f"{args.quizzes} quizzes of {args.quiz_size} answers\n")
+    _measure("single answer endpoint (per answer)", _single, quizzes, args.quiz_size, counter)
+    _measure("bulk endpoint (whole quiz)", _bulk, quizzes, args.quiz_size, counter)
+
+
+if __name__ == "__main__":
+    main()
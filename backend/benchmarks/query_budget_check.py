@@ -0,0 +1,155 @@
+# Check - Per-Route SQL Budgets and N+1 Detection
+#
+# Seeds a throwaway SQLite file with a user whose history is large enough for
+# any per-row query to show up, then calls the budgeted read and write routes
+# through FastAPI's TestClient with SQL_DEBUG_MODE=raise:
+#
+#   GET  /api/challenges/history   (first page, next page, filtered)
+#   GET  /api/challenges/search
+#   GET  /api/stats                (with and without today / week windows)
+#   POST /api/interview-answers/bulk
+#
+# A route over its QUERY_BUDGETS entry or with a repeated SELECT shape (N+1)
+# raises QueryBudgetExceeded in the instrumentation middleware. Before that,
+# the detector itself is checked: a hand-written N+1 loop and a block over
+# budget must both be reported. The script exits with status 1 on any failure,
+# so it doubles as a regression check:
+#
+#   python -m benchmarks.query_budget_check || echo "query budgets regressed"
+#
+# Authentication is replaced with a fixed user through dependency_overrides.
+#
+# USAGE (from the backend directory):
+#   python -m benchmarks.query_budget_check
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+_tmpdir = tempfile.mkdtemp(prefix="query_budget_check_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'check.db')}"
+os.environ["SQL_DEBUG_MODE"] = "raise"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from src.app import app  # noqa: E402
+from src.auth import get_current_user  # noqa: E402
+from src.database import models, db as db_helpers  # noqa: E402
+from src.database.instrumentation import (  # noqa: E402
+    QueryBudgetExceeded, SQL_N_PLUS_ONE_THRESHOLD, check_request, query_budget, track_queries
+)
+
+CHECK_USER = "budget_user"
+TOPICS = ["Kernels", "Networking", "Databases", "Caching"]
+
+
+def _question(i: int):
+    return {"title": f"Kernel question {i}", "options": ["A", "B", "C", "D"], "correct_answer_id": i % 4,
+            "explaination": f"Kernel explanation {i}"}
+
+
+def _seed():
+    """40 interview challenges (30 answered), 10 evaluated scenarios, plus another user's rows."""
+    db = models.SessionLocal()
+    interview = []
+    for topic in TOPICS:
+        interview += db_helpers.create_interview_challenges(
+            db, "Medium", CHECK_USER, topic, [_question(i) for i in range(10)])
+    db_helpers.save_interview_answers(db, CHECK_USER, [
+        {"challenge_id": challenge.id, "user_answer_id": i % 4} for i, challenge in enumerate(interview[:30])
+    ])
+    for i in range(10):
+        scenario = db_helpers.create_scenario_challenge(
+            db, "Hard", CHECK_USER, TOPICS[i % 4], f"Kernel scenario {i}", [{"prompt": "How?"}], "Ideal", "Rubric")
+        answer = db_helpers.save_scenario_answer(db, CHECK_USER, scenario.id, 0, "Kernel answer")
+        db_helpers.update_scenario_evaluation(db, answer.id, 60 + i, "Feedback", "Model answer")
+    db_helpers.create_interview_challenges(db, "Easy", "other_user", "Kernels", [_question(i) for i in range(10)])
+    ids = [challenge.id for challenge in interview]
+    db.close()
+    return ids
+
+
+def _expect_problem(name: str, stats, route: str, expected: str):
+    """The detector must raise for `stats`, mentioning `expected`."""
+    try:
+        check_request(route, stats, "raise")
+    except QueryBudgetExceeded as e:
+        if expected in str(e):
+            print(f"{name:<40} detected")
+            return True
+        print(f"{name:<40} wrong report: {e}")
+        return False
+    print(f"{name:<40} NOT DETECTED ({stats.count} statements)")
+    return False
+
+
+def _check_detector(challenge_ids):
+    """Statements run through the real engine hooks, judged by check_request()."""
+    db = models.SessionLocal()
+    with track_queries("N+1 self-test") as n_plus_one:
+        for challenge_id in challenge_ids[:SQL_N_PLUS_ONE_THRESHOLD]:
+            db.execute(select(models.InterviewChallenge.title).where(models.InterviewChallenge.id == challenge_id))
+    route = "GET /api/challenges/history"
+    tables = [models.InterviewChallenge, models.ScenarioChallenge, models.InterviewAnswer, models.ScenarioAnswer,
+              models.UserStats, models.UserTopicStats, models.ChallengeQuota, models.UserDataVersion]
+    with track_queries("budget self-test") as over_budget:
+        for model in tables[:query_budget(route) + 1]:
+            db.execute(select(model).limit(1))
+    db.close()
+    return [
+        _expect_problem("detector: N+1 loop", n_plus_one, route, "possible N+1"),
+        _expect_problem("detector: over budget", over_budget, route, "exceed the budget"),
+    ]
+
+
+def _call(client, name: str, method: str, url: str, **kwargs):
+    """One request; False if it failed or broke its budget."""
+    try:
+        response = client.request(method, url, **kwargs)
+    except QueryBudgetExceeded as e:
+        print(f"{name:<40} FAILED {e}")
+        return False, None
+    timing = response.headers.get("Server-Timing", "")
+    statements = timing.split('desc="', 1)[1].split(" ", 1)[0] if 'desc="' in timing else "?"
+    ok = response.status_code < 400
+    print(f"{name:<40} {response.status_code} {statements:>3} statements" + ("" if ok else f"  {response.text[:200]}"))
+    return ok, response
+
+
+def main():
+    challenge_ids = _seed()
+    results = _check_detector(challenge_ids)
+
+    app.dependency_overrides[get_current_user] = lambda: {"user_id": CHECK_USER}
+    client = TestClient(app)
+
+    ok, response = _call(client, "history: first page", "GET", "/api/challenges/history?limit=20")
+    results.append(ok)
+    cursor = response.json().get("next_cursor") if ok else None
+    if cursor:
+        results.append(_call(client, "history: next page", "GET", f"/api/challenges/history?limit=20&cursor={cursor}")[0])
+    else:
+        print(f"{'history: next page':<40} FAILED no next_cursor")
+        results.append(False)
+    results.append(_call(client, "history: filtered", "GET",
+                         "/api/challenges/history?type=interview&answered=true&topic=Kernels")[0])
+    results.append(_call(client, "search", "GET", "/api/challenges/search?q=kernel&limit=50")[0])
+    results.append(_call(client, "stats", "GET", "/api/stats")[0])
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    results.append(_call(client, "stats: today / week windows", "GET", "/api/stats", params={
+        "today_start": today.isoformat(), "week_start": (today - timedelta(days=today.weekday())).isoformat()
+    })[0])
+    results.append(_call(client, "bulk answers (20, 10 repeated)", "POST", "/api/interview-answers/bulk", json={
+        "answers": [{"challenge_id": challenge_id, "user_answer_id": 1} for challenge_id in challenge_ids[20:]]
+    })[0])
+
+    failed = results.count(False)
+    if failed:
+        print(f"\n{failed} check(s) failed")
+        sys.exit(1)
+    print(f"\nAll {len(results)} checks passed")
+
+
+if __name__ == "__main__":
+    main()
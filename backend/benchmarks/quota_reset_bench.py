@@ -0,0 +1,120 @@
+# Benchmark - Quota Reset and Quota Read Path
+#
+# Compares the legacy quota handling against the set-based version:
+#   1. Admin reset: load every ChallengeQuota row into Python vs one UPDATE
+#   2. Read path: reset-and-commit on stale rows vs write-free window computation
+#
+# USAGE (from the backend directory):
+#   python -m benchmarks.quota_reset_bench                 # 1,000,000 quota rows
+#   python -m benchmarks.quota_reset_bench --rows 100000   # smaller run
+#
+# A throwaway SQLite file is used; the real database is never touched.
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_tmpdir = tempfile.mkdtemp(prefix="quota_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from sqlalchemy import insert  # noqa: E402
+from src.database import models, db as db_helpers  # noqa: E402
+
+
+def _populate(rows: int):
+    """Insert `rows` stale quota rows (half interview, half scenario)."""
+    stale = datetime.now() - timedelta(days=1)
+    batch = []
+    with models.engine.begin() as conn:
+        conn.execute(models.ChallengeQuota.__table__.delete())
+        for i in range(rows):
+            batch.append({
+                "user_id": f"user_{i // 2}",
+                "challenge_type": "interview" if i % 2 == 0 else "scenario",
+                "quota_remaining": random.randint(0, 10),
+                "last_reset_date": stale,
+            })
+            if len(batch) == 50_000:
+                conn.execute(insert(models.ChallengeQuota), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(models.ChallengeQuota), batch)
+
+
+def _legacy_force_reset(db):
+    """Previous force_reset_all_quotas: hydrate every row and update it in Python."""
+    for quota in db.query(models.ChallengeQuota).all():
+        quota.quota_remaining = 10
+        quota.last_reset_date = db_helpers.get_quota_window_start()
+    db.commit()
+
+
+def _legacy_read(db, user_id: str, challenge_type: str):
+    """Previous GET /quotas/{type}: read, then reset and commit if the row is stale."""
+    quota = db_helpers.get_challenge_quota(db, user_id, challenge_type)
+    if quota.last_reset_date < db_helpers.get_quota_window_start():
+        quota.quota_remaining = 10
+        quota.last_reset_date = db_helpers.get_quota_window_start()
+        db.commit()
+        db.refresh(quota)
+    return quota.quota_remaining
+
+
+def _new_read(db, user_id: str, challenge_type: str):
+    """Current GET /quotas/{type}: read and compute the window without writing."""
+    quota = db_helpers.get_challenge_quota(db, user_id, challenge_type)
+    return db_helpers.get_effective_quota(quota)[0]
+
+
+def _timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} {elapsed:>9.3f}s")
+    return elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--reads", type=int, default=5_000)
+    args = parser.parse_args()
+
+    print(f"Populating {args.rows:,} quota rows in {_tmpdir} ...")
+    _populate(args.rows)
+    with models.engine.begin() as conn:
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_bench_quota ON challenge_quotas (user_id, challenge_type)")
+
+    users = [(f"user_{random.randrange(args.rows // 2)}", random.choice(["interview", "scenario"]))
+             for _ in range(args.reads)]
+
+    print("\n-- Read path (all rows stale) --")
+    db = models.SessionLocal()
+    _timed(f"legacy read + reset commit x{args.reads:,}", lambda: [_legacy_read(db, u, t) for u, t in users])
+    db.close()
+    _populate(args.rows)
+    db = models.SessionLocal()
+    _timed(f"write-free read x{args.reads:,}", lambda: [_new_read(db, u, t) for u, t in users])
+    db.close()
+
+    print("\n-- Full reset --")
+    _populate(args.rows)
+    db = models.SessionLocal()
+    _timed("legacy ORM force reset", lambda: _legacy_force_reset(db))
+    db.close()
+    _populate(args.rows)
+    db = models.SessionLocal()
+    _, count = _timed("set-based force_reset_all_quotas", lambda: db_helpers.force_reset_all_quotas(db))
+    db.close()
+    _populate(args.rows)
+    db = models.SessionLocal()
+    _timed("set-based reset_stale_quotas", lambda: db_helpers.reset_stale_quotas(db))
+    db.close()
+    print(f"\nRows reset per UPDATE: {count:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# Benchmark - Response Serialization and Compression
+#
+# Serializes history pages (long LLM explanations, feedback and ideal answers)
+# the ways GET /challenges/history could:
+#
+#   - json.dumps       : JSONResponse.render (the previous history path)
+#   - jsonable_encoder : FastAPI's default for routes without a response model
+#   - response model   : pydantic validate + dump_json (typed routes, schemas.py)
+#   - orjson           : the history path now
+#
+# and reports bytes on the wire plus compression time for identity, gzip and
+# brotli (if the `brotli` package is installed) at the levels compression.py uses.
+#
+# USAGE (from the backend directory):
+#   python -m benchmarks.response_bench                  # pages of 20 and 100 items
+#   python -m benchmarks.response_bench --page-sizes 20 50 100 --repeats 200
+#
+# Synthetic rows, no database is touched.
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+_tmpdir = tempfile.mkdtemp(prefix="response_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+import orjson  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from src.compression import compress, SUPPORTED_ENCODINGS, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY  # noqa: E402
+from src.database.export import history_record  # noqa: E402
+from src.routes.schemas import HistoryPage  # noqa: E402
+
+# Word soup with the vocabulary of real LLM output (compresses like text, not like "xxxx")
+WORDS = (
+    "the model training data feature gradient loss function overfitting regularization "
+    "validation accuracy precision recall pipeline latency throughput embedding vector "
+    "transformer attention layer batch normalization learning rate schedule because "
+    "therefore however consider trade-off production monitoring drift retraining bias "
+    "variance cross-entropy optimizer convergence sample distribution inference cost"
+).split()
+
+
+def _text(rng, words: int):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _rows(page_size: int, seed: int = 7):
+    """(challenge_row, [answer_rows]) pairs shaped like get_user_history_page() output."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    rows = []
+    for i in range(page_size):
+        created = now - timedelta(hours=i)
+        if i % 3:
+            challenge = SimpleNamespace(
+                type="interview", id=i, topic=f"Topic {i % 7}", difficulty="Medium",
+                title=_text(rng, 25), date_created=created,
+                content=[_text(rng, 12) for _ in range(4)], correct_answer_id=i % 4,
+                correct_answer=None, explanation=_text(rng, 120)
+            )
+            answers = [SimpleNamespace(
+                user_answer_id=1, is_correct=i % 2 == 0, date_completed=created, time_taken_seconds=42,
+                attempts=1, best_is_correct=i % 2 == 0
+            )] if i % 2 else []
+        else:
+            challenge = SimpleNamespace(
+                type="scenario", id=i, topic=f"Topic {i % 7}", difficulty="Hard",
+                title=_text(rng, 80), date_created=created,
+                content=[{"prompt": _text(rng, 30), "explanation": _text(rng, 40)} for _ in range(2)],
+                correct_answer_id=None, correct_answer=_text(rng, 150), explanation=_text(rng, 80)
+            )
+            answers = [SimpleNamespace(
+                question_index=q, user_answer=_text(rng, 120), llm_score=70,
+                llm_feedback=_text(rng, 150), llm_correct_answer=_text(rng, 150), created_at=created
+            ) for q in range(2)]
+        rows.append((challenge, answers))
+    return rows
+
+
+def _payload(page_size: int):
+    return {
+        "challenges": [history_record(challenge, answers) for challenge, answers in _rows(page_size)],
+        "next_cursor": "WyIyMDI1LTAxLTAxVDAwOjAwOjAwIiwgImludGVydmlldyIsIDEyM10=",
+        "has_more": True,
+        "total_count": 5000,
+        "interview_count": 3333,
+        "scenario_count": 1667
+    }
+
+
+def _median_ms(fn, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--repeats", type=int, default=100)
+    args = parser.parse_args()
+
+    adapter = TypeAdapter(HistoryPage)
+    serializers = [
+        ("json.dumps (JSONResponse)", lambda p: JSONResponse(content=p).body),
+        ("jsonable_encoder + json.dumps", lambda p: JSONResponse(content=jsonable_encoder(p)).body),
+        ("response model (pydantic)", lambda p: adapter.dump_json(adapter.validate_python(p), exclude_unset=True)),
+        ("orjson", orjson.dumps),
+    ]
+    levels = {"gzip": f"level {COMPRESSION_GZIP_LEVEL}", "br": f"quality {COMPRESSION_BROTLI_QUALITY}"}
+
+    for page_size in args.page_sizes:
+        payload = _payload(page_size)
+        print(f"\nHistory page of {page_size} items")
+        print(f"  {'serializer':<34} {'median':>10} {'bytes':>10}")
+        for label, serialize in serializers:
+            body = serialize(payload)
+            print(f"  {label:<34} {_median_ms(lambda: serialize(payload), args.repeats):>7.3f} ms {len(body):>10,}")
+
+        body = orjson.dumps(payload)
+        print(f"  {'encoding':<34} {'median':>10} {'bytes':>10} {'ratio':>7}")
+        print(f"  {'identity':<34} {0:>7.3f} ms {len(body):>10,} {1:>6.1f}x")
+        for encoding in SUPPORTED_ENCODINGS:
+            compressed = compress(body, encoding)
+            label = f"{encoding} ({levels[encoding]})"
+            print(f"  {label:<34} {_median_ms(lambda: compress(body, encoding), args.repeats):>7.3f} ms "
+                  f"{len(compressed):>10,} {len(body) / len(compressed):>6.1f}x")
+        if "br" not in SUPPORTED_ENCODINGS:
+            print("  (install `brotli` for the br encoding)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Benchmark - Write Helper Round Trips
+#
+# Runs every write helper in src/database/db.py against a throwaway SQLite
+# file and reports SQL statements (round trips) and time per call. Each helper
+# has an exact expected statement count in EXPECTED_STATEMENTS; the script
+# exits with status 1 if any call runs a different number (more is a
+# regression, fewer means the table is stale), so it doubles as a test:
+#
+#   python -m benchmarks.write_path_bench || echo "write path regressed"
+#
+# Statements are counted with the same hooks as the per-request SQL
+# instrumentation (src/database/instrumentation.py). COMMIT is not a cursor
+# statement and is not counted.
+#
+# USAGE (from the backend directory):
+#   python -m benchmarks.write_path_bench               # 200 calls per helper
+#   python -m benchmarks.write_path_bench --calls 2000
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="write_path_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from src.database import models, db as db_helpers  # noqa: E402
+from src.database.instrumentation import track_queries  # noqa: E402
+
+# Statements per call. The 2 stats statements are the user_stats and
+# user_topic_stats upserts, "version" the user_data_versions upsert.
+EXPECTED_STATEMENTS = {
+    "create_challenge_quota": 2,             # INSERT RETURNING, version
+    "create_interview_challenge": 5,         # INSERT RETURNING, 2 stats, search, version
+    "create_interview_challenges (x5)": 5,   # multi-row INSERT RETURNING, 2 stats, search executemany, version
+    "create_scenario_challenge": 5,          # INSERT RETURNING, 2 stats, search, version
+    "save_scenario_answer": 3,               # INSERT RETURNING, search, version
+    "update_scenario_evaluation": 5,         # read, UPDATE RETURNING, 2 stats, version
+    # projected read (correctness, topic, previous result), upsert RETURNING, 2 stats, version
+    "save_interview_answer": 5,
+    "save_interview_answers (x7)": 5,
+    # same answer again: read, upsert RETURNING, version (no stats delta, so no stats statements)
+    "save_interview_answer (repeat)": 3,
+}
+
+QUESTION = {"title": "What is a kernel?", "options": ["A", "B", "C", "D"], "correct_answer_id": 1,
+            "explaination": "Because"}
+
+
+def _helpers(calls: int):
+    """{label: fn(db, i)} for every write helper, with the fixtures they need."""
+    db = models.SessionLocal()
+    # Fresh challenges per call, so every first-answer call changes the stats
+    single = db_helpers.create_interview_challenges(db, "Medium", "fixture", "Kernels", [QUESTION] * calls)
+    batches = db_helpers.create_interview_challenges(db, "Medium", "fixture", "Kernels", [QUESTION] * 7 * calls)
+    repeated = single[0].id
+    db_helpers.save_interview_answer(db, "bench", repeated, 0, 30)
+    scenario = db_helpers.create_scenario_challenge(
+        db, "Hard", "fixture", "Design", "Scenario", [{"prompt": "How?"}], "Ideal", "Rubric"
+    )
+    answers = [db_helpers.save_scenario_answer(db, "fixture", scenario.id, 0, "Answer").id for _ in range(calls)]
+    db.close()
+
+    return {
+        "create_challenge_quota": lambda db, i: db_helpers.create_challenge_quota(db, f"quota_user_{i}", "interview"),
+        "create_interview_challenge": lambda db, i: db_helpers.create_interview_challenge(
+            db, "Easy", "bench", "Kernels", QUESTION["title"], QUESTION["options"], 1, QUESTION["explaination"]),
+        "create_interview_challenges (x5)": lambda db, i: db_helpers.create_interview_challenges(
+            db, "Easy", "bench", "Kernels", [QUESTION] * 5),
+        "create_scenario_challenge": lambda db, i: db_helpers.create_scenario_challenge(
+            db, "Hard", "bench", "Design", "Scenario", [{"prompt": "How?"}], "Ideal", "Rubric"),
+        "save_scenario_answer": lambda db, i: db_helpers.save_scenario_answer(db, "bench", scenario.id, 0, "Answer"),
+        "update_scenario_evaluation": lambda db, i: db_helpers.update_scenario_evaluation(
+            db, answers[i], 70 + i % 30, "Feedback", "Model answer"),
+        "save_interview_answer": lambda db, i: db_helpers.save_interview_answer(
+            db, "bench_first", single[i].id, i % 4, 30),
+        "save_interview_answers (x7)": lambda db, i: db_helpers.save_interview_answers(db, "bench_first", [
+            {"challenge_id": challenge.id, "user_answer_id": i % 4} for challenge in batches[i * 7:(i + 1) * 7]
+        ]),
+        "save_interview_answer (repeat)": lambda db, i: db_helpers.save_interview_answer(db, "bench", repeated, 0, 30),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    failed = []
+    print(f"{'helper':<34} {'statements':>10} {'expected':>9} {'ms/call':>9}")
+    for label, fn in _helpers(args.calls).items():
+        timings, counts = [], []
+        for i in range(args.calls):
+            db = models.SessionLocal()
+            with track_queries(label) as stats:
+                start = time.perf_counter()
+                fn(db, i)
+                timings.append(time.perf_counter() - start)
+            counts.append(stats.count)
+            db.close()
+        expected = EXPECTED_STATEMENTS[label]
+        unexpected = sorted({count for count in counts if count != expected})
+        statements = "/".join(str(count) for count in unexpected) if unexpected else str(expected)
+        flag = "  UNEXPECTED" if unexpected else ""
+        print(f"{label:<34} {statements:>10} {expected:>9} {statistics.median(timings) * 1000:>9.3f}{flag}")
+        if unexpected:
+            failed.append(label)
+
+    if failed:
+        print(f"\n{len(failed)} helper(s) ran an unexpected number of statements: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
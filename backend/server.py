@@ -1,8 +1,105 @@
 # this will run the application in the backend
-from src.app import app
+#
+# USAGE:
+#   python server.py               # development: one process, auto-reload
+#   python server.py --production  # production: worker pool (railway.json)
+#
+# PRODUCTION MODE:
+#   - workers  : WEB_CONCURRENCY, default one per available CPU (affinity and
+#                cgroup CPU quota of the container are respected)
+#   - preload  : the parent imports the app once before starting the workers,
+#                so migrations and the shard map are set up by ONE process
+#                (workers find them done); each worker then warms up (see
+#                src/warmup.py) before it accepts connections. A worker that
+#                does not answer the supervisor's health ping within
+#                WEB_WORKER_HEALTHCHECK_SECONDS is replaced
+#   - draining : on SIGTERM the workers stop accepting, let in-flight requests
+#                (LLM generations take a while) finish for up to
+#                WEB_GRACEFUL_TIMEOUT_SECONDS, then flush their queues
+#   - recycling: a worker exits gracefully after WEB_MAX_REQUESTS requests
+#                (+ up to WEB_MAX_REQUESTS_JITTER, so they do not all restart
+#                at once) and is replaced by a fresh one
+#   - shared state: read-your-writes tracking is shared by the workers through
+#                a memory-mapped file, and only one worker runs the scheduled
+#                database jobs (lock file); see sharding.py / scheduler.py
+import argparse
+import os
+import shutil
+import tempfile
 
-if __name__ == "__main__":
+WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", "10000"))
+WEB_MAX_REQUESTS_JITTER = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "1000"))
+WEB_GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("WEB_GRACEFUL_TIMEOUT_SECONDS", "120"))
+WEB_WORKER_HEALTHCHECK_SECONDS = int(os.getenv("WEB_WORKER_HEALTHCHECK_SECONDS", "30"))
+
+
+def __getattr__(name):
+    # `uvicorn server:app` keeps working. The app is NOT imported at module level:
+    # spawned workers re-run this module before they can answer health pings.
+    if name == "app":
+        from src.app import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def available_cpus():
+    """CPUs this process may use: scheduler affinity, capped by the cgroup v2 CPU quota."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def worker_count():
+    """WEB_CONCURRENCY if set, otherwise one worker per available CPU."""
+    configured = os.getenv("WEB_CONCURRENCY")
+    return max(1, int(configured)) if configured else available_cpus()
+
+
+def run_production(host: str, port: int):
     import uvicorn
-    uvicorn.run("src.app:app", host="0.0.0.0", port=8000, reload=True)
-    
-    
\ No newline at end of file
+    import src.database.models  # noqa: F401 - preload: migrations and shard map, once
+    from src.database.sharding import SharedRecentWrites
+
+    workers = worker_count()
+    state_dir = tempfile.mkdtemp(prefix="intrvu-")
+    try:
+        # Inherited by the workers (spawned after this point)
+        os.environ["READ_YOUR_WRITES_FILE"] = os.path.join(state_dir, "recent_writes")
+        os.environ["SCHEDULER_LOCK_FILE"] = os.path.join(state_dir, "scheduler.lock")
+        os.environ["METRICS_DIR"] = os.path.join(state_dir, "metrics")
+        SharedRecentWrites.create(os.environ["READ_YOUR_WRITES_FILE"])
+
+        print(f"Starting {workers} workers on {host}:{port} (recycled after ~{WEB_MAX_REQUESTS} requests, "
+              f"{WEB_GRACEFUL_TIMEOUT_SECONDS}s graceful shutdown)")
+        uvicorn.run(
+            "src.app:app",
+            host=host,
+            port=port,
+            workers=workers,
+            limit_max_requests=WEB_MAX_REQUESTS,
+            limit_max_requests_jitter=WEB_MAX_REQUESTS_JITTER,
+            timeout_graceful_shutdown=WEB_GRACEFUL_TIMEOUT_SECONDS,
+            timeout_worker_healthcheck=WEB_WORKER_HEALTHCHECK_SECONDS,
+        )
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the IntrVu backend")
+    parser.add_argument("--production", action="store_true", help="Worker pool instead of the auto-reloading dev server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    args = parser.parse_args()
+
+    if args.production:
+        run_production(args.host, args.port)
+    else:
+        import uvicorn
+        uvicorn.run("src.app:app", host=args.host, port=args.port, reload=True)
@@ -6,6 +6,11 @@
 # PROMPT CUSTOMIZATION:
 # The basic prompts are provided as templates - customize them for better results.
 # Focus on: specific output format, difficulty calibration, and evaluation criteria.
+#
+# LLM calls go through llm_circuit (see circuit.py): while the backend keeps
+# failing they raise CircuitOpen immediately instead of waiting for a timeout.
+# _invoke_llm() also records calls, latency and token usage per node for the
+# Prometheus endpoint (see metrics.py).
 
 import os
 import json
@@ -14,6 +19,9 @@ from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
 from langgraph.graph import StateGraph, END
+from .circuit import llm_circuit, CircuitOpen
+from ..metrics import llm_calls, llm_call_duration, llm_tokens
+import time
 
 # Load environment variables
 load_dotenv()
@@ -246,11 +254,30 @@ Generate your evaluation now, following all instructions above and outputting on
 # LANGGRAPH NODES
 # ========================================================================================
 
+def _invoke_llm(node: str, prompt: str):
+    """Call the LLM through the circuit breaker, recording metrics for the node"""
+    start = time.perf_counter()
+    try:
+        response = llm_circuit.call(llm, [HumanMessage(content=prompt)])
+    except CircuitOpen:
+        llm_calls.inc(node, "rejected")
+        raise
+    except Exception:
+        llm_calls.inc(node, "error")
+        llm_call_duration.observe(time.perf_counter() - start, node)
+        raise
+    llm_calls.inc(node, "ok")
+    llm_call_duration.observe(time.perf_counter() - start, node)
+    usage = getattr(response, "usage_metadata", None) or {}
+    llm_tokens.inc(node, "input", amount=usage.get("input_tokens", 0))
+    llm_tokens.inc(node, "output", amount=usage.get("output_tokens", 0))
+    return response
+
 def mcq_generation_node(state: AgentState) -> AgentState:
     """Generate MCQ challenges"""
     prompt = get_mcq_prompt(state['topic'], state['difficulty'], state['num_questions'])
     
-    response = llm([HumanMessage(content=prompt)])
+    response = _invoke_llm("mcq_generation_node", prompt)
     questions_data = json.loads(response.content)
     
     # Simple validation and formatting
@@ -258,7 +285,7 @@ def mcq_generation_node(state: AgentState) -> AgentState:
     for q in questions_data:
         validated_questions.append({
             "title": q["title"],
-            "options": json.dumps(q["options"]),  # Convert to JSON string for DB
+            "options": q["options"],  # Stored as native JSON
             "correct_answer_id": q["correct_answer_id"],
             "explaination": q["explaination"]
         })
@@ -270,13 +297,13 @@ def scenario_generation_node(state: AgentState) -> AgentState:
     """Generate scenario challenges"""
     prompt = get_scenario_prompt(state['topic'], state['difficulty'], state['num_questions'])
     
-    response = llm([HumanMessage(content=prompt)])
+    response = _invoke_llm("scenario_generation_node", prompt)
     scenario_data = json.loads(response.content)
     
-    # Format for database (questions as JSON string)
+    # Format for database (questions stored as native JSON)
     result = {
         "title": scenario_data["title"],
-        "questions": json.dumps(scenario_data["questions"]),  # Convert to JSON string for DB
+        "questions": scenario_data["questions"],
         "correct_answer": scenario_data["correct_answer"],
         "explanation": scenario_data["explanation"]
     }
@@ -293,7 +320,7 @@ def evaluation_node(state: AgentState) -> AgentState:
         state['questions']
     )
     
-    response = llm([HumanMessage(content=prompt)])
+    response = _invoke_llm("evaluation_node", prompt)
     eval_data = json.loads(response.content)
     
     # Format for database
@@ -380,9 +407,9 @@ def evaluate_scenario_answer(
     user_answer: str,
     correct_answer: str,
     scenario_title: str,
-    questions: str
+    questions: Any
 ) -> Dict[str, Any]:
-    """Evaluate scenario answer using LangGraph workflow"""
+    """Evaluate scenario answer using LangGraph workflow (questions: stored JSON array)"""
     workflow = create_evaluation_workflow()
     initial_state = {
         "messages": [],
@@ -393,7 +420,7 @@ def evaluate_scenario_answer(
         "user_answer": user_answer,
         "correct_answer": correct_answer,
         "scenario_title": scenario_title,
-        "questions": questions,
+        "questions": questions if isinstance(questions, str) else json.dumps(questions),  # prompt text
         "result": {}
     }
     
@@ -0,0 +1,140 @@
+# Circuit Breaker - Fail Fast While the LLM Backend Is Down
+#
+# Every LLM call of the agents goes through llm_circuit.call(). After
+# LLM_CIRCUIT_FAILURE_THRESHOLD consecutive failures the circuit OPENS: calls
+# are refused at once with CircuitOpen (the routes answer 503 + Retry-After)
+# instead of each request waiting for the backend to time out. After
+# LLM_CIRCUIT_RESET_SECONDS one trial call is let through (HALF_OPEN): success
+# closes the circuit, failure opens it again.
+#
+#   closed --N failures--> open --cooldown--> half_open --success--> closed
+#                                                       --failure--> open
+#
+# Only the LLM request counts: output that fails to parse is not a backend
+# failure. State is per worker; readiness reports it (see readiness.py).
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """The backend failed repeatedly; calls are refused until the cooldown ends."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Thread-safe consecutive-failure circuit breaker with latency counters."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None  # monotonic time the circuit last opened
+        self._trial_running = False
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self._call_seconds = 0.0
+        self.last_error = None
+
+    def _retry_after(self, now: float):
+        return max(0.0, self.reset_seconds - (now - self._opened_at))
+
+    def before_call(self):
+        """
+        Admit one call or refuse it.
+
+        Raises:
+            CircuitOpen: The circuit is open (or its half-open trial is running)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now - self._opened_at < self.reset_seconds:
+                    self.rejected += 1
+                    raise CircuitOpen(self.name, self._retry_after(now))
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._trial_running:
+                    self.rejected += 1
+                    raise CircuitOpen(self.name, self.reset_seconds)
+                self._trial_running = True
+
+    def record_success(self, seconds: float):
+        with self._lock:
+            self.calls += 1
+            self._call_seconds += seconds
+            self._consecutive_failures = 0
+            self._trial_running = False
+            if self.state != CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self.state = CLOSED
+
+    def record_failure(self, seconds: float, error: Exception):
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            self._call_seconds += seconds
+            self._consecutive_failures += 1
+            self.last_error = f"{type(error).__name__}: {str(error)}"[:200]
+            self._trial_running = False
+            if self.state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.error(f"Circuit '{self.name}' opened after {self._consecutive_failures} failures: {self.last_error}")
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) through the breaker (raises CircuitOpen while open)."""
+        self.before_call()
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(time.perf_counter() - start, e)
+            raise
+        self.record_success(time.perf_counter() - start)
+        return result
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "state": self.state,
+                "consecutive_failures": self._consecutive_failures,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "avg_ms": round(self._call_seconds * 1000 / self.calls, 1) if self.calls else 0.0,
+                "retry_after_seconds": round(self._retry_after(now), 1) if self.state == OPEN else None,
+                "last_error": self.last_error
+            }
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+
+llm_circuit = CircuitBreaker("llm", LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_SECONDS)
@@ -1,12 +1,53 @@
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from clerk_backend_api import Clerk
-from .routes import challenge, webhooks, health
-import os
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from .routes import challenge, webhooks, health, metrics, admin
+from .scheduler import database_jobs, jwks_refresh_loop, metrics_flush_loop
+from .auth import signing_keys, admin_user_id
+from .provisioning import provisioning_queue
+from .warmup import warm_up
+from .compression import CompressionMiddleware
+from .profiling import ProfilingMiddleware
+from .database.instrumentation import track_queries, check_request, route_metrics, route_template
+from .metrics import http_requests, http_request_duration, http_requests_in_progress, worker_metrics
+import asyncio
+import logging
+import time
 
-clerk_sdk = Clerk(bearer_auth=os.getenv("CLERK_SECRET_KEY"))
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connect, compile the hot queries and load the signing keys before serving
+    await run_in_threadpool(warm_up)
+    # Background jobs: set-based daily quota reset, expired idempotency keys,
+    # retention (see retention.py) - in one worker under server.py
+    database_jobs_task = asyncio.create_task(database_jobs())
+    # Background job: keep the Clerk JWKS fresh (not needed with JWT_KEY)
+    jwks_task = asyncio.create_task(jwks_refresh_loop()) if signing_keys.uses_jwks else None
+    # Batches the quota writes of user.created webhooks (see provisioning.py)
+    provisioning_queue.start()
+    # Publishes this worker's metrics to the others (METRICS_DIR, see metrics.py)
+    metrics_task = asyncio.create_task(metrics_flush_loop()) if worker_metrics.directory else None
+    yield
+    await provisioning_queue.stop()  # flush buffered signups before exiting
+    database_jobs_task.cancel()
+    if jwks_task:
+        jwks_task.cancel()
+    if metrics_task:
+        metrics_task.cancel()
+        worker_metrics.flush()  # keep this worker's final counts
+
+app = FastAPI(lifespan=lifespan)
+
+# brotli / gzip for JSON bodies above COMPRESSION_MIN_BYTES (innermost: sees the
+# route's response as one body, before the middlewares below wrap it)
+app.add_middleware(CompressionMiddleware)
+
+# Sampling profile of single admin requests sent with "X-Profile: 1" (see
+# profiling.py); wraps compression so its cost is part of the profile
+app.add_middleware(ProfilingMiddleware, authorize=admin_user_id)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,11 +63,59 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Readable by the frontend: export file name, idempotent replay marker, request profile
+    expose_headers=["Content-Disposition", "Idempotent-Replayed", "X-Profile-Id", "X-Profile-Breakdown"],
 )
 
+@app.middleware("http")
+async def sql_instrumentation(request: Request, call_next):
+    """
+    Count the SQL statements and DB time of every request (see instrumentation.py).
+    Logged per request, aggregated per route for /api/health/details, and sent to the
+    browser as a Server-Timing header (with the auth time, see auth.py). In
+    SQL_DEBUG_MODE=warn/raise, N+1 patterns and per-route budget overruns are reported.
+    Request count, latency and in-flight metrics go to /metrics (see metrics.py).
+    """
+    start = time.perf_counter()
+    status_code = 500  # unhandled exception
+    http_requests_in_progress.inc()
+    try:
+        with track_queries(f"{request.method} {request.url.path}") as stats:
+            response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        http_requests_in_progress.dec()
+        route_key = route_template(request.scope)
+        # Unmatched paths share one label (raw paths would explode the series count)
+        route = route_key.split(" ", 1)[1] if route_key else "unmatched"
+        http_request_duration.observe(time.perf_counter() - start, request.method, route)
+        http_requests.inc(request.method, route, str(status_code))
+
+    if route_key is None:  # 404s and CORS preflights: no per-route entry
+        return response
+    route_metrics.observe(route_key, stats)
+    summary = stats.summary()
+    timing = f'db;dur={summary["db_ms"]};desc="{stats.count} queries"'
+    auth_ms = getattr(request.state, "auth_ms", None)
+    if auth_ms is not None:
+        timing += f", auth;dur={auth_ms}"
+    response.headers["Server-Timing"] = timing
+    logger.info(
+        f"{route_key} {response.status_code} sql={stats.count} db={summary['db_ms']}ms "
+        f"slowest={summary['slowest_ms']}ms"
+    )
+    check_request(route_key, stats)
+    return response
+
 # Include challenge router with API prefix
 app.include_router(challenge.router, prefix="/api")
 
 app.include_router(webhooks.router, prefix="/webhooks")
 
-app.include_router(health.router, prefix="/api")
\ No newline at end of file
+app.include_router(health.router, prefix="/api")
+
+# Admin-only: stored request profiles (see profiling.py)
+app.include_router(admin.router, prefix="/api")
+
+# Prometheus scrape endpoint (no /api prefix, by convention)
+app.include_router(metrics.router)
\ No newline at end of file
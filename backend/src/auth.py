@@ -0,0 +1,363 @@
+# Authentication - Local Clerk Session Token Verification
+#
+# Routes depend on get_current_user(), which verifies the Clerk session JWT
+# (Authorization: Bearer <token> or the __session cookie) IN PROCESS - no call
+# to Clerk per request:
+#
+#   1. claims cache  - tokens verified in the last AUTH_CLAIMS_CACHE_SECONDS
+#                      (never past their exp) are accepted from an LRU
+#   2. signature     - RS256 against JWT_KEY (the instance's PEM public key)
+#                      or, if JWT_KEY is unset, the instance's JWKS fetched
+#                      with CLERK_SECRET_KEY and cached by key id
+#   3. claims        - exp / nbf / iat (with AUTH_CLOCK_SKEW_SECONDS leeway)
+#                      and azp, when present, must be one of AUTHORIZED_PARTIES
+#
+# The JWKS is refreshed every AUTH_JWKS_REFRESH_SECONDS by a background job
+# (see scheduler.jwks_refresh_loop) and immediately when a token names an
+# unknown key id (key rotation) - at most once per AUTH_JWKS_MIN_REFRESH_SECONDS,
+# so random key ids can not make every request wait on Clerk.
+#
+# Time spent authenticating is sent in the Server-Timing header ("auth").
+#
+# ADMINS: the Clerk user ids in ADMIN_USER_IDS may use the admin features
+# (get_admin_user; per-request profiling, see profiling.py).
+
+from fastapi import HTTPException, Request, status
+from collections import OrderedDict
+from jwt.algorithms import RSAAlgorithm
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from .profiling import profiled_thread
+import json
+import jwt
+import logging
+import os
+import re
+import threading
+import time
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+# azp (origin of the frontend that requested the token), if the token has one,
+# must be one of these
+AUTHORIZED_PARTIES = [
+    "http://localhost:5173",
+    "http://localhost:5174",
+    "https://intrvu-production.up.railway.app",
+    "https://intrvu-one.vercel.app",
+    # "https://intrvu.store",  # Your custom domain
+    # "https://www.intrvu.store",  # Your custom domain with www
+    "https://www.intrvu.online",
+    "https://intrvu.online",
+]
+
+CLERK_API_URL = os.getenv("CLERK_API_URL", "https://api.clerk.com/v1")
+
+# Verified-token LRU (per worker)
+AUTH_CLAIMS_CACHE_SECONDS = float(os.getenv("AUTH_CLAIMS_CACHE_SECONDS", "30"))
+AUTH_CLAIMS_CACHE_SIZE = int(os.getenv("AUTH_CLAIMS_CACHE_SIZE", "10000"))
+
+# JWKS refresh (only used when JWT_KEY is unset)
+AUTH_JWKS_REFRESH_SECONDS = float(os.getenv("AUTH_JWKS_REFRESH_SECONDS", "3600"))
+AUTH_JWKS_MIN_REFRESH_SECONDS = float(os.getenv("AUTH_JWKS_MIN_REFRESH_SECONDS", "60"))
+AUTH_JWKS_TIMEOUT_SECONDS = float(os.getenv("AUTH_JWKS_TIMEOUT_SECONDS", "5"))
+
+AUTH_CLOCK_SKEW_SECONDS = float(os.getenv("AUTH_CLOCK_SKEW_SECONDS", "5"))
+
+# Clerk user ids (comma-separated) allowed to use the admin features
+ADMIN_USER_IDS = frozenset(user_id.strip() for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip())
+
+
+class AuthError(Exception):
+    """The request carries no valid session token."""
+
+
+class KeyUnavailable(Exception):
+    """No verification key could be loaded (JWKS fetch failed, nothing configured)."""
+
+
+# ========================================================================================
+# VERIFICATION KEYS
+# ========================================================================================
+
+class SigningKeys:
+    """
+    Public keys for RS256 verification: JWT_KEY if configured, otherwise the
+    Clerk JWKS, cached by key id and refreshed periodically or on rotation.
+    """
+
+    def __init__(self, jwt_key: str = None, secret_key: str = None, api_url: str = CLERK_API_URL):
+        self._static = _load_pem_key(jwt_key) if jwt_key else None
+        self._secret_key = secret_key
+        self._api_url = api_url
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._fetched_at = None  # monotonic time of the last successful fetch
+        self._attempted_at = None  # monotonic time of the last fetch attempt
+
+    @property
+    def uses_jwks(self):
+        return self._static is None
+
+    def get(self, kid: str):
+        """
+        Public key for a token's key id.
+
+        Raises:
+            AuthError: Unknown key id (after a refresh)
+            KeyUnavailable: No key source configured or the JWKS fetch failed
+        """
+        if self._static is not None:
+            return self._static
+        stale = self._fetched_at is None or time.monotonic() - self._fetched_at > AUTH_JWKS_REFRESH_SECONDS
+        if stale or kid not in self._keys:
+            self.refresh(force=False)
+        key = self._keys.get(kid)
+        if key is None:
+            raise AuthError(f"Unknown signing key '{kid}'")
+        return key
+
+    def refresh(self, force: bool = True):
+        """
+        Fetch the JWKS again. Without force, a fetch attempted less than
+        AUTH_JWKS_MIN_REFRESH_SECONDS ago is not repeated.
+
+        Returns:
+            Number of keys loaded (0 when JWT_KEY is used or the fetch was skipped)
+
+        Raises:
+            KeyUnavailable: The fetch failed and no keys are cached
+        """
+        if self._static is not None:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._attempted_at is not None and now - self._attempted_at < AUTH_JWKS_MIN_REFRESH_SECONDS:
+                if not self._keys:
+                    raise KeyUnavailable("JWKS is unavailable")
+                return 0
+            self._attempted_at = now
+            try:
+                self._keys = self._fetch()
+                self._fetched_at = now
+                return len(self._keys)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Failed to fetch Clerk JWKS: {str(e)}")
+                if not self._keys:
+                    raise KeyUnavailable(f"JWKS is unavailable: {str(e)}")
+                return 0  # keep serving the cached keys
+
+    def _fetch(self):
+        if not self._secret_key:
+            raise KeyUnavailable("Neither JWT_KEY nor CLERK_SECRET_KEY is set")
+        request = urllib.request.Request(
+            f"{self._api_url}/jwks", headers={"Authorization": f"Bearer {self._secret_key}"}
+        )
+        with urllib.request.urlopen(request, timeout=AUTH_JWKS_TIMEOUT_SECONDS) as response:
+            jwks = json.load(response)
+        return {
+            key["kid"]: RSAAlgorithm.from_jwk(key)
+            for key in jwks.get("keys", []) if key.get("kty") == "RSA" and key.get("kid")
+        }
+
+
+def _load_pem_key(pem: str):
+    """RSA public key from JWT_KEY (Clerk's dashboard shows it on one line; whitespace is ignored)."""
+    body = re.sub(r"-----(BEGIN|END) PUBLIC KEY-----|\s", "", pem)
+    lines = "\n".join(body[i:i + 64] for i in range(0, len(body), 64))
+    return load_pem_public_key(f"-----BEGIN PUBLIC KEY-----\n{lines}\n-----END PUBLIC KEY-----\n".encode())
+
+
+# ========================================================================================
+# VERIFIED CLAIMS CACHE
+# ========================================================================================
+
+class ClaimsCache:
+    """Thread-safe LRU of verified token -> (claims, valid_until)."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, token: str, claims: dict):
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        valid_until = min(time.time() + self.ttl_seconds, claims.get("exp", 0))
+        with self._lock:
+            self._entries[token] = (claims, valid_until)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+signing_keys = SigningKeys(jwt_key=os.getenv("JWT_KEY"), secret_key=os.getenv("CLERK_SECRET_KEY"))
+claims_cache = ClaimsCache(AUTH_CLAIMS_CACHE_SECONDS, AUTH_CLAIMS_CACHE_SIZE)
+
+
+# ========================================================================================
+# VERIFY
+# ========================================================================================
+
+def session_token(request):
+    """Session JWT from the Authorization header or the __session cookie (None if absent)."""
+    authorization = request.headers.get("authorization")
+    if authorization and authorization.startswith("Bearer "):
+        return authorization[len("Bearer "):].strip() or None
+    cookies = getattr(request, "cookies", None) or {}
+    for name, value in cookies.items():
+        if name.startswith("__session"):
+            return value
+    return None
+
+
+def _decode(token: str, key):
+    return jwt.decode(
+        token,
+        key,
+        algorithms=["RS256"],
+        options={"verify_aud": False, "require": ["exp", "iat", "sub"]},
+        leeway=AUTH_CLOCK_SKEW_SECONDS
+    )
+
+
+def verify_session_token(token: str, keys: SigningKeys = None, cache: ClaimsCache = None):
+    """
+    Verified claims of a Clerk session token.
+
+    Args:
+        token: Encoded JWT
+        keys: Key source (default: the process-wide signing_keys)
+        cache: Claims cache (default: the process-wide claims_cache)
+
+    Returns:
+        dict: Token claims (sub is the user id)
+
+    Raises:
+        AuthError: Invalid, expired or foreign token
+        KeyUnavailable: No verification key could be loaded
+    """
+    keys = keys or signing_keys
+    cache = cache if cache is not None else claims_cache
+
+    claims = cache.get(token)
+    if claims is not None:
+        return claims
+
+    try:
+        kid = jwt.get_unverified_header(token).get("kid") if keys.uses_jwks else None
+        try:
+            claims = _decode(token, keys.get(kid))
+        except jwt.InvalidSignatureError:
+            if not keys.uses_jwks:
+                raise
+            # Clerk key ids are per instance, so a rotated key keeps its kid
+            keys.refresh(force=False)
+            claims = _decode(token, keys.get(kid))
+    except jwt.InvalidTokenError as e:
+        raise AuthError(str(e))
+
+    # Like the Clerk SDK: only a present azp is checked (tokens minted by the
+    # backend API or for native clients carry none; signature and exp still apply)
+    azp = claims.get("azp")
+    if azp is not None and azp not in AUTHORIZED_PARTIES:
+        raise AuthError(f"Token issued for unauthorized party '{azp}'")
+
+    cache.set(token, claims)
+    return claims
+
+
+@profiled_thread()  # runs in the threadpool: sampled for a profiled request
+def get_current_user(request: Request):
+    """
+    FastAPI dependency: the authenticated user.
+
+    USAGE IN ROUTES:
+    async def my_endpoint(user: dict = Depends(get_current_user)):
+        user_id = user["user_id"]
+
+    Returns:
+        dict: {"user_id": str}
+
+    Raises:
+        HTTPException: 401 missing / invalid token, 503 verification keys unavailable
+    """
+    start = time.perf_counter()
+    token = session_token(request)
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing session token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    try:
+        claims = verify_session_token(token)
+    except AuthError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid Credentials. {str(e)}",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    except KeyUnavailable as e:
+        logger.error(f"Cannot verify session tokens: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Authentication unavailable")
+    finally:
+        request.state.auth_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    return {"user_id": claims["sub"]}
+
+
+def get_admin_user(request: Request):
+    """
+    FastAPI dependency: the authenticated user, who must be in ADMIN_USER_IDS.
+
+    Raises:
+        HTTPException: 401 as get_current_user, 403 not an admin
+    """
+    user = get_current_user(request)
+    if user["user_id"] not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user
+
+
+def admin_user_id(request):
+    """User id of the request's session if it is a verified admin, else None (never raises)."""
+    token = session_token(request)
+    if not token or not ADMIN_USER_IDS:
+        return None
+    try:
+        claims = verify_session_token(token)
+    except (AuthError, KeyUnavailable):
+        return None
+    return claims["sub"] if claims["sub"] in ADMIN_USER_IDS else None
@@ -0,0 +1,140 @@
+# Response Compression - Negotiated brotli / gzip for JSON Bodies
+#
+# History pages carry long LLM texts (explanations, feedback, ideal answers)
+# that compress 4-8x. CompressionMiddleware compresses a response when:
+#
+#   - the client accepts it      : Accept-Encoding (q-values honored), brotli
+#                                  preferred over gzip; brotli needs the
+#                                  optional `brotli` package
+#   - it is worth it             : body of at least COMPRESSION_MIN_BYTES
+#   - it is compressible         : JSON / text, not already encoded
+#   - it is a single body        : streamed responses (the export) pass
+#                                  through - the export has its own gzip option
+#
+# Compressible responses always get "Vary: Accept-Encoding" so shared caches
+# keep the encodings apart. A compressed body gets the weak form of the route's
+# ETag (W/"..."): its bytes differ from the identity body's, so the strong tag
+# would claim byte equality it does not have, while If-None-Match (weak
+# comparison) still revalidates either form. Routes may compress themselves
+# (the history route caches its compressed bodies): a response with
+# Content-Encoding is left alone.
+
+from starlette.datastructures import Headers, MutableHeaders
+import gzip
+import os
+
+try:
+    import brotli  # optional dependency, gzip only without it
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+# Server preference for equally weighted encodings
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: str):
+    """
+    Best supported content coding for an Accept-Encoding header.
+
+    Returns:
+        "br", "gzip" or None (send the body uncompressed)
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            weights[coding] = quality
+    wildcard = weights.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        quality = weights.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str):
+    """Compress a whole body with a coding returned by negotiate_encoding()."""
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported encoding '{encoding}'")
+
+
+def add_vary_accept_encoding(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if vary is None:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+def weaken_etag(headers: MutableHeaders):
+    """Turn a strong ETag into its weak form (for a body the route did not produce byte for byte)."""
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+def _is_compressible(headers: MutableHeaders):
+    if "content-encoding" in headers:
+        return False
+    return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """ASGI middleware: compress single-body JSON / text responses (see module header)."""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message  # headers are sent with the first body
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            held, start = start, None
+            headers = MutableHeaders(scope=held)
+            body = message.get("body", b"")
+            if _is_compressible(headers) and not message.get("more_body", False):
+                add_vary_accept_encoding(headers)
+                if encoding and len(body) >= self.minimum_size:
+                    body = compress(body, encoding)
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    weaken_etag(headers)
+                    message = {**message, "body": body}
+            await send(held)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,323 @@
+# In-Process Caches
+#
+# Small thread-safe caches for hot, per-user read paths.
+# Entries expire after a short TTL and are invalidated explicitly by the
+# write paths that change the underlying rows.
+#
+# NOTE: TTLCache lives inside one worker process. Keep TTLs short so a
+# write handled by another worker is picked up quickly. ResponseCache can use
+# a shared backend (Redis) instead; its keys also carry the user's data version,
+# so a write through any worker makes older entries unreachable.
+
+from collections import OrderedDict
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Per-key cache with a fixed time-to-live and hit/miss counters.
+
+    USAGE:
+    value = cache.get(user_id)
+    if value is None:
+        value = load_from_db(user_id)
+        cache.set(user_id, value)
+    ...
+    cache.invalidate(user_id)  # after a write
+    """
+
+    def __init__(self, ttl_seconds: float, name: str = "cache"):
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """Store a value for `key` for ttl_seconds."""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def invalidate(self, key):
+        """Drop the entry for `key` (call after every write that changes it)."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry (e.g. after an admin-wide reset)."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """Counters for monitoring: hits, misses, hit_rate, size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "ttl_seconds": self.ttl_seconds
+            }
+
+
+class ResponseCache:
+    """
+    Bounded cache of serialized (bytes) responses, grouped per user.
+
+    In-process backend: LRU order, per-entry TTL, and both an entry-count and
+    a total-bytes ceiling - the least recently used entries are evicted first.
+
+    USAGE:
+    body = cache.get(user_id, key)
+    if body is None:
+        body = serialize(build_response())
+        cache.set(user_id, key, body)
+    ...
+    cache.invalidate_user(user_id)  # after a write
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, max_bytes: int, name: str = "responses"):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.name = name
+        self._entries = OrderedDict()  # (user_id, key) -> (expires_at, body)
+        self._user_keys = {}  # user_id -> set of keys
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _drop(self, entry_key):
+        """Remove one entry (caller holds the lock)."""
+        _, body = self._entries.pop(entry_key)
+        self._bytes -= len(body)
+        user_id, key = entry_key
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+    def get(self, user_id: str, key: str):
+        """Return the cached body, or None if missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._drop((user_id, key))
+                self.misses += 1
+                return None
+            self._entries.move_to_end((user_id, key))
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id: str, key: str, body: bytes):
+        """Store a body, evicting least recently used entries past the ceilings."""
+        if self.ttl_seconds <= 0 or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if (user_id, key) in self._entries:
+                self._drop((user_id, key))
+            self._entries[(user_id, key)] = (time.monotonic() + self.ttl_seconds, body)
+            self._user_keys.setdefault(user_id, set()).add(key)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: str):
+        """Drop every entry of one user (call after every write that changes their data)."""
+        with self._lock:
+            for key in list(self._user_keys.get(user_id, ())):
+                self._drop((user_id, key))
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._user_keys.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Counters for monitoring: hits, misses, evictions, hit_rate, size, bytes."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds
+            }
+
+
+class RedisResponseCache:
+    """
+    ResponseCache interface on a shared Redis server, so every worker sees the
+    same entries. Redis enforces the memory ceiling (configure maxmemory with an
+    LRU eviction policy); entries expire after ttl_seconds.
+
+    Per-user invalidation bumps a generation number that is part of every key,
+    which makes all older entries of that user unreachable in one command.
+
+    Requires the optional `redis` package.
+    """
+
+    def __init__(self, url: str, ttl_seconds: float, max_bytes: int, name: str = "responses"):
+        import redis  # optional dependency, only needed for the shared backend
+        self._redis = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.name = name
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def _generation_key(self, user_id: str):
+        return f"{self.name}:gen:{user_id}"
+
+    def _entry_key(self, user_id: str, key: str):
+        generation = int(self._redis.get(self._generation_key(user_id)) or 0)
+        return f"{self.name}:{user_id}:{generation}:{key}"
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, user_id: str, key: str):
+        """Return the cached body, or None if missing (Redis errors count as misses)."""
+        try:
+            body = self._redis.get(self._entry_key(user_id, key))
+        except Exception as e:
+            logger.warning(f"{self.name} cache read failed: {str(e)}")
+            self._count("errors")
+            body = None
+        self._count("hits" if body is not None else "misses")
+        return body
+
+    def set(self, user_id: str, key: str, body: bytes):
+        """Store a body with the TTL (best effort)."""
+        if self.ttl_seconds <= 0 or len(body) > self.max_bytes:
+            return
+        try:
+            self._redis.set(self._entry_key(user_id, key), body, px=int(self.ttl_seconds * 1000))
+        except Exception as e:
+            logger.warning(f"{self.name} cache write failed: {str(e)}")
+            self._count("errors")
+
+    def invalidate_user(self, user_id: str):
+        """Make every entry of one user unreachable (they expire on their own)."""
+        try:
+            self._redis.incr(self._generation_key(user_id))
+            self._count("invalidations")
+        except Exception as e:
+            logger.warning(f"{self.name} cache invalidation failed: {str(e)}")
+            self._count("errors")
+
+    def clear(self):
+        """Drop every entry of this cache."""
+        try:
+            for redis_key in self._redis.scan_iter(match=f"{self.name}:*"):
+                self._redis.delete(redis_key)
+        except Exception as e:
+            logger.warning(f"{self.name} cache clear failed: {str(e)}")
+            self._count("errors")
+
+    def stats(self):
+        """Counters for monitoring (this worker's lookups only)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "redis",
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds
+            }
+
+
+def make_response_cache(prefix: str, name: str, ttl_seconds: float, max_entries: int, max_bytes: int):
+    """
+    Build a response cache configured from environment variables:
+      {prefix}_TTL_SECONDS, {prefix}_MAX_ENTRIES, {prefix}_MAX_BYTES,
+      {prefix}_BACKEND ("memory" | "redis"), {prefix}_REDIS_URL
+
+    Falls back to the in-process backend if Redis is requested but unavailable.
+    """
+    ttl_seconds = float(os.getenv(f"{prefix}_TTL_SECONDS", str(ttl_seconds)))
+    max_entries = int(os.getenv(f"{prefix}_MAX_ENTRIES", str(max_entries)))
+    max_bytes = int(os.getenv(f"{prefix}_MAX_BYTES", str(max_bytes)))
+    if os.getenv(f"{prefix}_BACKEND", "memory") == "redis":
+        try:
+            return RedisResponseCache(
+                os.getenv(f"{prefix}_REDIS_URL", "redis://localhost:6379/0"),
+                ttl_seconds=ttl_seconds,
+                max_bytes=max_bytes,
+                name=name
+            )
+        except ImportError:
+            logger.warning(f"{prefix}_BACKEND=redis but the redis package is not installed; using memory")
+    return ResponseCache(ttl_seconds=ttl_seconds, max_entries=max_entries, max_bytes=max_bytes, name=name)
+
+
+# ========================================================================================
+# CACHE INSTANCES
+# ========================================================================================
+
+# Quota snapshots per user: (data_version, {challenge_type: QuotaRow})
+quota_cache = TTLCache(
+    ttl_seconds=float(os.getenv("QUOTA_CACHE_TTL_SECONDS", "10")),
+    name="quota"
+)
+
+# Serialized GET /challenges/history responses per user, keyed by ETag
+history_cache = make_response_cache(
+    "HISTORY_CACHE",
+    name="history",
+    ttl_seconds=300,
+    max_entries=2000,
+    max_bytes=64 * 1024 * 1024
+)
@@ -4,19 +4,59 @@
 # Functions handle challenge creation, quota management, and scenario answer processing.
 # All functions include comprehensive error handling and input validation.
 
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    insert, update, select, and_, or_, exists, func, union_all, literal_column, null, cast, Integer, String
+)
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy.exc import SQLAlchemyError
 from . import models
+from .cache import quota_cache, history_cache
+from .stats import (
+    record_challenge_created,
+    record_interview_answers,
+    record_scenario_evaluation
+)
+from .versions import bump_data_version, bump_data_versions, bump_all_data_versions
+from .dialects import insert_returning, dialect_insert
+from ..metrics import track_db_helper
+from .search import index_challenge, index_challenges, index_scenario_answer, find_matches, SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT
+from collections import namedtuple
 from datetime import datetime, timedelta, time as dt_time
+import base64
+import json
 import logging
 
 # Set up logging for database operations
 logger = logging.getLogger(__name__)
 
+# Number of challenges each user may generate per type per day
+DAILY_QUOTA = 10
+
+CHALLENGE_TYPES = ("interview", "scenario")
+
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+
+# Maximum answers accepted by one bulk MCQ submission
+MAX_BULK_ANSWERS = 50
+
+# History page size limits (keyset pagination)
+HISTORY_DEFAULT_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+# Rows fetched per round trip when streaming a full history export
+HISTORY_EXPORT_BATCH_SIZE = 1000
+
+# Users provisioned per transaction by provision_users()
+PROVISION_BATCH_SIZE = 5000
+
+# Lightweight read-only quota snapshot (no ORM identity map / change tracking)
+QuotaRow = namedtuple("QuotaRow", ["user_id", "challenge_type", "quota_remaining", "last_reset_date"])
+
 # ========================================================================================
 # CHALLENGE QUOTA FUNCTIONS
 # ========================================================================================
 
+@track_db_helper
 def get_challenge_quota(db: Session, user_id: str, challenge_type: str):
     """
     Retrieve user's quota for a specific challenge type.
@@ -37,7 +77,7 @@ def get_challenge_quota(db: Session, user_id: str, challenge_type: str):
     if not user_id or not user_id.strip():
         raise ValueError("user_id cannot be empty")
     
-    if challenge_type not in ["interview", "scenario"]:
+    if challenge_type not in CHALLENGE_TYPES:
         raise ValueError(f"Invalid challenge_type '{challenge_type}'. Must be 'interview' or 'scenario'")
     
     try:
@@ -49,6 +89,7 @@ def get_challenge_quota(db: Session, user_id: str, challenge_type: str):
         logger.error(f"Failed to get challenge quota for user {user_id}: {str(e)}")
         raise RuntimeError(f"Database error while getting challenge quota: {str(e)}")
 
+@track_db_helper
 def create_challenge_quota(db: Session, user_id: str, challenge_type: str):
     """
     Create a new quota record for a user and challenge type.
@@ -76,8 +117,9 @@ def create_challenge_quota(db: Session, user_id: str, challenge_type: str):
         # Create new quota with default values (10 daily quota)
         db_quota = models.ChallengeQuota(user_id=user_id, challenge_type=challenge_type)
         db.add(db_quota)
-        db.commit()
-        db.refresh(db_quota)
+        bump_data_version(db, user_id)  # same transaction
+        db.commit()  # id came back with the INSERT; no refresh needed
+        quota_cache.invalidate(user_id)
         logger.info(f"Created challenge quota for user {user_id}, type {challenge_type}")
         return db_quota
     except SQLAlchemyError as e:
@@ -85,37 +127,333 @@ def create_challenge_quota(db: Session, user_id: str, challenge_type: str):
         logger.error(f"Failed to create challenge quota for user {user_id}: {str(e)}")
         raise RuntimeError(f"Database error while creating challenge quota: {str(e)}")
 
-def reset_quota_if_needed(db: Session, quota: models.ChallengeQuota):
+@track_db_helper
+def get_user_quotas(db: Session, user_id: str):
     """
-    Reset quota to full (10) at midnight (12:00:00am) every day, regardless of last usage.
+    Retrieve all of a user's quotas (both challenge types) with ONE query.
+    
+    Args:
+        db: Database session
+        user_id: User identifier from authentication
+    
+    Returns:
+        Dict of {challenge_type: QuotaRow} - missing types are absent
+    
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
     """
-    if not quota:
-        raise ValueError("quota cannot be None")
-    now = datetime.now()
-    today_midnight = datetime.combine(now.date(), dt_time.min)
-    if quota.last_reset_date < today_midnight:
+    if not user_id or not user_id.strip():
+        raise ValueError("user_id cannot be empty")
+    
+    try:
+        rows = db.execute(
+            select(
+                models.ChallengeQuota.user_id,
+                models.ChallengeQuota.challenge_type,
+                models.ChallengeQuota.quota_remaining,
+                models.ChallengeQuota.last_reset_date
+            ).where(
+                models.ChallengeQuota.user_id == user_id,
+                models.ChallengeQuota.challenge_type.in_(CHALLENGE_TYPES)
+            )
+        ).all()
+        # First row per type wins (matches get_challenge_quota's .first())
+        quotas = {}
+        for row in rows:
+            quotas.setdefault(row.challenge_type, QuotaRow(*row))
+        return quotas
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to get quotas for user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while getting user quotas: {str(e)}")
+
+def _insert_quota_rows(db: Session, user_ids, challenge_types, window_start: datetime):
+    """
+    Internal helper: insert a full quota row per (user, type) with one
+    multi-row INSERT ... ON CONFLICT DO NOTHING ... RETURNING (SQLAlchemy sends
+    it in pages of 1000 rows); rows that already exist are left untouched
+    (caller commits).
+    
+    Returns:
+        Set of user ids that got at least one new row
+    """
+    table = models.ChallengeQuota.__table__
+    rows = [
+        {"user_id": user_id, "challenge_type": challenge_type,
+         "quota_remaining": DAILY_QUOTA, "last_reset_date": window_start}
+        for user_id in user_ids for challenge_type in challenge_types
+    ]
+    if not rows:
+        return set()
+    
+    stmt = dialect_insert(db, table)
+    if stmt is not None:
+        stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "challenge_type"]).returning(table.c.user_id)
+        return set(db.execute(stmt, rows).scalars().all())
+    
+    # Fallback for engines without ON CONFLICT support: skip the rows that exist
+    existing = set(db.execute(
+        select(table.c.user_id, table.c.challenge_type).where(table.c.user_id.in_(set(user_ids)))
+    ).all())
+    rows = [row for row in rows if (row["user_id"], row["challenge_type"]) not in existing]
+    if rows:
+        db.execute(insert(table), rows)
+    return {row["user_id"] for row in rows}
+
+@track_db_helper
+def create_user_quotas(db: Session, user_id: str, challenge_types):
+    """
+    Create quota records for several challenge types in ONE statement and commit.
+    Types the user already has a quota for are skipped (insert-or-ignore), so
+    concurrent calls never create duplicates.
+    
+    Args:
+        db: Database session
+        user_id: User identifier from authentication
+        challenge_types: Iterable of "interview" / "scenario"
+    
+    Returns:
+        Dict of {challenge_type: QuotaRow} for the requested types
+    
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    if not user_id or not user_id.strip():
+        raise ValueError("user_id cannot be empty")
+    
+    challenge_types = list(challenge_types)
+    for challenge_type in challenge_types:
+        if challenge_type not in CHALLENGE_TYPES:
+            raise ValueError(f"Invalid challenge_type '{challenge_type}'. Must be 'interview' or 'scenario'")
+    
+    try:
+        window_start = get_quota_window_start()
+        if _insert_quota_rows(db, [user_id], challenge_types, window_start):
+            bump_data_version(db, user_id)  # same transaction
+        db.commit()
+        quota_cache.invalidate(user_id)
+        logger.info(f"Created challenge quotas for user {user_id}, types {challenge_types}")
+        # A row created concurrently by another request is also a fresh full quota
+        return {
+            challenge_type: QuotaRow(user_id, challenge_type, DAILY_QUOTA, window_start)
+            for challenge_type in challenge_types
+        }
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to create challenge quotas for user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while creating challenge quotas: {str(e)}")
+
+# BULK PROVISIONING: New users (user.created webhooks, Clerk exports)
+
+@track_db_helper
+def provision_users(db: Session, user_ids, batch_size: int = PROVISION_BATCH_SIZE):
+    """
+    Give every user a full quota for each challenge type. Idempotent: users
+    that already have their quotas are skipped by the database (insert-or-ignore),
+    so redelivered webhooks and re-run imports do no duplicate work.
+    
+    Per batch of `batch_size` users: one lookup of users queued for deletion
+    (never provisioned again), one INSERT ... ON CONFLICT DO NOTHING for the
+    quota rows, one multi-row upsert of the new users' data versions, one commit.
+    
+    Args:
+        db: Database session bound to the shard holding ALL of `user_ids`
+        user_ids: Iterable of user identifiers (duplicates are ignored)
+        batch_size: Users per transaction
+    
+    Returns:
+        dict: {"users": unique users given, "provisioned": users that got new
+               quota rows, "deleted": users skipped because they were deleted}
+    
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    user_ids = list(dict.fromkeys(user_ids))
+    if any(not user_id or not user_id.strip() for user_id in user_ids):
+        raise ValueError("user_id cannot be empty")
+    
+    summary = {"users": len(user_ids), "provisioned": 0, "deleted": 0}
+    window_start = get_quota_window_start()
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
         try:
-            quota.quota_remaining = 10
-            quota.last_reset_date = today_midnight
+            deleted = set(db.execute(
+                select(models.DeletedUser.user_id).where(models.DeletedUser.user_id.in_(batch))
+            ).scalars().all())
+            created = _insert_quota_rows(
+                db, [user_id for user_id in batch if user_id not in deleted], CHALLENGE_TYPES, window_start
+            )
+            bump_data_versions(db, created)  # same transaction
             db.commit()
-            db.refresh(quota)
-            logger.info(f"Midnight quota reset for user {quota.user_id}, type {quota.challenge_type}")
         except SQLAlchemyError as e:
             db.rollback()
-            logger.error(f"Failed to reset quota for user {quota.user_id}: {str(e)}")
-            raise RuntimeError(f"Database error while resetting quota: {str(e)}")
+            logger.error(f"Failed to provision {len(batch)} users: {str(e)}")
+            raise RuntimeError(f"Database error while provisioning users: {str(e)}")
+        for user_id in created:
+            quota_cache.invalidate(user_id)
+        summary["provisioned"] += len(created)
+        summary["deleted"] += len(deleted)
+    
+    logger.info(
+        f"Provisioned {summary['provisioned']} of {summary['users']} users "
+        f"({summary['deleted']} deleted users skipped)"
+    )
+    return summary
+
+def get_quota_window_start(now: datetime = None):
+    """
+    Start of the current daily quota window (today's midnight).
+    
+    Args:
+        now: Optional reference time (defaults to datetime.now())
+    
+    Returns:
+        datetime at 12:00:00am of the reference day
+    """
+    now = now or datetime.now()
+    return datetime.combine(now.date(), dt_time.min)
+
+def get_effective_quota(quota: models.ChallengeQuota, now: datetime = None):
+    """
+    Compute the quota values for the current daily window WITHOUT writing.
+    
+    A row whose last_reset_date is before today's midnight is treated as a full
+    quota for today. The stored row is left untouched - it is brought up to date
+    either when the user spends quota or by the scheduled set-based reset.
+    
+    Args:
+        quota: ChallengeQuota object
+        now: Optional reference time (defaults to datetime.now())
+    
+    Returns:
+        Tuple of (quota_remaining, last_reset_date) for the current window
+    
+    Raises:
+        ValueError: quota is None
+    """
+    if not quota:
+        raise ValueError("quota cannot be None")
+    window_start = get_quota_window_start(now)
+    if quota.last_reset_date is None or quota.last_reset_date < window_start:
+        return DAILY_QUOTA, window_start
+    return quota.quota_remaining, quota.last_reset_date
+
+@track_db_helper
+def reset_quota_if_needed(db: Session, quota: models.ChallengeQuota):
+    """
+    Reset quota to full (10) at midnight (12:00:00am) every day, regardless of last usage.
+    
+    Only used on the spend path: the reset is applied to the in-session object and
+    committed together with the quota decrement, so no extra commit is issued here.
+    Read-only endpoints should use get_effective_quota() instead.
+    """
+    if not quota:
+        raise ValueError("quota cannot be None")
+    today_midnight = get_quota_window_start()
+    if quota.last_reset_date is None or quota.last_reset_date < today_midnight:
+        quota.quota_remaining = DAILY_QUOTA
+        quota.last_reset_date = today_midnight
+        logger.info(f"Midnight quota reset for user {quota.user_id}, type {quota.challenge_type}")
     return quota
 
+@track_db_helper
+def consume_quota(db: Session, quota: models.ChallengeQuota, amount: int):
+    """
+    Spend `amount` challenges from a quota and commit.
+    
+    Args:
+        db: Database session
+        quota: ChallengeQuota object (already reset for today's window)
+        amount: Number of challenges generated
+    
+    Returns:
+        Updated ChallengeQuota object
+    
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    if not quota:
+        raise ValueError("quota cannot be None")
+    
+    try:
+        quota.quota_remaining = max(quota.quota_remaining - amount, 0)
+        bump_data_version(db, quota.user_id)  # same transaction
+        db.commit()
+        quota_cache.invalidate(quota.user_id)
+        return quota
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to consume quota for user {quota.user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while consuming quota: {str(e)}")
+
+# SCHEDULED MAINTENANCE: Bring stale quota rows up to date with one set-based UPDATE
+
+@track_db_helper
+def reset_stale_quotas(db: Session):
+    """
+    Reset every quota row whose window has expired, in a single UPDATE statement.
+    
+    Run by the scheduler shortly after midnight. Rows are never loaded into Python.
+    Data versions are not bumped: readers already see these rows as reset
+    (get_effective_quota), and quota ETags include the window start.
+    
+    Args:
+        db: Database session
+    
+    Returns:
+        Number of rows reset
+    
+    Raises:
+        RuntimeError: Database operation failed
+    """
+    today_midnight = get_quota_window_start()
+    try:
+        result = db.execute(
+            update(models.ChallengeQuota)
+            .where(models.ChallengeQuota.last_reset_date < today_midnight)
+            .values(quota_remaining=DAILY_QUOTA, last_reset_date=today_midnight)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        logger.info(f"Scheduled quota reset updated {result.rowcount} stale quota rows")
+        return result.rowcount
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to reset stale quotas: {str(e)}")
+        raise RuntimeError(f"Database error while resetting stale quotas: {str(e)}")
+
 # ADMIN/MAINTENANCE: Force reset all quotas to 10 immediately
 
+@track_db_helper
 def force_reset_all_quotas(db: Session):
+    """
+    Force reset all quotas to 10 for all users and types with one set-based UPDATE.
+    
+    Args:
+        db: Database session
+    
+    Returns:
+        Number of rows reset
+    
+    Raises:
+        RuntimeError: Database operation failed
+    """
     try:
-        all_quotas = db.query(models.ChallengeQuota).all()
-        for quota in all_quotas:
-            quota.quota_remaining = 10
-            quota.last_reset_date = datetime.combine(datetime.now().date(), dt_time.min)
+        result = db.execute(
+            update(models.ChallengeQuota)
+            .values(quota_remaining=DAILY_QUOTA, last_reset_date=get_quota_window_start())
+            .execution_options(synchronize_session=False)
+        )
+        bump_all_data_versions(db)  # same transaction
         db.commit()
-        logger.info("Force reset all quotas to 10 for all users and types.")
+        quota_cache.clear()
+        logger.info(f"Force reset {result.rowcount} quotas to 10 for all users and types.")
+        return result.rowcount
     except SQLAlchemyError as e:
         db.rollback()
         logger.error(f"Failed to force reset all quotas: {str(e)}")
@@ -125,13 +463,14 @@ def force_reset_all_quotas(db: Session):
 # INTERVIEW CHALLENGE FUNCTIONS
 # ========================================================================================
 
+@track_db_helper
 def create_interview_challenge(
     db: Session, 
     difficulty: str, 
     created_by: str, 
     topic: str, 
     title: str, 
-    options: str, 
+    options: list, 
     correct_answer_id: int, 
     explaination: str
 ):
@@ -144,13 +483,45 @@ def create_interview_challenge(
         created_by: User ID who created this challenge
         topic: Subject matter (user input)
         title: Question text (AI generated)
-        options: JSON string of answer choices (AI generated)
+        options: List of answer choices (AI generated, stored as native JSON)
         correct_answer_id: Index of correct option 0-3 (AI generated)
         explaination: Explanation text (AI generated, typo preserved)
     
     Returns:
         Created InterviewChallenge object
     
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    # Undecorated batch path: the call is counted once, as this helper, in the metrics
+    return create_interview_challenges.__wrapped__(db, difficulty, created_by, topic, [{
+        "title": title,
+        "options": options,
+        "correct_answer_id": correct_answer_id,
+        "explaination": explaination
+    }])[0]
+
+@track_db_helper
+def create_interview_challenges(db: Session, difficulty: str, created_by: str, topic: str, questions: list):
+    """
+    Create a batch of generated MCQ challenges (one generation request) in ONE transaction.
+    
+    The rows are written with one multi-row INSERT ... RETURNING, the search
+    index with one executemany, and stats / data version are updated once for
+    the batch instead of once per question.
+    
+    Args:
+        db: Database session
+        difficulty: "Easy", "Medium", or "Hard"
+        created_by: User ID who created these challenges
+        topic: Subject matter (user input)
+        questions: List of dicts with title, options, correct_answer_id and
+                   explaination (AI generated)
+    
+    Returns:
+        List of created InterviewChallenge objects in the order of `questions`
+    
     Raises:
         ValueError: Invalid input parameters
         RuntimeError: Database operation failed
@@ -159,43 +530,54 @@ def create_interview_challenge(
     if difficulty not in ["Easy", "Medium", "Hard"]:
         raise ValueError(f"Invalid difficulty '{difficulty}'. Must be 'Easy', 'Medium', or 'Hard'")
     
-    if not 0 <= correct_answer_id <= 3:
-        raise ValueError(f"Invalid correct_answer_id '{correct_answer_id}'. Must be 0, 1, 2, or 3 (for A/B/C/D options)")
-    
     if not created_by or not created_by.strip():
         raise ValueError("created_by cannot be empty")
     
+    if not questions:
+        raise ValueError("questions cannot be empty")
+    
+    for question in questions:
+        if not 0 <= question["correct_answer_id"] <= 3:
+            raise ValueError(f"Invalid correct_answer_id '{question['correct_answer_id']}'. Must be 0, 1, 2, or 3 (for A/B/C/D options)")
+        
+        if not isinstance(question["options"], list) or not question["options"]:
+            raise ValueError("options must be a non-empty list of answer choices")
+    
     try:
-        db_interview_challenge = models.InterviewChallenge(
-            difficulty=difficulty,
-            created_by=created_by,
-            topic=topic,  # User input: what they want to learn about
-            title=title,  # AI-generated: the actual question text
-            options=options,  # JSON string of answer choices
-            correct_answer_id=correct_answer_id,  # Index of correct option
-            explaination=explaination  # Explanation text (with typo to match frontend)
-        )
-        db.add(db_interview_challenge)
-        db.commit()
-        db.refresh(db_interview_challenge)
-        logger.info(f"Created interview challenge for user {created_by}, topic: {topic}")
-        return db_interview_challenge
+        # One INSERT ... RETURNING; the ids are needed for the search index rows
+        challenges = insert_returning(db, models.InterviewChallenge, [{
+            "difficulty": difficulty,
+            "created_by": created_by,
+            "topic": topic,  # User input: what they want to learn about
+            "title": question["title"],  # AI-generated: the actual question text
+            "options": question["options"],  # Native JSON array of answer choices
+            "correct_answer_id": question["correct_answer_id"],  # Index of correct option
+            "explaination": question["explaination"]  # Explanation text (with typo to match frontend)
+        } for question in questions])
+        record_challenge_created(db, created_by, topic, "interview", difficulty, count=len(challenges))  # same transaction
+        index_challenges(db, challenges)
+        bump_data_version(db, created_by)
+        db.commit()  # sessions do not expire on commit: no refresh needed
+        history_cache.invalidate_user(created_by)
+        logger.info(f"Created {len(challenges)} interview challenges for user {created_by}, topic: {topic}")
+        return challenges
     except SQLAlchemyError as e:
         db.rollback()
-        logger.error(f"Failed to create interview challenge for user {created_by}: {str(e)}")
-        raise RuntimeError(f"Database error while creating interview challenge: {str(e)}")
+        logger.error(f"Failed to create interview challenges for user {created_by}: {str(e)}")
+        raise RuntimeError(f"Database error while creating interview challenges: {str(e)}")
 
 # ========================================================================================
 # SCENARIO CHALLENGE FUNCTIONS
 # ========================================================================================
 
+@track_db_helper
 def create_scenario_challenge(
     db: Session, 
     difficulty: str, 
     created_by: str, 
     topic: str, 
     title: str, 
-    questions: str, 
+    questions: list, 
     correct_answer: str = None, 
     explanation: str = None
 ):
@@ -208,7 +590,7 @@ def create_scenario_challenge(
         created_by: User ID who created this challenge
         topic: Subject matter (user input)
         title: Scenario description (AI generated)
-        questions: JSON string of question objects (AI generated)
+        questions: List of question objects (AI generated, stored as native JSON)
         correct_answer: Optional ideal answer template (AI generated)
         explanation: Optional rubric or feedback guidelines (AI generated)
     
@@ -226,19 +608,26 @@ def create_scenario_challenge(
     if not created_by or not created_by.strip():
         raise ValueError("created_by cannot be empty")
     
+    if not isinstance(questions, list) or not questions:
+        raise ValueError("questions must be a non-empty list of question objects")
+    
     try:
         db_scenario_challenge = models.ScenarioChallenge(
             difficulty=difficulty,
             created_by=created_by,
             topic=topic,  # User input: what they want to learn about
             title=title,  # AI-generated: the main scenario description
-            questions=questions,  # JSON string of question objects
+            questions=questions,  # Native JSON array of question objects
             correct_answer=correct_answer,  # Optional: ideal answer
             explanation=explanation  # Optional: rubric or feedback
         )
         db.add(db_scenario_challenge)
+        db.flush()  # assigns the id for the search index row
+        record_challenge_created(db, created_by, topic, "scenario", difficulty)  # same transaction
+        index_challenge(db, db_scenario_challenge)
+        bump_data_version(db, created_by)
         db.commit()
-        db.refresh(db_scenario_challenge)
+        history_cache.invalidate_user(created_by)
         logger.info(f"Created scenario challenge for user {created_by}, topic: {topic}")
         return db_scenario_challenge
     except SQLAlchemyError as e:
@@ -250,6 +639,7 @@ def create_scenario_challenge(
 # SCENARIO ANSWER FUNCTIONS
 # ========================================================================================
 
+@track_db_helper
 def save_scenario_answer(
     db: Session, 
     user_id: str, 
@@ -292,8 +682,10 @@ def save_scenario_answer(
             user_answer=user_answer
         )
         db.add(answer)
+        index_scenario_answer(db, user_id, scenario_id, user_answer)  # same transaction
+        bump_data_version(db, user_id)
         db.commit()
-        db.refresh(answer)
+        history_cache.invalidate_user(user_id)
         logger.info(f"Saved scenario answer for user {user_id}, scenario {scenario_id}, question {question_index}")
         return answer
     except SQLAlchemyError as e:
@@ -301,6 +693,7 @@ def save_scenario_answer(
         logger.error(f"Failed to save scenario answer for user {user_id}: {str(e)}")
         raise RuntimeError(f"Database error while saving scenario answer: {str(e)}")
 
+@track_db_helper
 def update_scenario_evaluation(
     db: Session, 
     answer_id: int, 
@@ -325,18 +718,43 @@ def update_scenario_evaluation(
         ValueError: Answer not found
         RuntimeError: Database operation failed
     """
-    # Check if answer exists before accessing properties
-    answer = db.query(models.ScenarioAnswer).filter(models.ScenarioAnswer.id == answer_id).first()
-    if not answer:
-        raise ValueError(f"ScenarioAnswer with id {answer_id} not found")
-    
+    answers = models.ScenarioAnswer
     try:
-        # Update evaluation fields
-        answer.llm_score = llm_score
-        answer.llm_feedback = llm_feedback
-        answer.llm_correct_answer = llm_correct_answer
+        # ONE read: the answer's owner and previous score, the scenario topic and
+        # the owner's score summary for that scenario (needed for the stats deltas)
+        siblings = aliased(models.ScenarioAnswer)
+        sibling_filter = and_(siblings.user_id == answers.user_id, siblings.scenario_id == answers.scenario_id)
+        current = db.execute(
+            select(
+                answers.user_id,
+                answers.llm_score,
+                models.ScenarioChallenge.topic,
+                select(func.count(siblings.llm_score)).where(sibling_filter).scalar_subquery().label("scored"),
+                select(func.coalesce(func.sum(siblings.llm_score), 0)).where(sibling_filter)
+                .scalar_subquery().label("score_total")
+            )
+            .join(models.ScenarioChallenge, models.ScenarioChallenge.id == answers.scenario_id)
+            .where(answers.id == answer_id)
+        ).first()
+        if not current:
+            raise ValueError(f"ScenarioAnswer with id {answer_id} not found")
+        
+        # UPDATE ... RETURNING hands back the updated row (no post-commit refresh)
+        answer = db.execute(
+            update(answers)
+            .where(answers.id == answer_id)
+            .values(llm_score=llm_score, llm_feedback=llm_feedback, llm_correct_answer=llm_correct_answer)
+            .returning(answers)
+            .execution_options(synchronize_session=False)
+        ).scalar_one()
+        # Aggregate stats are updated in the same transaction
+        record_scenario_evaluation(
+            db, current.user_id, current.topic, current.llm_score, llm_score,
+            (current.scored, current.score_total)
+        )
+        bump_data_version(db, current.user_id)
         db.commit()
-        db.refresh(answer)
+        history_cache.invalidate_user(current.user_id)
         logger.info(f"Updated evaluation for answer {answer_id} with score {llm_score}")
         return answer
     except SQLAlchemyError as e:
@@ -348,6 +766,7 @@ def update_scenario_evaluation(
 # INTERVIEW ANSWER FUNCTIONS
 # ========================================================================================
 
+@track_db_helper
 def save_interview_answer(
     db: Session, 
     user_id: str, 
@@ -358,6 +777,10 @@ def save_interview_answer(
     """
     Save a user's answer to an interview (MCQ) challenge.
     
+    Same write path as save_interview_answers() with a batch of one: one
+    projected read of the challenge, one upsert ... RETURNING, no refresh.
+    Answering a challenge again updates the user's row for it.
+    
     Args:
         db: Database session
         user_id: User identifier from authentication
@@ -366,54 +789,184 @@ def save_interview_answer(
         time_taken_seconds: Optional time taken to answer
     
     Returns:
-        Created InterviewAnswer object
+        Dict with answer_id, challenge_id, user_answer_id, is_correct,
+        correct_answer_id, attempts and best_is_correct
     
     Raises:
         ValueError: Invalid input parameters
         RuntimeError: Database operation failed
     """
+    # Undecorated batch path: the call is counted once, as this helper, in the metrics
+    return save_interview_answers.__wrapped__(db, user_id, [{
+        "challenge_id": challenge_id,
+        "user_answer_id": user_answer_id,
+        "time_taken_seconds": time_taken_seconds
+    }])[0]
+
+def _upsert_interview_answers(db: Session, rows):
+    """
+    Insert or update one InterviewAnswer per row with ONE
+    INSERT ... ON CONFLICT (user_id, challenge_id) DO UPDATE ... RETURNING.
+    A conflicting row takes the new answer fields, increments `attempts` and
+    keeps `best_is_correct` if any attempt was correct.
+    
+    Returns:
+        {challenge_id: (answer_id, attempts, best_is_correct)}
+    """
+    table = models.InterviewAnswer.__table__
+    stmt = dialect_insert(db, table)
+    if stmt is not None:
+        stmt = stmt.values([{**row, "attempts": 1, "best_is_correct": row["is_correct"]} for row in rows])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "challenge_id"],
+            set_={
+                "user_answer_id": stmt.excluded.user_answer_id,
+                "is_correct": stmt.excluded.is_correct,
+                "time_taken_seconds": stmt.excluded.time_taken_seconds,
+                "date_completed": stmt.excluded.date_completed,
+                "attempts": table.c.attempts + 1,
+                "best_is_correct": or_(table.c.best_is_correct, stmt.excluded.is_correct)
+            }
+        ).returning(table.c.challenge_id, table.c.id, table.c.attempts, table.c.best_is_correct)
+        return {row.challenge_id: (row.id, row.attempts, row.best_is_correct) for row in db.execute(stmt)}
+    
+    # Fallback for engines without ON CONFLICT support: read-modify-write
+    result = {}
+    for row in rows:
+        answer = db.query(models.InterviewAnswer).filter(
+            models.InterviewAnswer.user_id == row["user_id"],
+            models.InterviewAnswer.challenge_id == row["challenge_id"]
+        ).first()
+        if answer is None:
+            answer = models.InterviewAnswer(**row, attempts=1, best_is_correct=row["is_correct"])
+            db.add(answer)
+        else:
+            for column, value in row.items():
+                setattr(answer, column, value)
+            answer.attempts += 1
+            answer.best_is_correct = answer.best_is_correct or row["is_correct"]
+        db.flush()
+        result[row["challenge_id"]] = (answer.id, answer.attempts, answer.best_is_correct)
+    return result
+
+@track_db_helper
+def save_interview_answers(db: Session, user_id: str, answers):
+    """
+    Grade and save a batch of MCQ answers (a whole quiz) in ONE transaction.
+    
+    There is one InterviewAnswer row per (user, challenge): answering a
+    challenge again updates its row (last answer, attempts + 1, best result).
+    All referenced challenges and the user's existing answers to them are
+    read with one IN query, every answer is written with one multi-row
+    upsert ... RETURNING, and the aggregate stats are updated once per topic.
+
+    The read is deliberately not folded into an INSERT ... SELECT ... RETURNING:
+    unknown challenge ids must fail before anything is written (an INSERT ...
+    SELECT would silently skip them), the stats delta needs the PREVIOUS
+    is_correct (RETURNING only sees the new row), and the topic and
+    correct_answer_id live in interview_challenges, which RETURNING cannot
+    reach. The answer write is therefore exactly 2 statements (5 with stats
+    and version), as checked by benchmarks/write_path_bench.py.
+
+    Args:
+        db: Database session
+        user_id: User identifier from authentication
+        answers: List of dicts with challenge_id, user_answer_id (0-3) and
+                 optional time_taken_seconds (each challenge at most once)
+    
+    Returns:
+        List of dicts (answer_id, challenge_id, user_answer_id, is_correct,
+        correct_answer_id, attempts, best_is_correct) in the order of `answers`
+    
+    Raises:
+        ValueError: Invalid input parameters or unknown challenge ids
+        RuntimeError: Database operation failed
+    """
     # INPUT VALIDATION
     if not user_id or not user_id.strip():
         raise ValueError("user_id cannot be empty")
     
-    if not 0 <= user_answer_id <= 3:
-        raise ValueError(f"Invalid user_answer_id '{user_answer_id}'. Must be 0, 1, 2, or 3 (for A/B/C/D options)")
+    if not answers:
+        raise ValueError("answers cannot be empty")
+    
+    if len(answers) > MAX_BULK_ANSWERS:
+        raise ValueError(f"Too many answers ({len(answers)}). Maximum is {MAX_BULK_ANSWERS} per request")
+    
+    for answer in answers:
+        if not 0 <= answer["user_answer_id"] <= 3:
+            raise ValueError(f"Invalid user_answer_id '{answer['user_answer_id']}'. Must be 0, 1, 2, or 3 (for A/B/C/D options)")
+    
+    challenge_ids = {answer["challenge_id"] for answer in answers}
+    if len(challenge_ids) != len(answers):
+        raise ValueError("Each challenge can only be answered once per batch")
     
     try:
-        # Get the challenge to check correct answer
-        challenge = db.query(models.InterviewChallenge).filter(
-            models.InterviewChallenge.id == challenge_id
-        ).first()
-        if not challenge:
-            raise ValueError(f"InterviewChallenge with id {challenge_id} not found")
+        # One IN query: referenced challenges (projected) and the user's existing answers
+        existing = models.InterviewAnswer
+        challenges = {
+            row.id: row for row in db.execute(
+                select(
+                    models.InterviewChallenge.id,
+                    models.InterviewChallenge.correct_answer_id,
+                    models.InterviewChallenge.topic,
+                    existing.is_correct.label("was_correct")
+                ).outerjoin(existing, and_(
+                    existing.challenge_id == models.InterviewChallenge.id,
+                    existing.user_id == user_id
+                )).where(models.InterviewChallenge.id.in_(challenge_ids))
+            )
+        }
+        missing = sorted(challenge_ids - challenges.keys())
+        if missing:
+            raise ValueError(f"InterviewChallenge with id(s) {missing} not found")
         
-        # Calculate if answer is correct
-        is_correct = (user_answer_id == challenge.correct_answer_id)
+        now = datetime.now()
+        rows = [{
+            "user_id": user_id,
+            "challenge_id": answer["challenge_id"],
+            "user_answer_id": answer["user_answer_id"],
+            "is_correct": answer["user_answer_id"] == challenges[answer["challenge_id"]].correct_answer_id,
+            "time_taken_seconds": answer.get("time_taken_seconds"),
+            "date_completed": now
+        } for answer in answers]
         
-        answer = models.InterviewAnswer(
-            user_id=user_id,
-            challenge_id=challenge_id,
-            user_answer_id=user_answer_id,
-            is_correct=is_correct,
-            time_taken_seconds=time_taken_seconds
-        )
-        db.add(answer)
+        saved = _upsert_interview_answers(db, rows)
+        # attempts == 1 means this call created the row (race-safe, unlike the read above)
+        record_interview_answers(db, user_id, [(
+            challenges[row["challenge_id"]].topic,
+            saved[row["challenge_id"]][1] > 1,
+            challenges[row["challenge_id"]].was_correct if saved[row["challenge_id"]][1] > 1 else None,
+            row["is_correct"]
+        ) for row in rows])  # same transaction
+        bump_data_version(db, user_id)
         db.commit()
-        db.refresh(answer)
-        logger.info(f"Saved interview answer for user {user_id}, challenge {challenge_id}, correct: {is_correct}")
-        return answer
+        history_cache.invalidate_user(user_id)
+        
+        logger.info(f"Saved {len(rows)} interview answers for user {user_id}, "
+                    f"correct: {sum(row['is_correct'] for row in rows)}")
+        return [{
+            "answer_id": saved[row["challenge_id"]][0],
+            "challenge_id": row["challenge_id"],
+            "user_answer_id": row["user_answer_id"],
+            "is_correct": row["is_correct"],
+            "correct_answer_id": challenges[row["challenge_id"]].correct_answer_id,
+            "attempts": saved[row["challenge_id"]][1],
+            "best_is_correct": bool(saved[row["challenge_id"]][2])
+        } for row in rows]
     except SQLAlchemyError as e:
         db.rollback()
-        logger.error(f"Failed to save interview answer for user {user_id}: {str(e)}")
-        raise RuntimeError(f"Database error while saving interview answer: {str(e)}")
+        logger.error(f"Failed to save interview answers for user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while saving interview answers: {str(e)}")
 
-def get_user_interview_answers(db: Session, user_id: str):
+@track_db_helper
+def get_user_interview_answers(db: Session, user_id: str, challenge_ids=None):
     """
     Get all interview answers for a user.
     
     Args:
         db: Database session
         user_id: User identifier from authentication
+        challenge_ids: Optional list of challenge IDs to restrict to (one history page)
     
     Returns:
         List of InterviewAnswer objects with challenge data
@@ -421,23 +974,31 @@ def get_user_interview_answers(db: Session, user_id: str):
     if not user_id or not user_id.strip():
         raise ValueError("user_id cannot be empty")
     
+    if challenge_ids is not None and not challenge_ids:
+        return []
+    
     try:
-        answers = db.query(models.InterviewAnswer).filter(
+        query = db.query(models.InterviewAnswer).filter(
             models.InterviewAnswer.user_id == user_id
-        ).all()
+        )
+        if challenge_ids is not None:
+            query = query.filter(models.InterviewAnswer.challenge_id.in_(challenge_ids))
+        answers = query.all()
         logger.info(f"Retrieved {len(answers)} interview answers for user {user_id}")
         return answers
     except SQLAlchemyError as e:
         logger.error(f"Failed to get interview answers for user {user_id}: {str(e)}")
         raise RuntimeError(f"Database error while getting interview answers: {str(e)}")
 
-def get_user_scenario_answers(db: Session, user_id: str):
+@track_db_helper
+def get_user_scenario_answers(db: Session, user_id: str, scenario_ids=None):
     """
     Get all scenario answers for a user.
     
     Args:
         db: Database session
         user_id: User identifier from authentication
+        scenario_ids: Optional list of scenario IDs to restrict to (one history page)
     
     Returns:
         List of ScenarioAnswer objects
@@ -445,10 +1006,16 @@ def get_user_scenario_answers(db: Session, user_id: str):
     if not user_id or not user_id.strip():
         raise ValueError("user_id cannot be empty")
     
+    if scenario_ids is not None and not scenario_ids:
+        return []
+    
     try:
-        answers = db.query(models.ScenarioAnswer).filter(
+        query = db.query(models.ScenarioAnswer).filter(
             models.ScenarioAnswer.user_id == user_id
-        ).all()
+        )
+        if scenario_ids is not None:
+            query = query.filter(models.ScenarioAnswer.scenario_id.in_(scenario_ids))
+        answers = query.all()
         logger.info(f"Retrieved {len(answers)} scenario answers for user {user_id}")
         return answers
     except SQLAlchemyError as e:
@@ -459,6 +1026,7 @@ def get_user_scenario_answers(db: Session, user_id: str):
 # CHALLENGE RETRIEVAL FUNCTIONS
 # ========================================================================================
 
+@track_db_helper
 def get_user_challenges(db: Session, user_id: str, challenge_type: str):
     """
     Retrieve all challenges created by a specific user for a specific type.
@@ -498,3 +1066,467 @@ def get_user_challenges(db: Session, user_id: str, challenge_type: str):
         logger.error(f"Failed to get user challenges for user {user_id}: {str(e)}")
         raise RuntimeError(f"Database error while getting user challenges: {str(e)}")
 
+# ========================================================================================
+# CHALLENGE HISTORY FUNCTIONS (KEYSET PAGINATION)
+# ========================================================================================
+
+# Tie-break rank when an interview and a scenario share the same date_created
+_HISTORY_TYPE_RANK = {"interview": 0, "scenario": 1}
+
+def encode_history_cursor(date_created: datetime, challenge_type: str, challenge_id: int):
+    """
+    Build the opaque cursor pointing just after a history row.
+    
+    Returns:
+        URL-safe string encoding (date_created, type, id)
+    """
+    raw = json.dumps([date_created.isoformat(), challenge_type, challenge_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_history_cursor(cursor: str):
+    """
+    Parse a cursor produced by encode_history_cursor().
+    
+    Returns:
+        Tuple of (date_created, challenge_type, challenge_id)
+    
+    Raises:
+        ValueError: Malformed cursor
+    """
+    try:
+        date_str, challenge_type, challenge_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if challenge_type not in CHALLENGE_TYPES:
+            raise ValueError(challenge_type)
+        return datetime.fromisoformat(date_str), challenge_type, int(challenge_id)
+    except (ValueError, TypeError, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid history cursor: {str(e)}")
+
+def _keyset_condition(model, challenge_type: str, cursor):
+    """
+    WHERE clause selecting rows strictly after `cursor` in the history order
+    (date_created DESC, type rank DESC, id DESC) for one challenge table.
+    """
+    cursor_date, cursor_type, cursor_id = cursor
+    rank, cursor_rank = _HISTORY_TYPE_RANK[challenge_type], _HISTORY_TYPE_RANK[cursor_type]
+    if rank < cursor_rank:
+        return model.date_created <= cursor_date
+    if rank > cursor_rank:
+        return model.date_created < cursor_date
+    return or_(
+        model.date_created < cursor_date,
+        and_(model.date_created == cursor_date, model.id < cursor_id)
+    )
+
+def _history_branch(model, challenge_type: str, user_id: str, limit, decoded_cursor, filters):
+    """
+    One side of the history UNION ALL: projected columns of one challenge table,
+    filtered and cut to limit+1 rows through the (created_by, date_created, id) index.
+    With limit=None the branch is left unordered and uncut (full exports).
+    """
+    if challenge_type == "interview":
+        answer_model = models.InterviewAnswer
+        answered_clause = exists().where(
+            models.InterviewAnswer.challenge_id == model.id,
+            models.InterviewAnswer.user_id == user_id
+        )
+        columns = [
+            model.options.label("content"),
+            model.correct_answer_id.label("correct_answer_id"),
+            model.explaination.label("explanation"),
+            cast(null(), String).label("correct_answer")
+        ]
+    else:
+        answered_clause = exists().where(
+            models.ScenarioAnswer.scenario_id == model.id,
+            models.ScenarioAnswer.user_id == user_id
+        )
+        columns = [
+            model.questions.label("content"),
+            cast(null(), Integer).label("correct_answer_id"),
+            model.explanation.label("explanation"),
+            model.correct_answer.label("correct_answer")
+        ]
+    
+    query = select(
+        literal_column(f"'{challenge_type}'", String).label("type"),
+        literal_column(str(_HISTORY_TYPE_RANK[challenge_type]), Integer).label("type_rank"),
+        model.id.label("id"),
+        model.topic.label("topic"),
+        model.difficulty.label("difficulty"),
+        model.title.label("title"),
+        model.date_created.label("date_created"),
+        *columns
+    ).where(model.created_by == user_id)
+    
+    if filters["topic"] is not None:
+        query = query.where(model.topic == filters["topic"])
+    if filters["difficulty"] is not None:
+        query = query.where(model.difficulty == filters["difficulty"])
+    if filters["date_from"] is not None:
+        query = query.where(model.date_created >= filters["date_from"])
+    if filters["date_to"] is not None:
+        query = query.where(model.date_created < filters["date_to"])
+    if filters["answered"] is True:
+        query = query.where(answered_clause)
+    elif filters["answered"] is False:
+        query = query.where(~answered_clause)
+    if filters.get("ids") is not None:
+        query = query.where(model.id.in_(filters["ids"]))
+    if decoded_cursor is not None:
+        query = query.where(_keyset_condition(model, challenge_type, decoded_cursor))
+    if limit is None:
+        return query
+    
+    # Wrapped so the per-branch ORDER BY/LIMIT is legal inside a compound SELECT (SQLite)
+    branch = query.order_by(model.date_created.desc(), model.id.desc()).limit(limit + 1).subquery()
+    return select(branch)
+
+def _history_join_statement(page, user_id: str):
+    """
+    Join a subquery of projected history rows (see _history_branch) with the
+    user's answers, ordered so each challenge's rows are adjacent (history order).
+    """
+    ia = models.InterviewAnswer.__table__
+    sa = models.ScenarioAnswer.__table__
+    statement = select(
+        page,
+        ia.c.user_answer_id,
+        ia.c.is_correct,
+        ia.c.date_completed,
+        ia.c.time_taken_seconds,
+        ia.c.attempts,
+        ia.c.best_is_correct,
+        sa.c.question_index,
+        sa.c.user_answer,
+        sa.c.llm_score,
+        sa.c.llm_feedback,
+        sa.c.llm_correct_answer,
+        sa.c.created_at
+    ).select_from(
+        page.outerjoin(ia, and_(
+            page.c.type == "interview",
+            ia.c.challenge_id == page.c.id,
+            ia.c.user_id == user_id
+        )).outerjoin(sa, and_(
+            page.c.type == "scenario",
+            sa.c.scenario_id == page.c.id,
+            sa.c.user_id == user_id
+        ))
+    ).order_by(
+        page.c.date_created.desc(), page.c.type_rank.desc(), page.c.id.desc(),
+        ia.c.id, sa.c.id
+    )
+    return statement
+
+def _group_history_rows(rows):
+    """
+    Group joined rows (see _history_join_statement) per challenge, lazily.
+    
+    Yields:
+        (challenge_row, [answer_rows]) in history order; for interview challenges
+        the answer list holds at most one row (one answer row per user and challenge)
+    """
+    current, answers = None, []
+    for row in rows:
+        if current is None or current.type != row.type or current.id != row.id:
+            if current is not None:
+                yield current, answers
+            current, answers = row, []
+        if row.type == "interview" and row.user_answer_id is not None:
+            answers.append(row)
+        elif row.type == "scenario" and row.question_index is not None:
+            answers.append(row)
+    if current is not None:
+        yield current, answers
+
+def _fetch_history_rows(db: Session, page, user_id: str):
+    """
+    Load and group one page of history rows.
+    
+    Returns:
+        List of (challenge_row, [answer_rows]) in history order
+    """
+    return list(_group_history_rows(db.execute(_history_join_statement(page, user_id))))
+
+def _history_filters(user_id: str, challenge_type, topic, difficulty, answered, date_from, date_to):
+    """
+    Internal helper: validate the history filters shared by get_user_history_page()
+    and count_user_history() and return them as the dict _history_branch() takes.
+    """
+    if not user_id or not user_id.strip():
+        raise ValueError("user_id cannot be empty")
+    
+    if challenge_type is not None and challenge_type not in CHALLENGE_TYPES:
+        raise ValueError(f"Invalid challenge_type: {challenge_type}. Must be 'interview' or 'scenario'")
+    
+    if difficulty is not None and difficulty not in DIFFICULTIES:
+        raise ValueError(f"Invalid difficulty '{difficulty}'. Must be 'Easy', 'Medium', or 'Hard'")
+    
+    return {
+        "topic": topic,
+        "difficulty": difficulty,
+        "answered": answered,
+        "date_from": date_from,
+        "date_to": date_to
+    }
+
+def _history_sources(challenge_type: str = None):
+    """Internal helper: (type, challenge model) pairs a history listing reads."""
+    return [
+        (source_type, model) for source_type, model in (
+            ("interview", models.InterviewChallenge),
+            ("scenario", models.ScenarioChallenge)
+        )
+        if challenge_type is None or source_type == challenge_type
+    ]
+
+@track_db_helper
+def get_user_history_page(
+    db: Session,
+    user_id: str,
+    limit: int = HISTORY_DEFAULT_PAGE_SIZE,
+    cursor: str = None,
+    challenge_type: str = None,
+    topic: str = None,
+    difficulty: str = None,
+    answered: bool = None,
+    date_from: datetime = None,
+    date_to: datetime = None
+):
+    """
+    Retrieve one page of a user's history (challenges + the user's answers) with
+    ONE Core query - no ORM hydration, ordering done in SQL.
+    
+    Query shape:
+        page = (interview branch LIMIT n+1) UNION ALL (scenario branch LIMIT n+1)
+               ORDER BY date_created DESC, type_rank DESC, id DESC LIMIT n+1
+        SELECT page.*, answer columns
+        FROM page LEFT JOIN interview_answers ... LEFT JOIN scenario_answers ...
+    
+    Each branch is read through the (created_by, date_created, id) index, so the
+    cost of a page does not depend on how long the user's history is.
+    
+    Args:
+        db: Database session
+        user_id: User identifier from authentication
+        limit: Page size (1-100)
+        cursor: Opaque cursor from the previous page's next_cursor
+        challenge_type: Optional "interview" or "scenario" filter
+        topic: Optional exact topic filter
+        difficulty: Optional "Easy" / "Medium" / "Hard" filter
+        answered: Optional filter - True answered only, False unanswered only
+        date_from: Optional inclusive lower bound on date_created
+        date_to: Optional exclusive upper bound on date_created
+    
+    Returns:
+        Tuple of (list of (challenge_row, [answer_rows]), next_cursor or None).
+        Rows are lightweight SQLAlchemy Row tuples; for interview challenges the
+        answer list holds at most one row.
+    
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    # INPUT VALIDATION
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        raise ValueError(f"Invalid limit '{limit}'. Must be between 1 and {HISTORY_MAX_PAGE_SIZE}")
+    
+    decoded_cursor = decode_history_cursor(cursor) if cursor else None
+    filters = _history_filters(user_id, challenge_type, topic, difficulty, answered, date_from, date_to)
+    
+    branches = [
+        _history_branch(model, source_type, user_id, limit, decoded_cursor, filters)
+        for source_type, model in _history_sources(challenge_type)
+    ]
+    combined = (union_all(*branches) if len(branches) > 1 else branches[0]).subquery()
+    page = select(combined).order_by(
+        combined.c.date_created.desc(), combined.c.type_rank.desc(), combined.c.id.desc()
+    ).limit(limit + 1).subquery("page")
+    
+    try:
+        grouped = _fetch_history_rows(db, page, user_id)
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to get history page for user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while getting challenge history page: {str(e)}")
+    
+    page_rows = grouped[:limit]
+    next_cursor = None
+    if len(grouped) > limit:
+        last = page_rows[-1][0]
+        next_cursor = encode_history_cursor(last.date_created, last.type, last.id)
+    
+    logger.info(f"Retrieved history page of {len(page_rows)} challenges for user {user_id}")
+    return page_rows, next_cursor
+
+@track_db_helper
+def count_user_history(
+    db: Session,
+    user_id: str,
+    challenge_type: str = None,
+    topic: str = None,
+    difficulty: str = None,
+    answered: bool = None,
+    date_from: datetime = None,
+    date_to: datetime = None
+):
+    """
+    Count the challenges get_user_history_page() pages through for the same
+    filters, per type, with ONE query (one scalar COUNT subquery per branch).
+    
+    Archived challenges (retention.py) are not in the hot tables, so they are
+    not counted here - unlike the lifetime totals in user_stats.
+    
+    Args:
+        db: Database session
+        user_id: User identifier from authentication
+        challenge_type, topic, difficulty, answered, date_from, date_to:
+            Same filters as get_user_history_page()
+    
+    Returns:
+        Dict of {"interview": int, "scenario": int} (0 for a type filtered out)
+    
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    filters = _history_filters(user_id, challenge_type, topic, difficulty, answered, date_from, date_to)
+    counts = {
+        source_type: select(func.count()).select_from(
+            _history_branch(model, source_type, user_id, None, None, filters).subquery()
+        ).scalar_subquery().label(source_type)
+        for source_type, model in _history_sources(challenge_type)
+    }
+    
+    try:
+        row = db.execute(select(*counts.values())).one()
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to count history for user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while counting challenge history: {str(e)}")
+    
+    return {source_type: getattr(row, source_type, 0) for source_type in CHALLENGE_TYPES}
+
+@track_db_helper
+def search_user_history(
+    db: Session,
+    user_id: str,
+    query: str,
+    limit: int = SEARCH_DEFAULT_LIMIT,
+    challenge_type: str = None
+):
+    """
+    Full-text search over a user's history: challenge titles, options, scenario
+    questions, explanations and the user's own scenario answers.
+    
+    The full-text index ranks matching challenges (see search.py); the matches
+    are then loaded with the same projected query as a history page.
+    
+    Args:
+        db: Database session
+        user_id: User identifier from authentication
+        query: Free text; every word must match (prefix match)
+        limit: Maximum number of results (1-50)
+        challenge_type: Optional "interview" or "scenario" filter
+    
+    Returns:
+        List of (challenge_row, [answer_rows]), best match first
+    
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    # INPUT VALIDATION
+    if not user_id or not user_id.strip():
+        raise ValueError("user_id cannot be empty")
+    
+    if not 1 <= limit <= SEARCH_MAX_LIMIT:
+        raise ValueError(f"Invalid limit '{limit}'. Must be between 1 and {SEARCH_MAX_LIMIT}")
+    
+    if challenge_type is not None and challenge_type not in CHALLENGE_TYPES:
+        raise ValueError(f"Invalid challenge_type: {challenge_type}. Must be 'interview' or 'scenario'")
+    
+    matches = find_matches(db, user_id, query, limit=limit, challenge_type=challenge_type)
+    if not matches:
+        return []
+    
+    filters = {"topic": None, "difficulty": None, "answered": None, "date_from": None, "date_to": None}
+    branches = []
+    for source_type, model in (("interview", models.InterviewChallenge), ("scenario", models.ScenarioChallenge)):
+        ids = [challenge_id for match_type, challenge_id in matches if match_type == source_type]
+        if ids:
+            branches.append(_history_branch(model, source_type, user_id, len(ids), None, {**filters, "ids": ids}))
+    combined = (union_all(*branches) if len(branches) > 1 else branches[0]).subquery("page")
+    
+    try:
+        grouped = _fetch_history_rows(db, combined, user_id)
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to load search results for user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while searching challenge history: {str(e)}")
+    
+    # Back into rank order
+    position = {match: rank for rank, match in enumerate(matches)}
+    grouped.sort(key=lambda item: position[(item[0].type, item[0].id)])
+    logger.info(f"Search matched {len(grouped)} challenges for user {user_id}")
+    return grouped
+
+def iter_user_history(
+    db: Session,
+    user_id: str,
+    challenge_type: str = None,
+    date_from: datetime = None,
+    date_to: datetime = None,
+    batch_size: int = HISTORY_EXPORT_BATCH_SIZE
+):
+    """
+    Stream a user's WHOLE history (challenges + the user's answers) for exports.
+    
+    Same projected query as get_user_history_page() without the LIMIT, read
+    through a server-side cursor (yield_per): rows are fetched `batch_size` at a
+    time and grouped on the fly, so memory stays flat however long the history is.
+    
+    Args:
+        db: Database session (must stay open while the generator is consumed)
+        user_id: User identifier from authentication
+        challenge_type: Optional "interview" or "scenario" filter
+        date_from: Optional inclusive lower bound on date_created
+        date_to: Optional exclusive upper bound on date_created
+        batch_size: Rows fetched per round trip
+    
+    Returns:
+        Generator of (challenge_row, [answer_rows]) in history order (newest first).
+        Input is validated on call; the query runs when iteration starts.
+    
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed (raised while iterating)
+    """
+    # INPUT VALIDATION
+    if not user_id or not user_id.strip():
+        raise ValueError("user_id cannot be empty")
+    
+    if challenge_type is not None and challenge_type not in CHALLENGE_TYPES:
+        raise ValueError(f"Invalid challenge_type: {challenge_type}. Must be 'interview' or 'scenario'")
+    
+    filters = {"topic": None, "difficulty": None, "answered": None, "date_from": date_from, "date_to": date_to}
+    branches = [
+        _history_branch(model, source_type, user_id, None, None, filters)
+        for source_type, model in (
+            ("interview", models.InterviewChallenge),
+            ("scenario", models.ScenarioChallenge)
+        )
+        if challenge_type is None or source_type == challenge_type
+    ]
+    combined = (union_all(*branches) if len(branches) > 1 else branches[0]).subquery("page")
+    statement = _history_join_statement(combined, user_id).execution_options(yield_per=batch_size)
+    return _stream_history_rows(db, statement, user_id)
+
+def _stream_history_rows(db: Session, statement, user_id: str):
+    """Generator behind iter_user_history() (kept separate so validation is eager)."""
+    count = 0
+    try:
+        for item in _group_history_rows(db.execute(statement)):
+            count += 1
+            yield item
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to stream history for user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while streaming challenge history: {str(e)}")
+    logger.info(f"Streamed {count} history challenges for user {user_id}")
@@ -0,0 +1,89 @@
+# Dialect Helpers - Engine-Specific SQL
+#
+# SQLite (development) and PostgreSQL (production) both support
+# INSERT ... ON CONFLICT, but through dialect-specific constructs.
+# Helpers here pick the right construct for the session's engine, plus
+# multi-row INSERT ... RETURNING that stays one statement on both.
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from datetime import datetime
+
+# Dialects whose insert() supports on_conflict_do_update / on_conflict_do_nothing
+UPSERT_DIALECTS = ("sqlite", "postgresql")
+
+
+def dialect_name(db: Session):
+    """Name of the dialect the session is bound to ("sqlite", "postgresql", ...)."""
+    return db.get_bind().dialect.name
+
+
+def dialect_insert(db: Session, table):
+    """
+    Dialect-specific insert() for `table` supporting ON CONFLICT clauses.
+
+    Returns:
+        Insert construct, or None if the dialect has no upsert support
+        (callers then fall back to read-modify-write)
+    """
+    name = dialect_name(db)
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert(table)
+
+
+def upsert_increment(db: Session, model, keys: dict, deltas: dict):
+    """
+    Atomically add `deltas` to the counter columns of one row, creating the row
+    if it does not exist yet. Uses INSERT ... ON CONFLICT DO UPDATE where available.
+
+    Args:
+        model: ORM model whose primary key columns are exactly `keys`
+        keys: Primary key values, e.g. {"user_id": ...}
+        deltas: {column: amount}; zero deltas are skipped
+    """
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table = model.__table__
+    extra = {"updated_at": datetime.now()} if "updated_at" in table.c else {}
+
+    stmt = dialect_insert(db, table)
+    if stmt is not None:
+        stmt = stmt.values(**keys, **deltas, **extra).on_conflict_do_update(
+            index_elements=list(keys),
+            set_={**{column: table.c[column] + delta for column, delta in deltas.items()}, **extra}
+        )
+        db.execute(stmt)
+        return
+
+    # Fallback for engines without ON CONFLICT support: read-modify-write
+    row = db.get(model, tuple(keys.values()) if len(keys) > 1 else next(iter(keys.values())))
+    if row is None:
+        row = model(**keys, **{column: 0 for column in deltas})
+        db.add(row)
+    for column, delta in deltas.items():
+        setattr(row, column, (getattr(row, column) or 0) + delta)
+    db.flush()
+
+
+def insert_returning(db: Session, model, rows: list):
+    """
+    Insert `rows` with ONE multi-row INSERT ... RETURNING and return the new
+    ORM objects (fully loaded, no refresh needed) in the order of `rows`.
+
+    RETURNING's row order is not guaranteed, and asking SQLAlchemy to sort
+    it (sort_by_parameter_order) falls back to one INSERT per row on SQLite.
+    Integer primary keys are assigned in VALUES order (SQLite rowid,
+    PostgreSQL sequence), so sorting by id restores the order of `rows`.
+
+    Args:
+        model: ORM model with an integer autoincrement `id` primary key
+        rows: Column values per row (Python-side defaults are applied)
+    """
+    objects = db.scalars(insert(model).returning(model), rows).all()
+    return sorted(objects, key=lambda obj: obj.id)
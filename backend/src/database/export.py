@@ -0,0 +1,202 @@
+# History Export - Streaming NDJSON / CSV Serialization
+#
+# Turns the row stream of db.iter_user_history() into byte chunks for a
+# StreamingResponse. Nothing is accumulated beyond one output chunk, so memory
+# use is constant regardless of history size.
+#
+# FORMATS:
+#   ndjson - one JSON object per challenge, same shape as a version 2 history
+#            item (options / questions as native arrays, answers nested)
+#   csv    - one row per answer (a challenge without answers gets one row with
+#            empty answer columns); options / questions are JSON-encoded
+#
+# COMPRESSION:
+#   gzip   - the chunks form one gzip stream (.gz file), compressed incrementally
+
+from sqlalchemy.orm import Session
+from datetime import datetime
+from .db import iter_user_history, HISTORY_EXPORT_BATCH_SIZE
+import csv
+import io
+import json
+import zlib
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_COMPRESSIONS = ("gzip",)
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "gzip": "application/gzip"
+}
+
+# Serialized bytes buffered before a chunk is handed to the response
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+CSV_COLUMNS = [
+    "type", "challenge_id", "topic", "difficulty", "title", "date_created",
+    "content", "correct_answer_id", "correct_answer", "explanation",
+    "question_index", "user_answer_id", "user_answer", "is_correct",
+    "llm_score", "llm_feedback", "llm_correct_answer", "answered_at", "time_taken_seconds", "attempts"
+]
+
+
+def export_filename(fmt: str, compression: str = None, now: datetime = None):
+    """Download file name, e.g. intrvu-history-20250101.ndjson.gz"""
+    name = f"intrvu-history-{(now or datetime.now()).strftime('%Y%m%d')}.{fmt}"
+    return f"{name}.gz" if compression == "gzip" else name
+
+
+def export_media_type(fmt: str, compression: str = None):
+    return EXPORT_MEDIA_TYPES["gzip" if compression == "gzip" else fmt]
+
+
+# ========================================================================================
+# RECORDS
+# ========================================================================================
+
+def history_record(challenge, answers):
+    """
+    History item dict (version 2 shape: native arrays) for one
+    (challenge_row, [answer_rows]) pair from the history queries.
+    Shared by GET /challenges/history, /challenges/search and the NDJSON export.
+    """
+    if challenge.type == "interview":
+        user_answer = answers[0] if answers else None
+        return {
+            "id": challenge.id,
+            "type": "interview",
+            "topic": challenge.topic,
+            "difficulty": challenge.difficulty,
+            "title": challenge.title,
+            "date_created": challenge.date_created.isoformat(),
+            "options": challenge.content,
+            "correct_answer_id": challenge.correct_answer_id,
+            "explanation": challenge.explanation,
+            "user_answer": {
+                "user_answer_id": user_answer.user_answer_id,
+                "is_correct": user_answer.is_correct,
+                "date_completed": user_answer.date_completed.isoformat(),
+                "time_taken_seconds": user_answer.time_taken_seconds,
+                "attempts": user_answer.attempts,
+                "best_is_correct": bool(user_answer.best_is_correct)
+            } if user_answer else None
+        }
+    return {
+        "id": challenge.id,
+        "type": "scenario",
+        "topic": challenge.topic,
+        "difficulty": challenge.difficulty,
+        "title": challenge.title,
+        "date_created": challenge.date_created.isoformat(),
+        "questions": challenge.content,
+        "correct_answer": challenge.correct_answer,
+        "explanation": challenge.explanation,
+        "user_answers": [
+            {
+                "question_index": answer.question_index,
+                "user_answer": answer.user_answer,
+                "llm_score": answer.llm_score,
+                "llm_feedback": answer.llm_feedback,
+                "llm_correct_answer": answer.llm_correct_answer,
+                "created_at": answer.created_at.isoformat()
+            } for answer in answers
+        ]
+    }
+
+
+def _csv_rows(challenge, answers):
+    """Flat CSV rows (CSV_COLUMNS order) for a (challenge_row, [answer_rows]) pair."""
+    base = [
+        challenge.type, challenge.id, challenge.topic, challenge.difficulty, challenge.title,
+        challenge.date_created.isoformat(), json.dumps(challenge.content),
+        challenge.correct_answer_id, challenge.correct_answer, challenge.explanation
+    ]
+    if not answers:
+        return [base + [None] * 10]
+    if challenge.type == "interview":
+        return [base + [
+            None, answer.user_answer_id, None, answer.is_correct, None, None, None,
+            answer.date_completed.isoformat(), answer.time_taken_seconds, answer.attempts
+        ] for answer in answers]
+    return [base + [
+        answer.question_index, None, answer.user_answer, None, answer.llm_score,
+        answer.llm_feedback, answer.llm_correct_answer, answer.created_at.isoformat(), None, None
+    ] for answer in answers]
+
+
+# ========================================================================================
+# STREAM
+# ========================================================================================
+
+def _text_chunks(items, fmt: str):
+    """Serialized text of the export, cut into chunks of about EXPORT_CHUNK_BYTES."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n") if fmt == "csv" else None
+    if writer:
+        writer.writerow(CSV_COLUMNS)
+
+    for challenge, answers in items:
+        if writer:
+            writer.writerows(_csv_rows(challenge, answers))
+        else:
+            buffer.write(json.dumps(history_record(challenge, answers), ensure_ascii=False))
+            buffer.write("\n")
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_history_export(
+    db: Session,
+    user_id: str,
+    fmt: str = "ndjson",
+    compression: str = None,
+    challenge_type: str = None,
+    date_from: datetime = None,
+    date_to: datetime = None,
+    batch_size: int = HISTORY_EXPORT_BATCH_SIZE
+):
+    """
+    Byte chunks of a user's full history export.
+
+    Args:
+        db: Database session (must stay open while the generator is consumed)
+        user_id: User identifier from authentication
+        fmt: "ndjson" or "csv"
+        compression: None or "gzip"
+        challenge_type: Optional "interview" or "scenario" filter
+        date_from: Optional inclusive lower bound on date_created
+        date_to: Optional exclusive upper bound on date_created
+        batch_size: Rows fetched per database round trip
+
+    Returns:
+        Generator of bytes (input is validated on call)
+
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed (raised while iterating)
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid format '{fmt}'. Must be one of: {', '.join(EXPORT_FORMATS)}")
+    if compression is not None and compression not in EXPORT_COMPRESSIONS:
+        raise ValueError(f"Invalid compression '{compression}'. Must be one of: {', '.join(EXPORT_COMPRESSIONS)}")
+
+    items = iter_user_history(
+        db, user_id, challenge_type=challenge_type, date_from=date_from, date_to=date_to, batch_size=batch_size
+    )
+    chunks = (text.encode("utf-8") for text in _text_chunks(items, fmt))
+    return _gzip_chunks(chunks) if compression == "gzip" else chunks
+
+
+def _gzip_chunks(chunks):
+    """Compress a chunk stream into one gzip member, incrementally."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,265 @@
+# Idempotency Keys - Replay Stored Responses for Retried POSTs
+#
+# A client sends the same Idempotency-Key header on every retry of one logical
+# request. The first attempt CLAIMS the key (a "pending" row committed before
+# any LLM call), runs the request and stores its response. Later attempts:
+#   - completed key          -> replay the stored response, no work repeated
+#   - pending key            -> wait until the first attempt stores or releases it
+#   - key with another body  -> rejected (IdempotencyConflict)
+#
+# A failed attempt releases its key, so a retry runs the request again. A
+# pending row older than IDEMPOTENCY_PENDING_TIMEOUT_SECONDS belongs to a
+# crashed worker and may be taken over. Rows expire after IDEMPOTENCY_TTL_SECONDS
+# and are removed by purge_expired_keys() (scheduled job / maintenance CLI).
+#
+# Unlike the write helpers in db.py, these functions COMMIT: the claim must be
+# visible to other workers while the first attempt is still running.
+
+from sqlalchemy import select, update, delete, and_, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from datetime import datetime, timedelta
+from . import models
+from .dialects import dialect_insert
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Stored responses are replayed for this long
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+
+# A pending claim older than this is treated as abandoned (worker crashed mid-request)
+IDEMPOTENCY_PENDING_TIMEOUT_SECONDS = int(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", "300"))
+
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+STATUS_PENDING = "pending"
+STATUS_COMPLETED = "completed"
+
+
+class IdempotencyConflict(ValueError):
+    """The key was already used for a request with a different body."""
+
+
+def request_fingerprint(payload):
+    """Stable hash of a JSON-serializable request payload."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _validate(user_id: str, endpoint: str, key: str):
+    if not user_id or not user_id.strip():
+        raise ValueError("user_id cannot be empty")
+    if not endpoint:
+        raise ValueError("endpoint cannot be empty")
+    if not key or not key.strip():
+        raise ValueError("Idempotency-Key cannot be empty")
+    if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise ValueError(f"Idempotency-Key cannot be longer than {MAX_IDEMPOTENCY_KEY_LENGTH} characters")
+
+
+def _row_filter(user_id: str, endpoint: str, key: str):
+    table = models.IdempotencyKey
+    return and_(table.user_id == user_id, table.endpoint == endpoint, table.key == key)
+
+
+def _insert_claim(db: Session, values: dict):
+    """INSERT the pending row unless the key exists; returns True if inserted."""
+    stmt = dialect_insert(db, models.IdempotencyKey.__table__)
+    if stmt is not None:
+        result = db.execute(stmt.values(**values).on_conflict_do_nothing())
+        return result.rowcount == 1
+
+    # Fallback for engines without ON CONFLICT support: rely on the primary key
+    try:
+        with db.begin_nested():
+            db.add(models.IdempotencyKey(**values))
+        return True
+    except IntegrityError:
+        return False
+
+
+# ========================================================================================
+# CLAIM / STORE / RELEASE
+# ========================================================================================
+
+def claim_idempotency_key(db: Session, user_id: str, endpoint: str, key: str, request_hash: str):
+    """
+    Try to become the attempt that runs the request for this key.
+
+    Args:
+        db: Database session (committed by this call)
+        user_id: User identifier from authentication
+        endpoint: Endpoint the key belongs to
+        key: Idempotency-Key header value
+        request_hash: request_fingerprint() of the request payload
+
+    Returns:
+        True if this caller owns the key and must run the request,
+        False if another attempt owns it (see get_idempotent_response)
+
+    Raises:
+        ValueError: Invalid input parameters
+        IdempotencyConflict: Key already used with a different request body
+        RuntimeError: Database operation failed
+    """
+    _validate(user_id, endpoint, key)
+
+    table = models.IdempotencyKey
+    now = datetime.now()
+    values = {
+        "user_id": user_id,
+        "endpoint": endpoint,
+        "key": key,
+        "request_hash": request_hash,
+        "status": STATUS_PENDING,
+        "response_status": None,
+        "response_body": None,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+    }
+
+    try:
+        if _insert_claim(db, values):
+            db.commit()
+            return True
+
+        # Take over an expired key or an abandoned pending claim (atomic: one winner)
+        stale_before = now - timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT_SECONDS)
+        taken_over = db.execute(
+            update(table)
+            .where(_row_filter(user_id, endpoint, key))
+            .where(or_(
+                table.expires_at <= now,
+                and_(table.status == STATUS_PENDING, table.created_at <= stale_before)
+            ))
+            .values(**{k: v for k, v in values.items() if k not in ("user_id", "endpoint", "key")})
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if taken_over:
+            db.commit()
+            logger.info(f"Took over stale idempotency key for user {user_id} on {endpoint}")
+            return True
+
+        existing_hash = db.execute(
+            select(table.request_hash).where(_row_filter(user_id, endpoint, key))
+        ).scalar()
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to claim idempotency key for user {user_id} on {endpoint}: {str(e)}")
+        raise RuntimeError(f"Database error while claiming idempotency key: {str(e)}")
+
+    if existing_hash is None:
+        # Released between our INSERT and SELECT - claim again
+        return claim_idempotency_key(db, user_id, endpoint, key, request_hash)
+    if existing_hash != request_hash:
+        raise IdempotencyConflict("Idempotency-Key was already used with a different request body")
+    return False
+
+
+def get_idempotent_response(db: Session, user_id: str, endpoint: str, key: str):
+    """
+    Current state of a key owned by another attempt.
+
+    Returns:
+        (STATUS_COMPLETED, response_status, response_body) - replay this response
+        (STATUS_PENDING, None, None)                       - first attempt still running
+        None                                               - key released, claim it again
+
+    Raises:
+        RuntimeError: Database operation failed
+    """
+    table = models.IdempotencyKey
+    try:
+        # End any open transaction so the read sees other workers' commits
+        db.rollback()
+        row = db.execute(
+            select(table.status, table.response_status, table.response_body)
+            .where(_row_filter(user_id, endpoint, key))
+        ).first()
+        db.rollback()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to read idempotency key for user {user_id} on {endpoint}: {str(e)}")
+        raise RuntimeError(f"Database error while reading idempotency key: {str(e)}")
+
+    if row is None:
+        return None
+    if row.status == STATUS_COMPLETED:
+        return (STATUS_COMPLETED, row.response_status, row.response_body)
+    return (STATUS_PENDING, None, None)
+
+
+def store_idempotent_response(db: Session, user_id: str, endpoint: str, key: str,
+                              response_status: int, response_body):
+    """
+    Record the response of the attempt that owns the key.
+
+    Raises:
+        RuntimeError: Database operation failed
+    """
+    try:
+        db.execute(
+            update(models.IdempotencyKey)
+            .where(_row_filter(user_id, endpoint, key))
+            .values(status=STATUS_COMPLETED, response_status=response_status, response_body=response_body)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to store idempotent response for user {user_id} on {endpoint}: {str(e)}")
+        raise RuntimeError(f"Database error while storing idempotent response: {str(e)}")
+
+
+def release_idempotency_key(db: Session, user_id: str, endpoint: str, key: str):
+    """
+    Drop a pending claim after a failed attempt so a retry runs the request again.
+    Never raises: the claim would expire on its own.
+    """
+    table = models.IdempotencyKey
+    try:
+        db.rollback()  # discard whatever the failed attempt left in the session
+        db.execute(
+            delete(table)
+            .where(_row_filter(user_id, endpoint, key))
+            .where(table.status == STATUS_PENDING)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to release idempotency key for user {user_id} on {endpoint}: {str(e)}")
+
+
+# ========================================================================================
+# EXPIRY
+# ========================================================================================
+
+def purge_expired_keys(db: Session, now: datetime = None):
+    """
+    Delete expired idempotency rows with one set-based DELETE.
+
+    Returns:
+        Number of rows deleted
+
+    Raises:
+        RuntimeError: Database operation failed
+    """
+    now = now or datetime.now()
+    table = models.IdempotencyKey
+    try:
+        deleted = db.execute(
+            delete(table).where(table.expires_at <= now).execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        logger.info(f"Purged {deleted} expired idempotency keys")
+        return deleted
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to purge idempotency keys: {str(e)}")
+        raise RuntimeError(f"Database error while purging idempotency keys: {str(e)}")
@@ -0,0 +1,371 @@
+# SQL Instrumentation - Per-Request Statement Counts, DB Time and N+1 Detection
+#
+# SQLAlchemy cursor events feed a per-request QueryStats object held in a
+# context variable, so every statement a request runs (including those run in
+# the threadpool) is counted against it:
+#   - statement count and total DB time
+#   - the slowest statement (SQL text and duration)
+#   - statements grouped by SHAPE (SQL text with literals and IN-lists folded)
+#
+# The HTTP middleware in app.py opens one QueryStats per request, logs it,
+# adds a Server-Timing header and aggregates it per route (see route_metrics,
+# reported by /api/health/details).
+#
+# DEBUG MODES (SQL_DEBUG_MODE, default "warn" when ENVIRONMENT is development
+# or test, "off" otherwise):
+#   off   - only counting / logging
+#   warn  - log N+1 patterns and per-route budget overruns as warnings
+#   raise - also raise QueryBudgetExceeded, so the request fails with a 500
+#           and a TestClient-based test fails (see benchmarks/query_budget_check.py)
+#
+# A SELECT shape repeated SQL_N_PLUS_ONE_THRESHOLD times in one request is
+# reported as N+1. Budgets are per route template ("POST /api/interview-answers")
+# in QUERY_BUDGETS, falling back to SQL_QUERY_BUDGET.
+#
+# Statements outside a request (scheduler, CLI, benchmarks) are not tracked
+# unless wrapped in track_queries().
+#
+# Independently of requests, engine_metrics keeps per-ENGINE load totals
+# (statements, DB time, errors, pool usage) for every instrumented engine -
+# shard primaries and read replicas - reported under "engines" by /api/health/details.
+#
+# NOTE: For a StreamingResponse only the statements run before the first byte
+# is sent are counted (the body is produced after the middleware returns).
+
+from contextlib import contextmanager
+from collections import Counter
+from contextvars import ContextVar
+from sqlalchemy import event
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_DEBUG_DEFAULT = "warn" if os.getenv("ENVIRONMENT", "").lower() in ("development", "test") else "off"
+SQL_DEBUG_MODE = os.getenv("SQL_DEBUG_MODE", _DEBUG_DEFAULT).lower()
+
+# Same-shape SELECTs per request before they are reported as N+1
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+
+# Statements longer than this are logged with their SQL text
+SQL_SLOW_STATEMENT_MS = float(os.getenv("SQL_SLOW_STATEMENT_MS", "200"))
+
+# Statement budget for routes not listed in QUERY_BUDGETS
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "25"))
+
+# Per-route statement budgets (route template as matched by FastAPI).
+# Keep them tight: a new lazy load or per-row query should trip them.
+QUERY_BUDGETS = {
+    "GET /api/quotas": 3,
+    "GET /api/quotas/{challenge_type}": 3,
+    "GET /api/stats": 6,
+    "GET /api/challenges/history": 6,
+    "GET /api/challenges/search": 6,
+    "GET /api/challenges/export": 4,
+    "POST /api/interview-answers": 6,
+    "POST /api/interview-answers/bulk": 8,
+    "POST /api/scenario-answers": 12,
+    "POST /api/challenges/interview": 14,
+    "POST /api/challenges/scenario": 10,
+}
+
+DEBUG_MODES = ("off", "warn", "raise")
+if SQL_DEBUG_MODE not in DEBUG_MODES:
+    raise ValueError(f"Invalid SQL_DEBUG_MODE '{SQL_DEBUG_MODE}'. Must be one of: {', '.join(DEBUG_MODES)}")
+
+_current = ContextVar("sql_query_stats", default=None)
+
+# Literals and bind-parameter lists that vary between otherwise identical statements
+_SHAPE_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), "'?'"),
+    (re.compile(r"(?:\?|%\(\w+\)s|:\w+|\$\d+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+|\$\d+))+"), "?..."),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "N"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more statements than its budget, or an N+1 pattern (SQL_DEBUG_MODE=raise)."""
+
+
+def statement_shape(statement: str):
+    """SQL text with literals, IN-lists and whitespace normalized."""
+    for pattern, replacement in _SHAPE_PATTERNS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class QueryStats:
+    """Statements observed while this object is the current one."""
+
+    def __init__(self, label: str = None):
+        self.label = label
+        self.count = 0
+        self.total_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement = None
+        self.shapes = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+        self.shapes[statement_shape(statement)] += 1
+        if seconds * 1000 >= SQL_SLOW_STATEMENT_MS:
+            logger.warning(f"Slow SQL ({seconds * 1000:.1f} ms) in {self.label or 'untracked scope'}: {statement}")
+
+    def repeated_selects(self, threshold: int = None):
+        """[(shape, count)] of SELECT shapes run at least `threshold` times."""
+        threshold = threshold or SQL_N_PLUS_ONE_THRESHOLD
+        return [
+            (shape, count) for shape, count in self.shapes.most_common()
+            if count >= threshold and shape.lstrip("( ").upper().startswith("SELECT")
+        ]
+
+    def summary(self):
+        """Dict for logs / responses: count, db_ms, slowest_ms, slowest_statement."""
+        return {
+            "count": self.count,
+            "db_ms": round(self.total_seconds * 1000, 3),
+            "slowest_ms": round(self.slowest_seconds * 1000, 3),
+            "slowest_statement": self.slowest_statement
+        }
+
+
+# ========================================================================================
+# ENGINE HOOKS
+# ========================================================================================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    engine_metrics.record(conn.engine, seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, seconds)
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    starts = connection.info.get("query_start") if connection is not None else None
+    if starts:
+        starts.pop()
+    engine_metrics.error(exception_context.engine)
+
+
+def instrument_engine(engine, label: str = None):
+    """
+    Attach the statement counting hooks to an engine (idempotent).
+
+    Args:
+        engine: SQLAlchemy engine
+        label: Name in engine_metrics, e.g. "primary:0" (default: the URL without password)
+    """
+    engine_metrics.register(engine, label or engine.url.render_as_string(hide_password=True))
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# ========================================================================================
+# SCOPES
+# ========================================================================================
+
+@contextmanager
+def track_queries(label: str = None):
+    """
+    Count the statements run inside the block.
+
+    USAGE:
+    with track_queries("save answer") as stats:
+        save_interview_answer(db, ...)
+    assert stats.count <= 4
+    """
+    stats = QueryStats(label)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_query_budget(max_statements: int, label: str = None):
+    """track_queries() that raises QueryBudgetExceeded if the block ran more than max_statements."""
+    with track_queries(label) as stats:
+        yield stats
+    if stats.count > max_statements:
+        raise QueryBudgetExceeded(
+            f"{label or 'block'} ran {stats.count} SQL statements (budget {max_statements})"
+        )
+
+
+def route_template(scope):
+    """
+    "METHOD /full/{template}" of the matched route, or None if nothing matched.
+
+    Depending on the FastAPI version, route.path may or may not include the
+    include_router() prefix; the prefix is recovered from the request path.
+    """
+    route = scope.get("route")
+    if route is None or not hasattr(route, "path_regex"):
+        return None
+    match = re.search(route.path_regex.pattern.lstrip("^"), scope["path"])
+    prefix = scope["path"][:match.start()] if match else ""
+    return f"{scope['method']} {prefix}{route.path}"
+
+
+def query_budget(route: str):
+    """Statement budget of a route template, e.g. 'GET /api/stats'."""
+    return QUERY_BUDGETS.get(route, SQL_QUERY_BUDGET)
+
+
+def check_request(route: str, stats: QueryStats, mode: str = None):
+    """
+    Report N+1 patterns and budget overruns of a finished request.
+
+    Returns:
+        List of problem descriptions (empty when the request is clean)
+
+    Raises:
+        QueryBudgetExceeded: A problem was found and mode is "raise"
+    """
+    mode = mode or SQL_DEBUG_MODE
+    if mode == "off":
+        return []
+
+    problems = [
+        f"possible N+1: {count}x {shape}" for shape, count in stats.repeated_selects()
+    ]
+    budget = query_budget(route)
+    if stats.count > budget:
+        problems.append(f"{stats.count} SQL statements exceed the budget of {budget}")
+
+    for problem in problems:
+        logger.warning(f"{route}: {problem}")
+    if problems and mode == "raise":
+        raise QueryBudgetExceeded(f"{route}: " + "; ".join(problems))
+    return problems
+
+
+# ========================================================================================
+# PER-ROUTE METRICS
+# ========================================================================================
+
+class RouteQueryMetrics:
+    """Thread-safe per-route totals of request statement counts and DB time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def observe(self, route: str, stats: QueryStats):
+        with self._lock:
+            entry = self._routes.setdefault(route, {
+                "requests": 0, "statements": 0, "db_seconds": 0.0,
+                "max_statements": 0, "slowest_ms": 0.0, "budget_overruns": 0
+            })
+            entry["requests"] += 1
+            entry["statements"] += stats.count
+            entry["db_seconds"] += stats.total_seconds
+            entry["max_statements"] = max(entry["max_statements"], stats.count)
+            entry["slowest_ms"] = max(entry["slowest_ms"], round(stats.slowest_seconds * 1000, 3))
+            if stats.count > query_budget(route):
+                entry["budget_overruns"] += 1
+
+    def stats(self):
+        """{route: {requests, avg_statements, max_statements, avg_db_ms, slowest_ms, budget, budget_overruns}}"""
+        with self._lock:
+            return {
+                route: {
+                    "requests": entry["requests"],
+                    "avg_statements": round(entry["statements"] / entry["requests"], 2),
+                    "max_statements": entry["max_statements"],
+                    "avg_db_ms": round(entry["db_seconds"] * 1000 / entry["requests"], 3),
+                    "slowest_ms": entry["slowest_ms"],
+                    "budget": query_budget(route),
+                    "budget_overruns": entry["budget_overruns"]
+                } for route, entry in sorted(self._routes.items())
+            }
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_metrics = RouteQueryMetrics()
+
+
+# ========================================================================================
+# PER-ENGINE METRICS
+# ========================================================================================
+
+def _pool_stats(engine):
+    """Size / checked-out / overflow of the engine's pool (what the pool class reports)."""
+    pool = engine.pool
+    return {
+        name: getattr(pool, name)() for name in ("size", "checkedout", "overflow")
+        if callable(getattr(pool, name, None))
+    }
+
+
+class EngineMetrics:
+    """Thread-safe per-engine statement counts, DB time and errors."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = {}
+
+    def register(self, engine, label: str):
+        with self._lock:
+            self._engines.setdefault(engine, {"label": label, "statements": 0, "db_seconds": 0.0, "errors": 0})
+
+    def record(self, engine, seconds: float):
+        entry = self._engines.get(engine)
+        if entry is None:
+            return
+        with self._lock:
+            entry["statements"] += 1
+            entry["db_seconds"] += seconds
+
+    def error(self, engine):
+        entry = self._engines.get(engine)
+        if entry is None:
+            return
+        with self._lock:
+            entry["errors"] += 1
+
+    def stats(self):
+        """{label: {statements, errors, db_ms, avg_ms, pool}}"""
+        with self._lock:
+            entries = [(engine, dict(entry)) for engine, entry in self._engines.items()]
+        return {
+            entry["label"]: {
+                "statements": entry["statements"],
+                "errors": entry["errors"],
+                "db_ms": round(entry["db_seconds"] * 1000, 3),
+                "avg_ms": round(entry["db_seconds"] * 1000 / entry["statements"], 3) if entry["statements"] else 0.0,
+                "pool": _pool_stats(engine)
+            } for engine, entry in sorted(entries, key=lambda item: item[1]["label"])
+        }
+
+    def clear(self):
+        with self._lock:
+            for entry in self._engines.values():
+                entry.update(statements=0, db_seconds=0.0, errors=0)
+
+
+engine_metrics = EngineMetrics()
@@ -0,0 +1,197 @@
+# Maintenance CLI - Offline Database Jobs
+#
+# USAGE (from the backend directory):
+#   python -m src.database.maintenance backfill-stats             # rebuild stats for everyone
+#   python -m src.database.maintenance backfill-stats --user ID   # rebuild one user
+#   python -m src.database.maintenance rebuild-search             # rebuild the full-text index
+#   python -m src.database.maintenance rebuild-search --user ID   # rebuild one user
+#   python -m src.database.maintenance reset-quotas               # reset stale quotas
+#   python -m src.database.maintenance reset-quotas --force       # reset every quota to full
+#   python -m src.database.maintenance purge-idempotency          # delete expired idempotency keys
+#   python -m src.database.maintenance archive-history --days 365 # move old answered history to the archive
+#   python -m src.database.maintenance rollup-archive             # fold archived rows into monthly stats
+#   python -m src.database.maintenance purge-deleted-users        # purge users queued by user.deleted
+#   python -m src.database.maintenance purge-deleted-users --user ID  # queue and purge one user now
+#   python -m src.database.maintenance rebalance-shards --dry-run # show the bucket moves
+#   python -m src.database.maintenance rebalance-shards           # move buckets (API stopped!)
+#   python -m src.database.maintenance sync-replicas              # copy SQLite shards to their replica files
+#   python -m src.database.maintenance provision-users users.jsonl # create quotas for a Clerk user export
+#
+# Uses DATABASE_URL / DATABASE_SHARD_URLS like the API itself. Jobs for every
+# user run shard by shard; --user runs on that user's shard only.
+
+import argparse
+import logging
+import time
+
+from .models import SessionLocal, shard_sessions, router
+from .db import reset_stale_quotas, force_reset_all_quotas, PROVISION_BATCH_SIZE
+from .stats import backfill_user_stats
+from .search import rebuild_search_index
+from .idempotency import purge_expired_keys
+from .retention import (
+    archive_old_history,
+    rollup_archived_stats,
+    mark_user_deleted,
+    purge_user_data,
+    purge_deleted_users,
+    RETENTION_ARCHIVE_DAYS,
+    RETENTION_BATCH_SIZE
+)
+from .rebalance import plan_rebalance, rebalance_shards
+from .provisioning import provision_user_export
+
+
+def _sessions(user_id: str = None):
+    """[(shard, session)] of the user's shard, or of every shard."""
+    if user_id:
+        db = SessionLocal().bind_user(user_id)
+        try:
+            yield db.shard, db
+        finally:
+            db.close()
+    else:
+        yield from shard_sessions()
+
+
+def _backfill_stats(args):
+    for shard, db in _sessions(args.user):
+        count = backfill_user_stats(db, user_id=args.user)
+        print(f"Shard {shard}: rebuilt stats for {count} users")
+
+
+def _rebuild_search(args):
+    for shard, db in _sessions(args.user):
+        count = rebuild_search_index(db, user_id=args.user)
+        print(f"Shard {shard}: indexed {count} search documents")
+
+
+def _reset_quotas(args):
+    for shard, db in _sessions():
+        count = force_reset_all_quotas(db) if args.force else reset_stale_quotas(db)
+        print(f"Shard {shard}: reset {count} quota rows")
+
+
+def _purge_idempotency(args):
+    for shard, db in _sessions():
+        count = purge_expired_keys(db)
+        print(f"Shard {shard}: purged {count} expired idempotency keys")
+
+
+def _archive_history(args):
+    if not args.days:
+        raise SystemExit("archive-history needs --days (or RETENTION_ARCHIVE_DAYS)")
+    for shard, db in _sessions():
+        count = archive_old_history(db, args.days, batch_size=args.batch_size, max_batches=args.max_batches)
+        print(f"Shard {shard}: archived {count} challenges")
+
+
+def _rollup_archive(args):
+    for shard, db in _sessions():
+        count = rollup_archived_stats(db, batch_size=args.batch_size)
+        print(f"Shard {shard}: rolled up {count} archived challenges")
+
+
+def _purge_deleted_users(args):
+    for shard, db in _sessions(args.user):
+        if args.user:
+            mark_user_deleted(db, args.user)
+            count = purge_user_data(db, args.user, batch_size=args.batch_size)
+            print(f"Shard {shard}: deleted {count} rows of user {args.user}")
+        else:
+            count = purge_deleted_users(db, batch_size=args.batch_size)
+            print(f"Shard {shard}: purged {count} deleted users")
+
+
+def _rebalance_shards(args):
+    moves = plan_rebalance(router.bucket_map, router.shards)
+    if args.dry_run:
+        for bucket, (source, target) in sorted(moves.items()):
+            print(f"bucket {bucket}: shard {source} -> {target}")
+        print(f"{len(moves)} buckets would move")
+        return
+    summary = rebalance_shards(router, batch_size=args.batch_size)
+    print(f"Moved {summary['buckets']} buckets ({summary['users']} users, {summary['rows']} rows); "
+          f"removed {summary['stray_users']} stray copies")
+
+
+def _sync_replicas(args):
+    # Local testing only: real replicas are kept up to date by the database server
+    for shard, replica in router.replicas.items():
+        primary = router.engines[shard]
+        if primary.dialect.name != "sqlite" or replica.dialect.name != "sqlite":
+            print(f"Shard {shard}: skipped (not SQLite - replication is managed by the database)")
+            continue
+        source, target = primary.raw_connection(), replica.raw_connection()
+        try:
+            source.driver_connection.backup(target.driver_connection)
+        finally:
+            source.close()
+            target.close()
+        print(f"Shard {shard}: copied {primary.url.database} to {replica.url.database}")
+
+
+def _provision_users(args):
+    start = time.perf_counter()
+    with open(args.path, encoding="utf-8") as lines:
+        summary = provision_user_export(lines, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"Provisioned {summary['provisioned']} of {summary['users']} users "
+          f"({summary['deleted']} deleted users skipped) in {elapsed:.2f}s "
+          f"({summary['users'] / elapsed if elapsed else 0:,.0f} users/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.database.maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill-stats", help="Rebuild user_stats / user_topic_stats")
+    backfill.add_argument("--user", help="Only rebuild this user id")
+    backfill.set_defaults(handler=_backfill_stats)
+
+    search = commands.add_parser("rebuild-search", help="Rebuild the history full-text search index")
+    search.add_argument("--user", help="Only rebuild this user id")
+    search.set_defaults(handler=_rebuild_search)
+
+    reset = commands.add_parser("reset-quotas", help="Set-based daily quota reset")
+    reset.add_argument("--force", action="store_true", help="Reset every row, not only stale ones")
+    reset.set_defaults(handler=_reset_quotas)
+
+    purge = commands.add_parser("purge-idempotency", help="Delete expired idempotency keys")
+    purge.set_defaults(handler=_purge_idempotency)
+
+    archive = commands.add_parser("archive-history", help="Move old answered challenges to challenge_archive")
+    archive.add_argument("--days", type=int, default=RETENTION_ARCHIVE_DAYS, help="Age threshold in days")
+    archive.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+    archive.add_argument("--max-batches", type=int, help="Stop after this many batches per challenge type")
+    archive.set_defaults(handler=_archive_history)
+
+    rollup = commands.add_parser("rollup-archive", help="Fold archived challenges into user_monthly_stats")
+    rollup.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+    rollup.set_defaults(handler=_rollup_archive)
+
+    purge_users = commands.add_parser("purge-deleted-users", help="Delete all data of deleted users")
+    purge_users.add_argument("--user", help="Queue and purge this user id now")
+    purge_users.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+    purge_users.set_defaults(handler=_purge_deleted_users)
+
+    rebalance = commands.add_parser("rebalance-shards", help="Spread user buckets evenly over all shards (offline)")
+    rebalance.add_argument("--dry-run", action="store_true", help="Only print the planned bucket moves")
+    rebalance.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+    rebalance.set_defaults(handler=_rebalance_shards)
+
+    sync = commands.add_parser("sync-replicas", help="Copy each SQLite shard into its replica file (local testing)")
+    sync.set_defaults(handler=_sync_replicas)
+
+    provision = commands.add_parser("provision-users", help="Create missing quotas for a JSONL user export")
+    provision.add_argument("path", help="JSONL file, one user object ({\"id\": ...}) per line")
+    provision.add_argument("--batch-size", type=int, default=PROVISION_BATCH_SIZE, help="Users per transaction")
+    provision.set_defaults(handler=_provision_users)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# Database Migrations - Lightweight, Idempotent Schema Upgrades
+#
+# Base.metadata.create_all() only creates missing TABLES. Anything added to an
+# existing table later (indexes, columns, data fixes) is applied here.
+# Every step must be safe to run on every startup. Data fixes that would scan
+# whole tables run once: they record themselves in schema_migrations.
+
+from sqlalchemy import MetaData, select, func, text, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _ensure_indexes(engine: Engine, metadata: MetaData):
+    """Create any index declared on the models that the database is missing."""
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _ensure_migrations_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations "
+        "(name VARCHAR PRIMARY KEY, applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+
+def _is_applied(conn, name: str):
+    """True if the one-time migration `name` already ran on this database."""
+    _ensure_migrations_table(conn)
+    return conn.execute(
+        text("SELECT 1 FROM schema_migrations WHERE name = :name"), {"name": name}
+    ).first() is not None
+
+
+def _mark_applied(conn, name: str):
+    """Record a one-time migration (in the caller's transaction, with its changes)."""
+    # Workers starting together may both run an idempotent migration: first marker wins
+    conn.execute(
+        text("INSERT INTO schema_migrations (name) VALUES (:name) ON CONFLICT DO NOTHING"), {"name": name}
+    )
+
+
+# Columns that moved from JSON-encoded strings to native JSON
+_JSON_COLUMNS = (("interview_challenges", "options"), ("scenario_challenges", "questions"))
+
+
+def _migrate_json_columns(engine: Engine):
+    """
+    Convert options / questions to native JSON in place.
+
+    PostgreSQL: ALTER the VARCHAR columns to JSONB (existing text is cast).
+    SQLite: column types cannot be altered, and the stored text already is
+    valid JSON1 - only rows that are not valid JSON are wrapped in a one-element
+    array so they still decode to the expected shape. That check scans both
+    tables, so it runs once (recorded in schema_migrations); rows written since
+    are native JSON.
+    """
+    if engine.dialect.name == "postgresql":
+        inspector = inspect(engine)
+        with engine.begin() as conn:
+            for table, column in _JSON_COLUMNS:
+                current = {c["name"]: c["type"] for c in inspector.get_columns(table)}[column]
+                if current.__class__.__name__.upper() != "JSONB":
+                    conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb"))
+                    logger.info(f"Migrated {table}.{column} to JSONB")
+    elif engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            if _is_applied(conn, "native_json_columns"):
+                return
+            for table, column in _JSON_COLUMNS:
+                result = conn.execute(text(
+                    f"UPDATE {table} SET {column} = json_array({column}) WHERE NOT json_valid({column})"
+                ))
+                if result.rowcount:
+                    logger.warning(f"Wrapped {result.rowcount} invalid JSON values in {table}.{column}")
+            _mark_applied(conn, "native_json_columns")
+
+
+def _dedupe_interview_answers(engine: Engine):
+    """
+    Move interview_answers to one row per (user, challenge).
+
+    1. Add the attempt columns (attempts, best_is_correct) to old tables.
+    2. If duplicates exist, fold each group into its newest row (highest id):
+       attempts = sum of the group, best_is_correct = any attempt correct,
+       and delete the rest - two set-based statements.
+    3. Drop the old non-unique index; _ensure_indexes() then creates the
+       unique one, which must come AFTER the dedupe.
+
+    Aggregate stats are rebuilt afterwards, since the answer counts changed.
+    """
+    inspector = inspect(engine)
+    if "interview_answers" not in inspector.get_table_names():
+        return
+    columns = {c["name"] for c in inspector.get_columns("interview_answers")}
+    indexes = {index["name"] for index in inspector.get_indexes("interview_answers")}
+    false = "false" if engine.dialect.name == "postgresql" else "0"
+
+    with engine.begin() as conn:
+        if "attempts" not in columns:
+            conn.execute(text("ALTER TABLE interview_answers ADD COLUMN attempts INTEGER NOT NULL DEFAULT 1"))
+        if "best_is_correct" not in columns:
+            conn.execute(text(
+                f"ALTER TABLE interview_answers ADD COLUMN best_is_correct BOOLEAN NOT NULL DEFAULT {false}"
+            ))
+            conn.execute(text("UPDATE interview_answers SET best_is_correct = is_correct"))
+
+        has_duplicates = conn.execute(text(
+            "SELECT 1 FROM interview_answers GROUP BY user_id, challenge_id HAVING count(*) > 1 LIMIT 1"
+        )).first()
+        if has_duplicates:
+            conn.execute(text(
+                "UPDATE interview_answers SET "
+                "attempts = (SELECT sum(d.attempts) FROM interview_answers d "
+                "            WHERE d.user_id = interview_answers.user_id "
+                "            AND d.challenge_id = interview_answers.challenge_id), "
+                "best_is_correct = (SELECT max(CASE WHEN d.best_is_correct THEN 1 ELSE 0 END) "
+                "                   FROM interview_answers d "
+                "                   WHERE d.user_id = interview_answers.user_id "
+                "                   AND d.challenge_id = interview_answers.challenge_id) = 1 "
+                "WHERE id IN (SELECT max(id) FROM interview_answers GROUP BY user_id, challenge_id "
+                "             HAVING count(*) > 1)"
+            ))
+            deleted = conn.execute(text(
+                "DELETE FROM interview_answers WHERE id NOT IN "
+                "(SELECT max(id) FROM interview_answers GROUP BY user_id, challenge_id)"
+            )).rowcount
+            logger.warning(f"Merged {deleted} duplicate interview answers into one row per user and challenge")
+
+        if "ix_interview_answers_user_challenge" in indexes:
+            conn.execute(text("DROP INDEX ix_interview_answers_user_challenge"))
+
+    if has_duplicates:
+        from .stats import backfill_user_stats
+        with Session(bind=engine) as db:
+            try:
+                backfill_user_stats(db)
+            except RuntimeError as e:
+                logger.warning(f"Stats rebuild after answer dedupe skipped: {str(e)}")
+
+
+def _dedupe_challenge_quotas(engine: Engine):
+    """
+    Move challenge_quotas to one row per (user, challenge type).
+
+    Duplicates (concurrent initialize calls or redelivered user.created
+    webhooks before the unique index existed) are folded into the oldest row
+    (lowest id), keeping the LOWEST remaining quota of the group so nobody
+    gains challenges. The old user_id index is dropped: the unique
+    (user_id, challenge_type) index created by _ensure_indexes() afterwards
+    covers the same lookups.
+    """
+    inspector = inspect(engine)
+    if "challenge_quotas" not in inspector.get_table_names():
+        return
+    indexes = {index["name"] for index in inspector.get_indexes("challenge_quotas")}
+
+    with engine.begin() as conn:
+        has_duplicates = conn.execute(text(
+            "SELECT 1 FROM challenge_quotas GROUP BY user_id, challenge_type HAVING count(*) > 1 LIMIT 1"
+        )).first()
+        if has_duplicates:
+            conn.execute(text(
+                "UPDATE challenge_quotas SET "
+                "quota_remaining = (SELECT min(d.quota_remaining) FROM challenge_quotas d "
+                "                   WHERE d.user_id = challenge_quotas.user_id "
+                "                   AND d.challenge_type = challenge_quotas.challenge_type) "
+                "WHERE id IN (SELECT min(id) FROM challenge_quotas GROUP BY user_id, challenge_type "
+                "             HAVING count(*) > 1)"
+            ))
+            deleted = conn.execute(text(
+                "DELETE FROM challenge_quotas WHERE id NOT IN "
+                "(SELECT min(id) FROM challenge_quotas GROUP BY user_id, challenge_type)"
+            )).rowcount
+            logger.warning(f"Removed {deleted} duplicate challenge quotas (one row per user and type)")
+
+        if "ix_challenge_quotas_user_id" in indexes:
+            conn.execute(text("DROP INDEX ix_challenge_quotas_user_id"))
+
+
+def _backfill_user_stats_if_empty(engine: Engine, metadata: MetaData):
+    """
+    First start with the aggregate tables: build them from existing history.
+    Later starts find user_stats populated and skip this step.
+    """
+    user_stats = metadata.tables["user_stats"]
+    interview_challenges = metadata.tables["interview_challenges"]
+    scenario_challenges = metadata.tables["scenario_challenges"]
+    with engine.connect() as conn:
+        if conn.execute(select(func.count()).select_from(user_stats)).scalar():
+            return
+        has_history = (
+            conn.execute(select(interview_challenges.c.id).limit(1)).first()
+            or conn.execute(select(scenario_challenges.c.id).limit(1)).first()
+        )
+    if not has_history:
+        return
+
+    from .stats import backfill_user_stats
+    with Session(bind=engine) as db:
+        try:
+            backfill_user_stats(db)
+        except RuntimeError as e:
+            # Another worker may be running the same backfill; the CLI can rerun it
+            logger.warning(f"Automatic stats backfill skipped: {str(e)}")
+
+
+def _ensure_search_index(engine: Engine):
+    """
+    Create the full-text search index; populate it from existing history
+    the first time it is created.
+    """
+    from .search import ensure_search_index, rebuild_search_index
+    if not ensure_search_index(engine):
+        return
+    with Session(bind=engine) as db:
+        try:
+            rebuild_search_index(db)
+        except RuntimeError as e:
+            logger.warning(f"Automatic search index build skipped: {str(e)}")
+
+
+def run_migrations(engine: Engine, metadata: MetaData):
+    """
+    Apply all idempotent migrations in order.
+
+    Called once at import time from models.py, right after create_all().
+    """
+    _dedupe_interview_answers(engine)  # before the unique indexes are created
+    _dedupe_challenge_quotas(engine)
+    _ensure_indexes(engine, metadata)
+    _migrate_json_columns(engine)
+    _backfill_user_stats_if_empty(engine, metadata)
+    _ensure_search_index(engine)
+    logger.info("Database migrations applied")
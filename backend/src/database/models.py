@@ -4,12 +4,13 @@
 # Models represent the core entities: challenges, answers, and user quotas.
 #
 # FRONTEND NOTES:
-# - Interview challenges contain MCQ data with options as JSON strings
-# - Scenario challenges contain open-ended questions as JSON strings  
+# - Interview challenges contain MCQ data with options as a native JSON array
+# - Scenario challenges contain open-ended questions as a native JSON array
 # - All dates are returned as ISO format strings in API responses
 # - User quotas reset daily (10 challenges per type per day)
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, create_engine, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, create_engine, ForeignKey, Index, JSON, false, select
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -18,10 +19,20 @@ from datetime import datetime
 # engine = create_engine("sqlite:///database.db", echo=True)
 import os
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///database.db")
-engine = create_engine(DATABASE_URL, echo=False)
+
+# One engine per shard (DATABASE_SHARD_URLS, default: DATABASE_URL alone), plus
+# optional read replicas (DATABASE_REPLICA_URLS). Engines are instrumented for
+# per-request statement counts and per-engine load (instrumentation.py).
+from .sharding import ShardRouter, ShardedSession, shard_urls, replica_urls
+router = ShardRouter(shard_urls(), replica_urls())
+engines = router.engines
+engine = router.directory  # shard "0": holds the shard map; the only engine when unsharded
 
 Base = declarative_base()
 
+# Native JSON storage: JSON1 text on SQLite, JSONB on PostgreSQL
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
 # ========================================================================================
 # CHALLENGE MODELS
 # ========================================================================================
@@ -32,7 +43,7 @@ class InterviewChallenge(Base):
     Each record represents one generated question with multiple answer options.
     
     FRONTEND USAGE:
-    - Use 'options' field as JSON.parse(challenge.options) to get array
+    - 'options' is returned as an array (response version 2) or a JSON string (version 1)
     - 'correct_answer_id' maps to array index (0=A, 1=B, 2=C, 3=D)
     - Display 'title' as the main question text
     """
@@ -49,17 +60,22 @@ class InterviewChallenge(Base):
     
     # AI-generated content fields (OpenAI outputs stored for reuse)
     title = Column(String, nullable=False)  # AI GENERATED: The actual question text
-    options = Column(String, nullable=False)  # AI GENERATED: JSON array ["Option A", "Option B", "Option C", "Option D"]
+    options = Column(JSONType, nullable=False)  # AI GENERATED: JSON array ["Option A", "Option B", "Option C", "Option D"]
     correct_answer_id = Column(Integer, nullable=False)  # AI GENERATED: Index of correct option (0-3 for A/B/C/D)
     explaination = Column(String, nullable=False)  # AI GENERATED: Explanation text (typo preserved for frontend compatibility)
     
+    # Keyset pagination index for history: WHERE created_by = ? ORDER BY date_created DESC, id DESC
+    __table_args__ = (
+        Index("ix_interview_challenges_history", "created_by", "date_created", "id"),
+    )
+    
 class ScenarioChallenge(Base):
     """
     Open-ended scenario challenges for interview preparation.
     Each record represents one scenario with multiple related questions.
     
     FRONTEND USAGE:
-    - Use 'questions' field as JSON.parse(challenge.questions) to get question array
+    - 'questions' is returned as an array (response version 2) or a JSON string (version 1)
     - Display 'title' as the main scenario description
     - 'correct_answer' and 'explanation' are used for AI evaluation
     """
@@ -76,12 +92,17 @@ class ScenarioChallenge(Base):
     
     # AI-generated content fields (OpenAI outputs stored for reuse)
     title = Column(String, nullable=False)  # AI GENERATED: Main scenario description
-    questions = Column(String, nullable=False)  # AI GENERATED: JSON array of question objects
+    questions = Column(JSONType, nullable=False)  # AI GENERATED: JSON array of question objects
     correct_answer = Column(String, nullable=True)  # AI GENERATED: Optional ideal answer template for evaluation
     explanation = Column(String, nullable=True)  # AI GENERATED: Optional rubric or feedback guidelines
     
     # Relationship to answers (one scenario can have many user answers)
     answers = relationship("ScenarioAnswer", back_populates="scenario")
+    
+    # Keyset pagination index for history: WHERE created_by = ? ORDER BY date_created DESC, id DESC
+    __table_args__ = (
+        Index("ix_scenario_challenges_history", "created_by", "date_created", "id"),
+    )
 
 # ========================================================================================
 # ANSWER TRACKING MODELS
@@ -116,11 +137,18 @@ class ScenarioAnswer(Base):
     
     # Relationship back to scenario
     scenario = relationship("ScenarioChallenge", back_populates="answers")
+    
+    # Answer lookups for a page of history: WHERE user_id = ? AND scenario_id IN (...)
+    __table_args__ = (
+        Index("ix_scenario_answers_user_scenario", "user_id", "scenario_id"),
+    )
 
 class InterviewAnswer(Base):
     """
-    Tracks individual user responses to interview (MCQ) challenges.
-    Stores what users actually answered vs the correct answers.
+    A user's answer to an interview (MCQ) challenge - ONE row per (user, challenge).
+    Answering the same challenge again updates the row (upsert): the answer
+    fields hold the LAST attempt, `attempts` counts submissions and
+    `best_is_correct` records whether any attempt was correct.
     
     FRONTEND USAGE:
     - Submit answers via POST /interview-answers endpoint
@@ -139,13 +167,23 @@ class InterviewAnswer(Base):
     # Challenge reference
     challenge_id = Column(Integer, ForeignKey("interview_challenges.id"), nullable=False)  # References InterviewChallenge.id
     
-    # User response data
+    # User response data (last attempt)
     user_answer_id = Column(Integer, nullable=False)  # USER RESPONSE: Selected option (0-3 for A/B/C/D)
     is_correct = Column(Boolean, nullable=False)  # SYSTEM CALCULATED: Whether user got it right
     time_taken_seconds = Column(Integer, nullable=True)  # SYSTEM TRACKED: How long user took (optional)
     
+    # Attempt tracking
+    attempts = Column(Integer, nullable=False, default=1, server_default="1")  # SYSTEM TRACKED: Submissions so far
+    best_is_correct = Column(Boolean, nullable=False, default=False, server_default=false())  # SYSTEM CALCULATED: Ever correct
+    
     # Relationship back to challenge
     challenge = relationship("InterviewChallenge")
+    
+    # One row per (user, challenge): the upsert conflict target, and the index for
+    # history answer lookups (WHERE user_id = ? AND challenge_id IN (...))
+    __table_args__ = (
+        Index("uq_interview_answers_user_challenge", "user_id", "challenge_id", unique=True),
+    )
 
 # ========================================================================================
 # QUOTA MANAGEMENT MODELS
@@ -167,12 +205,189 @@ class ChallengeQuota(Base):
     id = Column(Integer, primary_key=True)  # Auto-generated unique identifier
     
     # User tracking fields (from authentication system)
-    user_id = Column(String, nullable=False, index=True)  # USER AUTH: User identifier - INDEXED for quota lookups
+    user_id = Column(String, nullable=False)  # USER AUTH: User identifier - INDEXED (see below) for quota lookups
     
     # Quota management fields (business logic)
     challenge_type = Column(String, nullable=False)  # SYSTEM: "interview" or "scenario" - tracks quotas separately
     quota_remaining = Column(Integer, nullable=False, default=10)  # SYSTEM: How many challenges user can generate today
     last_reset_date = Column(DateTime, default=datetime.now)  # SYSTEM: When quota was last reset (for daily reset logic)
+    
+    # One row per (user, type): the insert-or-ignore conflict target of quota
+    # provisioning, and the index for quota lookups (WHERE user_id = ?)
+    __table_args__ = (
+        Index("uq_challenge_quotas_user_type", "user_id", "challenge_type", unique=True),
+    )
+
+# ========================================================================================
+# AGGREGATE STATISTICS MODELS
+# ========================================================================================
+
+class UserStats(Base):
+    """
+    Per-user running totals, maintained in the same transaction as every write
+    (challenge creation, interview answer, scenario evaluation).
+    
+    FRONTEND USAGE:
+    - Read via GET /stats (one row lookup, independent of history length)
+    - Interview accuracy = interview_correct / interview_answered
+    - Average scenario score = scenario_score_total / scenario_answers_scored
+    """
+    __tablename__ = "user_stats"
+    
+    user_id = Column(String, primary_key=True)  # USER AUTH: User identifier
+    
+    # Challenge counts
+    interview_count = Column(Integer, nullable=False, default=0)
+    scenario_count = Column(Integer, nullable=False, default=0)
+    easy_count = Column(Integer, nullable=False, default=0)
+    medium_count = Column(Integer, nullable=False, default=0)
+    hard_count = Column(Integer, nullable=False, default=0)
+    
+    # Interview (MCQ) answers
+    interview_answered = Column(Integer, nullable=False, default=0)
+    interview_correct = Column(Integer, nullable=False, default=0)
+    
+    # Scenario answers (per evaluated answer)
+    scenario_answers_scored = Column(Integer, nullable=False, default=0)
+    scenario_score_total = Column(Integer, nullable=False, default=0)
+    
+    # Scenario challenges (per challenge: average score >= 70 counts as passed)
+    scenario_challenges_evaluated = Column(Integer, nullable=False, default=0)
+    scenario_challenges_passed = Column(Integer, nullable=False, default=0)
+    
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+class UserTopicStats(Base):
+    """
+    Per-user, per-topic running totals (same maintenance rules as UserStats).
+    Powers the topic breakdown without scanning the user's history.
+    """
+    __tablename__ = "user_topic_stats"
+    
+    user_id = Column(String, primary_key=True)  # USER AUTH: User identifier
+    topic = Column(String, primary_key=True)  # USER INPUT: Topic as entered when generating
+    
+    interview_count = Column(Integer, nullable=False, default=0)
+    scenario_count = Column(Integer, nullable=False, default=0)
+    interview_answered = Column(Integer, nullable=False, default=0)
+    interview_correct = Column(Integer, nullable=False, default=0)
+    scenario_answers_scored = Column(Integer, nullable=False, default=0)
+    scenario_score_total = Column(Integer, nullable=False, default=0)
+
+# ========================================================================================
+# CACHE VALIDATION MODELS
+# ========================================================================================
+
+class UserDataVersion(Base):
+    """
+    Per-user monotonic data version, incremented in the same transaction as
+    every write that changes what the user can read (challenges, answers, quotas).
+    
+    FRONTEND USAGE:
+    - Not read directly: GET /challenges/history, /quotas and /stats derive a
+      strong ETag from it and answer If-None-Match with 304 Not Modified
+    """
+    __tablename__ = "user_data_versions"
+    
+    user_id = Column(String, primary_key=True)  # USER AUTH: User identifier
+    version = Column(Integer, nullable=False, default=0)  # SYSTEM: Bumped on every write
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+# ========================================================================================
+# IDEMPOTENCY MODELS
+# ========================================================================================
+
+class IdempotencyKey(Base):
+    """
+    Stored outcome of a POST sent with an Idempotency-Key header, so client
+    retries replay the first response instead of repeating the LLM call.
+    
+    LIFECYCLE:
+    - "pending":   claimed by the attempt that is running the request
+    - "completed": response_status / response_body hold the response to replay
+    Failed attempts delete their row; expired rows are purged by a scheduled job.
+    """
+    __tablename__ = "idempotency_keys"
+    
+    user_id = Column(String, primary_key=True)  # USER AUTH: Keys are scoped per user
+    endpoint = Column(String, primary_key=True)  # SYSTEM: e.g. "challenges/interview"
+    key = Column(String, primary_key=True)  # USER INPUT: Idempotency-Key header value
+    
+    request_hash = Column(String, nullable=False)  # SYSTEM: Fingerprint of the request body
+    status = Column(String, nullable=False, default="pending")  # SYSTEM: "pending" or "completed"
+    response_status = Column(Integer, nullable=True)  # SYSTEM: HTTP status to replay
+    response_body = Column(JSONType, nullable=True)  # SYSTEM: JSON body to replay
+    
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    expires_at = Column(DateTime, nullable=False, index=True)  # SYSTEM: Purged after this time
+
+# ========================================================================================
+# RETENTION MODELS
+# ========================================================================================
+
+class ChallengeArchive(Base):
+    """
+    Compact cold storage for old, answered challenges moved out of the hot
+    challenge / answer tables by the retention archive job (see retention.py).
+    One row per challenge; its answers are folded into a JSON array.
+    
+    FRONTEND NOTES:
+    - Archived challenges no longer appear in /challenges/history or search
+    - They stay counted in /stats (user_stats totals are never decremented)
+    """
+    __tablename__ = "challenge_archive"
+    
+    challenge_type = Column(String, primary_key=True)  # SYSTEM: "interview" or "scenario"
+    id = Column(Integer, primary_key=True)  # SYSTEM: Original challenge id
+    
+    created_by = Column(String, nullable=False)  # USER AUTH: Challenge owner
+    topic = Column(String, nullable=False)
+    difficulty = Column(String, nullable=False)
+    title = Column(String, nullable=False)
+    date_created = Column(DateTime, nullable=False)
+    
+    # {"options" | "questions", "correct_answer_id" | "correct_answer", "explanation"}
+    content = Column(JSONType, nullable=False)
+    # Answer dicts (user_id, scores, timestamps) in submission order
+    answers = Column(JSONType, nullable=False)
+    
+    archived_at = Column(DateTime, nullable=False, default=datetime.now)
+    rolled_up = Column(Boolean, nullable=False, default=False)  # SYSTEM: Counted in user_monthly_stats
+    
+    __table_args__ = (
+        Index("ix_challenge_archive_owner", "created_by", "date_created"),
+        Index("ix_challenge_archive_rollup", "rolled_up"),
+    )
+
+class UserMonthlyStats(Base):
+    """
+    Per-user, per-month, per-topic activity of archived history, maintained by
+    the retention rollup job. Archived rows keep contributing to trends here.
+    """
+    __tablename__ = "user_monthly_stats"
+    
+    user_id = Column(String, primary_key=True)  # USER AUTH: User identifier
+    month = Column(String, primary_key=True)  # SYSTEM: "YYYY-MM" of date_created
+    topic = Column(String, primary_key=True)
+    
+    interview_count = Column(Integer, nullable=False, default=0)
+    scenario_count = Column(Integer, nullable=False, default=0)
+    interview_answered = Column(Integer, nullable=False, default=0)
+    interview_correct = Column(Integer, nullable=False, default=0)
+    scenario_answers_scored = Column(Integer, nullable=False, default=0)
+    scenario_score_total = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+class DeletedUser(Base):
+    """
+    Users deleted in Clerk (user.deleted webhook) whose data must be purged.
+    The purge job removes their rows in bounded batches and sets purged_at.
+    """
+    __tablename__ = "deleted_users"
+    
+    user_id = Column(String, primary_key=True)  # USER AUTH: Deleted user identifier
+    deleted_at = Column(DateTime, nullable=False, default=datetime.now)
+    purged_at = Column(DateTime, nullable=True, index=True)  # SYSTEM: Null until the purge finished
 
 # ========================================================================================
 # FUTURE MODELS (Not implemented yet, but planned)
@@ -208,18 +423,48 @@ class ChallengeQuota(Base):
 # DATABASE INITIALIZATION
 # ========================================================================================
 
-# Create all tables in the database
-Base.metadata.create_all(engine)
+from .migrations import run_migrations
+
+def _has_user_data(shard_engine):
+    """True if the shard already holds challenges or quotas (an existing database)."""
+    with shard_engine.connect() as conn:
+        return any(
+            conn.execute(select(column).limit(1)).first() is not None
+            for column in (InterviewChallenge.id, ScenarioChallenge.id, ChallengeQuota.id)
+        )
+
+# Create all tables on every shard and bring existing databases up to date
+# (indexes added after the tables were created)
+for shard_engine in engines.values():
+    Base.metadata.create_all(shard_engine)
+    run_migrations(shard_engine, Base.metadata)
+
+# Load the shard map. On first start, shards that already hold data (an
+# unsharded database being sharded) keep every bucket until a rebalance.
+router.load_map(initial_shards=[name for name, shard_engine in engines.items() if _has_user_data(shard_engine)])
 
-# Session factory for database connections
-SessionLocal = sessionmaker(autoflush=False, autocommit=False, bind=engine)
+# Session factory for database connections (ShardedSession: bind_user(user_id)
+# before the first query when several shards are configured).
+# expire_on_commit=False: write helpers return objects that are still loaded
+# after commit (ids come back through INSERT ... RETURNING), so reading them
+# does not issue a refresh SELECT per object.
+SessionLocal = sessionmaker(
+    class_=ShardedSession, router=router, autoflush=False, autocommit=False, expire_on_commit=False
+)
 
-def get_db():
+# Read-only sessions: served by the shard's replica when one is configured
+# (primary for READ_YOUR_WRITES_SECONDS after the user wrote); writes raise.
+ReadSessionLocal = sessionmaker(
+    class_=ShardedSession, router=router, autoflush=False, autocommit=False, expire_on_commit=False,
+    info={"read_only": True}
+)
+
+def get_write_db():
     """
-    Database session dependency for FastAPI.
+    Database session dependency for FastAPI (primary database).
     
     USAGE IN ROUTES:
-    async def my_endpoint(db: Session = Depends(get_db)):
+    async def my_endpoint(db: Session = Depends(get_write_db)):
         # Use db session here
         pass
     
@@ -231,5 +476,35 @@ def get_db():
     finally:
         db.close()
 
+# Routes that write (and older callers) use the primary
+get_db = get_write_db
+
+def get_read_db():
+    """
+    Read-only session dependency for GET routes that never write.
+    
+    USAGE IN ROUTES:
+    async def my_endpoint(db: Session = Depends(get_read_db)):
+        db.bind_user(user_id)  # picks the replica or, right after a write, the primary
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def shard_sessions():
+    """
+    Yield (shard, session) for every shard, for jobs that cover all users
+    (quota reset, retention, maintenance). Each session is closed after use.
+    """
+    for shard in router.shards:
+        db = SessionLocal().bind_shard(shard)
+        try:
+            yield shard, db
+        finally:
+            db.close()
+
 
     
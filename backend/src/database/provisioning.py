@@ -0,0 +1,130 @@
+# Bulk User Provisioning - Quotas for Many Users Across Shards
+#
+# db.provision_users() provisions users that live on ONE shard. The helpers
+# here split any list of user ids by shard (see sharding.py), so the webhook
+# queue (src/provisioning.py) and the import CLI can hand over mixed batches:
+#
+#   user ids --shard_for_user--> one provision_users() call per shard
+#
+# IMPORT: read_user_ids() streams a Clerk user export in JSONL format, one
+# user object per line ({"id": "user_..."}; "user_id" is accepted too), and
+# provision_user_export() provisions it in PROVISION_BATCH_SIZE chunks per
+# shard - a few statements and one commit per chunk.
+#
+# USAGE: python -m src.database.maintenance provision-users users.jsonl
+
+from collections import defaultdict
+from .db import provision_users, PROVISION_BATCH_SIZE
+from .models import SessionLocal, router
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _empty_summary():
+    return {"users": 0, "provisioned": 0, "deleted": 0}
+
+
+def _add(summary: dict, result: dict):
+    for key in summary:
+        summary[key] += result[key]
+
+
+def provision_users_across_shards(user_ids, batch_size: int = PROVISION_BATCH_SIZE):
+    """
+    Provision users that may live on different shards, one session per shard.
+
+    Args:
+        user_ids: Iterable of user identifiers
+        batch_size: Users per transaction
+
+    Returns:
+        dict: provision_users() summary summed over the shards
+
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed (shards provisioned before
+            the failing one stay committed; re-running is safe)
+    """
+    by_shard = defaultdict(list)
+    for user_id in dict.fromkeys(user_ids):
+        if not user_id or not user_id.strip():
+            raise ValueError("user_id cannot be empty")
+        by_shard[router.shard_for_user(user_id)].append(user_id)
+
+    summary = _empty_summary()
+    for shard, shard_user_ids in sorted(by_shard.items()):
+        db = SessionLocal().bind_shard(shard)
+        try:
+            _add(summary, provision_users(db, shard_user_ids, batch_size=batch_size))
+        finally:
+            db.close()
+    return summary
+
+
+def read_user_ids(lines):
+    """
+    Yield the user id of every line of a JSONL user export. Blank lines are
+    skipped.
+
+    Raises:
+        ValueError: A line is not a JSON object with an "id" / "user_id"
+    """
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {number}: invalid JSON ({str(e)})")
+        user_id = (record.get("id") or record.get("user_id")) if isinstance(record, dict) else None
+        if not isinstance(user_id, str) or not user_id.strip():
+            raise ValueError(f"Line {number}: missing user id")
+        yield user_id
+
+
+def provision_user_export(lines, batch_size: int = PROVISION_BATCH_SIZE):
+    """
+    Provision every user of a JSONL export, streaming: at most `batch_size`
+    ids per shard are held in memory before they are written.
+
+    Args:
+        lines: Iterable of JSONL lines (an open file)
+        batch_size: Users per transaction
+
+    Returns:
+        dict: {"users", "provisioned", "deleted"} (users counted per chunk, so
+              an id repeated across chunks is counted again but never
+              provisioned twice)
+
+    Raises:
+        ValueError: Invalid export line or parameters
+        RuntimeError: Database operation failed (re-running resumes safely)
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    summary = _empty_summary()
+    pending = defaultdict(list)
+    sessions = {}
+
+    def flush(shard):
+        if shard not in sessions:
+            sessions[shard] = SessionLocal().bind_shard(shard)
+        _add(summary, provision_users(sessions[shard], pending.pop(shard), batch_size=batch_size))
+
+    try:
+        for user_id in read_user_ids(lines):
+            shard = router.shard_for_user(user_id)
+            pending[shard].append(user_id)
+            if len(pending[shard]) >= batch_size:
+                flush(shard)
+        for shard in sorted(pending):
+            flush(shard)
+    finally:
+        for db in sessions.values():
+            db.close()
+
+    logger.info(f"Provisioned {summary['provisioned']} of {summary['users']} exported users")
+    return summary
@@ -0,0 +1,320 @@
+# Shard Rebalancing - Offline Bucket Moves
+#
+# Spreads the SHARD_BUCKETS buckets evenly over the configured shards (for
+# example after appending a URL to DATABASE_SHARD_URLS), moving as few
+# buckets as possible. For every moved bucket:
+#
+#   1. copy   - each user of the bucket is copied from the source shard to the
+#               target in one transaction per user. Challenge ids are
+#               re-assigned by the target, answers are re-pointed at the new
+#               ids, archive rows get fresh negative ids (never exposed, and
+#               hot-table ids are positive so a later archive batch can not
+#               collide with them), the search index is rebuilt for the user
+#               and the data version is bumped so old ETags stop matching.
+#               Idempotency keys are not copied (their replies hold old ids).
+#   2. flip   - the bucket's shard_map row is pointed at the target
+#   3. delete - the users' rows are purged from the source shard
+#
+# Rows on a shard that does not own their user's bucket are STRAY copies of an
+# interrupted run (copied but not flipped, or flipped but not deleted). They
+# are deleted first, so the tool can simply be re-run after a failure.
+#
+# RUN IT WITH THE API STOPPED: requests of a user being moved would write to
+# the old shard, and running processes only load the shard map at startup.
+#
+# USAGE: python -m src.database.maintenance rebalance-shards [--dry-run]
+
+from sqlalchemy import select, insert, update, delete, union, func
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from collections import Counter, defaultdict
+from datetime import datetime
+from . import models
+from .dialects import dialect_name
+from .retention import purge_user_data, RETENTION_BATCH_SIZE
+from .search import rebuild_search_index, SEARCH_DIALECTS
+from .sharding import ShardRouter, SHARD_BUCKETS, shard_map_table, user_bucket
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Challenge table, answer table and answer -> challenge column per challenge type
+_SOURCES = {
+    "interview": (models.InterviewChallenge, models.InterviewAnswer, models.InterviewAnswer.challenge_id),
+    "scenario": (models.ScenarioChallenge, models.ScenarioAnswer, models.ScenarioAnswer.scenario_id),
+}
+
+# Per-user tables copied as they are (challenge_quotas ids are re-assigned)
+_USER_TABLES = (
+    models.UserStats, models.UserTopicStats, models.UserMonthlyStats, models.ChallengeQuota, models.DeletedUser
+)
+
+# (model, user column) of every table that can hold a user's rows
+_USER_COLUMNS = (
+    (models.InterviewChallenge, models.InterviewChallenge.created_by),
+    (models.ScenarioChallenge, models.ScenarioChallenge.created_by),
+    (models.InterviewAnswer, models.InterviewAnswer.user_id),
+    (models.ScenarioAnswer, models.ScenarioAnswer.user_id),
+    (models.ChallengeArchive, models.ChallengeArchive.created_by),
+    (models.ChallengeQuota, models.ChallengeQuota.user_id),
+    (models.UserStats, models.UserStats.user_id),
+    (models.UserTopicStats, models.UserTopicStats.user_id),
+    (models.UserMonthlyStats, models.UserMonthlyStats.user_id),
+    (models.UserDataVersion, models.UserDataVersion.user_id),
+    (models.IdempotencyKey, models.IdempotencyKey.user_id),
+    (models.DeletedUser, models.DeletedUser.user_id),
+)
+
+
+# ========================================================================================
+# PLAN
+# ========================================================================================
+
+def plan_rebalance(bucket_map: dict, shards: list):
+    """
+    Bucket moves that leave every shard with SHARD_BUCKETS / len(shards)
+    buckets (+1 for the remainder), moving as few buckets as possible.
+
+    Args:
+        bucket_map: Current {bucket: shard}
+        shards: All configured shard names
+
+    Returns:
+        {bucket: (source_shard, target_shard)}
+    """
+    if not shards:
+        raise ValueError("At least one shard is required")
+
+    owned = defaultdict(list)
+    for bucket, shard in sorted(bucket_map.items()):
+        owned[shard].append(bucket)
+
+    # The remainder goes to the shards that already hold the most buckets
+    base, extra = divmod(SHARD_BUCKETS, len(shards))
+    by_size = sorted(shards, key=lambda shard: -len(owned[shard]))
+    target_size = {shard: base + (1 if rank < extra else 0) for rank, shard in enumerate(by_size)}
+
+    surplus = []
+    for shard in shards:
+        keep = target_size[shard]
+        surplus.extend((bucket, shard) for bucket in owned[shard][keep:])
+
+    moves = {}
+    for shard in shards:
+        for _ in range(target_size[shard] - len(owned[shard])):
+            bucket, source = surplus.pop(0)
+            moves[bucket] = (source, shard)
+    return moves
+
+
+def shard_users(db: Session):
+    """Every user id with at least one row on the session's shard."""
+    query = union(*(select(column.label("user_id")) for _, column in _USER_COLUMNS))
+    return set(db.execute(query).scalars().all())
+
+
+# ========================================================================================
+# COPY
+# ========================================================================================
+
+def _rows(db: Session, statement):
+    return [dict(row) for row in db.execute(statement).mappings()]
+
+
+def _insert_ids(db: Session, table, rows):
+    """Insert rows (without ids) and return their new ids in row order."""
+    if not rows:
+        return []
+    return sorted(db.execute(insert(table).returning(table.c.id), rows).scalars().all())
+
+
+def _copy_user(source: Session, target: Session, user_id: str, batch_size: int):
+    """
+    Copy every row of `user_id` from source to target (one target transaction).
+
+    Returns:
+        Number of rows copied
+    """
+    copied = 0
+    for challenge_type, (challenge_model, answer_model, answer_fk) in _SOURCES.items():
+        challenges, answers = challenge_model.__table__, answer_model.__table__
+        id_map, last_id = {}, 0
+        while True:
+            batch = _rows(source, select(challenges).where(
+                challenges.c.created_by == user_id, challenges.c.id > last_id
+            ).order_by(challenges.c.id).limit(batch_size))
+            if not batch:
+                break
+            last_id = batch[-1]["id"]
+            new_ids = _insert_ids(target, challenges, [
+                {key: value for key, value in row.items() if key != "id"} for row in batch
+            ])
+            id_map.update(zip((row["id"] for row in batch), new_ids))
+            copied += len(batch)
+
+        fk, last_id, skipped = answer_fk.key, 0, 0
+        while True:
+            batch = _rows(source, select(answers).where(
+                answers.c.user_id == user_id, answers.c.id > last_id
+            ).order_by(answers.c.id).limit(batch_size))
+            if not batch:
+                break
+            last_id = batch[-1]["id"]
+            rows = [
+                {**{key: value for key, value in row.items() if key != "id"}, fk: id_map[row[fk]]}
+                for row in batch if row[fk] in id_map
+            ]
+            skipped += len(batch) - len(rows)
+            if rows:
+                target.execute(insert(answers), rows)
+            copied += len(rows)
+        if skipped:
+            # Answers to another user's challenge: that challenge is not moving with this user
+            logger.warning(f"Skipped {skipped} {challenge_type} answers of user {user_id} to other users' challenges")
+
+        archive = models.ChallengeArchive.__table__
+        rows = _rows(source, select(archive).where(
+            archive.c.challenge_type == challenge_type, archive.c.created_by == user_id
+        ).order_by(archive.c.id))
+        if rows:
+            lowest = target.execute(
+                select(func.min(archive.c.id)).where(archive.c.challenge_type == challenge_type)
+            ).scalar()
+            next_id = min(lowest or 0, 0) - 1
+            for offset, row in enumerate(rows):
+                row["id"] = next_id - offset
+            target.execute(insert(archive), rows)
+            copied += len(rows)
+
+    for model in _USER_TABLES:
+        table = model.__table__
+        rows = _rows(source, select(table).where(table.c.user_id == user_id))
+        if rows:
+            target.execute(insert(table), [
+                {key: value for key, value in row.items() if key != "id"} for row in rows
+            ])
+            copied += len(rows)
+
+    # One past the source version, so ETags and cached responses of the old ids never match
+    versions = models.UserDataVersion.__table__
+    version = source.execute(select(versions.c.version).where(versions.c.user_id == user_id)).scalar()
+    target.execute(insert(versions).values(
+        user_id=user_id, version=(version or 0) + 1, updated_at=datetime.now()
+    ))
+    return copied + 1
+
+
+def _remove_user(db: Session, user_id: str, batch_size: int):
+    """Delete every row of a user from the session's shard (including its deleted_users row)."""
+    removed = purge_user_data(db, user_id, batch_size=batch_size, pause_seconds=0)
+    db.execute(delete(models.DeletedUser).where(models.DeletedUser.user_id == user_id))
+    db.commit()
+    return removed
+
+
+def move_user(source: Session, target: Session, user_id: str, batch_size: int = RETENTION_BATCH_SIZE):
+    """
+    Copy one user from the source shard to the target shard. Any earlier
+    (partial) copy on the target is removed first. The source is not changed.
+
+    Returns:
+        Number of rows copied
+
+    Raises:
+        RuntimeError: Database operation failed
+    """
+    _remove_user(target, user_id, batch_size)
+    try:
+        copied = _copy_user(source, target, user_id, batch_size)
+        source.commit()
+        target.commit()
+    except SQLAlchemyError as e:
+        source.rollback()
+        target.rollback()
+        logger.error(f"Failed to copy user {user_id} from shard {source.shard} to {target.shard}: {str(e)}")
+        raise RuntimeError(f"Database error while moving user to another shard: {str(e)}")
+
+    if dialect_name(target) in SEARCH_DIALECTS:
+        rebuild_search_index(target, user_id=user_id)
+    return copied
+
+
+# ========================================================================================
+# REBALANCE
+# ========================================================================================
+
+def _set_bucket_shard(router: ShardRouter, bucket: int, shard: str):
+    with router.directory.begin() as conn:
+        conn.execute(
+            update(shard_map_table)
+            .where(shard_map_table.c.bucket == bucket)
+            .values(shard=shard, updated_at=datetime.now())
+        )
+    router.bucket_map[bucket] = shard
+
+
+def remove_stray_users(router: ShardRouter, batch_size: int = RETENTION_BATCH_SIZE):
+    """
+    Delete users from shards that do not own their bucket (left behind by an
+    interrupted rebalance).
+
+    Returns:
+        Number of stray user copies removed
+    """
+    removed = 0
+    for shard, db in models.shard_sessions():
+        for user_id in sorted(shard_users(db)):
+            if router.shard_for_user(user_id) != shard:
+                _remove_user(db, user_id, batch_size)
+                logger.info(f"Removed stray copy of user {user_id} from shard {shard}")
+                removed += 1
+    return removed
+
+
+def rebalance_shards(router: ShardRouter, batch_size: int = RETENTION_BATCH_SIZE):
+    """
+    Move buckets until every shard holds an even share (see plan_rebalance).
+    Offline only: stop the API first and restart it afterwards.
+
+    Returns:
+        {"buckets", "users", "rows", "stray_users"}
+
+    Raises:
+        RuntimeError: Database operation failed (re-running resumes safely)
+    """
+    summary = {"buckets": 0, "users": 0, "rows": 0, "stray_users": remove_stray_users(router, batch_size)}
+    moves = plan_rebalance(router.bucket_map, router.shards)
+
+    by_source = defaultdict(list)
+    for bucket, (source_shard, target_shard) in sorted(moves.items()):
+        by_source[source_shard].append((bucket, target_shard))
+
+    for source_shard, bucket_moves in by_source.items():
+        source = models.SessionLocal().bind_shard(source_shard)
+        try:
+            users_by_bucket = defaultdict(list)
+            for user_id in sorted(shard_users(source)):
+                users_by_bucket[user_bucket(user_id)].append(user_id)
+            source.commit()
+
+            for bucket, target_shard in bucket_moves:
+                users = users_by_bucket.get(bucket, [])
+                target = models.SessionLocal().bind_shard(target_shard)
+                try:
+                    for user_id in users:
+                        summary["rows"] += move_user(source, target, user_id, batch_size)
+                finally:
+                    target.close()
+
+                _set_bucket_shard(router, bucket, target_shard)
+                for user_id in users:
+                    _remove_user(source, user_id, batch_size)
+
+                summary["buckets"] += 1
+                summary["users"] += len(users)
+                logger.info(f"Moved bucket {bucket} ({len(users)} users) from shard {source_shard} to {target_shard}")
+        finally:
+            source.close()
+
+    logger.info(f"Shard sizes in buckets: {dict(sorted(Counter(router.bucket_map.values()).items()))}")
+    return summary
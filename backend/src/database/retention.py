@@ -0,0 +1,537 @@
+# Data Retention - Archive, Roll Up and Purge
+#
+# Three offline jobs keep the hot tables (challenges + answers) small:
+#
+#   archive_old_history()  - moves answered challenges older than N days, with
+#                            their answers, into the compact challenge_archive
+#                            table (one row per challenge, answers as JSON)
+#   rollup_archived_stats() - folds archived rows into user_monthly_stats
+#   purge_deleted_users()  - removes every row of users deleted in Clerk
+#                            (queued by the user.deleted webhook)
+#
+# Every job works in bounded batches, each batch its own short transaction, with
+# a short pause between batches so API writes are never blocked for long (SQLite
+# has a single writer). Jobs are safe to interrupt and re-run: a batch either
+# commits completely or not at all, and the next run continues where it stopped.
+#
+# user_stats totals are never decremented by archiving (archived activity still
+# counts); backfill_user_stats() reads challenge_archive for the same reason.
+
+from sqlalchemy import select, delete, update, exists, cast, String
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from datetime import datetime, timedelta
+from . import models
+from .cache import quota_cache, history_cache
+from .dialects import dialect_insert, upsert_increment
+from .search import remove_challenges, remove_user_documents
+from .stats import backfill_user_stats
+from .versions import bump_data_version
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Archive answered challenges older than this many days (unset: archiving disabled)
+RETENTION_ARCHIVE_DAYS = int(os.getenv("RETENTION_ARCHIVE_DAYS")) if os.getenv("RETENTION_ARCHIVE_DAYS") else None
+
+# Rows per batch / transaction and pause between batches
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv("RETENTION_BATCH_PAUSE_SECONDS", "0.05"))
+
+# Challenge table, answer table and answer -> challenge column per challenge type
+_SOURCES = {
+    "interview": (models.InterviewChallenge, models.InterviewAnswer, models.InterviewAnswer.challenge_id),
+    "scenario": (models.ScenarioChallenge, models.ScenarioAnswer, models.ScenarioAnswer.scenario_id),
+}
+
+
+def _pause(seconds: float):
+    if seconds:
+        time.sleep(seconds)
+
+
+# ========================================================================================
+# ARCHIVE
+# ========================================================================================
+
+def _archive_content(challenge_type: str, challenge):
+    if challenge_type == "interview":
+        return {
+            "options": challenge.options,
+            "correct_answer_id": challenge.correct_answer_id,
+            "explanation": challenge.explaination
+        }
+    return {
+        "questions": challenge.questions,
+        "correct_answer": challenge.correct_answer,
+        "explanation": challenge.explanation
+    }
+
+
+def _archive_answer(challenge_type: str, answer):
+    if challenge_type == "interview":
+        return {
+            "user_id": answer.user_id,
+            "user_answer_id": answer.user_answer_id,
+            "is_correct": answer.is_correct,
+            "date_completed": answer.date_completed.isoformat() if answer.date_completed else None,
+            "time_taken_seconds": answer.time_taken_seconds,
+            "attempts": answer.attempts,
+            "best_is_correct": answer.best_is_correct
+        }
+    return {
+        "user_id": answer.user_id,
+        "question_index": answer.question_index,
+        "user_answer": answer.user_answer,
+        "llm_score": answer.llm_score,
+        "llm_feedback": answer.llm_feedback,
+        "llm_correct_answer": answer.llm_correct_answer,
+        "created_at": answer.created_at.isoformat() if answer.created_at else None
+    }
+
+
+def _archive_batch(db: Session, challenge_type: str, cutoff: datetime, after_id: int, batch_size: int):
+    """
+    Move one batch of answered challenges (id > after_id, created before cutoff).
+
+    Returns:
+        (number of challenges moved, last id scanned or None when done, owners touched)
+    """
+    challenge_model, answer_model, answer_fk = _SOURCES[challenge_type]
+    challenges = db.execute(
+        select(challenge_model.__table__)
+        .where(
+            challenge_model.id > after_id,
+            challenge_model.date_created < cutoff,
+            exists().where(answer_fk == challenge_model.id)
+        )
+        .order_by(challenge_model.id)
+        .limit(batch_size)
+    ).all()
+    if not challenges:
+        return 0, None, set()
+
+    ids = [challenge.id for challenge in challenges]
+    answers = {}
+    for answer in db.execute(
+        select(answer_model.__table__).where(answer_fk.in_(ids)).order_by(answer_model.id)
+    ):
+        answers.setdefault(getattr(answer, answer_fk.key), []).append(_archive_answer(challenge_type, answer))
+
+    now = datetime.now()
+    db.execute(models.ChallengeArchive.__table__.insert(), [{
+        "challenge_type": challenge_type,
+        "id": challenge.id,
+        "created_by": challenge.created_by,
+        "topic": challenge.topic,
+        "difficulty": challenge.difficulty,
+        "title": challenge.title,
+        "date_created": challenge.date_created,
+        "content": _archive_content(challenge_type, challenge),
+        "answers": answers.get(challenge.id, []),
+        "archived_at": now,
+        "rolled_up": False
+    } for challenge in challenges])
+    db.execute(delete(answer_model).where(answer_fk.in_(ids)).execution_options(synchronize_session=False))
+    db.execute(delete(challenge_model).where(challenge_model.id.in_(ids)).execution_options(synchronize_session=False))
+
+    owners = {}
+    for challenge in challenges:
+        owners.setdefault(challenge.created_by, []).append(challenge.id)
+    for owner, owner_ids in owners.items():
+        remove_challenges(db, owner, challenge_type, owner_ids)
+        bump_data_version(db, owner)  # their history changed
+    return len(challenges), ids[-1], set(owners)
+
+
+def archive_old_history(
+    db: Session,
+    older_than_days: int,
+    batch_size: int = RETENTION_BATCH_SIZE,
+    pause_seconds: float = RETENTION_BATCH_PAUSE_SECONDS,
+    max_batches: int = None
+):
+    """
+    Move answered challenges created more than `older_than_days` ago (and all
+    their answers) from the hot tables into challenge_archive.
+
+    Candidates are walked in primary-key order (keyset), so every batch is a
+    short index range scan and the whole run reads each table once.
+
+    Args:
+        db: Database session
+        older_than_days: Age threshold in days (>= 1)
+        batch_size: Challenges per batch / transaction
+        pause_seconds: Sleep between batches
+        max_batches: Optional cap per challenge type for one run
+
+    Returns:
+        Number of challenges archived
+
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    if older_than_days < 1:
+        raise ValueError(f"Invalid older_than_days '{older_than_days}'. Must be at least 1")
+    if batch_size < 1:
+        raise ValueError(f"Invalid batch_size '{batch_size}'. Must be at least 1")
+
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    total = 0
+    try:
+        for challenge_type in _SOURCES:
+            after_id, batches = 0, 0
+            while max_batches is None or batches < max_batches:
+                moved, after_id, owners = _archive_batch(db, challenge_type, cutoff, after_id, batch_size)
+                if after_id is None:
+                    break
+                db.commit()
+                for owner in owners:
+                    history_cache.invalidate_user(owner)
+                total += moved
+                batches += 1
+                _pause(pause_seconds)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to archive history: {str(e)}")
+        raise RuntimeError(f"Database error while archiving history: {str(e)}")
+
+    logger.info(f"Archived {total} challenges older than {older_than_days} days")
+    return total
+
+
+# ========================================================================================
+# ROLLUP
+# ========================================================================================
+
+def _rollup_deltas(row):
+    """{(user_id, month, topic): {counter: delta}} contributed by one archive row."""
+    month = row.date_created.strftime("%Y-%m")
+    deltas = {}
+
+    def add(user_id, column, value):
+        counters = deltas.setdefault((user_id, month, row.topic), {})
+        counters[column] = counters.get(column, 0) + value
+
+    add(row.created_by, f"{row.challenge_type}_count", 1)
+    for answer in row.answers or []:
+        if row.challenge_type == "interview":
+            add(answer["user_id"], "interview_answered", 1)
+            add(answer["user_id"], "interview_correct", 1 if answer["is_correct"] else 0)
+        elif answer.get("llm_score") is not None:
+            add(answer["user_id"], "scenario_answers_scored", 1)
+            add(answer["user_id"], "scenario_score_total", answer["llm_score"])
+    return deltas
+
+
+def rollup_archived_stats(
+    db: Session,
+    batch_size: int = RETENTION_BATCH_SIZE,
+    pause_seconds: float = RETENTION_BATCH_PAUSE_SECONDS
+):
+    """
+    Fold archive rows that are not rolled up yet into user_monthly_stats.
+
+    Each batch adds its counters and flags its rows in one transaction, so
+    every archive row is counted exactly once.
+
+    Returns:
+        Number of archive rows rolled up
+
+    Raises:
+        RuntimeError: Database operation failed
+    """
+    archive = models.ChallengeArchive
+    total = 0
+    try:
+        while True:
+            rows = db.execute(
+                select(archive.challenge_type, archive.id, archive.created_by, archive.topic,
+                       archive.date_created, archive.answers)
+                .where(archive.rolled_up.is_(False))
+                .order_by(archive.challenge_type, archive.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            totals = {}
+            for row in rows:
+                for key, counters in _rollup_deltas(row).items():
+                    merged = totals.setdefault(key, {})
+                    for column, value in counters.items():
+                        merged[column] = merged.get(column, 0) + value
+            for (user_id, month, topic), counters in totals.items():
+                upsert_increment(db, models.UserMonthlyStats,
+                                 {"user_id": user_id, "month": month, "topic": topic}, counters)
+
+            for challenge_type in _SOURCES:
+                ids = [row.id for row in rows if row.challenge_type == challenge_type]
+                if ids:
+                    db.execute(
+                        update(archive)
+                        .where(archive.challenge_type == challenge_type, archive.id.in_(ids))
+                        .values(rolled_up=True)
+                        .execution_options(synchronize_session=False)
+                    )
+            db.commit()
+            total += len(rows)
+            _pause(pause_seconds)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to roll up archived history: {str(e)}")
+        raise RuntimeError(f"Database error while rolling up archived history: {str(e)}")
+
+    logger.info(f"Rolled up {total} archived challenges")
+    return total
+
+
+# ========================================================================================
+# PURGE (Clerk user.deleted)
+# ========================================================================================
+
+def mark_user_deleted(db: Session, user_id: str):
+    """
+    Queue a user for purging (idempotent: repeated webhooks keep the first row).
+
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    if not user_id or not user_id.strip():
+        raise ValueError("user_id cannot be empty")
+
+    try:
+        stmt = dialect_insert(db, models.DeletedUser.__table__)
+        if stmt is not None:
+            db.execute(stmt.values(user_id=user_id, deleted_at=datetime.now()).on_conflict_do_nothing())
+        elif db.get(models.DeletedUser, user_id) is None:
+            db.add(models.DeletedUser(user_id=user_id))
+        db.commit()
+        logger.info(f"Queued deleted user {user_id} for purge")
+    except IntegrityError:
+        db.rollback()  # concurrent duplicate webhook
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to queue deleted user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while queueing deleted user: {str(e)}")
+
+
+def _delete_in_batches(db: Session, model, condition, batch_size: int, pause_seconds: float):
+    """DELETE rows matching `condition` at most `batch_size` at a time (one commit each)."""
+    total = 0
+    while True:
+        batch = select(model.id).where(condition).limit(batch_size).scalar_subquery()
+        deleted = db.execute(
+            delete(model).where(condition, model.id.in_(batch)).execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+        _pause(pause_seconds)
+
+
+def _purge_owned_archive(db: Session, challenge_type: str, user_id: str, affected: set,
+                         batch_size: int, pause_seconds: float):
+    """
+    Delete the user's archive rows of one type in batches. Answerers of those rows
+    are added to `affected`; counters they already contributed to other users'
+    user_monthly_stats (rows rolled up before) are subtracted in the same transaction.
+    """
+    archive = models.ChallengeArchive
+    total = 0
+    while True:
+        rows = db.execute(
+            select(archive.challenge_type, archive.id, archive.created_by, archive.topic,
+                   archive.date_created, archive.answers, archive.rolled_up)
+            .where(archive.challenge_type == challenge_type, archive.created_by == user_id)
+            .order_by(archive.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return total
+
+        for row in rows:
+            affected.update(answer["user_id"] for answer in row.answers or [] if answer["user_id"] != user_id)
+            if not row.rolled_up:
+                continue
+            for (answerer, month, topic), counters in _rollup_deltas(row).items():
+                if answerer != user_id:  # the user's own monthly rows are deleted below
+                    upsert_increment(db, models.UserMonthlyStats,
+                                     {"user_id": answerer, "month": month, "topic": topic},
+                                     {column: -value for column, value in counters.items()})
+        db.execute(
+            delete(archive)
+            .where(archive.challenge_type == challenge_type, archive.id.in_([row.id for row in rows]))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        total += len(rows)
+        if len(rows) < batch_size:
+            return total
+        _pause(pause_seconds)
+
+
+def _scrub_archive_answers(db: Session, challenge_type: str, user_id: str,
+                           batch_size: int, pause_seconds: float):
+    """
+    Remove the user's answers from other owners' archive rows of one type (JSON
+    rewrite, batched by id). The textual match only preselects rows; the answer
+    lists are filtered exactly. Returns the number of answers removed.
+    """
+    archive = models.ChallengeArchive
+    total, after_id = 0, 0
+    while True:
+        rows = db.execute(
+            select(archive.id, archive.answers)
+            .where(
+                archive.challenge_type == challenge_type,
+                archive.id > after_id,
+                archive.created_by != user_id,
+                cast(archive.answers, String).contains(f'"{user_id}"', autoescape=True)
+            )
+            .order_by(archive.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return total
+
+        for row in rows:
+            kept = [answer for answer in row.answers or [] if answer["user_id"] != user_id]
+            if len(kept) != len(row.answers or []):
+                db.execute(
+                    update(archive)
+                    .where(archive.challenge_type == challenge_type, archive.id == row.id)
+                    .values(answers=kept)
+                    .execution_options(synchronize_session=False)
+                )
+                total += len(row.answers) - len(kept)
+        db.commit()
+        after_id = rows[-1].id
+        if len(rows) < batch_size:
+            return total
+        _pause(pause_seconds)
+
+
+def purge_user_data(
+    db: Session,
+    user_id: str,
+    batch_size: int = RETENTION_BATCH_SIZE,
+    pause_seconds: float = RETENTION_BATCH_PAUSE_SECONDS
+):
+    """
+    Delete every row belonging to a user, in bounded batches.
+
+    Large tables (answers, challenges, archive, search index) are deleted
+    `batch_size` rows per transaction; per-user tables (stats, quotas, versions,
+    idempotency keys) in one final transaction that also marks the user purged.
+
+    Other users' answers to the purged user's challenges go with them (hot
+    tables and archive), and the user's own answers are removed from other
+    owners' archive rows. Those other users get their stats rebuilt, their
+    rolled-up monthly stats reduced and their data version bumped.
+
+    Returns:
+        Number of rows deleted
+
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    if not user_id or not user_id.strip():
+        raise ValueError("user_id cannot be empty")
+
+    total = 0
+    affected = set()  # other users whose answers to this user's challenges are deleted
+    try:
+        for challenge_type, (challenge_model, answer_model, answer_fk) in _SOURCES.items():
+            owned = select(challenge_model.id).where(challenge_model.created_by == user_id)
+            affected.update(db.execute(
+                select(answer_model.user_id).distinct()
+                .where(answer_fk.in_(owned), answer_model.user_id != user_id)
+            ).scalars())
+            # The user's answers, then any answers to the user's challenges (FK), then the challenges
+            total += _delete_in_batches(db, answer_model, answer_model.user_id == user_id, batch_size, pause_seconds)
+            total += _delete_in_batches(db, answer_model, answer_fk.in_(owned), batch_size, pause_seconds)
+            total += _delete_in_batches(
+                db, challenge_model, challenge_model.created_by == user_id, batch_size, pause_seconds
+            )
+            total += _purge_owned_archive(db, challenge_type, user_id, affected, batch_size, pause_seconds)
+            total += _scrub_archive_answers(db, challenge_type, user_id, batch_size, pause_seconds)
+
+        while True:
+            deleted = remove_user_documents(db, user_id, batch_size)
+            db.commit()
+            total += deleted
+            if deleted < batch_size:
+                break
+            _pause(pause_seconds)
+
+        for model in (models.UserStats, models.UserTopicStats, models.UserMonthlyStats,
+                      models.ChallengeQuota, models.UserDataVersion, models.IdempotencyKey):
+            total += db.execute(
+                delete(model).where(model.user_id == user_id).execution_options(synchronize_session=False)
+            ).rowcount
+        db.execute(
+            update(models.DeletedUser)
+            .where(models.DeletedUser.user_id == user_id)
+            .values(purged_at=datetime.now())
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to purge data of user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while purging user data: {str(e)}")
+
+    quota_cache.invalidate(user_id)
+    history_cache.invalidate_user(user_id)
+
+    # Their stats counted the deleted answers: rebuild them and invalidate their caches
+    for answerer in sorted(affected):
+        try:
+            bump_data_version(db, answerer)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error(f"Failed to bump data version of user {answerer}: {str(e)}")
+            raise RuntimeError(f"Database error while purging user data: {str(e)}")
+        backfill_user_stats(db, answerer)
+        history_cache.invalidate_user(answerer)
+    logger.info(f"Purged {total} rows of deleted user {user_id} ({len(affected)} other users' stats rebuilt)")
+    return total
+
+
+def purge_deleted_users(
+    db: Session,
+    batch_size: int = RETENTION_BATCH_SIZE,
+    pause_seconds: float = RETENTION_BATCH_PAUSE_SECONDS
+):
+    """
+    Purge every queued deleted user that is not purged yet.
+
+    Returns:
+        Number of users purged
+
+    Raises:
+        RuntimeError: Database operation failed
+    """
+    try:
+        pending = db.execute(
+            select(models.DeletedUser.user_id)
+            .where(models.DeletedUser.purged_at.is_(None))
+            .order_by(models.DeletedUser.deleted_at)
+        ).scalars().all()
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to list deleted users: {str(e)}")
+        raise RuntimeError(f"Database error while listing deleted users: {str(e)}")
+
+    for user_id in pending:
+        purge_user_data(db, user_id, batch_size=batch_size, pause_seconds=pause_seconds)
+    return len(pending)
@@ -0,0 +1,356 @@
+# Full-Text Search - Per-User History Search Index
+#
+# One index row per searchable document:
+#   kind "challenge" - title, topic, options / questions, explanation, ideal answer
+#   kind "answer"    - one of the user's own scenario answers
+# Rows carry (user_id, challenge_type, challenge_id) so matches map back to history items.
+#
+# ENGINES:
+#   SQLite     - FTS5 virtual table (porter stemming), ranked with bm25().
+#                Rows are scoped to a user through an indexed per-user token, so a
+#                lookup only walks that user's posting lists.
+#   PostgreSQL - plain table with a generated tsvector column + GIN index,
+#                ranked with ts_rank().
+#
+# The write helpers in db.py add index rows INSIDE their transaction (no commit
+# here). rebuild_search_index() repopulates the index from the source tables.
+
+from sqlalchemy import text, inspect, select, bindparam
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from . import models
+from .dialects import dialect_name
+import hashlib
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = "history_search"
+
+# Engines with a native full-text index implementation below
+SEARCH_DIALECTS = ("sqlite", "postgresql")
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 50
+
+# Longer queries are cut to this many terms
+SEARCH_MAX_TERMS = 16
+
+_REBUILD_BATCH_SIZE = 1000
+
+# ========================================================================================
+# SCHEMA
+# ========================================================================================
+
+_SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        user_token,
+        body,
+        user_id UNINDEXED,
+        challenge_type UNINDEXED,
+        challenge_id UNINDEXED,
+        kind UNINDEXED,
+        tokenize = 'porter unicode61'
+    )"""
+]
+
+_POSTGRES_DDL = [
+    f"""CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} (
+        id BIGSERIAL PRIMARY KEY,
+        user_id VARCHAR NOT NULL,
+        challenge_type VARCHAR NOT NULL,
+        challenge_id INTEGER NOT NULL,
+        kind VARCHAR NOT NULL,
+        body TEXT NOT NULL,
+        tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', body)) STORED
+    )""",
+    f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_tsv ON {SEARCH_TABLE} USING GIN (tsv)",
+    f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_user ON {SEARCH_TABLE} (user_id, challenge_type, challenge_id)"
+]
+
+def ensure_search_index(engine: Engine):
+    """
+    Create the search index for the engine's dialect if it does not exist.
+
+    Returns:
+        True if the index was created by this call (caller should populate it)
+    """
+    name = engine.dialect.name
+    if name not in SEARCH_DIALECTS:
+        logger.warning(f"Full-text search is not available on dialect '{name}'")
+        return False
+
+    existed = inspect(engine).has_table(SEARCH_TABLE)
+    with engine.begin() as conn:
+        for statement in (_SQLITE_DDL if name == "sqlite" else _POSTGRES_DDL):
+            conn.execute(text(statement))
+    return not existed
+
+def _enabled(db: Session):
+    return dialect_name(db) in SEARCH_DIALECTS
+
+# ========================================================================================
+# DOCUMENTS
+# ========================================================================================
+
+def _user_token(user_id: str):
+    """Single alphanumeric FTS5 token identifying a user (ids contain separators)."""
+    return "u" + hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:20]
+
+def _strings(value):
+    """All string leaves of a value; JSON-encoded strings are decoded first (keys skipped)."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        stripped = value.strip()
+        if stripped[:1] in ("[", "{"):
+            try:
+                return _strings(json.loads(stripped))
+            except ValueError:
+                pass
+        return [stripped] if stripped else []
+    if isinstance(value, dict):
+        return [s for item in value.values() for s in _strings(item)]
+    if isinstance(value, (list, tuple)):
+        return [s for item in value for s in _strings(item)]
+    return [str(value)]
+
+def _document(*parts):
+    return "\n".join(s for part in parts for s in _strings(part))
+
+def _index_rows(db: Session, rows):
+    """Insert index rows (dicts with user_id, challenge_type, challenge_id, kind, body); returns the count."""
+    rows = [row for row in rows if row["body"]]
+    if not rows or not _enabled(db):
+        return 0
+    if dialect_name(db) == "sqlite":
+        statement = text(
+            f"INSERT INTO {SEARCH_TABLE} (user_token, body, user_id, challenge_type, challenge_id, kind) "
+            "VALUES (:user_token, :body, :user_id, :challenge_type, :challenge_id, :kind)"
+        )
+        rows = [{**row, "user_token": _user_token(row["user_id"])} for row in rows]
+    else:
+        statement = text(
+            f"INSERT INTO {SEARCH_TABLE} (user_id, challenge_type, challenge_id, kind, body) "
+            "VALUES (:user_id, :challenge_type, :challenge_id, :kind, :body)"
+        )
+    db.execute(statement, rows)
+    return len(rows)
+
+def _interview_document(challenge):
+    return {
+        "user_id": challenge.created_by,
+        "challenge_type": "interview",
+        "challenge_id": challenge.id,
+        "kind": "challenge",
+        "body": _document(challenge.title, challenge.topic, challenge.options, challenge.explaination)
+    }
+
+def _scenario_document(challenge):
+    return {
+        "user_id": challenge.created_by,
+        "challenge_type": "scenario",
+        "challenge_id": challenge.id,
+        "kind": "challenge",
+        "body": _document(
+            challenge.title, challenge.topic, challenge.questions,
+            challenge.correct_answer, challenge.explanation
+        )
+    }
+
+def _answer_document(user_id: str, scenario_id: int, user_answer: str):
+    return {
+        "user_id": user_id,
+        "challenge_type": "scenario",
+        "challenge_id": scenario_id,
+        "kind": "answer",
+        "body": _document(user_answer)
+    }
+
+# ========================================================================================
+# INCREMENTAL UPDATES (called from db.py write helpers and retention jobs, caller commits)
+# ========================================================================================
+
+def index_challenge(db: Session, challenge):
+    """Index a newly created (flushed) InterviewChallenge or ScenarioChallenge."""
+    index_challenges(db, [challenge])
+
+def index_challenges(db: Session, challenges):
+    """Index several newly created (flushed) challenges with one executemany."""
+    _index_rows(db, [
+        _interview_document(challenge) if isinstance(challenge, models.InterviewChallenge)
+        else _scenario_document(challenge)
+        for challenge in challenges
+    ])
+
+def index_scenario_answer(db: Session, user_id: str, scenario_id: int, user_answer: str):
+    """Index a user's scenario answer text under its scenario."""
+    _index_rows(db, [_answer_document(user_id, scenario_id, user_answer)])
+
+def remove_challenges(db: Session, user_id: str, challenge_type: str, challenge_ids):
+    """Drop the index rows (challenge text and answers) of some of a user's challenges."""
+    challenge_ids = list(challenge_ids)
+    if not challenge_ids or not _enabled(db):
+        return
+    params = {"challenge_type": challenge_type, "ids": challenge_ids}
+    if dialect_name(db) == "sqlite":
+        # Scoped through the user's token so only their posting list is walked
+        params["match"] = f"user_token:{_user_token(user_id)}"
+        where = f"{SEARCH_TABLE} MATCH :match"
+    else:
+        params["user_id"] = user_id
+        where = "user_id = :user_id"
+    statement = text(
+        f"DELETE FROM {SEARCH_TABLE} WHERE {where} "
+        "AND challenge_type = :challenge_type AND challenge_id IN :ids"
+    ).bindparams(bindparam("ids", expanding=True))
+    db.execute(statement, params)
+
+def remove_user_documents(db: Session, user_id: str, limit: int):
+    """
+    Drop up to `limit` of a user's index rows (bounded purge batches).
+
+    Returns:
+        Number of rows deleted (0 once the user has none left)
+    """
+    if not _enabled(db):
+        return 0
+    if dialect_name(db) == "sqlite":
+        statement = text(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ("
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match LIMIT :limit)"
+        )
+        params = {"match": f"user_token:{_user_token(user_id)}", "limit": limit}
+    else:
+        statement = text(
+            f"DELETE FROM {SEARCH_TABLE} WHERE id IN ("
+            f"SELECT id FROM {SEARCH_TABLE} WHERE user_id = :user_id LIMIT :limit)"
+        )
+        params = {"user_id": user_id, "limit": limit}
+    return db.execute(statement, params).rowcount
+
+# ========================================================================================
+# SEARCH
+# ========================================================================================
+
+def _query_terms(query: str):
+    return re.findall(r"\w+", query.lower())[:SEARCH_MAX_TERMS]
+
+def find_matches(db: Session, user_id: str, query: str, limit: int = SEARCH_DEFAULT_LIMIT, challenge_type: str = None):
+    """
+    Rank a user's challenges against a free-text query.
+
+    Every query term must match (as a prefix, so partially typed words work);
+    a challenge matches through its own text or any of the user's answers to it.
+
+    Args:
+        db: Database session
+        user_id: User identifier from authentication
+        query: Free text typed by the user (operators are not interpreted)
+        limit: Maximum number of challenges to return
+        challenge_type: Optional "interview" or "scenario" filter
+
+    Returns:
+        List of (challenge_type, challenge_id) tuples, best match first
+
+    Raises:
+        RuntimeError: Search unavailable or database operation failed
+    """
+    terms = _query_terms(query)
+    if not terms:
+        return []
+    if not _enabled(db):
+        raise RuntimeError(f"Full-text search is not available on dialect '{dialect_name(db)}'")
+
+    params = {"limit": limit, "challenge_type": challenge_type}
+    type_clause = "AND challenge_type = :challenge_type" if challenge_type else ""
+    if dialect_name(db) == "sqlite":
+        params["match"] = f"user_token:{_user_token(user_id)} AND body:(" + " AND ".join(
+            f'"{term}"*' for term in terms
+        ) + ")"
+        # rank = bm25() with column weights user_token 0 (scoping only), body 1
+        statement = text(
+            "SELECT challenge_type, challenge_id, min(rank) AS score "
+            f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match AND rank MATCH 'bm25(0.0, 1.0)' "
+            f"{type_clause} GROUP BY challenge_type, challenge_id ORDER BY score LIMIT :limit"
+        )
+    else:
+        params["user_id"] = user_id
+        params["tsquery"] = " & ".join(f"{term}:*" for term in terms)
+        statement = text(
+            "SELECT challenge_type, challenge_id, max(ts_rank(tsv, q)) AS score "
+            f"FROM {SEARCH_TABLE}, to_tsquery('english', :tsquery) AS q "
+            f"WHERE user_id = :user_id AND tsv @@ q {type_clause} "
+            "GROUP BY challenge_type, challenge_id ORDER BY score DESC LIMIT :limit"
+        )
+
+    try:
+        return [(row.challenge_type, int(row.challenge_id)) for row in db.execute(statement, params)]
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to search history for user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while searching history: {str(e)}")
+
+# ========================================================================================
+# REBUILD
+# ========================================================================================
+
+def _delete_index_rows(db: Session, user_id: str = None):
+    if user_id is None:
+        db.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    elif dialect_name(db) == "sqlite":
+        db.execute(
+            text(f"DELETE FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match"),
+            {"match": f"user_token:{_user_token(user_id)}"}
+        )
+    else:
+        db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE user_id = :user_id"), {"user_id": user_id})
+
+def rebuild_search_index(db: Session, user_id: str = None):
+    """
+    Repopulate the search index from the source tables in one transaction.
+
+    Rows are streamed and inserted in batches, so memory stays flat for
+    large histories.
+
+    Args:
+        db: Database session
+        user_id: Optional single user to rebuild (default: everyone)
+
+    Returns:
+        Number of index rows written
+
+    Raises:
+        RuntimeError: Search unavailable or database operation failed
+    """
+    if not _enabled(db):
+        raise RuntimeError(f"Full-text search is not available on dialect '{dialect_name(db)}'")
+
+    ic, sc, sa = models.InterviewChallenge, models.ScenarioChallenge, models.ScenarioAnswer
+    sources = [
+        (select(ic.id, ic.created_by, ic.title, ic.topic, ic.options, ic.explaination),
+         ic.created_by, _interview_document),
+        (select(sc.id, sc.created_by, sc.title, sc.topic, sc.questions, sc.correct_answer, sc.explanation),
+         sc.created_by, _scenario_document),
+        (select(sa.user_id, sa.scenario_id, sa.user_answer),
+         sa.user_id, lambda row: _answer_document(row.user_id, row.scenario_id, row.user_answer)),
+    ]
+
+    written = 0
+    try:
+        _delete_index_rows(db, user_id)
+        for statement, user_column, to_document in sources:
+            if user_id is not None:
+                statement = statement.where(user_column == user_id)
+            result = db.execute(statement.execution_options(yield_per=_REBUILD_BATCH_SIZE))
+            for batch in result.partitions():
+                written += _index_rows(db, [to_document(row) for row in batch])
+        db.commit()
+        logger.info(f"Rebuilt search index with {written} documents")
+        return written
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to rebuild search index: {str(e)}")
+        raise RuntimeError(f"Database error while rebuilding search index: {str(e)}")
@@ -0,0 +1,347 @@
+# Sharding - Per-User Routing Across Several Databases
+#
+# Every user lives on exactly one shard. The user id hashes to one of
+# SHARD_BUCKETS buckets (sha1, stable across processes and restarts) and the
+# SHARD MAP - table shard_map on shard "0", the directory - assigns each
+# bucket to a shard:
+#
+#   user_id --sha1--> bucket 0..255 --shard_map--> shard "2" --> engine
+#
+# All of a user's rows (challenges, answers, stats, quotas, archive, search
+# documents) are stored on that shard, so no request ever crosses shards and
+# the helpers in db.py run unchanged on a session bound to it.
+#
+# CONFIGURATION:
+#   DATABASE_SHARD_URLS - comma separated database URLs. Shards are named by
+#                         position ("0", "1", ...): only ever APPEND new URLs,
+#                         reordering renames shards.
+#   Unset               - a single shard on DATABASE_URL (unsharded setup)
+#
+# The map is written once, on first start. The API never changes it: a shard
+# added later stays empty until the offline rebalancer (rebalance.py) moves
+# buckets onto it. Restart the API after a rebalance so every process reloads
+# the map.
+#
+# SESSIONS: SessionLocal builds ShardedSession objects. Routes call
+# db.bind_user(user_id) right after authentication, before the first query.
+# Jobs that cover every user iterate models.shard_sessions().
+#
+# READ REPLICAS: DATABASE_REPLICA_URLS lists one replica per shard, in shard
+# order (leave an entry empty for a shard without one). Read sessions
+# (models.get_read_db / ReadSessionLocal) run on the shard's replica, except
+# for READ_YOUR_WRITES_SECONDS after the user's last committed write, when
+# they stay on the primary so users always see their own changes. Read
+# sessions refuse to write. Keep the window above the replicas' usual lag.
+# The write tracking is per process, or shared by all workers of server.py
+# (READ_YOUR_WRITES_FILE, a memory-mapped table of expiry times) so a write
+# handled by one worker is seen by the others.
+
+from sqlalchemy import create_engine, event, MetaData, Table, Column, Integer, String, DateTime, select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from datetime import datetime
+from .instrumentation import instrument_engine
+import hashlib
+import logging
+import mmap
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Fixed forever: changing it re-hashes every user
+SHARD_BUCKETS = 256
+
+# Shard holding the shard map
+DIRECTORY_SHARD = "0"
+
+# Seconds after a user's committed write during which their reads use the primary
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# Shared read-your-writes table (set by server.py for its workers; unset = per process)
+READ_YOUR_WRITES_FILE = os.getenv("READ_YOUR_WRITES_FILE")
+READ_YOUR_WRITES_SLOTS = 65536
+
+# Kept out of the models' metadata: the map only exists on the directory shard
+shard_map_metadata = MetaData()
+
+shard_map_table = Table(
+    "shard_map",
+    shard_map_metadata,
+    Column("bucket", Integer, primary_key=True),  # SYSTEM: 0..SHARD_BUCKETS-1
+    Column("shard", String, nullable=False),  # SYSTEM: Shard name ("0", "1", ...)
+    Column("updated_at", DateTime, nullable=False, default=datetime.now),
+)
+
+
+def shard_urls():
+    """Database URLs of the shards, in shard-name order (DATABASE_SHARD_URLS or DATABASE_URL)."""
+    urls = [url.strip() for url in os.getenv("DATABASE_SHARD_URLS", "").split(",") if url.strip()]
+    return urls or [os.getenv("DATABASE_URL", "sqlite:///database.db")]
+
+
+def replica_urls():
+    """Replica URL per shard from DATABASE_REPLICA_URLS ("" = no replica for that shard)."""
+    raw = os.getenv("DATABASE_REPLICA_URLS", "")
+    return [url.strip() for url in raw.split(",")] if raw.strip() else []
+
+
+def user_bucket(user_id: str):
+    """Stable bucket (0..SHARD_BUCKETS-1) of a user id."""
+    if not user_id:
+        raise ValueError("user_id cannot be empty")
+    digest = hashlib.sha1(user_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % SHARD_BUCKETS
+
+
+def default_bucket_map(shards):
+    """{bucket: shard} spreading the buckets round-robin over `shards`."""
+    return {bucket: shards[bucket % len(shards)] for bucket in range(SHARD_BUCKETS)}
+
+
+class RecentWrites:
+    """Users whose last committed write is less than `window` seconds old (this process)."""
+
+    def __init__(self, window: float, max_users: int = 100_000):
+        self.window = window
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._until = {}
+
+    def mark(self, user_id: str):
+        if self.window <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._until.pop(user_id, None)
+            self._until[user_id] = now + self.window  # insertion order = expiry order
+            while len(self._until) > self.max_users or next(iter(self._until.values())) <= now:
+                self._until.pop(next(iter(self._until)))
+
+    def is_recent(self, user_id: str):
+        until = self._until.get(user_id)
+        return until is not None and until > time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._until.clear()
+
+
+class SharedRecentWrites:
+    """
+    RecentWrites for several processes on one host: `slots` expiry times
+    (wall clock, float64) in a memory-mapped file, indexed by a hash of the
+    user id. Two users sharing a slot only cost an extra primary read.
+    """
+
+    def __init__(self, window: float, path: str, slots: int = READ_YOUR_WRITES_SLOTS):
+        self.window = window
+        self.slots = slots
+        with open(path, "r+b") as file:
+            self._map = mmap.mmap(file.fileno(), slots * 8)
+        self._until = memoryview(self._map).cast("d")
+
+    @staticmethod
+    def create(path: str, slots: int = READ_YOUR_WRITES_SLOTS):
+        """Create (or zero) the shared file; done once by the parent process."""
+        with open(path, "wb") as file:
+            file.truncate(slots * 8)
+
+    def _slot(self, user_id: str):
+        digest = hashlib.sha1(user_id.encode("utf-8")).digest()
+        return int.from_bytes(digest[4:12], "big") % self.slots
+
+    def mark(self, user_id: str):
+        if self.window > 0:
+            self._until[self._slot(user_id)] = time.time() + self.window
+
+    def is_recent(self, user_id: str):
+        return self._until[self._slot(user_id)] > time.time()
+
+    def clear(self):
+        self._map[:] = bytes(len(self._map))
+
+
+recent_writes = (
+    SharedRecentWrites(READ_YOUR_WRITES_SECONDS, READ_YOUR_WRITES_FILE) if READ_YOUR_WRITES_FILE
+    else RecentWrites(READ_YOUR_WRITES_SECONDS)
+)
+
+
+class ShardRouter:
+    """One engine (and optionally one read replica) per shard plus the bucket -> shard map."""
+
+    def __init__(self, urls, replicas=()):
+        if not urls:
+            raise ValueError("At least one shard URL is required")
+        if len(replicas) > len(urls):
+            raise ValueError(f"{len(replicas)} replica URLs configured for {len(urls)} shards")
+        self.engines = {str(index): create_engine(url, echo=False) for index, url in enumerate(urls)}
+        self.replicas = {str(index): create_engine(url, echo=False) for index, url in enumerate(replicas) if url}
+        # Per-request statement counts and per-engine load cover every database
+        for name, engine in self.engines.items():
+            instrument_engine(engine, label=f"primary:{name}")
+        for name, engine in self.replicas.items():
+            instrument_engine(engine, label=f"replica:{name}")
+        self.bucket_map = None
+
+    @property
+    def shards(self):
+        return list(self.engines)
+
+    @property
+    def directory(self):
+        return self.engines[DIRECTORY_SHARD]
+
+    def load_map(self, initial_shards=None):
+        """
+        Read the shard map from the directory shard, creating it on first start.
+
+        Args:
+            initial_shards: Shards the buckets are spread over when the map is
+                created (default: all). Pass the shards that already hold data
+                when sharding an existing database, so its users stay put.
+
+        Returns:
+            {bucket: shard}
+
+        Raises:
+            RuntimeError: The stored map is incomplete or names an unknown shard
+        """
+        shard_map_metadata.create_all(self.directory)
+        rows = self._read_map()
+        if not rows:
+            rows = default_bucket_map(initial_shards or self.shards)
+            try:
+                with self.directory.begin() as conn:
+                    conn.execute(insert(shard_map_table), [
+                        {"bucket": bucket, "shard": shard, "updated_at": datetime.now()}
+                        for bucket, shard in rows.items()
+                    ])
+                logger.info(f"Created shard map over shards {', '.join(sorted(set(rows.values())))}")
+            except IntegrityError:
+                rows = self._read_map()  # another worker created it first
+
+        missing = SHARD_BUCKETS - len(rows)
+        unknown = sorted(set(rows.values()) - set(self.engines))
+        if missing or unknown:
+            raise RuntimeError(
+                f"Invalid shard map: {missing} unmapped buckets, unknown shards {unknown} "
+                f"(configured: {', '.join(self.shards)})"
+            )
+        self.bucket_map = rows
+        return rows
+
+    def _read_map(self):
+        with self.directory.connect() as conn:
+            return dict(conn.execute(select(shard_map_table.c.bucket, shard_map_table.c.shard)).all())
+
+    def shard_for_user(self, user_id: str):
+        """Name of the shard holding `user_id`."""
+        if self.bucket_map is None:
+            raise RuntimeError("Shard map is not loaded")
+        return self.bucket_map[user_bucket(user_id)]
+
+
+class ShardedSession(Session):
+    """
+    Session that runs every statement on ONE shard.
+
+    The shard is chosen with bind_user() / bind_shard() before the first
+    query. With a single shard configured an unbound session uses it, so
+    scripts written for the unsharded setup keep working.
+
+    A session created with info={"read_only": True} reads from the shard's
+    replica (if configured) unless its user wrote recently, and raises on
+    INSERT / UPDATE / DELETE.
+    """
+
+    def __init__(self, *args, router: ShardRouter, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.router = router
+
+    @property
+    def shard(self):
+        return self.info.get("shard")
+
+    @property
+    def read_only(self):
+        return bool(self.info.get("read_only"))
+
+    def bind_shard(self, shard: str):
+        """
+        Route this session to `shard`.
+
+        Raises:
+            ValueError: Unknown shard
+            RuntimeError: A transaction is open on another shard
+        """
+        if shard not in self.router.engines:
+            raise ValueError(f"Unknown shard '{shard}'. Configured: {', '.join(self.router.shards)}")
+        current = self.info.get("shard")
+        if current is not None and current != shard:
+            if self.in_transaction():
+                raise RuntimeError(
+                    f"Session has an open transaction on shard {current}; "
+                    f"commit or roll back before switching to shard {shard}"
+                )
+            self.expunge_all()  # same primary keys mean different rows on another shard
+            self.info.pop("user_id", None)
+        self.info["shard"] = shard
+        return self
+
+    def bind_user(self, user_id: str):
+        """Route this session to the shard holding `user_id` (primary reads if they just wrote)."""
+        self.bind_shard(self.router.shard_for_user(user_id))
+        self.info["user_id"] = user_id
+        self.info["primary_reads"] = recent_writes.is_recent(user_id)
+        return self
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        shard = self.info.get("shard")
+        if shard is None:
+            if len(self.router.engines) > 1:
+                raise RuntimeError(
+                    "Session is not bound to a shard: call bind_user(user_id) or bind_shard(name) first"
+                )
+            shard = DIRECTORY_SHARD
+        if self.read_only and not self.info.get("primary_reads"):
+            replica = self.router.replicas.get(shard)
+            if replica is not None:
+                return replica
+        return self.router.engines[shard]
+
+
+# ========================================================================================
+# WRITE TRACKING (read-your-writes, read-only enforcement)
+# ========================================================================================
+
+@event.listens_for(ShardedSession, "do_orm_execute")
+def _track_dml(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    session = orm_execute_state.session
+    if session.read_only:
+        raise RuntimeError("Read-only session cannot write (use the write session dependency)")
+    session.info["wrote"] = True
+
+
+@event.listens_for(ShardedSession, "before_flush")
+def _track_flush(session, flush_context, instances):
+    if not (session.new or session.dirty or session.deleted):
+        return
+    if session.read_only:
+        raise RuntimeError("Read-only session cannot write (use the write session dependency)")
+    session.info["wrote"] = True
+
+
+@event.listens_for(ShardedSession, "after_commit")
+def _remember_write(session):
+    if session.info.pop("wrote", False) and session.info.get("user_id"):
+        recent_writes.mark(session.info["user_id"])
+
+
+@event.listens_for(ShardedSession, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
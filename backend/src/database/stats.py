@@ -0,0 +1,382 @@
+# Aggregate Statistics - Incrementally Maintained Per-User Totals
+#
+# UserStats / UserTopicStats rows are updated by the write helpers in db.py
+# INSIDE their transaction (no commit here), so the totals always match the
+# rows they describe. Reads are a primary-key lookup, independent of how long
+# a user's history is.
+#
+# backfill_user_stats() rebuilds the tables from the source tables with
+# set-based GROUP BY queries (run for existing data or to repair drift),
+# plus one pass over challenge_archive so archived activity keeps counting.
+
+from sqlalchemy import func, delete, insert, case, select, and_, or_, cast, String
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+from . import models
+from .dialects import upsert_increment
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Average scenario score at which a scenario challenge counts as passed
+SCENARIO_PASS_SCORE = 70
+
+# ========================================================================================
+# INCREMENTAL UPDATES (called from db.py write helpers, caller commits)
+# ========================================================================================
+
+def record_challenge_created(db: Session, user_id: str, topic: str, challenge_type: str, difficulty: str,
+                             count: int = 1):
+    """Count `count` newly created challenges in the user's totals and topic totals."""
+    upsert_increment(db, models.UserStats, {"user_id": user_id}, {
+        f"{challenge_type}_count": count,
+        f"{difficulty.lower()}_count": count
+    })
+    upsert_increment(db, models.UserTopicStats, {"user_id": user_id, "topic": topic}, {
+        f"{challenge_type}_count": count
+    })
+
+def record_interview_answers(db: Session, user_id: str, results):
+    """
+    Apply a batch of MCQ answer upserts with one counter update per topic.
+
+    interview_answered counts answered CHALLENGES (a re-answer adds nothing)
+    and interview_correct counts challenges whose latest answer is correct,
+    matching the one-row-per-challenge interview_answers table.
+
+    Args:
+        results: Iterable of (topic, was_answered, was_correct, is_correct)
+                 tuples; was_* describe the row before the upsert
+                 (was_correct is None for a first answer)
+    """
+    per_topic = {}
+    for topic, was_answered, was_correct, is_correct in results:
+        answered, correct = per_topic.get(topic, (0, 0))
+        per_topic[topic] = (
+            answered + (0 if was_answered else 1),
+            correct + int(bool(is_correct)) - int(bool(was_correct))
+        )
+    upsert_increment(db, models.UserStats, {"user_id": user_id}, {
+        "interview_answered": sum(answered for answered, _ in per_topic.values()),
+        "interview_correct": sum(correct for _, correct in per_topic.values())
+    })
+    for topic, (answered, correct) in per_topic.items():
+        upsert_increment(db, models.UserTopicStats, {"user_id": user_id, "topic": topic}, {
+            "interview_answered": answered,
+            "interview_correct": correct
+        })
+
+def _is_passed(summary):
+    count, total = summary
+    return count > 0 and total / count >= SCENARIO_PASS_SCORE
+
+def record_scenario_evaluation(
+    db: Session,
+    user_id: str,
+    topic: str,
+    old_score: int,
+    new_score: int,
+    summary_before
+):
+    """
+    Apply a (re-)evaluation of one scenario answer to the user's totals.
+
+    Args:
+        old_score: Previous llm_score of the answer (None if first evaluation)
+        new_score: New llm_score
+        summary_before: (scored, score_total) of the user's answers to this
+                        scenario BEFORE the update - the number of answers with
+                        an llm_score and the sum of those scores (read by
+                        update_scenario_evaluation() in its single SELECT)
+    """
+    count_before, total_before = summary_before
+    summary_after = (
+        count_before + (1 if old_score is None else 0),
+        total_before - (old_score or 0) + new_score
+    )
+    answer_deltas = {
+        "scenario_answers_scored": 1 if old_score is None else 0,
+        "scenario_score_total": new_score - (old_score or 0)
+    }
+    upsert_increment(db, models.UserStats, {"user_id": user_id}, {
+        **answer_deltas,
+        "scenario_challenges_evaluated": int(summary_after[0] > 0) - int(count_before > 0),
+        "scenario_challenges_passed": int(_is_passed(summary_after)) - int(_is_passed(summary_before))
+    })
+    upsert_increment(db, models.UserTopicStats, {"user_id": user_id, "topic": topic}, answer_deltas)
+
+# ========================================================================================
+# READS
+# ========================================================================================
+
+def get_user_stats(db: Session, user_id: str):
+    """
+    Read a user's aggregate statistics.
+
+    Args:
+        db: Database session
+        user_id: User identifier from authentication
+
+    Returns:
+        Tuple of (UserStats or None, list of UserTopicStats)
+
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    if not user_id or not user_id.strip():
+        raise ValueError("user_id cannot be empty")
+
+    try:
+        user_stats = db.get(models.UserStats, user_id)
+        topic_stats = db.query(models.UserTopicStats).filter(
+            models.UserTopicStats.user_id == user_id
+        ).all()
+        return user_stats, topic_stats
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to get stats for user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while getting user stats: {str(e)}")
+
+def get_user_window_stats(db: Session, user_id: str, starts: dict):
+    """
+    Activity on the user's challenges created since each window start
+    (e.g. {"today": midnight, "week": start of the week}).
+
+    Time windows can not come from the running totals; these are two small
+    range queries over the hot tables (one per challenge type, all windows at
+    once), bounded by the earliest start.
+
+    Args:
+        db: Database session
+        user_id: User identifier from authentication
+        starts: Window name -> naive datetime (same clock as date_created)
+
+    Returns:
+        dict: {name: {"challenge_count",
+                      "interview": {"answered", "correct"},
+                      "scenario": {"challenges_evaluated", "challenges_passed"}}}
+
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    if not user_id or not user_id.strip():
+        raise ValueError("user_id cannot be empty")
+    if not starts:
+        return {}
+
+    ic, sc = models.InterviewChallenge, models.ScenarioChallenge
+    ia, sa = models.InterviewAnswer, models.ScenarioAnswer
+    since = min(starts.values())
+    names = list(starts)
+
+    def in_window(date_column, name, *conditions):
+        return func.coalesce(func.sum(case((and_(date_column >= starts[name], *conditions), 1), else_=0)), 0)
+
+    try:
+        # One row per interview challenge (a user answers each challenge at most once)
+        interview = db.execute(
+            select(*(
+                column for name in names for column in (
+                    in_window(ic.date_created, name),
+                    in_window(ic.date_created, name, ia.id.isnot(None)),
+                    in_window(ic.date_created, name, ia.is_correct.is_(True))
+                )
+            ))
+            .select_from(ic)
+            .outerjoin(ia, and_(ia.challenge_id == ic.id, ia.user_id == user_id))
+            .where(ic.created_by == user_id, ic.date_created >= since)
+        ).one()
+
+        # Scenario challenges: evaluated / passed by the average score of their answers
+        per_scenario = (
+            select(
+                sc.date_created.label("date_created"),
+                func.count(sa.llm_score).label("scored"),
+                func.avg(sa.llm_score).label("avg_score")
+            )
+            .select_from(sc)
+            .outerjoin(sa, and_(sa.scenario_id == sc.id, sa.user_id == user_id))
+            .where(sc.created_by == user_id, sc.date_created >= since)
+            .group_by(sc.id, sc.date_created)
+            .subquery()
+        )
+        scenario = db.execute(select(*(
+            column for name in names for column in (
+                in_window(per_scenario.c.date_created, name),
+                in_window(per_scenario.c.date_created, name, per_scenario.c.scored > 0),
+                in_window(per_scenario.c.date_created, name, per_scenario.c.avg_score >= SCENARIO_PASS_SCORE)
+            )
+        ))).one()
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to get window stats for user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while getting window stats: {str(e)}")
+
+    windows = {}
+    for index, name in enumerate(names):
+        interviews, answered, correct = interview[index * 3:index * 3 + 3]
+        scenarios, evaluated, passed = scenario[index * 3:index * 3 + 3]
+        windows[name] = {
+            "challenge_count": interviews + scenarios,
+            "interview": {"answered": answered, "correct": correct},
+            "scenario": {"challenges_evaluated": evaluated, "challenges_passed": passed}
+        }
+    return windows
+
+# ========================================================================================
+# BACKFILL
+# ========================================================================================
+
+def _complete(model, row: dict):
+    """Fill every counter column missing from a backfill row with 0."""
+    return {
+        column.name: row.get(column.name, 0)
+        for column in model.__table__.c
+        if column.name != "updated_at"
+    }
+
+def backfill_user_stats(db: Session, user_id: str = None):
+    """
+    Rebuild UserStats / UserTopicStats from the source tables.
+
+    Uses a handful of set-based GROUP BY queries; existing rows for the
+    affected users are replaced in one transaction.
+
+    Args:
+        db: Database session
+        user_id: Optional single user to rebuild (default: everyone)
+
+    Returns:
+        Number of UserStats rows written
+
+    Raises:
+        RuntimeError: Database operation failed
+    """
+    ic, sc = models.InterviewChallenge, models.ScenarioChallenge
+    ia, sa = models.InterviewAnswer, models.ScenarioAnswer
+
+    def scoped(statement, column):
+        return statement.where(column == user_id) if user_id else statement
+
+    users, topics = {}, {}
+
+    def user_row(uid):
+        return users.setdefault(uid, {"user_id": uid})
+
+    def topic_row(uid, topic):
+        return topics.setdefault((uid, topic), {"user_id": uid, "topic": topic})
+
+    def add(row, column, value):
+        row[column] = row.get(column, 0) + (value or 0)
+
+    try:
+        # Challenge counts per (user, topic, difficulty)
+        for challenge_type, model in (("interview", ic), ("scenario", sc)):
+            statement = scoped(
+                select(model.created_by, model.topic, model.difficulty, func.count())
+                .group_by(model.created_by, model.topic, model.difficulty),
+                model.created_by
+            )
+            for uid, topic, difficulty, count in db.execute(statement):
+                add(user_row(uid), f"{challenge_type}_count", count)
+                if difficulty in ("Easy", "Medium", "Hard"):
+                    add(user_row(uid), f"{difficulty.lower()}_count", count)
+                add(topic_row(uid, topic), f"{challenge_type}_count", count)
+
+        # Interview answers per (user, topic)
+        statement = scoped(
+            select(ia.user_id, ic.topic, func.count(), func.sum(case((ia.is_correct, 1), else_=0)))
+            .join(ic, ic.id == ia.challenge_id)
+            .group_by(ia.user_id, ic.topic),
+            ia.user_id
+        )
+        for uid, topic, answered, correct in db.execute(statement):
+            for row in (user_row(uid), topic_row(uid, topic)):
+                add(row, "interview_answered", answered)
+                add(row, "interview_correct", correct)
+
+        # Scored scenario answers per (user, topic)
+        statement = scoped(
+            select(sa.user_id, sc.topic, func.count(sa.llm_score), func.sum(sa.llm_score))
+            .join(sc, sc.id == sa.scenario_id)
+            .group_by(sa.user_id, sc.topic),
+            sa.user_id
+        )
+        for uid, topic, scored, total in db.execute(statement):
+            for row in (user_row(uid), topic_row(uid, topic)):
+                add(row, "scenario_answers_scored", scored)
+                add(row, "scenario_score_total", total)
+
+        # Scenario challenges evaluated / passed per user
+        per_scenario = scoped(
+            select(sa.user_id.label("user_id"), func.avg(sa.llm_score).label("avg_score"))
+            .where(sa.llm_score.isnot(None))
+            .group_by(sa.user_id, sa.scenario_id),
+            sa.user_id
+        ).subquery()
+        statement = select(
+            per_scenario.c.user_id,
+            func.count(),
+            func.sum(case((per_scenario.c.avg_score >= SCENARIO_PASS_SCORE, 1), else_=0))
+        ).group_by(per_scenario.c.user_id)
+        for uid, evaluated, passed in db.execute(statement):
+            add(user_row(uid), "scenario_challenges_evaluated", evaluated)
+            add(user_row(uid), "scenario_challenges_passed", passed)
+
+        # Archived challenges (retention.py) keep counting: one streamed pass over the archive.
+        # A single user's rebuild also needs the archived challenges of others that user
+        # answered: the JSON text match is only a prefilter, answers are checked below.
+        archive = models.ChallengeArchive
+        statement = select(
+            archive.challenge_type, archive.created_by, archive.topic, archive.difficulty, archive.answers
+        )
+        if user_id:
+            statement = statement.where(or_(
+                archive.created_by == user_id,
+                cast(archive.answers, String).contains(f'"{user_id}"', autoescape=True)
+            ))
+        for challenge_type, uid, topic, difficulty, answers in db.execute(statement.execution_options(yield_per=1000)):
+            if not user_id or uid == user_id:
+                add(user_row(uid), f"{challenge_type}_count", 1)
+                if difficulty in ("Easy", "Medium", "Hard"):
+                    add(user_row(uid), f"{difficulty.lower()}_count", 1)
+                add(topic_row(uid, topic), f"{challenge_type}_count", 1)
+            scores = {}
+            for answer in answers or []:
+                answer_uid = answer["user_id"]
+                if user_id and answer_uid != user_id:
+                    continue
+                if challenge_type == "interview":
+                    for row in (user_row(answer_uid), topic_row(answer_uid, topic)):
+                        add(row, "interview_answered", 1)
+                        add(row, "interview_correct", 1 if answer["is_correct"] else 0)
+                elif answer.get("llm_score") is not None:
+                    for row in (user_row(answer_uid), topic_row(answer_uid, topic)):
+                        add(row, "scenario_answers_scored", 1)
+                        add(row, "scenario_score_total", answer["llm_score"])
+                    scores.setdefault(answer_uid, []).append(answer["llm_score"])
+            for answer_uid, values in scores.items():
+                add(user_row(answer_uid), "scenario_challenges_evaluated", 1)
+                add(user_row(answer_uid), "scenario_challenges_passed",
+                    1 if sum(values) / len(values) >= SCENARIO_PASS_SCORE else 0)
+
+        # Replace existing rows in one transaction
+        db.execute(scoped(delete(models.UserStats), models.UserStats.user_id))
+        db.execute(scoped(delete(models.UserTopicStats), models.UserTopicStats.user_id))
+        now = datetime.now()
+        if users:
+            db.execute(insert(models.UserStats), [
+                {**_complete(models.UserStats, row), "updated_at": now} for row in users.values()
+            ])
+        if topics:
+            db.execute(insert(models.UserTopicStats), [
+                _complete(models.UserTopicStats, row) for row in topics.values()
+            ])
+        db.commit()
+        logger.info(f"Backfilled stats for {len(users)} users, {len(topics)} user topics")
+        return len(users)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Failed to backfill user stats: {str(e)}")
+        raise RuntimeError(f"Database error while backfilling user stats: {str(e)}")
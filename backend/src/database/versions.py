@@ -0,0 +1,101 @@
+# Data Versions - Per-User Change Counters for Conditional GETs
+#
+# Every write helper in db.py calls bump_data_version() INSIDE its transaction
+# (no commit here), so a user's version changes exactly when data they can read
+# changes. Read endpoints turn the version into a strong ETag and answer
+# If-None-Match with 304 after one primary-key lookup.
+#
+# Values that change WITHOUT a write (the daily quota window) must be mixed
+# into the ETag by the caller - see make_etag().
+
+from sqlalchemy import select, update, insert, exists, literal
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from . import models
+from .dialects import upsert_increment, dialect_insert
+from datetime import datetime
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def bump_data_version(db: Session, user_id: str):
+    """Increment one user's data version (caller commits)."""
+    upsert_increment(db, models.UserDataVersion, {"user_id": user_id}, {"version": 1})
+
+
+def bump_data_versions(db: Session, user_ids):
+    """
+    Increment the data version of many users with ONE batched upsert (caller commits).
+    Used by bulk writes such as quota provisioning.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    table = models.UserDataVersion.__table__
+    now = datetime.now()
+    stmt = dialect_insert(db, table)
+    if stmt is None:
+        for user_id in user_ids:
+            bump_data_version(db, user_id)
+        return
+    # executemany of one compiled statement: no per-row SQL compilation
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={"version": table.c.version + 1, "updated_at": now}
+    ), [{"user_id": user_id, "version": 1, "updated_at": now} for user_id in user_ids])
+
+
+def bump_all_data_versions(db: Session):
+    """
+    Increment every quota holder's data version (caller commits).
+    Used by set-based writes that touch all users at once.
+    """
+    versions = models.UserDataVersion
+    quotas = models.ChallengeQuota
+    db.execute(
+        update(versions)
+        .values(version=versions.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    # Users that never had a version row start at 1
+    missing = select(quotas.user_id, literal(1)).where(
+        ~exists().where(versions.user_id == quotas.user_id)
+    ).distinct()
+    db.execute(insert(versions).from_select(["user_id", "version"], missing))
+
+
+def get_data_version(db: Session, user_id: str):
+    """
+    Current data version of a user (0 if they never wrote anything).
+
+    Raises:
+        ValueError: Invalid input parameters
+        RuntimeError: Database operation failed
+    """
+    if not user_id or not user_id.strip():
+        raise ValueError("user_id cannot be empty")
+
+    try:
+        version = db.execute(
+            select(models.UserDataVersion.version).where(models.UserDataVersion.user_id == user_id)
+        ).scalar()
+        return version or 0
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to get data version for user {user_id}: {str(e)}")
+        raise RuntimeError(f"Database error while getting data version: {str(e)}")
+
+
+def make_etag(user_id: str, version: int, *parts):
+    """
+    Strong ETag for one representation of a user's data.
+
+    Args:
+        user_id: Owner of the data (two users never share an ETag)
+        version: get_data_version() result
+        *parts: Anything else the representation depends on
+                (endpoint, query parameters, response format, quota window)
+    """
+    raw = "|".join(str(part) for part in (user_id, version, *parts))
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24] + '"'
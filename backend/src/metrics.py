@@ -0,0 +1,359 @@
+# Metrics - Prometheus Counters, Gauges and Histograms for /metrics
+#
+# A small in-process registry rendered in the Prometheus text format
+# (version 0.0.4) by GET /metrics. Updating a metric is a dict update under a
+# lock (~1 µs), so every request, db.py helper call and LLM call is recorded.
+#
+#   http_requests_total{method,route,status}           app.py middleware
+#   http_request_duration_seconds{method,route}        (route template, "unmatched" for 404s;
+#   http_requests_in_progress                           streamed bodies: time to first byte)
+#   db_helper_calls_total{helper,outcome}              @track_db_helper on the db.py helpers
+#   db_helper_duration_seconds{helper}
+#   llm_calls_total{node,outcome}                      agents: mcq_generation_node,
+#   llm_call_duration_seconds{node}                    scenario_generation_node, evaluation_node
+#   llm_tokens_total{node,kind}                        (kind: input / output)
+#   quota_exceeded_total{challenge_type}               generation routes answering 429
+#
+# MULTIPLE WORKERS: with METRICS_DIR set (server.py does), every worker writes
+# a snapshot of its registry to METRICS_DIR/<pid>.json every
+# METRICS_FLUSH_SECONDS and at shutdown, and /metrics serves the SUM over all
+# workers, whichever worker answers the scrape. Counters and histograms of
+# exited (recycled) workers are folded into archive.json, so totals never go
+# backwards; gauges only count live workers.
+
+from bisect import bisect_left
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; the top buckets are for LLM generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+ARCHIVE_FILE = "archive.json"
+
+
+# ========================================================================================
+# METRIC TYPES
+# ========================================================================================
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # label values tuple -> value
+
+    def _check(self, labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labelvalues}")
+
+    def snapshot(self):
+        """JSON-able state: {"type", "help", "labels", "values": [[label values, value], ...]}"""
+        with self._lock:
+            values = [[list(key), value] for key, value in self._values.items()]
+        return {"type": self.kind, "help": self.documentation, "labels": list(self.labelnames), "values": values}
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        self._check(labelvalues)
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        self._check(labelvalues)
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def dec(self, *labelvalues, amount: float = 1.0):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, value: float, *labelvalues):
+        self._check(labelvalues)
+        with self._lock:
+            self._values[labelvalues] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues):
+        self._check(labelvalues)
+        index = bisect_left(self.buckets, value)  # first bucket with value <= upper bound
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                # per-bucket counts (the last one is +Inf), sum, count
+                entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            values = [[list(key), [list(entry[0]), entry[1], entry[2]]] for key, entry in self._values.items()]
+        return {
+            "type": self.kind, "help": self.documentation, "labels": list(self.labelnames),
+            "buckets": list(self.buckets), "values": values
+        }
+
+
+class MetricsRegistry:
+    """Named metrics of this process."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def clear(self):
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+# ========================================================================================
+# MERGE / RENDER
+# ========================================================================================
+
+def merge_snapshots(snapshots, gauges: bool = True):
+    """
+    Sum registry snapshots of several processes (same metric definitions).
+    With gauges=False, gauges are left out (used for the exited-worker archive).
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            if metric["type"] == "gauge" and not gauges:
+                continue
+            target = merged.setdefault(name, {**metric, "values": {}})
+            values = target["values"]
+            for labelvalues, value in metric["values"]:
+                key = tuple(labelvalues)
+                if metric["type"] == "histogram":
+                    current = values.get(key)
+                    if current is None:
+                        values[key] = [list(value[0]), value[1], value[2]]
+                    else:
+                        current[0] = [a + b for a, b in zip(current[0], value[0])]
+                        current[1] += value[1]
+                        current[2] += value[2]
+                else:
+                    values[key] = values.get(key, 0.0) + value
+    for metric in merged.values():
+        metric["values"] = [[list(key), value] for key, value in metric["values"].items()]
+    return merged
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """Prometheus text exposition of a (merged) snapshot."""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric["labels"]
+        for labelvalues, value in sorted(metric["values"]):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels(names, labelvalues)} {_number(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip([*metric["buckets"], math.inf], counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{name}_bucket{_labels(names, labelvalues, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labelvalues)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(names, labelvalues)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# ========================================================================================
+# MULTIPLE WORKERS
+# ========================================================================================
+
+def _write_json(path: str, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)  # readers never see a partial file
+
+
+def _read_json(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WorkerMetrics:
+    """Shares the registry of this worker with the others through METRICS_DIR (see header)."""
+
+    def __init__(self, registry: MetricsRegistry, directory: str = None):
+        self.registry = registry
+        self.directory = directory
+
+    def flush(self):
+        """Write this worker's snapshot (no-op without a directory)."""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        _write_json(os.path.join(self.directory, f"{os.getpid()}.json"), self.registry.snapshot())
+
+    def _archive_exited_workers(self, pids):
+        """Fold the counters / histograms of exited workers into the archive (under a file lock)."""
+        import fcntl  # POSIX only; server.py sets METRICS_DIR on Linux deployments
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+            snapshots = [_read_json(archive_path) or {}]
+            paths = [os.path.join(self.directory, f"{pid}.json") for pid in pids]
+            snapshots += [snapshot for snapshot in map(_read_json, paths) if snapshot]
+            _write_json(archive_path, merge_snapshots(snapshots, gauges=False))
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def collect(self):
+        """Merged snapshot of every worker (this one's is written first, so it is current)."""
+        if not self.directory:
+            return self.registry.snapshot()
+        self.flush()
+        pids = [int(entry[:-5]) for entry in os.listdir(self.directory)
+                if entry.endswith(".json") and entry[:-5].isdigit()]
+        exited = [pid for pid in pids if not _alive(pid)]
+        if exited:
+            self._archive_exited_workers(exited)
+        paths = [os.path.join(self.directory, ARCHIVE_FILE)]
+        paths += [os.path.join(self.directory, f"{pid}.json") for pid in pids if pid not in exited]
+        return merge_snapshots(snapshot for snapshot in map(_read_json, paths) if snapshot)
+
+
+registry = MetricsRegistry()
+worker_metrics = WorkerMetrics(registry, METRICS_DIR)
+
+
+def render_metrics():
+    """Body of GET /metrics."""
+    return render(worker_metrics.collect())
+
+
+# ========================================================================================
+# APPLICATION METRICS
+# ========================================================================================
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status code.", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency (to the first byte for streamed bodies).",
+    ("method", "route")
+)
+http_requests_in_progress = registry.gauge("http_requests_in_progress", "HTTP requests being served.")
+
+db_helper_calls = registry.counter(
+    "db_helper_calls_total", "Calls of the db.py helpers by outcome (ok / error).", ("helper", "outcome")
+)
+db_helper_duration = registry.histogram(
+    "db_helper_duration_seconds", "Duration of the db.py helpers.", ("helper",), buckets=DB_BUCKETS
+)
+
+llm_calls = registry.counter(
+    "llm_calls_total", "LLM calls per agent node by outcome (ok / error / rejected).", ("node", "outcome")
+)
+llm_call_duration = registry.histogram("llm_call_duration_seconds", "LLM call latency per agent node.", ("node",))
+llm_tokens = registry.counter("llm_tokens_total", "LLM tokens per agent node (kind: input / output).", ("node", "kind"))
+
+quota_exceeded = registry.counter(
+    "quota_exceeded_total", "Generation requests refused with 429 (daily quota).", ("challenge_type",)
+)
+
+
+def track_db_helper(fn):
+    """Decorator: count and time a db.py helper (db_helper_calls_total / db_helper_duration_seconds)."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = fn(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            db_helper_duration.observe(time.perf_counter() - start, name)
+            db_helper_calls.inc(name, outcome)
+
+    return wrapper
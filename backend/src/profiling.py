@@ -0,0 +1,457 @@
+# Profiling - On-Demand Sampling Profiles of Single Requests
+#
+# An admin (ADMIN_USER_IDS, see auth.py) adds "X-Profile: 1" - or ?profile=1,
+# which also changes the URL and with it the history cache key - to any
+# request. ProfilingMiddleware then samples THAT request with a background
+# thread every PROFILE_INTERVAL_MS:
+#
+#   - the event loop thread, while it runs the request's task (its stack
+#     contains the middleware's frame; ticks spent on other tasks are not
+#     attributed to the request)
+#   - threadpool threads while they run code under profiled_thread() for the
+#     request: the auth dependency and the idempotent handlers (LLM calls)
+#
+# Each tick is attributed to one phase by the functions on its stack:
+#
+#   llm           _invoke_llm() / the OpenAI client
+#   sql           SQLAlchemy and the DB driver
+#   auth          auth.py, PyJWT, cryptography
+#   serialization response models (pydantic), serializers, compression
+#   app           anything else the request runs
+#   wait          nothing runs for the request (awaiting I/O, or other tasks
+#                 hold the event loop)
+#
+# The response carries X-Profile-Id and X-Profile-Breakdown (wall ms per
+# phase). The profile is stored as PROFILE_DIR/<id>.json (the PROFILE_MAX_STORED
+# most recent are kept) and served by GET /api/admin/profiles/<id>; its stacks
+# are in the folded format ("frame;frame;frame count" per line) read by
+# flamegraph.pl, speedscope and inferno:
+#
+#   curl -H "X-Profile: 1" -H "Authorization: Bearer $TOKEN" -D - .../api/challenges/history
+#   curl -H "Authorization: Bearer $TOKEN" .../api/admin/profiles/<id>/folded | flamegraph.pl > history.svg
+#
+# The admin check verifies the token before sampling starts, so the route's
+# own verification is a claims cache hit. While a profile runs, the
+# interpreter's thread switch interval (5 ms by default) is lowered to half
+# the sampling interval, otherwise the sampler would wait for the GIL and take
+# a sample only every 5 ms. Without the flag a request pays one header / query
+# string lookup; the sampler thread only runs while a profiled request does.
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import Counter
+from datetime import datetime
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from urllib.parse import parse_qs
+import json
+import logging
+import os
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "intrvu-profiles"))
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "100"))
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_PARAM = "profile"
+
+# Phases in attribution priority: a stack under _invoke_llm that is running SQL counts as llm
+PHASES = ("llm", "sql", "auth", "serialization", "app", "wait")
+
+_FALSE_VALUES = ("", "0", "false", "no", "off")
+_PROFILE_ID = re.compile(r"^[0-9a-f]{16}$")
+_PACKAGES = re.compile(r"^.*/(?:site|dist)-packages/")
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend/
+
+_current = ContextVar("request_profile", default=None)
+
+# Switch interval shared by concurrent profiles: lowered by the first, restored by the last
+_switch_lock = threading.Lock()
+_switch_users = 0
+_switch_default = None
+
+
+def _lower_switch_interval(seconds: float):
+    global _switch_users, _switch_default
+    with _switch_lock:
+        if _switch_users == 0:
+            _switch_default = sys.getswitchinterval()
+        _switch_users += 1
+        sys.setswitchinterval(min(seconds, _switch_default))
+
+
+def _restore_switch_interval():
+    global _switch_users
+    with _switch_lock:
+        _switch_users -= 1
+        if _switch_users == 0:
+            sys.setswitchinterval(_switch_default)
+
+
+def _code_phase(path: str, name: str):
+    """Phase a function belongs to (None: app code or framework plumbing)."""
+    if name == "_invoke_llm" or path.startswith(("langchain_openai/", "openai/", "httpx/")):
+        return "llm"
+    if path.startswith("sqlalchemy/") or path.endswith("sqlite3/dbapi2.py"):
+        return "sql"
+    if path == "src/auth.py" or path.startswith(("jwt/", "cryptography/")):
+        return "auth"
+    if (
+        path.startswith(("pydantic/", "pydantic_core/", "json/"))
+        or path == "fastapi/encoders.py"
+        or "serializ" in name.lower()
+        or (path == "src/compression.py" and name == "compress")
+        or (path == "starlette/responses.py" and name == "render")
+    ):
+        return "serialization"
+    return None
+
+
+def _code_path(filename: str):
+    """Short file name for frame labels: src/... for the app, package/... for libraries."""
+    if filename.startswith(_APP_ROOT + os.sep):
+        return os.path.relpath(filename, _APP_ROOT).replace(os.sep, "/")
+    stripped = _PACKAGES.sub("", filename)
+    if stripped != filename:
+        return stripped
+    # Standard library: keep the package directory (json/encoder.py)
+    return "/".join(filename.replace(os.sep, "/").rsplit("/", 2)[-2:])
+
+
+class RequestProfile:
+    """Stack samples of one request, taken by a background thread."""
+
+    def __init__(self, request: str, user_id: str, anchor, loop_thread: int,
+                 interval_ms: float = PROFILE_INTERVAL_MS, max_seconds: float = PROFILE_MAX_SECONDS):
+        if interval_ms <= 0:
+            raise ValueError("interval_ms must be positive")
+        self.id = secrets.token_hex(8)
+        self.request = request
+        self.user_id = user_id
+        self.interval_ms = interval_ms
+        self.max_seconds = max_seconds
+        self._anchor = anchor  # frame of the middleware: marks the request's task on the loop
+        self._loop_thread = loop_thread
+        self._threads = Counter()  # threadpool thread id -> nesting depth of profiled_thread()
+        self._lock = threading.Lock()
+        self._codes = {}  # code object -> (label, phase)
+        self._stop = threading.Event()
+        self._sampler = None
+        self.stacks = Counter()  # folded stack -> samples
+        self.phases = Counter()  # phase -> ticks
+        self.ticks = 0
+        self.truncated = False
+        self.started_at = None
+        self.duration_ms = None
+
+    # ------------------------------------------------------------------------------------
+    # Threads working for the request
+    # ------------------------------------------------------------------------------------
+
+    def attach(self, ident: int):
+        with self._lock:
+            self._threads[ident] += 1
+
+    def detach(self, ident: int):
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    # ------------------------------------------------------------------------------------
+    # Sampling
+    # ------------------------------------------------------------------------------------
+
+    def start(self):
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        _lower_switch_interval(self.interval_ms / 2000)
+        self._sampler = threading.Thread(target=self._run, name=f"profile-{self.id}", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        """Stop sampling (idempotent)."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            _restore_switch_interval()
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 3)
+
+    def _run(self):
+        interval = self.interval_ms / 1000
+        next_tick = time.perf_counter() + interval
+        deadline = next_tick - interval + self.max_seconds
+        # Ticks on a fixed schedule: time spent waiting for the GIL is not added to the interval
+        while not self._stop.wait(max(0.0, next_tick - time.perf_counter())):
+            next_tick = max(next_tick + interval, time.perf_counter())
+            if time.perf_counter() >= deadline:
+                self.truncated = True
+                logger.warning(f"Profile {self.id} of {self.request} stopped after {self.max_seconds}s")
+                return
+            self._sample()
+
+    def _code_info(self, code):
+        info = self._codes.get(code)
+        if info is None:
+            path = _code_path(code.co_filename)
+            name = getattr(code, "co_qualname", code.co_name)
+            info = self._codes[code] = (f"{path}:{name}", _code_phase(path, code.co_name))
+        return info
+
+    def _stack(self, frame, anchor=None):
+        """
+        (labels root first, phase) of a thread's stack.
+
+        With an anchor, only the frames from the anchor down are kept, and None
+        is returned when the anchor is not on the stack (another task runs).
+        Otherwise the thread machinery at the root (threading, anyio) is dropped.
+        """
+        labels, phases = [], set()
+        while frame is not None:
+            code = frame.f_code
+            if anchor is None and code.co_filename.endswith(("threading.py", "anyio/_backends/_asyncio.py")):
+                break
+            label, phase = self._code_info(code)
+            labels.append(label)
+            if phase:
+                phases.add(phase)
+            if frame is anchor:
+                break
+            frame = frame.f_back
+        else:
+            if anchor is not None:
+                return None
+        labels.reverse()
+        return labels, next((phase for phase in PHASES if phase in phases), "app")
+
+    def _sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            threads = list(self._threads)
+
+        # Threadpool threads do the request's work while its task awaits them
+        samples = []
+        for ident in threads:
+            frame = frames.get(ident)
+            if frame is not None:
+                samples.append(("threadpool",) + self._stack(frame))
+        if not samples:
+            frame = frames.get(self._loop_thread)
+            stack = self._stack(frame, self._anchor) if frame is not None else None
+            if stack is not None:
+                samples.append(("event-loop",) + stack)
+
+        self.ticks += 1
+        if not samples:
+            self.phases["wait"] += 1
+            self.stacks["(waiting)"] += 1
+            return
+        self.phases[samples[0][2]] += 1
+        for root, labels, _ in samples:
+            self.stacks[";".join([root, *labels])] += 1
+
+    # ------------------------------------------------------------------------------------
+    # Results
+    # ------------------------------------------------------------------------------------
+
+    def breakdown(self):
+        """Wall-clock ms per phase (share of the ticks times the request duration)."""
+        duration = self.duration_ms or 0.0
+        return {
+            phase: round(duration * self.phases[phase] / self.ticks, 3) if self.ticks else 0.0
+            for phase in PHASES
+        }
+
+    def folded(self):
+        """Stacks in the folded format: one "frame;frame;frame count" line per stack."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "request": self.request,
+            "user_id": self.user_id,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "duration_ms": self.duration_ms,
+            "interval_ms": self.interval_ms,
+            "samples": self.ticks,
+            "truncated": self.truncated,
+            "breakdown_ms": self.breakdown(),
+            "folded": self.folded()
+        }
+
+
+@contextmanager
+def profiled_thread():
+    """
+    Sample the current (threadpool) thread for the request being profiled.
+    A no-op outside profiled requests. Works as a decorator too:
+
+    @profiled_thread()
+    def get_current_user(request): ...
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    ident = threading.get_ident()
+    profile.attach(ident)
+    try:
+        yield
+    finally:
+        profile.detach(ident)
+
+
+# ========================================================================================
+# STORAGE
+# ========================================================================================
+
+def _profile_path(directory: str, profile_id: str):
+    if not _PROFILE_ID.match(profile_id or ""):
+        raise ValueError(f"Invalid profile id '{profile_id}'")
+    return os.path.join(directory, f"{profile_id}.json")
+
+
+def save_profile(profile: RequestProfile, directory: str = None, max_stored: int = None):
+    """Write a profile to the profile directory and drop the oldest beyond max_stored."""
+    directory = directory or PROFILE_DIR
+    max_stored = max_stored or PROFILE_MAX_STORED
+    os.makedirs(directory, exist_ok=True)
+    path = _profile_path(directory, profile.id)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(profile.to_dict(), f)
+    os.replace(tmp_path, path)  # readers never see a partial file
+
+    stored = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in stored[:-max_stored]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass  # removed by another worker
+
+
+def load_profile(profile_id: str, directory: str = None):
+    """
+    Stored profile as a dict, or None if it does not exist (any more).
+
+    Raises:
+        ValueError: Malformed profile id
+    """
+    path = _profile_path(directory or PROFILE_DIR, profile_id)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles(directory: str = None):
+    """Summaries (without stacks) of the stored profiles, newest first."""
+    directory = directory or PROFILE_DIR
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            with open(entry.path) as f:
+                profile = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue  # removed or being replaced meanwhile
+        profile.pop("folded", None)
+        profiles.append(profile)
+    profiles.sort(key=lambda profile: profile["started_at"] or "", reverse=True)
+    return profiles
+
+
+# ========================================================================================
+# MIDDLEWARE
+# ========================================================================================
+
+def profile_requested(scope):
+    """True if the request asks for a profile (X-Profile header or ?profile= flag)."""
+    header = PROFILE_HEADER.lower().encode()
+    for name, value in scope["headers"]:
+        if name == header:
+            return value.decode("latin-1").strip().lower() not in _FALSE_VALUES
+    query = scope.get("query_string", b"")
+    if PROFILE_QUERY_PARAM.encode() + b"=" not in query:
+        return False
+    values = parse_qs(query.decode("latin-1"), keep_blank_values=True).get(PROFILE_QUERY_PARAM)
+    return bool(values) and values[-1].strip().lower() not in _FALSE_VALUES
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware: sample admin requests that ask for it (see module header).
+
+    Args:
+        app: Inner ASGI app
+        authorize: Sync callable(request) -> admin user id, or None to ignore the flag
+    """
+
+    def __init__(self, app, authorize):
+        self.app = app
+        self.authorize = authorize
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        user_id = await run_in_threadpool(self.authorize, Request(scope))
+        if user_id is None:  # not an admin: served as usual
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(
+            f"{scope['method']} {scope['path']}", user_id, sys._getframe(), threading.get_ident()
+        )
+        start = None
+
+        async def send_profiled(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message  # headers are sent with the first body
+                return
+            if message["type"] == "http.response.body" and start is not None:
+                held, start = start, None
+                headers = MutableHeaders(scope=held)
+                headers["X-Profile-Id"] = profile.id
+                if not message.get("more_body", False):  # the response is complete
+                    profile.stop()
+                    headers["X-Profile-Breakdown"] = ", ".join(
+                        f"{phase}={ms}" for phase, ms in profile.breakdown().items()
+                    )
+                await send(held)
+            await send(message)
+
+        token = _current.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            _current.reset(token)
+            profile.stop()
+            await run_in_threadpool(save_profile, profile)
+            logger.info(
+                f"Profiled {profile.request} for {user_id}: id={profile.id} "
+                f"{profile.duration_ms}ms {profile.ticks} samples"
+            )
@@ -0,0 +1,146 @@
+# Provisioning Queue - Batched Quota Creation for user.created Webhooks
+#
+# The Clerk webhook handler only verifies the signature and submits the user
+# id here. A single flusher task collects the ids of concurrent webhooks and
+# writes them together (database/provisioning.py): a signup spike of N users
+# costs a few statements per shard instead of N transactions.
+#
+#   webhook --verify--> submit(user_id) --buffer--> flush: provision_users() per shard
+#
+# A batch is flushed when PROVISION_QUEUE_BATCH_SIZE ids are waiting or
+# PROVISION_QUEUE_MAX_WAIT_MS after its first id arrived. submit() returns
+# once the user's batch is COMMITTED, so the webhook is only acknowledged
+# after the write: if the flush fails, the handler answers 500 and Clerk
+# redelivers (provisioning is idempotent). With more than
+# PROVISION_QUEUE_MAX_PENDING ids waiting, submit() refuses new ids (503,
+# also redelivered) instead of growing without bound.
+#
+# The queue is per worker process; shutdown flushes what is still buffered.
+
+from fastapi.concurrency import run_in_threadpool
+from .database.provisioning import provision_users_across_shards
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+PROVISION_QUEUE_BATCH_SIZE = int(os.getenv("PROVISION_QUEUE_BATCH_SIZE", "500"))
+PROVISION_QUEUE_MAX_WAIT_MS = float(os.getenv("PROVISION_QUEUE_MAX_WAIT_MS", "50"))
+PROVISION_QUEUE_MAX_PENDING = int(os.getenv("PROVISION_QUEUE_MAX_PENDING", "20000"))
+
+
+class QueueFull(Exception):
+    """Too many user ids are waiting to be provisioned."""
+
+
+class ProvisioningQueue:
+    """Buffers user ids and provisions them in batches with one flusher task."""
+
+    def __init__(self, batch_size: int, max_wait_seconds: float, max_pending: int,
+                 provision=provision_users_across_shards):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.batch_size = batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.max_pending = max_pending
+        self._provision = provision
+        self._pending = {}  # user_id -> [futures of the submitters waiting for it]
+        self._arrived = None
+        self._full = None
+        self._task = None
+        self._stopping = False
+        self.batches = 0
+        self.users = 0
+
+    def start(self):
+        """Start the flusher task (from the running event loop, at app startup)."""
+        self._arrived = asyncio.Event()
+        self._full = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def submit(self, user_id: str):
+        """
+        Queue a user and wait until their quotas are committed.
+
+        Raises:
+            QueueFull: PROVISION_QUEUE_MAX_PENDING ids are already waiting
+            RuntimeError: The flush failed or the queue is not running
+        """
+        if self._task is None or self._task.done() or self._stopping:
+            raise RuntimeError("Provisioning queue is not running")
+        if user_id not in self._pending and len(self._pending) >= self.max_pending:
+            raise QueueFull(f"{len(self._pending)} users are waiting to be provisioned")
+        future = asyncio.get_running_loop().create_future()
+        # A redelivered webhook for a queued user shares the pending write
+        self._pending.setdefault(user_id, []).append(future)
+        self._arrived.set()
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+        await future
+
+    async def _run(self):
+        while True:
+            await self._arrived.wait()
+            if not self._stopping:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.max_wait_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            await self._flush()
+            if self._stopping:
+                return
+
+    async def _flush(self):
+        """Provision everything that is waiting (in batch_size chunks) and wake the submitters."""
+        while self._pending:
+            batch = dict(list(self._pending.items())[:self.batch_size])
+            for user_id in batch:
+                del self._pending[user_id]
+            if len(self._pending) < self.batch_size:
+                self._full.clear()
+            if not self._pending:
+                self._arrived.clear()
+
+            try:
+                await run_in_threadpool(self._provision, list(batch))
+                error = None
+            except Exception as e:
+                logger.error(f"Provisioning batch of {len(batch)} users failed: {str(e)}")
+                error = RuntimeError(f"Provisioning failed: {str(e)}")
+            self.batches += 1
+            self.users += len(batch)
+            for futures in batch.values():
+                for future in futures:
+                    if future.done():  # submitter went away (client disconnected)
+                        continue
+                    if error:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(None)
+
+    async def stop(self):
+        """Provision whatever is still buffered, then stop the flusher."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._arrived.set()
+        self._full.set()
+        await self._task
+        self._task = None
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "users": self.users,
+            "batch_size": self.batch_size,
+            "max_wait_ms": self.max_wait_seconds * 1000
+        }
+
+
+provisioning_queue = ProvisioningQueue(
+    PROVISION_QUEUE_BATCH_SIZE, PROVISION_QUEUE_MAX_WAIT_MS / 1000, PROVISION_QUEUE_MAX_PENDING
+)
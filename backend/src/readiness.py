@@ -0,0 +1,167 @@
+# Readiness - Can This Worker Serve Traffic Right Now?
+#
+#   GET /api/health/live   liveness : the event loop answers (no dependency is
+#                          touched; a failing liveness probe means restart)
+#   GET /api/health/ready  readiness: 200 when the worker should get traffic,
+#                          503 when the load balancer should route around it
+#
+# Both only report statuses; the full result below (pools, latencies, error
+# texts) is served to admins by GET /api/health/details.
+#
+# Readiness checks, per worker:
+#
+#   - warmup   : warm_up() has finished and none of its steps failed (see
+#                warmup.py); failed steps (e.g. the Clerk JWKS fetch) are
+#                retried by each probe run until they succeed
+#   - database : every primary and replica engine answers SELECT 1 within
+#                READINESS_DB_TIMEOUT_SECONDS, and its pool is not saturated
+#                (checked-out connections / pool capacity below
+#                READINESS_MAX_POOL_UTILIZATION). A saturated pool is not
+#                pinged - the ping would just queue behind the requests
+#   - llm      : state of the LLM circuit breaker (see agents/circuit.py)
+#
+# A failed warmup or database check makes the worker NOT READY (503). An open
+# LLM circuit only makes it DEGRADED (200): an LLM outage hits every worker
+# alike, and history, stats and quotas keep working without it.
+#
+# The result is cached for READINESS_CACHE_SECONDS and computed by one probe at
+# a time, so frequent polling by several load balancers costs at most one round
+# of pings per interval.
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from .database.models import router
+from .agents.circuit import llm_circuit, OPEN
+from .warmup import warmup_state, retry_failed_warmup
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+READINESS_DB_TIMEOUT_SECONDS = float(os.getenv("READINESS_DB_TIMEOUT_SECONDS", "1"))
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "2"))
+READINESS_MAX_POOL_UTILIZATION = float(os.getenv("READINESS_MAX_POOL_UTILIZATION", "1.0"))
+
+READY = "ready"
+DEGRADED = "degraded"
+NOT_READY = "not_ready"
+
+
+def _engines():
+    """(label, engine) of every primary and replica, labelled like engine_metrics."""
+    return [
+        *((f"primary:{name}", engine) for name, engine in router.engines.items()),
+        *((f"replica:{name}", engine) for name, engine in router.replicas.items()),
+    ]
+
+
+def pool_usage(engine):
+    """
+    Checked-out connections of an engine's pool against its capacity
+    (pool size + max overflow). Capacity is None for pools without a limit
+    (e.g. SQLite in-memory engines), which never count as saturated.
+    """
+    pool = engine.pool
+    checked_out = pool.checkedout() if callable(getattr(pool, "checkedout", None)) else 0
+    size = pool.size() if callable(getattr(pool, "size", None)) else None
+    max_overflow = getattr(pool, "_max_overflow", None)
+    capacity = size + max_overflow if size is not None and max_overflow is not None and max_overflow >= 0 else None
+    return {
+        "checked_out": checked_out,
+        "capacity": capacity,
+        "utilization": round(checked_out / capacity, 3) if capacity else None
+    }
+
+
+def _ping(engine):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+def _warmup_status():
+    if not warmup_state["done"]:
+        return "pending"
+    return "fail" if warmup_state["failed"] else "ok"
+
+
+class ReadinessProbe:
+    """Runs the readiness checks and caches their result briefly."""
+
+    def __init__(self, cache_seconds: float, db_timeout_seconds: float, max_pool_utilization: float):
+        self.cache_seconds = cache_seconds
+        self.db_timeout_seconds = db_timeout_seconds
+        self.max_pool_utilization = max_pool_utilization
+        self._lock = asyncio.Lock()
+        self._result = None
+        self._checked_at = None  # monotonic time of the cached result
+        self.runs = 0
+
+    def _fresh(self):
+        return self._result is not None and time.monotonic() - self._checked_at < self.cache_seconds
+
+    async def check(self):
+        """
+        Readiness result, computed at most once per cache_seconds.
+
+        Returns:
+            dict: {"status": "ready" | "degraded" | "not_ready", "age_seconds",
+                   "duration_ms", "checks": {"warmup", "database", "llm"}}
+        """
+        if not self._fresh():
+            async with self._lock:  # concurrent probes wait for one run
+                if not self._fresh():
+                    self._result = await self._run()
+                    self._checked_at = time.monotonic()
+                    self.runs += 1
+        return {**self._result, "age_seconds": round(time.monotonic() - self._checked_at, 3)}
+
+    async def _check_engine(self, engine):
+        pool = pool_usage(engine)
+        if pool["utilization"] is not None and pool["utilization"] >= self.max_pool_utilization:
+            return {"status": "saturated", "pool": pool}
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(run_in_threadpool(_ping, engine), timeout=self.db_timeout_seconds)
+        except asyncio.TimeoutError:
+            return {"status": "timeout", "pool": pool}
+        except Exception as e:
+            return {"status": "error", "error": str(e)[:200], "pool": pool}
+        return {"status": "ok", "latency_ms": round((time.perf_counter() - start) * 1000, 3), "pool": pool}
+
+    async def _run(self):
+        start = time.perf_counter()
+        labels, engines = zip(*_engines())
+        results = dict(zip(labels, await asyncio.gather(*(self._check_engine(engine) for engine in engines))))
+        database_ok = all(result["status"] == "ok" for result in results.values())
+        llm = llm_circuit.stats()
+        if warmup_state["done"] and warmup_state["failed"]:
+            await run_in_threadpool(retry_failed_warmup)
+        warmup_ok = warmup_state["done"] and not warmup_state["failed"]
+
+        if not warmup_ok or not database_ok:
+            status = NOT_READY
+        elif llm["state"] == OPEN:
+            status = DEGRADED
+        else:
+            status = READY
+        if status == NOT_READY:
+            failing = [label for label, result in results.items() if result["status"] != "ok"]
+            logger.warning(
+                f"Worker not ready: warmup_done={warmup_state['done']} "
+                f"failed_warmup_steps={warmup_state['failed']} failing_engines={failing}"
+            )
+
+        return {
+            "status": status,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            "checks": {
+                "warmup": {"status": _warmup_status(), **warmup_state},
+                "database": {"status": "ok" if database_ok else "fail", "engines": results},
+                "llm": {"status": "ok" if llm["state"] != OPEN else "open", **llm}
+            }
+        }
+
+
+readiness_probe = ReadinessProbe(READINESS_CACHE_SECONDS, READINESS_DB_TIMEOUT_SECONDS, READINESS_MAX_POOL_UTILIZATION)
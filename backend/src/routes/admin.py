@@ -0,0 +1,38 @@
+# Admin Routes - Request Profiles
+#
+# Profiles recorded for requests sent with "X-Profile: 1" by an admin (see
+# src/profiling.py). All routes require a user in ADMIN_USER_IDS.
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from ..auth import get_admin_user
+from ..profiling import list_profiles, load_profile
+
+router = APIRouter()
+
+async def _stored_profile(profile_id: str):
+    """Internal helper: stored profile, 400 for a malformed id, 404 if unknown."""
+    try:
+        profile = await run_in_threadpool(load_profile, profile_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return profile
+
+@router.get("/admin/profiles")
+async def get_profiles(admin: dict = Depends(get_admin_user)):
+    """Stored profiles of all workers (without stacks), newest first."""
+    return {"profiles": await run_in_threadpool(list_profiles)}
+
+@router.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, admin: dict = Depends(get_admin_user)):
+    """One profile: request, duration, time per phase and the folded stacks."""
+    return await _stored_profile(profile_id)
+
+@router.get("/admin/profiles/{profile_id}/folded", response_class=PlainTextResponse)
+async def get_profile_folded(profile_id: str, admin: dict = Depends(get_admin_user)):
+    """Folded stacks only, ready for flamegraph.pl / speedscope / inferno."""
+    profile = await _stored_profile(profile_id)
+    return PlainTextResponse(profile["folded"])
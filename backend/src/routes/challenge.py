@@ -6,43 +6,122 @@
 # ENDPOINTS OVERVIEW:
 # POST /challenges/interview   - Generate MCQ challenges (max 7 questions)
 # POST /challenges/scenario    - Generate scenario challenges (max 3 questions)  
-# GET  /challenges/history     - Get user's challenge history
+# GET  /challenges/history     - Get user's challenge history (paginated, filterable)
+# GET  /challenges/search      - Full-text search over the user's history (ranked)
+# GET  /challenges/export      - Stream the full history as NDJSON or CSV (optional gzip)
 # POST /quotas/initialize      - Initialize user quotas (call first)
 # GET  /quotas/{type}          - Get specific quota info
 # GET  /quotas                 - Get all quota info
+# GET  /stats                  - Get aggregate statistics (accuracy, topics)
 # POST /scenario-answers       - Submit & evaluate scenario answers
+# POST /interview-answers      - Submit one MCQ answer
+# POST /interview-answers/bulk - Submit & grade a whole quiz in one request
+#
+# IDEMPOTENCY: POST /challenges/interview, /challenges/scenario and /scenario-answers
+# accept an Idempotency-Key header (one fresh UUID per user action, reused on retries).
+# A retry replays the first response (header Idempotent-Replayed: true) instead of
+# repeating the LLM call; a retry that arrives mid-request waits for the first attempt.
+#
+# CONDITIONAL GET: /challenges/history, /quotas and /stats send a strong ETag derived
+# from the user's data version. Repeat requests with If-None-Match get 304 Not Modified
+# after one version lookup (browsers do this automatically for fetch()).
+#
+# RESPONSE FORMAT VERSIONS (request header X-API-Version, default 1):
+# 1 - "options" / "questions" are JSON-encoded strings (parse with JSON.parse())
+# 2 - "options" / "questions" are native JSON arrays
+#
+# SERIALIZATION: challenge, quota and search responses are typed (schemas.py) and
+# serialized by pydantic's Rust core; history pages are serialized with orjson and
+# cached. JSON bodies from COMPRESSION_MIN_BYTES up are sent brotli / gzip encoded
+# when the client accepts it (see compression.py) - browsers decode transparently.
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, validator
 from ..database.db import (
-    get_user_challenges,
+    get_user_history_page,
+    count_user_history,
+    search_user_history,
     create_challenge_quota,
-    create_interview_challenge,
+    create_interview_challenges,
     create_scenario_challenge,
     reset_quota_if_needed,
+    get_effective_quota,
     get_challenge_quota,
+    get_user_quotas,
+    get_quota_window_start,
+    create_user_quotas,
+    consume_quota,
     save_scenario_answer,
     update_scenario_evaluation,
     save_interview_answer,
-    get_user_interview_answers,
-    get_user_scenario_answers
+    save_interview_answers,
+    MAX_BULK_ANSWERS,
+    DAILY_QUOTA,
+    CHALLENGE_TYPES,
+    HISTORY_DEFAULT_PAGE_SIZE,
+    HISTORY_MAX_PAGE_SIZE
+)
+from ..database.cache import quota_cache, history_cache
+from ..database.stats import get_user_stats, get_user_window_stats
+from ..database.search import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT
+from ..database.versions import get_data_version, make_etag
+from ..database.export import history_record, stream_history_export, export_filename, export_media_type
+from ..database.idempotency import (
+    claim_idempotency_key,
+    get_idempotent_response,
+    store_idempotent_response,
+    release_idempotency_key,
+    request_fingerprint,
+    IdempotencyConflict,
+    STATUS_COMPLETED
 )
 from ..agents.ai_generator_agentic import (
     generate_interview_challenges,
     generate_scenario_challenge as agentic_generate_scenario_challenge,
     evaluate_scenario_answer
 )
-from ..utils import authenticate_and_get_user_details
-from ..database.models import get_db, ScenarioChallenge, InterviewAnswer
+from ..auth import get_current_user
+from ..agents.circuit import CircuitOpen
+from ..compression import negotiate_encoding, compress, weaken_etag, COMPRESSION_MIN_BYTES
+from ..metrics import quota_exceeded
+from ..profiling import profiled_thread
+from .schemas import (
+    InterviewChallengesResponse,
+    ScenarioChallengesResponse,
+    HistoryPage,
+    SearchResponse,
+    QuotaResponse,
+    QuotasResponse,
+)
+from ..database.models import get_read_db, get_write_db, ReadSessionLocal, ScenarioChallenge, InterviewAnswer
+import asyncio
 import json
+import orjson
+import os
+import time
 from datetime import datetime
+from typing import List, Optional
 
 router = APIRouter()
 
+API_VERSION_HEADER = "X-API-Version"
+API_VERSIONS = (1, 2)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_REPLAY_HEADER = "Idempotent-Replayed"
+
+# How long a retry waits for an in-flight first attempt (LLM calls take a while)
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "120"))
+IDEMPOTENCY_POLL_SECONDS = 0.5
+
 # ========================================================================================
 # REQUEST/RESPONSE MODELS
 # ========================================================================================
+# Response models live in schemas.py
 
 class ChallengeRequest(BaseModel):
     """
@@ -118,6 +197,27 @@ class InterviewAnswerRequest(BaseModel):
     user_answer_id: int  # Selected option (0-3 for A/B/C/D)
     time_taken_seconds: int = None  # Optional timing data
 
+class InterviewAnswerBulkRequest(BaseModel):
+    """
+    Frontend Request Model for Bulk Interview Answer Submission
+    
+    USAGE:
+    {
+      "answers": [InterviewAnswerRequest, ...]  (1-50 answers, each challenge once)
+    }
+    """
+    answers: List[InterviewAnswerRequest]
+    
+    @validator('answers')
+    def validate_answers(cls, v):
+        if not v:
+            raise ValueError('answers cannot be empty')
+        if len(v) > MAX_BULK_ANSWERS:
+            raise ValueError(f'answers cannot contain more than {MAX_BULK_ANSWERS} items')
+        if len({answer.challenge_id for answer in v}) != len(v):
+            raise ValueError('each challenge can only be answered once per batch')
+        return v
+
 # ========================================================================================
 # HELPER FUNCTIONS
 # ========================================================================================
@@ -125,6 +225,7 @@ class InterviewAnswerRequest(BaseModel):
 def _ensure_quota_exists_and_reset(db: Session, user_id: str, challenge_type: str):
     """
     Internal helper: Ensure quota exists and reset if needed.
+    The reset is committed together with the quota decrement.
     Frontend should use POST /quotas/initialize instead.
     """
     quota = get_challenge_quota(db, user_id=user_id, challenge_type=challenge_type)
@@ -133,6 +234,212 @@ def _ensure_quota_exists_and_reset(db: Session, user_id: str, challenge_type: st
     quota = reset_quota_if_needed(db, quota)
     return quota
 
+def _response_version(request: Request):
+    """
+    Internal helper: Response format version requested by the client.
+    Version 1 (default) keeps the legacy JSON-string fields for older frontends.
+    """
+    raw = request.headers.get(API_VERSION_HEADER)
+    if raw is None:
+        return API_VERSIONS[0]
+    try:
+        version = int(raw)
+    except ValueError:
+        version = None
+    if version not in API_VERSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported {API_VERSION_HEADER} '{raw}'. Supported: {', '.join(map(str, API_VERSIONS))}"
+        )
+    return version
+
+def _json_field(value, version: int):
+    """Internal helper: native JSON value for version 2+, legacy JSON string for version 1."""
+    return value if version >= 2 else json.dumps(value)
+
+def _serialize_quota(quota):
+    """
+    Internal helper: Quota payload for the current daily window.
+    Computed from the stored row without writing (no reset commit on reads).
+    """
+    quota_remaining, last_reset_date = get_effective_quota(quota)
+    return {
+        "quota_remaining": quota_remaining,
+        "last_reset_date": last_reset_date.isoformat(),
+        "total_daily_quota": DAILY_QUOTA
+    }
+
+def _get_user_quotas_cached(db: Session, user_id: str, data_version: int):
+    """
+    Internal helper: Both quota rows for a user in one query, served from a
+    short-TTL in-process cache on repeat reads. Entries are tagged with the
+    user's data version, so a write made through any worker invalidates them.
+    """
+    cached = quota_cache.get(user_id)
+    if cached is not None and cached[0] == data_version:
+        return cached[1]
+    quotas = get_user_quotas(db, user_id)
+    quota_cache.set(user_id, (data_version, quotas))
+    return quotas
+
+def _cache_headers(etag: str):
+    """Internal helper: Validators for per-user, always-revalidated responses."""
+    return {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": f"Authorization, {API_VERSION_HEADER}, Accept-Encoding"
+    }
+
+def _not_modified(request: Request, etag: str):
+    """
+    Internal helper: 304 response if the client's If-None-Match matches `etag`
+    (weak comparison), otherwise None (caller builds the full response). The
+    304 repeats the tag as the client holds it: W/ for a compressed body.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    for tag in (tag.strip() for tag in if_none_match.split(",")):
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers=_cache_headers(etag if tag == "*" else tag)
+            )
+    return None
+
+def _serialize_history_item(challenge, answers, version: int):
+    """
+    History item dict for one (challenge_row, [answer_rows]) pair from the history queries.
+    "type" distinguishes interview items (options, user_answer or null) from
+    scenario items (questions, user_answers per question).
+    """
+    item = history_record(challenge, answers)
+    content_field = "options" if challenge.type == "interview" else "questions"
+    item[content_field] = _json_field(item[content_field], version)
+    return item
+
+def _history_cache_key(etag: str, encoding: Optional[str]):
+    """Internal helper: History cache key of one representation (ETag + content coding)."""
+    return f"{etag}|{encoding}" if encoding else etag
+
+def _cached_history_body(user_id: str, etag: str, encoding: Optional[str]):
+    """
+    Internal helper: (body, content coding) of a cached history page, or None.
+
+    Pages are cached already compressed when the client accepts an encoding and
+    the page reaches COMPRESSION_MIN_BYTES, so a cache hit costs neither
+    serialization nor compression. Smaller pages are cached uncompressed under
+    the same key, so each cached value starts with the coding of its body
+    (b"gzip\n...", b"br\n..." or b"\n..." for identity).
+    """
+    value = history_cache.get(user_id, _history_cache_key(etag, encoding))
+    if value is None:
+        return None
+    coding, _, body = value.partition(b"\n")
+    return body, coding.decode() or None
+
+def _cache_history_body(user_id: str, etag: str, encoding: Optional[str], body: bytes, coding: Optional[str]):
+    """Internal helper: Cache a history body with its coding (see _cached_history_body)."""
+    history_cache.set(user_id, _history_cache_key(etag, encoding), (coding or "").encode() + b"\n" + body)
+
+def _history_response(body: bytes, etag: str, encoding: Optional[str]):
+    """
+    Internal helper: History page response from its (cached) body, compressed
+    with `encoding` or uncompressed if None. A compressed body carries the
+    weak form of the ETag, like bodies compressed by CompressionMiddleware.
+    """
+    response = Response(content=body, media_type="application/json", headers=_cache_headers(etag))
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+        weaken_etag(response.headers)
+    return response
+
+def _stream_then_close(chunks, db: Session):
+    """
+    Internal helper: Yield a streaming body, closing its session when the
+    stream ends (also on client disconnect or error).
+    """
+    try:
+        yield from chunks
+    finally:
+        db.close()
+
+def _claim_idempotency_key(db: Session, user_id: str, endpoint: str, key: str, request_hash: str):
+    """Internal helper: claim_idempotency_key() with client errors mapped to HTTP errors."""
+    try:
+        return claim_idempotency_key(db, user_id, endpoint, key, request_hash)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))  # Unprocessable Content
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+async def _run_idempotent(request: Request, db: Session, user_id: str, endpoint: str, payload: dict,
+                          handler, success_status: int = status.HTTP_201_CREATED):
+    """
+    Internal helper: Run `handler()` at most once per Idempotency-Key.
+    
+    Without the header the handler simply runs. With it:
+    - first attempt: claims the key, runs the handler, stores its response
+    - retry after completion: replays the stored response (Idempotent-Replayed: true)
+    - retry while the first attempt runs: waits for it, then replays its response
+    - same key, different body: 422
+    A failing handler releases the key, so the next retry runs it again.
+    
+    The handler (blocking LLM call) and every idempotency-key query (claim,
+    poll, store, release) run in the threadpool, so waiting retries and other
+    requests are served by the event loop meanwhile.
+    """
+    handler = profiled_thread()(handler)  # sampled in the threadpool for a profiled request
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return await run_in_threadpool(handler)
+    
+    request_hash = request_fingerprint(payload)
+    claimed = await run_in_threadpool(_claim_idempotency_key, db, user_id, endpoint, key, request_hash)
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while not claimed:
+        state = await run_in_threadpool(get_idempotent_response, db, user_id, endpoint, key)
+        if state is None:
+            # First attempt failed and released the key: this retry runs the request
+            claimed = await run_in_threadpool(_claim_idempotency_key, db, user_id, endpoint, key, request_hash)
+            continue
+        key_status, response_status, response_body = state
+        if key_status == STATUS_COMPLETED:
+            return JSONResponse(
+                status_code=response_status,
+                content=response_body,
+                headers={IDEMPOTENCY_REPLAY_HEADER: "true"}
+            )
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"A request with this {IDEMPOTENCY_HEADER} is still in progress. Retry later."
+            )
+        await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+    
+    try:
+        result = await run_in_threadpool(handler)
+    except BaseException:
+        await run_in_threadpool(release_idempotency_key, db, user_id, endpoint, key)
+        raise
+    
+    try:
+        await run_in_threadpool(
+            store_idempotent_response, db, user_id, endpoint, key, success_status, jsonable_encoder(result)
+        )
+    except RuntimeError:
+        # The work is committed and answered; only replay is lost for this key
+        await run_in_threadpool(release_idempotency_key, db, user_id, endpoint, key)
+    return result
+
+def _llm_unavailable(error: CircuitOpen):
+    """Internal helper: 503 for a refused LLM call (circuit open, see agents/circuit.py)."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="AI generation is temporarily unavailable. Please retry shortly.",
+        headers={"Retry-After": str(max(1, round(error.retry_after)))}
+    )
+
 def _validate_challenge_type_limits(challenge_type: str, num_questions: int):
     """
     Internal helper: Validate question limits.
@@ -153,11 +460,12 @@ def _validate_challenge_type_limits(challenge_type: str, num_questions: int):
 # CHALLENGE GENERATION ENDPOINTS
 # ========================================================================================
 
-@router.post("/challenges/interview", status_code=status.HTTP_201_CREATED)
+@router.post("/challenges/interview", status_code=status.HTTP_201_CREATED, response_model=InterviewChallengesResponse)
 async def generate_interview_challenge(
     challenge_request: ChallengeRequest, 
     request: Request, 
-    db: Session = Depends(get_db)
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_write_db)
 ):
     """
     Generate Interview (MCQ) Challenges
@@ -178,81 +486,91 @@ async def generate_interview_challenge(
     
     ERROR CODES:
     400 - Invalid input, 429 - Quota exceeded, 500 - Server error
+    503 - AI backend unavailable (repeated failures, retry after Retry-After seconds)
+    409 - Same Idempotency-Key still in progress, 422 - Idempotency-Key reused with a different body
     """
     try:
-        user_details = authenticate_and_get_user_details(request=request)
-        user_id = user_details.get("user_id")
+        user_id = user["user_id"]
+        db.bind_user(user_id)  # route the session to the user's shard
+        version = _response_version(request)
 
-        # Validate question limits for interview challenges
-        _validate_challenge_type_limits("interview", challenge_request.num_questions)
+        def generate():
+            # Runs once per Idempotency-Key (the LLM call is never repeated for a retry)
+            
+            # Validate question limits for interview challenges
+            _validate_challenge_type_limits("interview", challenge_request.num_questions)
 
-        # Ensure quota exists and check availability
-        quota = _ensure_quota_exists_and_reset(db, user_id, "interview")
+            # Ensure quota exists and check availability
+            quota = _ensure_quota_exists_and_reset(db, user_id, "interview")
         
-        if quota.quota_remaining < challenge_request.num_questions:    
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="You have reached your daily quota for interview challenges"
-            )
+            if quota.quota_remaining < challenge_request.num_questions:    
+                quota_exceeded.inc("interview")
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="You have reached your daily quota for interview challenges"
+                )
 
-        # Generate the challenge data using the AI agent
-        ai_generated_data = generate_interview_challenges(
-            topic=challenge_request.topic,
-            difficulty=challenge_request.difficulty,
-            num_questions=challenge_request.num_questions
-        )
+            # Generate the challenge data using the AI agent
+            ai_generated_data = generate_interview_challenges(
+                topic=challenge_request.topic,
+                difficulty=challenge_request.difficulty,
+                num_questions=challenge_request.num_questions
+            )
         
-        # Create challenges in database and format response
-        created_challenges = []
-        for q in ai_generated_data:
-            created = create_interview_challenge(
+            # Create all challenges in one transaction and format response
+            created_challenges = []
+            for created in create_interview_challenges(
                 db=db,
                 difficulty=challenge_request.difficulty,
                 created_by=user_id,
                 topic=challenge_request.topic,
-                title=q["title"],
-                options=q["options"],
-                correct_answer_id=q["correct_answer_id"],
-                explaination=q["explaination"]
-            )
-            # Frontend-friendly response format
-            created_challenges.append({
-                "id": created.id,
-                "type": "interview",
-                "topic": created.topic,
-                "difficulty": created.difficulty,
-                "title": created.title,
-                "date_created": created.date_created.isoformat(),
-                "options": created.options,  # JSON string - parse with JSON.parse()
-                "correct_answer_id": created.correct_answer_id,  # 0-3 for A/B/C/D
-                "explanation": created.explaination
-            })
+                questions=ai_generated_data
+            ):
+                # Frontend-friendly response format
+                created_challenges.append({
+                    "id": created.id,
+                    "type": "interview",
+                    "topic": created.topic,
+                    "difficulty": created.difficulty,
+                    "title": created.title,
+                    "date_created": created.date_created.isoformat(),
+                    "options": _json_field(created.options, version),
+                    "correct_answer_id": created.correct_answer_id,  # 0-3 for A/B/C/D
+                    "explanation": created.explaination
+                })
         
-        # Update quota and commit transaction
-        quota.quota_remaining -= challenge_request.num_questions
-        if quota.quota_remaining < 0:
-            quota.quota_remaining = 0
-        db.commit()
+            # Update quota and commit transaction (also invalidates the quota cache)
+            consume_quota(db, quota, challenge_request.num_questions)
         
-        return {
-            "challenges": created_challenges,
-            "quota_remaining": quota.quota_remaining,
-            "challenge_type": "interview"
-        }
+            return {
+                "challenges": created_challenges,
+                "quota_remaining": quota.quota_remaining,
+                "challenge_type": "interview"
+            }
+        
+        # Retries with the same Idempotency-Key replay the first response
+        return await _run_idempotent(
+            request, db, user_id, "challenges/interview",
+            {**challenge_request.dict(), "version": version},
+            generate
+        )
         
     except HTTPException:
         raise
+    except CircuitOpen as e:
+        raise _llm_unavailable(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error generating interview challenge: {str(e)}"
         )
 
-@router.post("/challenges/scenario", status_code=status.HTTP_201_CREATED)
+@router.post("/challenges/scenario", status_code=status.HTTP_201_CREATED, response_model=ScenarioChallengesResponse)
 async def generate_scenario_challenge(
     challenge_request: ChallengeRequest, 
     request: Request, 
-    db: Session = Depends(get_db)
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_write_db)
 ):
     """
     Generate Scenario (Open-ended) Challenges
@@ -273,68 +591,81 @@ async def generate_scenario_challenge(
     
     ERROR CODES:
     400 - Invalid input, 429 - Quota exceeded, 500 - Server error
+    503 - AI backend unavailable (repeated failures, retry after Retry-After seconds)
+    409 - Same Idempotency-Key still in progress, 422 - Idempotency-Key reused with a different body
     """
     try:
-        user_details = authenticate_and_get_user_details(request=request)
-        user_id = user_details.get("user_id")
+        user_id = user["user_id"]
+        db.bind_user(user_id)  # route the session to the user's shard
+        version = _response_version(request)
 
-        # Validate question limits for scenario challenges
-        _validate_challenge_type_limits("scenario", challenge_request.num_questions)
+        def generate():
+            # Runs once per Idempotency-Key (the LLM call is never repeated for a retry)
+            
+            # Validate question limits for scenario challenges
+            _validate_challenge_type_limits("scenario", challenge_request.num_questions)
 
-        # Ensure quota exists and check availability
-        quota = _ensure_quota_exists_and_reset(db, user_id, "scenario")
+            # Ensure quota exists and check availability
+            quota = _ensure_quota_exists_and_reset(db, user_id, "scenario")
         
-        if quota.quota_remaining < challenge_request.num_questions:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="You have reached your daily quota for scenario challenges"
-            )
+            if quota.quota_remaining < challenge_request.num_questions:
+                quota_exceeded.inc("scenario")
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="You have reached your daily quota for scenario challenges"
+                )
 
-        # Generate the challenge data using the AI agent
-        print(f"Calling agentic_generate_scenario_challenge with: topic={challenge_request.topic}, difficulty={challenge_request.difficulty}, num_questions={challenge_request.num_questions}")
-        ai_generated_data = agentic_generate_scenario_challenge(
-            topic=challenge_request.topic,
-            difficulty=challenge_request.difficulty,
-            num_questions=challenge_request.num_questions
-        )
+            # Generate the challenge data using the AI agent
+            print(f"Calling agentic_generate_scenario_challenge with: topic={challenge_request.topic}, difficulty={challenge_request.difficulty}, num_questions={challenge_request.num_questions}")
+            ai_generated_data = agentic_generate_scenario_challenge(
+                topic=challenge_request.topic,
+                difficulty=challenge_request.difficulty,
+                num_questions=challenge_request.num_questions
+            )
         
-        # Create challenge in database
-        created_challenge = create_scenario_challenge(
-            db=db,
-            difficulty=challenge_request.difficulty,
-            created_by=user_id,
-            topic=challenge_request.topic,
-            title=ai_generated_data["title"],
-            questions=ai_generated_data["questions"],
-            correct_answer=ai_generated_data["correct_answer"],
-            explanation=ai_generated_data["explanation"]
-        )
+            # Create challenge in database
+            created_challenge = create_scenario_challenge(
+                db=db,
+                difficulty=challenge_request.difficulty,
+                created_by=user_id,
+                topic=challenge_request.topic,
+                title=ai_generated_data["title"],
+                questions=ai_generated_data["questions"],
+                correct_answer=ai_generated_data["correct_answer"],
+                explanation=ai_generated_data["explanation"]
+            )
         
-        # Update quota and commit transaction
-        quota.quota_remaining -= challenge_request.num_questions
-        if quota.quota_remaining < 0:
-            quota.quota_remaining = 0
-        db.commit()
+            # Update quota and commit transaction (also invalidates the quota cache)
+            consume_quota(db, quota, challenge_request.num_questions)
         
-        # Return consistent format with interview challenges (array of challenges)
-        return {
-            "challenges": [{
-                "id": created_challenge.id,
-                "type": "scenario",
-                "topic": created_challenge.topic,
-                "difficulty": created_challenge.difficulty,
-                "title": created_challenge.title,
-                "date_created": created_challenge.date_created.isoformat(),
-                "questions": created_challenge.questions,  # JSON string - parse with JSON.parse()
-                "correct_answer": created_challenge.correct_answer,
-                "explanation": created_challenge.explanation
-            }],
-            "quota_remaining": quota.quota_remaining,
-            "challenge_type": "scenario"
-        }
+            # Return consistent format with interview challenges (array of challenges)
+            return {
+                "challenges": [{
+                    "id": created_challenge.id,
+                    "type": "scenario",
+                    "topic": created_challenge.topic,
+                    "difficulty": created_challenge.difficulty,
+                    "title": created_challenge.title,
+                    "date_created": created_challenge.date_created.isoformat(),
+                    "questions": _json_field(created_challenge.questions, version),
+                    "correct_answer": created_challenge.correct_answer,
+                    "explanation": created_challenge.explanation
+                }],
+                "quota_remaining": quota.quota_remaining,
+                "challenge_type": "scenario"
+            }
+        
+        # Retries with the same Idempotency-Key replay the first response
+        return await _run_idempotent(
+            request, db, user_id, "challenges/scenario",
+            {**challenge_request.dict(), "version": version},
+            generate
+        )
         
     except HTTPException:
         raise
+    except CircuitOpen as e:
+        raise _llm_unavailable(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -345,24 +676,52 @@ async def generate_scenario_challenge(
 # HISTORY ENDPOINT
 # ========================================================================================
 
-@router.get("/challenges/history")
-async def get_challenge_history(request: Request, db: Session = Depends(get_db)):
+@router.get("/challenges/history", response_model=HistoryPage)
+async def get_challenge_history(
+    request: Request,
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    limit: int = Query(HISTORY_DEFAULT_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    type: Optional[str] = None,
+    topic: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    answered: Optional[bool] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+):
     """
-    Get User's Challenge History with User Answers (Read-only, Idempotent)
+    Get User's Challenge History with User Answers (Read-only, Idempotent, Paginated)
     
     FRONTEND USAGE:
-    const response = await fetch('/challenges/history', {
+    // First page
+    const response = await fetch('/challenges/history?limit=20&type=interview', {
       headers: { ...authHeaders }
     });
     const data = await response.json();
     
-    // Separate by type if needed
-    const interviews = data.challenges.filter(c => c.type === 'interview');
-    const scenarios = data.challenges.filter(c => c.type === 'scenario');
+    // Next page (same filters + cursor)
+    if (data.next_cursor) {
+      await fetch(`/challenges/history?limit=20&type=interview&cursor=${data.next_cursor}`, ...);
+    }
+    
+    QUERY PARAMETERS (all optional):
+    limit       - page size, 1-100 (default 20)
+    cursor      - next_cursor from the previous page
+    type        - "interview" | "scenario"
+    topic       - exact topic
+    difficulty  - "Easy" | "Medium" | "Hard"
+    answered    - true (answered only) | false (unanswered only)
+    date_from   - ISO datetime, inclusive
+    date_to     - ISO datetime, exclusive
     
     RESPONSE FORMAT:
     {
       "challenges": [mixed array of interview and scenario challenges with user answers],
+      "next_cursor": "string" | null,
+      "has_more": boolean,
+      // First page only (no cursor), counting only challenges matching the filters
+      // (archived challenges are not listed and not counted; see /stats for lifetime totals):
       "total_count": number,
       "interview_count": number,
       "scenario_count": number
@@ -370,96 +729,300 @@ async def get_challenge_history(request: Request, db: Session = Depends(get_db))
     
     NOTE: Challenges are sorted by date_created (newest first)
     Each challenge includes user_answer data if available
+    
+    ERROR CODES:
+    400 - Invalid filter or cursor
+    304 - Not Modified (If-None-Match matches the current ETag)
     """
     
-    user_details = authenticate_and_get_user_details(request)
-    user_id = user_details.get("user_id")
-
-    # Get user's challenges - both types (READ-ONLY operation)
-    interview_challenges = get_user_challenges(db, user_id=user_id, challenge_type="interview")
-    scenario_challenges = get_user_challenges(db, user_id=user_id, challenge_type="scenario")
-    
-    # Get user's answers for both types
-    interview_answers = get_user_interview_answers(db, user_id)
-    scenario_answers = get_user_scenario_answers(db, user_id)
-    
-    # Create lookup dictionaries for answers
-    interview_answers_dict = {answer.challenge_id: answer for answer in interview_answers}
-    scenario_answers_dict = {}
-    for answer in scenario_answers:
-        if answer.scenario_id not in scenario_answers_dict:
-            scenario_answers_dict[answer.scenario_id] = []
-        scenario_answers_dict[answer.scenario_id].append(answer)
-    
-    # Combine and return both types with type indicators and user answers
-    all_challenges = []
-    
-    # Add interview challenges with type indicator and user answers
-    for challenge in interview_challenges:
-        user_answer = interview_answers_dict.get(challenge.id)
-        challenge_dict = {
-            "id": challenge.id,
-            "type": "interview",  # Frontend: use this to distinguish challenge types
-            "topic": challenge.topic,
-            "difficulty": challenge.difficulty,
-            "title": challenge.title,
-            "date_created": challenge.date_created.isoformat(),
-            "options": challenge.options,  # JSON string for interview challenges
-            "correct_answer_id": challenge.correct_answer_id,
-            "explanation": challenge.explaination,
-            # User answer data (null if not answered)
-            "user_answer": {
-                "user_answer_id": user_answer.user_answer_id if user_answer else None,
-                "is_correct": user_answer.is_correct if user_answer else None,
-                "date_completed": user_answer.date_completed.isoformat() if user_answer else None,
-                "time_taken_seconds": user_answer.time_taken_seconds if user_answer else None
-            } if user_answer else None
+    user_id = user["user_id"]
+    db.bind_user(user_id)  # route the session to the user's shard
+    version = _response_version(request)
+    
+    # Unchanged since the client's copy: skip the page query and serialization
+    etag = make_etag(user_id, get_data_version(db, user_id), "history", version, request.url.query)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    
+    # Same representation already serialized and encoded (by any request of this user)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    cached = _cached_history_body(user_id, etag, encoding)
+    if cached is not None:
+        return _history_response(cached[0], etag, cached[1])
+    
+    # One keyset page of challenges + answers in a single query (READ-ONLY operation)
+    try:
+        page, next_cursor = get_user_history_page(
+            db,
+            user_id=user_id,
+            limit=limit,
+            cursor=cursor,
+            challenge_type=type,
+            topic=topic,
+            difficulty=difficulty,
+            answered=answered,
+            date_from=date_from,
+            date_to=date_to
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    # Page is already in history order (newest first)
+    all_challenges = [_serialize_history_item(challenge, answers, version) for challenge, answers in page]
+    
+    payload = {
+        "challenges": all_challenges,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
+    }
+    
+    # Totals are only needed once per listing - skip them on follow-up pages.
+    # Same filters and tables as the page query, so they match what can be paged through.
+    if cursor is None:
+        counts = count_user_history(
+            db,
+            user_id=user_id,
+            challenge_type=type,
+            topic=topic,
+            difficulty=difficulty,
+            answered=answered,
+            date_from=date_from,
+            date_to=date_to
+        )
+        payload.update({
+            "total_count": counts["interview"] + counts["scenario"],
+            "interview_count": counts["interview"],
+            "scenario_count": counts["scenario"]
+        })
+    
+    # Cache the serialized (and encoded) body under its ETag; db.py write helpers invalidate it.
+    # Small pages are not worth compressing (same threshold as CompressionMiddleware).
+    body = orjson.dumps(payload)
+    coding = encoding if len(body) >= COMPRESSION_MIN_BYTES else None
+    if coding:
+        body = compress(body, coding)
+    _cache_history_body(user_id, etag, encoding, body, coding)
+    return _history_response(body, etag, coding)
+
+@router.get("/challenges/search", response_model=SearchResponse)
+async def search_challenge_history(
+    request: Request,
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+    type: Optional[str] = None
+):
+    """
+    Full-Text Search over the User's Challenge History (Read-only, Ranked)
+    
+    Matches challenge titles, topics, options, scenario questions, explanations
+    and the user's own scenario answers. Every word must match; the last word
+    may be partially typed (prefix match).
+    
+    FRONTEND USAGE:
+    const response = await fetch(`/challenges/search?q=${encodeURIComponent(text)}&limit=20`, {
+      headers: { ...authHeaders }
+    });
+    
+    RESPONSE FORMAT:
+    {
+      "query": "string",
+      "challenges": [same item shape as /challenges/history, best match first]
+    }
+    
+    ERROR CODES:
+    400 - Invalid type or limit
+    """
+    
+    user_id = user["user_id"]
+    db.bind_user(user_id)  # route the session to the user's shard
+    version = _response_version(request)
+    
+    try:
+        results = search_user_history(db, user_id=user_id, query=q, limit=limit, challenge_type=type)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return {
+        "query": q,
+        "challenges": [_serialize_history_item(challenge, answers, version) for challenge, answers in results]
+    }
+
+@router.get("/challenges/export")
+async def export_challenge_history(
+    request: Request,
+    user: dict = Depends(get_current_user),
+    format: str = "ndjson",
+    compression: Optional[str] = None,
+    type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+):
+    """
+    Download the User's Full History (Streamed)
+    
+    Streams every challenge with the user's answers, newest first, from a
+    server-side cursor: the response starts immediately and server memory stays
+    constant however long the history is.
+    
+    QUERY PARAMETERS:
+    - format: "ndjson" (default, one history item per line, native arrays) or
+              "csv" (one row per answer; options / questions JSON-encoded)
+    - compression: "gzip" for a .gz download
+    - type, date_from, date_to: same filters as /challenges/history
+    
+    FRONTEND USAGE:
+    const response = await fetch('/challenges/export?format=csv', { headers: { ...authHeaders } });
+    const blob = await response.blob();  // file name in Content-Disposition
+    
+    ERROR CODES:
+    400 - Invalid format, compression or type
+    """
+    
+    user_id = user["user_id"]
+    
+    # Own session: it must outlive this function while the body streams
+    db = ReadSessionLocal().bind_user(user_id)
+    try:
+        chunks = stream_history_export(
+            db, user_id, fmt=format, compression=compression,
+            challenge_type=type, date_from=date_from, date_to=date_to
+        )
+    except ValueError as e:
+        db.close()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return StreamingResponse(
+        _stream_then_close(chunks, db),
+        media_type=export_media_type(format, compression),
+        headers={
+            "Content-Disposition": f'attachment; filename="{export_filename(format, compression)}"',
+            "Cache-Control": "private, no-store",
+            "X-Accel-Buffering": "no"  # let reverse proxies pass chunks through
         }
-        all_challenges.append(challenge_dict)
-    
-    # Add scenario challenges with type indicator and user answers
-    for challenge in scenario_challenges:
-        user_answers = scenario_answers_dict.get(challenge.id, [])
-        challenge_dict = {
-            "id": challenge.id,
-            "type": "scenario",  # Frontend: use this to distinguish challenge types
-            "topic": challenge.topic,
-            "difficulty": challenge.difficulty,
-            "title": challenge.title,
-            "date_created": challenge.date_created.isoformat(),
-            "questions": challenge.questions,  # JSON string for scenario challenges
-            "correct_answer": challenge.correct_answer,
-            "explanation": challenge.explanation,
-            # User answers data (array of answers for each question)
-            "user_answers": [
-                {
-                    "question_index": answer.question_index,
-                    "user_answer": answer.user_answer,
-                    "llm_score": answer.llm_score,
-                    "llm_feedback": answer.llm_feedback,
-                    "llm_correct_answer": answer.llm_correct_answer,
-                    "created_at": answer.created_at.isoformat()
-                } for answer in user_answers
-            ] if user_answers else []
+    )
+
+# ========================================================================================
+# STATISTICS ENDPOINT
+# ========================================================================================
+
+@router.get("/stats")
+async def get_stats(
+    request: Request,
+    response: Response,
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    today_start: Optional[datetime] = None,
+    week_start: Optional[datetime] = None
+):
+    """
+    Get User's Aggregate Statistics (Read-only)
+    
+    Served from incrementally maintained totals - cost does not grow with history.
+    The optional time windows (challenges created since the client's local
+    midnight / start of week) are two small range queries.
+    
+    FRONTEND USAGE:
+    const response = await fetch('/stats', { headers: { ...authHeaders } });
+    
+    // With "today" / "this week" windows (client-local boundaries)
+    await fetch(`/stats?today_start=${midnight.toISOString()}&week_start=${weekStart.toISOString()}`, ...);
+    
+    RESPONSE FORMAT:
+    {
+      "total_count": number,
+      "interview_count": number,
+      "scenario_count": number,
+      "difficulty_breakdown": { "Easy": number, "Medium": number, "Hard": number },
+      "interview": { "answered": number, "correct": number, "accuracy": number (0-100) },
+      "scenario": {
+        "answers_scored": number, "average_score": number (0-100),
+        "challenges_evaluated": number, "challenges_passed": number
+      },
+      "topics": [{ "topic", "challenge_count", "interview_count", "scenario_count",
+                   "interview_answered", "interview_correct", "average_scenario_score" }],
+      // Only with today_start / week_start:
+      "windows": {
+        "today" | "week": {
+          "challenge_count": number,
+          "interview": { "answered": number, "correct": number },
+          "scenario": { "challenges_evaluated": number, "challenges_passed": number }
         }
-        all_challenges.append(challenge_dict)
+      }
+    }
+    
+    ERROR CODES:
+    304 - Not Modified (If-None-Match matches the current ETag)
+    """
+    
+    user_id = user["user_id"]
+    db.bind_user(user_id)  # route the session to the user's shard
+    
+    # Window boundaries are part of the representation (a new day is a new ETag)
+    etag = make_etag(user_id, get_data_version(db, user_id), "stats", request.url.query)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    response.headers.update(_cache_headers(etag))
+    
+    user_stats, topic_stats = get_user_stats(db, user_id)
+    window_starts = {
+        name: start.astimezone().replace(tzinfo=None) if start.tzinfo else start  # date_created is server-local
+        for name, start in (("today", today_start), ("week", week_start)) if start is not None
+    }
+    windows = get_user_window_stats(db, user_id, window_starts)
+    
+    def ratio(part, whole):
+        return round(part * 100 / whole, 1) if whole else 0
     
-    # Sort by date created (newest first)
-    all_challenges.sort(key=lambda x: x["date_created"], reverse=True)
+    def value(column):
+        return getattr(user_stats, column) if user_stats else 0
     
     return {
-        "challenges": all_challenges,
-        "total_count": len(all_challenges),
-        "interview_count": len(interview_challenges),
-        "scenario_count": len(scenario_challenges)
+        "total_count": value("interview_count") + value("scenario_count"),
+        "interview_count": value("interview_count"),
+        "scenario_count": value("scenario_count"),
+        "difficulty_breakdown": {
+            "Easy": value("easy_count"),
+            "Medium": value("medium_count"),
+            "Hard": value("hard_count")
+        },
+        "interview": {
+            "answered": value("interview_answered"),
+            "correct": value("interview_correct"),
+            "accuracy": ratio(value("interview_correct"), value("interview_answered"))
+        },
+        "scenario": {
+            "answers_scored": value("scenario_answers_scored"),
+            "average_score": round(value("scenario_score_total") / value("scenario_answers_scored"), 1)
+                if value("scenario_answers_scored") else 0,
+            "challenges_evaluated": value("scenario_challenges_evaluated"),
+            "challenges_passed": value("scenario_challenges_passed")
+        },
+        "topics": sorted([
+            {
+                "topic": t.topic,
+                "challenge_count": t.interview_count + t.scenario_count,
+                "interview_count": t.interview_count,
+                "scenario_count": t.scenario_count,
+                "interview_answered": t.interview_answered,
+                "interview_correct": t.interview_correct,
+                "average_scenario_score": round(t.scenario_score_total / t.scenario_answers_scored, 1)
+                    if t.scenario_answers_scored else None
+            } for t in topic_stats
+        ], key=lambda t: t["challenge_count"], reverse=True),
+        **({"windows": windows} if windows else {})
     }
 
 # ========================================================================================
 # QUOTA MANAGEMENT ENDPOINTS
 # ========================================================================================
 
-@router.post("/quotas/initialize", status_code=status.HTTP_201_CREATED)
-async def initialize_quotas(request: Request, db: Session = Depends(get_db)):
+@router.post("/quotas/initialize", status_code=status.HTTP_201_CREATED, response_model=QuotasResponse,
+             response_model_exclude_unset=True)
+async def initialize_quotas(request: Request, user: dict = Depends(get_current_user), db: Session = Depends(get_write_db)):
     """
     Initialize User Quotas (Call this first!)
     
@@ -480,34 +1043,26 @@ async def initialize_quotas(request: Request, db: Session = Depends(get_db)):
     }
     """
     
-    user_details = authenticate_and_get_user_details(request)
-    user_id = user_details.get("user_id")
+    user_id = user["user_id"]
+    db.bind_user(user_id)  # route the session to the user's shard
     
-    quotas = {}
+    existing = _get_user_quotas_cached(db, user_id, get_data_version(db, user_id))
     
-    for challenge_type in ["interview", "scenario"]:
-        quota = get_challenge_quota(db, user_id=user_id, challenge_type=challenge_type)
-        
-        # Create quota if it doesn't exist
-        if not quota:
-            quota = create_challenge_quota(db, user_id=user_id, challenge_type=challenge_type)
-        
-        # Reset quota if needed (daily reset)
-        quota = reset_quota_if_needed(db, quota)
-        
-        quotas[challenge_type] = {
-            "quota_remaining": quota.quota_remaining,
-            "last_reset_date": quota.last_reset_date.isoformat(),
-            "total_daily_quota": 10
-        }
+    # Create any missing quotas in a single commit (bumps the data version)
+    missing = [t for t in CHALLENGE_TYPES if t not in existing]
+    if missing:
+        existing = {**existing, **create_user_quotas(db, user_id, missing)}
+    
+    # Daily window is computed on read - no reset write needed
+    quotas = {t: _serialize_quota(existing[t]) for t in CHALLENGE_TYPES}
     
     return {
         "quotas": quotas,
         "total_remaining": quotas["interview"]["quota_remaining"] + quotas["scenario"]["quota_remaining"]
     }
     
-@router.get("/quotas/{challenge_type}")
-async def get_quota(challenge_type: str, request: Request, db: Session = Depends(get_db)):
+@router.get("/quotas/{challenge_type}", response_model=QuotaResponse)
+async def get_quota(challenge_type: str, request: Request, response: Response, user: dict = Depends(get_current_user), db: Session = Depends(get_read_db)):
     """
     Get Quota for Specific Challenge Type (Read-only)
     
@@ -527,6 +1082,7 @@ async def get_quota(challenge_type: str, request: Request, db: Session = Depends
     
     ERROR CODES:
     400 - Invalid challenge_type, 404 - Quota not found (call /quotas/initialize first)
+    304 - Not Modified (If-None-Match matches the current ETag)
     """
     
     # Validate challenge type
@@ -536,11 +1092,18 @@ async def get_quota(challenge_type: str, request: Request, db: Session = Depends
             detail="Invalid challenge type. Must be 'interview' or 'scenario'"
         )
     
-    user_details = authenticate_and_get_user_details(request)
-    user_id = user_details.get("user_id")
+    user_id = user["user_id"]
+    db.bind_user(user_id)  # route the session to the user's shard
+    
+    # The daily window changes the effective quota without a write, so it is part of the ETag
+    data_version = get_data_version(db, user_id)
+    etag = make_etag(user_id, data_version, "quota", challenge_type, get_quota_window_start().date())
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
     
     # ONLY READ the quota - don't create or modify (maintains HTTP GET semantics)
-    quota = get_challenge_quota(db, user_id=user_id, challenge_type=challenge_type)
+    quota = _get_user_quotas_cached(db, user_id, data_version).get(challenge_type)
     
     if not quota:
         raise HTTPException(
@@ -548,18 +1111,16 @@ async def get_quota(challenge_type: str, request: Request, db: Session = Depends
             detail=f"No quota found for challenge type '{challenge_type}'. Use POST /quotas/initialize to create quotas."
         )
     
-    # Ensure quota is reset at midnight
-    quota = reset_quota_if_needed(db, quota)
+    # Midnight reset is applied on read without writing to the database
+    response.headers.update(_cache_headers(etag))
     return {
         "user_id": user_id,
         "challenge_type": challenge_type,
-        "quota_remaining": quota.quota_remaining,
-        "last_reset_date": quota.last_reset_date.isoformat(),
-        "total_daily_quota": 10
+        **_serialize_quota(quota)
     }
 
-@router.get("/quotas")
-async def get_all_quotas(request: Request, db: Session = Depends(get_db)):
+@router.get("/quotas", response_model=QuotasResponse, response_model_exclude_unset=True)
+async def get_all_quotas(request: Request, response: Response, user: dict = Depends(get_current_user), db: Session = Depends(get_read_db)):
     """
     Get All Quotas (Read-only)
     
@@ -588,28 +1149,36 @@ async def get_all_quotas(request: Request, db: Session = Depends(get_db)):
       "message": "Some quotas are missing. Use POST /quotas/initialize to create them.",
       "total_remaining": number
     }
+    
+    ERROR CODES:
+    304 - Not Modified (If-None-Match matches the current ETag)
     """
     
-    user_details = authenticate_and_get_user_details(request)
-    user_id = user_details.get("user_id")
+    user_id = user["user_id"]
+    db.bind_user(user_id)  # route the session to the user's shard
+    
+    # The daily window changes the effective quota without a write, so it is part of the ETag
+    data_version = get_data_version(db, user_id)
+    etag = make_etag(user_id, data_version, "quotas", get_quota_window_start().date())
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    response.headers.update(_cache_headers(etag))
+    
+    # ONLY READ the quotas - don't create or modify (maintains HTTP GET semantics)
+    # One query for both types, cached briefly per user
+    user_quotas = _get_user_quotas_cached(db, user_id, data_version)
     
     quotas = {}
     missing_quotas = []
     
-    for challenge_type in ["interview", "scenario"]:
-        # ONLY READ the quota - don't create or modify (maintains HTTP GET semantics)
-        quota = get_challenge_quota(db, user_id=user_id, challenge_type=challenge_type)
-        
+    for challenge_type in CHALLENGE_TYPES:
+        quota = user_quotas.get(challenge_type)
         if not quota:
             missing_quotas.append(challenge_type)
         else:
-            # Ensure quota is reset at midnight
-            quota = reset_quota_if_needed(db, quota)
-            quotas[challenge_type] = {
-                "quota_remaining": quota.quota_remaining,
-                "last_reset_date": quota.last_reset_date.isoformat(),
-                "total_daily_quota": 10
-            }
+            # Midnight reset is applied on read without writing to the database
+            quotas[challenge_type] = _serialize_quota(quota)
     
     if missing_quotas:
         return {
@@ -632,7 +1201,8 @@ async def get_all_quotas(request: Request, db: Session = Depends(get_db)):
 async def submit_scenario_answer(
     answer_request: ScenarioAnswerRequest,
     request: Request,
-    db: Session = Depends(get_db)
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_write_db)
 ):
     """
     Submit and Evaluate Scenario Answer
@@ -660,58 +1230,71 @@ async def submit_scenario_answer(
     
     ERROR CODES:
     404 - Scenario not found, 500 - Server error during evaluation
+    503 - AI backend unavailable (repeated failures, retry after Retry-After seconds)
+    409 - Same Idempotency-Key still in progress, 422 - Idempotency-Key reused with a different body
     """
     try:
-        user_details = authenticate_and_get_user_details(request)
-        user_id = user_details.get("user_id")
+        user_id = user["user_id"]
+        db.bind_user(user_id)  # route the session to the user's shard
         
-        # Fetch scenario from DB first to validate it exists
-        scenario = db.query(ScenarioChallenge).filter(
-            ScenarioChallenge.id == answer_request.scenario_id
-        ).first()
-        if not scenario:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Scenario not found"
+        def evaluate():
+            # Runs once per Idempotency-Key (the evaluation is never repeated for a retry)
+            # Fetch scenario from DB first to validate it exists
+            scenario = db.query(ScenarioChallenge).filter(
+                ScenarioChallenge.id == answer_request.scenario_id
+            ).first()
+            if not scenario:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Scenario not found"
+                )
+        
+            # Save user answer to database
+            answer = save_scenario_answer(
+                db, 
+                user_id, 
+                answer_request.scenario_id, 
+                answer_request.question_index, 
+                answer_request.user_answer
             )
         
-        # Save user answer to database
-        answer = save_scenario_answer(
-            db, 
-            user_id, 
-            answer_request.scenario_id, 
-            answer_request.question_index, 
-            answer_request.user_answer
-        )
+            # Evaluate answer using AI agent
+            eval_result = evaluate_scenario_answer(
+                user_answer=answer_request.user_answer,
+                correct_answer=scenario.correct_answer,
+                scenario_title=scenario.title,
+                questions=scenario.questions
+            )
         
-        # Evaluate answer using AI agent
-        eval_result = evaluate_scenario_answer(
-            user_answer=answer_request.user_answer,
-            correct_answer=scenario.correct_answer,
-            scenario_title=scenario.title,
-            questions=scenario.questions
-        )
+            # Save evaluation results
+            update_scenario_evaluation(
+                db, answer.id,
+                llm_score=eval_result["score"],
+                llm_feedback=eval_result["feedback"],
+                llm_correct_answer=eval_result["correct_answer"]
+            )
         
-        # Save evaluation results
-        update_scenario_evaluation(
-            db, answer.id,
-            llm_score=eval_result["score"],
-            llm_feedback=eval_result["feedback"],
-            llm_correct_answer=eval_result["correct_answer"]
-        )
+            # Return evaluation results to frontend
+            return {
+                "answer_id": answer.id,
+                "score": eval_result["score"],
+                "feedback": eval_result["feedback"],
+                "correct_answer": eval_result["correct_answer"],
+                "scenario_id": answer_request.scenario_id,
+                "question_index": answer_request.question_index
+            }
         
-        # Return evaluation results to frontend
-        return {
-            "answer_id": answer.id,
-            "score": eval_result["score"],
-            "feedback": eval_result["feedback"],
-            "correct_answer": eval_result["correct_answer"],
-            "scenario_id": answer_request.scenario_id,
-            "question_index": answer_request.question_index
-        }
+        # Retries with the same Idempotency-Key replay the first response
+        return await _run_idempotent(
+            request, db, user_id, "scenario-answers",
+            answer_request.dict(),
+            evaluate
+        )
         
     except HTTPException:
         raise
+    except CircuitOpen as e:
+        raise _llm_unavailable(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -722,7 +1305,8 @@ async def submit_scenario_answer(
 async def submit_interview_answer(
     answer_request: InterviewAnswerRequest,
     request: Request,
-    db: Session = Depends(get_db)
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_write_db)
 ):
     """
     Submit Interview (MCQ) Answer
@@ -738,21 +1322,26 @@ async def submit_interview_answer(
       })
     });
     
+    Answering the same challenge again updates the user's answer for it
+    (one answer per user and challenge); "attempts" counts the submissions.
+    
     RESPONSE FORMAT:
     {
       "answer_id": number,
       "is_correct": boolean,
       "correct_answer_id": number,
       "challenge_id": number,
-      "user_answer_id": number
+      "user_answer_id": number,
+      "attempts": number,
+      "best_is_correct": boolean  // any attempt correct
     }
     
     ERROR CODES:
     404 - Challenge not found, 500 - Server error
     """
     try:
-        user_details = authenticate_and_get_user_details(request)
-        user_id = user_details.get("user_id")
+        user_id = user["user_id"]
+        db.bind_user(user_id)  # route the session to the user's shard
         
         # Save user answer to database (automatically calculates correctness)
         answer = save_interview_answer(
@@ -763,16 +1352,15 @@ async def submit_interview_answer(
             answer_request.time_taken_seconds
         )
         
-        # Get the challenge to return correct answer
-        challenge = answer.challenge
-        
         # Return results to frontend
         return {
-            "answer_id": answer.id,
-            "is_correct": answer.is_correct,
-            "correct_answer_id": challenge.correct_answer_id,
+            "answer_id": answer["answer_id"],
+            "is_correct": answer["is_correct"],
+            "correct_answer_id": answer["correct_answer_id"],
             "challenge_id": answer_request.challenge_id,
-            "user_answer_id": answer_request.user_answer_id
+            "user_answer_id": answer_request.user_answer_id,
+            "attempts": answer["attempts"],
+            "best_is_correct": answer["best_is_correct"]
         }
         
     except HTTPException:
@@ -783,3 +1371,68 @@ async def submit_interview_answer(
             detail=f"Error processing interview answer: {str(e)}"
         )
 
+@router.post("/interview-answers/bulk", status_code=status.HTTP_201_CREATED)
+async def submit_interview_answers(
+    bulk_request: InterviewAnswerBulkRequest,
+    request: Request,
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_write_db)
+):
+    """
+    Submit a Whole Quiz of Interview (MCQ) Answers
+    
+    Grades every answer in one request: the referenced challenges are read with
+    one query and all answers are saved in one transaction (all or nothing).
+    
+    FRONTEND USAGE:
+    const response = await fetch('/interview-answers/bulk', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', ...authHeaders },
+      body: JSON.stringify({
+        answers: [
+          { challenge_id: 123, user_answer_id: 2, time_taken_seconds: 45 },
+          { challenge_id: 124, user_answer_id: 0 }
+        ]
+      })
+    });
+    
+    RESPONSE FORMAT:
+    {
+      "results": [
+        {
+          "answer_id": number,
+          "challenge_id": number,
+          "user_answer_id": number,
+          "is_correct": boolean,
+          "correct_answer_id": number,
+          "attempts": number,
+          "best_is_correct": boolean
+        }
+      ],  // same order as the request
+      "correct_count": number,
+      "total": number
+    }
+    
+    ERROR CODES:
+    400 - Invalid answer / unknown challenge id, 422 - Empty, oversized or duplicate batch, 500 - Server error
+    """
+    user_id = user["user_id"]
+    db.bind_user(user_id)  # route the session to the user's shard
+    
+    try:
+        results = save_interview_answers(db, user_id, [
+            answer.dict() for answer in bulk_request.answers
+        ])
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing interview answers: {str(e)}"
+        )
+    
+    return {
+        "results": results,
+        "correct_count": sum(1 for result in results if result["is_correct"]),
+        "total": len(results)
+    }
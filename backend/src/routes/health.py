@@ -1,7 +1,55 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Response, status
+import os
+from ..auth import get_admin_user
+from ..database.cache import quota_cache, history_cache
+from ..database.instrumentation import route_metrics, engine_metrics
+from ..provisioning import provisioning_queue
+from ..readiness import readiness_probe, NOT_READY
 
 router = APIRouter()
 
+# The public probes only report statuses; pools, SQL / cache metrics and error
+# texts are in /health/details (admins only).
+
+def _check_statuses(readiness: dict):
+    """Internal helper: {check name: status} without the details of each check."""
+    return {name: check["status"] for name, check in readiness["checks"].items()}
+
+@router.get("/health/live")
+async def liveness():
+    """Liveness probe: answers as long as the worker's event loop runs (no dependencies)."""
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def readiness(response: Response):
+    """Readiness probe: 503 while this worker should not get traffic (see readiness.py)."""
+    result = await readiness_probe.check()
+    if result["status"] == NOT_READY:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    response.headers["Cache-Control"] = "no-store"
+    return {"status": result["status"], "checks": _check_statuses(result)}
+
 @router.get("/health")
 async def health_check():
-    return {"status": "healthy", "database": "connected"}
\ No newline at end of file
+    readiness = await readiness_probe.check()  # cached, see readiness.py
+    return {
+        "status": "healthy" if readiness["status"] != NOT_READY else "unhealthy",
+        "database": "connected" if readiness["checks"]["database"]["status"] == "ok" else "unavailable"
+    }
+
+@router.get("/health/details")
+async def health_details(admin: dict = Depends(get_admin_user)):
+    """Full readiness result and per-worker cache, SQL, engine and queue metrics (admins only)."""
+    readiness = await readiness_probe.check()
+    return {
+        "status": "healthy" if readiness["status"] != NOT_READY else "unhealthy",
+        "worker": os.getpid(),  # metrics below are per worker process
+        "readiness": readiness,
+        "caches": {
+            "quota": quota_cache.stats(),
+            "history": history_cache.stats()
+        },
+        "sql": route_metrics.stats(),
+        "engines": engine_metrics.stats(),
+        "provisioning": provisioning_queue.stats()
+    }
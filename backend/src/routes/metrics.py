@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+import hmac
+import os
+from ..metrics import render_metrics, CONTENT_TYPE
+
+router = APIRouter()
+
+# Optional bearer token for scrapers (unset: /metrics is open, e.g. on a private network)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    """Prometheus text exposition of all workers' metrics (see src/metrics.py)."""
+    if METRICS_TOKEN:
+        authorization = request.headers.get("authorization", "")
+        if not hmac.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    # Reads the other workers' snapshot files: off the event loop
+    body = await run_in_threadpool(render_metrics)
+    return Response(content=body, media_type=CONTENT_TYPE)
@@ -0,0 +1,130 @@
+# Response Models - Typed Bodies of the Challenge, History and Quota Routes
+#
+# Declared as response_model on the routes: FastAPI validates the returned
+# dict and serializes it straight to JSON bytes with pydantic's Rust core
+# (no jsonable_encoder + json.dumps pass), and the OpenAPI schema documents
+# the exact shapes.
+#
+# Field order is the wire order. Dates are ISO strings (as built by the
+# routes). "options" / "questions" are JSON-encoded strings for response
+# format version 1 and native arrays for version 2 (see X-API-Version).
+#
+# /challenges/history serializes its (cached) body itself with orjson;
+# HistoryPage documents it.
+
+from pydantic import BaseModel, Field
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
+
+
+# ========================================================================================
+# CHALLENGES
+# ========================================================================================
+
+class InterviewChallengeItem(BaseModel):
+    id: int
+    type: Literal["interview"]
+    topic: str
+    difficulty: str
+    title: str
+    date_created: str
+    options: Union[str, List[Any]]
+    correct_answer_id: int  # 0-3 for A/B/C/D
+    explanation: str
+
+
+class ScenarioChallengeItem(BaseModel):
+    id: int
+    type: Literal["scenario"]
+    topic: str
+    difficulty: str
+    title: str
+    date_created: str
+    questions: Union[str, List[Any]]
+    correct_answer: Optional[str]
+    explanation: Optional[str]
+
+
+class InterviewChallengesResponse(BaseModel):
+    challenges: List[InterviewChallengeItem]
+    quota_remaining: int
+    challenge_type: Literal["interview"]
+
+
+class ScenarioChallengesResponse(BaseModel):
+    challenges: List[ScenarioChallengeItem]
+    quota_remaining: int
+    challenge_type: Literal["scenario"]
+
+
+# ========================================================================================
+# HISTORY
+# ========================================================================================
+
+class InterviewUserAnswer(BaseModel):
+    user_answer_id: int
+    is_correct: bool
+    date_completed: str
+    time_taken_seconds: Optional[int]
+    attempts: int
+    best_is_correct: bool
+
+
+class ScenarioUserAnswer(BaseModel):
+    question_index: int
+    user_answer: str
+    llm_score: Optional[int]
+    llm_feedback: Optional[str]
+    llm_correct_answer: Optional[str]
+    created_at: str
+
+
+class InterviewHistoryItem(InterviewChallengeItem):
+    user_answer: Optional[InterviewUserAnswer]
+
+
+class ScenarioHistoryItem(ScenarioChallengeItem):
+    user_answers: List[ScenarioUserAnswer]
+
+
+HistoryItem = Annotated[Union[InterviewHistoryItem, ScenarioHistoryItem], Field(discriminator="type")]
+
+
+class HistoryPage(BaseModel):
+    challenges: List[HistoryItem]
+    next_cursor: Optional[str]
+    has_more: bool
+    # First page only (no cursor): challenges matching the filters, archived ones excluded
+    total_count: Optional[int] = None
+    interview_count: Optional[int] = None
+    scenario_count: Optional[int] = None
+
+
+class SearchResponse(BaseModel):
+    query: str
+    challenges: List[HistoryItem]
+
+
+# ========================================================================================
+# QUOTAS
+# ========================================================================================
+
+class QuotaInfo(BaseModel):
+    quota_remaining: int
+    last_reset_date: str
+    total_daily_quota: int
+
+
+class QuotaResponse(BaseModel):
+    user_id: str
+    challenge_type: Literal["interview", "scenario"]
+    quota_remaining: int
+    last_reset_date: str
+    total_daily_quota: int
+
+
+class QuotasResponse(BaseModel):
+    quotas: Dict[str, QuotaInfo]
+    # Only when quotas are missing (POST /quotas/initialize creates them)
+    missing_quotas: Optional[List[str]] = None
+    message: Optional[str] = None
+    total_remaining: int
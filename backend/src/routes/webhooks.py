@@ -1,35 +1,63 @@
 # Webhook Routes - Clerk Integration
 # 
-# This module handles webhooks from Clerk for user lifecycle events.
-# Currently handles user creation to initialize challenge quotas.
+# This module handles webhooks from Clerk for user lifecycle events:
+# - user.created: initialize challenge quotas (batched with concurrent
+#   signups through the provisioning queue, see src/provisioning.py)
+# - user.deleted: queue the user's data for purging and start the purge in the
+#   background (bounded batches, see database/retention.py)
 
-from fastapi import APIRouter, Request, HTTPException, Depends
-from ..database.db import create_challenge_quota
-from ..database.models import get_db
+from fastapi import APIRouter, Request, HTTPException, Depends, BackgroundTasks
+from ..database.models import get_write_db, SessionLocal
+from ..database.retention import mark_user_deleted, purge_user_data
+from ..provisioning import provisioning_queue, QueueFull
 from svix.webhooks import Webhook, WebhookVerificationError
+import logging
 import os
 import json
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+HANDLED_EVENTS = ("user.created", "user.deleted")
+
+def _purge_deleted_user(user_id: str):
+    """Background task: purge a deleted user's data with its own session."""
+    db = SessionLocal().bind_user(user_id)
+    try:
+        purge_user_data(db, user_id)
+    except Exception as e:
+        # Still queued in deleted_users: the scheduled retention job retries it
+        logger.error(f"Background purge of user {user_id} failed: {str(e)}")
+    finally:
+        db.close()
 
 @router.post("/clerk")
-async def handle_user_created(request: Request, db = Depends(get_db)):
+async def handle_clerk_webhook(request: Request, background_tasks: BackgroundTasks, db = Depends(get_write_db)):
     """
-    Handle Clerk webhook events, specifically user creation.
+    Handle Clerk webhook events: user creation and user deletion.
     
     When a new user is created in Clerk, this endpoint:
     1. Verifies the webhook signature
-    2. Creates initial challenge quotas for the user
+    2. Queues the user for provisioning and waits until the batch holding
+       them created both quotas (insert-or-ignore: redeliveries are no-ops)
+    
+    When a user is deleted in Clerk, this endpoint:
+    1. Verifies the webhook signature
+    2. Queues the user in deleted_users (committed before responding)
+    3. Purges the user's data in a background task (retried by the scheduled
+       retention job if it fails)
     
     Args:
         request: FastAPI request object containing webhook payload
-        db: Database session for quota creation
+        background_tasks: Runs the purge after the response is sent
+        db: Database session for the deletion queue
     
     Returns:
         dict: Status of the webhook processing
     
     Raises:
-        HTTPException: 400 for invalid webhook, 500 for server errors
+        HTTPException: 400 for invalid webhook, 500 for server errors,
+            503 when the provisioning queue is full (Clerk redelivers)
     """
     webhook_secret = os.getenv("CLERK_WEBHOOK_SECRET")
     
@@ -46,8 +74,9 @@ async def handle_user_created(request: Request, db = Depends(get_db)):
         
         data = json.loads(payload)
         
-        # Only process user.created events
-        if data.get("type") != "user.created":
+        # Only process user lifecycle events
+        event_type = data.get("type")
+        if event_type not in HANDLED_EVENTS:
             return {"status": "ignored"}
         
         user_data = data.get("data", {})
@@ -57,9 +86,20 @@ async def handle_user_created(request: Request, db = Depends(get_db)):
         if not user_id:
             raise HTTPException(status_code=422, detail="Invalid webhook payload: missing user ID")
         
-        # Create initial challenge quotas for the new user
-        create_challenge_quota(db, user_id, "interview")
-        create_challenge_quota(db, user_id, "scenario")
+        if event_type == "user.deleted":
+            db.bind_user(user_id)  # the user's rows live on their shard
+            mark_user_deleted(db, user_id)
+            background_tasks.add_task(_purge_deleted_user, user_id)
+            return {"status": "success", "user_id": user_id, "action": "purge_scheduled"}
+        
+        # Create both challenge quotas, batched with other new users
+        try:
+            await provisioning_queue.submit(user_id)
+        except QueueFull as e:
+            logger.warning(f"Deferring user.created for {user_id}: {str(e)}")
+            raise HTTPException(status_code=503, detail="Provisioning queue is full, retry later")
+        except RuntimeError as e:
+            raise HTTPException(status_code=500, detail=f"Failed to provision user: {str(e)}")
         
         return {"status": "success", "user_id": user_id}
     
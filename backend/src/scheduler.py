@@ -0,0 +1,181 @@
+# Background Jobs - Scheduled Maintenance
+#
+# This module runs periodic maintenance inside the API process.
+# Runs the daily set-based quota reset shortly after midnight, purges
+# expired idempotency keys every hour and runs the data retention jobs daily.
+# Every database job runs once per shard (see database/sharding.py). Without
+# JWT_KEY, the Clerk JWKS used to verify session tokens is refreshed here too.
+#
+# MULTIPLE WORKERS: under server.py every worker would run the database jobs.
+# server.py sets SCHEDULER_LOCK_FILE and only the worker holding an exclusive
+# lock on it runs them; when that worker exits (recycling, crash) the lock is
+# released and another worker takes over within SCHEDULER_LOCK_RETRY_SECONDS.
+# The JWKS refresh runs in every worker (each has its own key cache), and so
+# does the metrics flush (each worker publishes its own snapshot, see metrics.py).
+#
+# NOTE: Quota reads never depend on this job - the daily window is computed on
+# read (see db.get_effective_quota). The job only keeps stored rows tidy so the
+# spend path rarely has to apply a reset itself.
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from fastapi.concurrency import run_in_threadpool
+
+from .database.db import reset_stale_quotas, get_quota_window_start
+from .database.idempotency import purge_expired_keys
+from .database.retention import (
+    purge_deleted_users,
+    archive_old_history,
+    rollup_archived_stats,
+    RETENTION_ARCHIVE_DAYS
+)
+from .database.models import shard_sessions
+from .auth import signing_keys, AUTH_JWKS_REFRESH_SECONDS
+from .metrics import worker_metrics, METRICS_FLUSH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Small delay after midnight so the new window has definitely started
+QUOTA_RESET_DELAY_SECONDS = 5
+
+IDEMPOTENCY_PURGE_INTERVAL_SECONDS = 60 * 60
+
+RETENTION_INTERVAL_SECONDS = 24 * 60 * 60
+
+# Set by server.py for its workers (unset: this process runs the jobs)
+SCHEDULER_LOCK_FILE = os.getenv("SCHEDULER_LOCK_FILE")
+SCHEDULER_LOCK_RETRY_SECONDS = 15
+
+
+def _seconds_until_next_reset(now: datetime = None):
+    """Seconds from now until just after the next midnight."""
+    now = now or datetime.now()
+    next_midnight = get_quota_window_start(now) + timedelta(days=1)
+    return (next_midnight - now).total_seconds() + QUOTA_RESET_DELAY_SECONDS
+
+
+def _run_quota_reset():
+    """Run the set-based quota reset on every shard, each with its own session."""
+    return sum(reset_stale_quotas(db) for _, db in shard_sessions())
+
+
+async def quota_reset_loop():
+    """
+    Run reset_stale_quotas() once at startup and then every midnight.
+
+    The UPDATE only touches stale rows, so running it from several workers
+    at the same time is harmless.
+    """
+    while True:
+        try:
+            await run_in_threadpool(_run_quota_reset)
+        except Exception as e:
+            logger.error(f"Scheduled quota reset failed: {str(e)}")
+        await asyncio.sleep(_seconds_until_next_reset())
+
+
+def _run_idempotency_purge():
+    """Delete expired idempotency keys on every shard, each with its own session."""
+    return sum(purge_expired_keys(db) for _, db in shard_sessions())
+
+
+async def idempotency_purge_loop():
+    """Purge expired idempotency keys at startup and then every hour (idempotent DELETE)."""
+    while True:
+        try:
+            await run_in_threadpool(_run_idempotency_purge)
+        except Exception as e:
+            logger.error(f"Scheduled idempotency key purge failed: {str(e)}")
+        await asyncio.sleep(IDEMPOTENCY_PURGE_INTERVAL_SECONDS)
+
+
+def _run_retention():
+    """
+    Purge deleted users, then (if RETENTION_ARCHIVE_DAYS is set) archive old
+    history and roll it up, shard by shard. Each job commits in small batches;
+    a failing shard is logged and does not stop the others.
+    """
+    for shard, db in shard_sessions():
+        try:
+            purge_deleted_users(db)
+            if RETENTION_ARCHIVE_DAYS:
+                archive_old_history(db, RETENTION_ARCHIVE_DAYS)
+                rollup_archived_stats(db)
+        except Exception as e:
+            logger.error(f"Retention jobs failed on shard {shard}: {str(e)}")
+
+
+async def retention_loop():
+    """
+    Run the retention jobs at startup and then once a day.
+
+    Safe to run from several workers: purges are idempotent and an archive
+    batch that races another worker's batch fails on the archive primary key
+    and is rolled back (the other worker moved those rows).
+    """
+    while True:
+        try:
+            await run_in_threadpool(_run_retention)
+        except Exception as e:
+            logger.error(f"Scheduled retention jobs failed: {str(e)}")
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+
+async def jwks_refresh_loop():
+    """
+    Fetch the Clerk JWKS every AUTH_JWKS_REFRESH_SECONDS, so token verification
+    never waits on Clerk (only started without JWT_KEY; the first fetch is
+    part of the worker warmup).
+    """
+    while True:
+        await asyncio.sleep(AUTH_JWKS_REFRESH_SECONDS)
+        try:
+            await run_in_threadpool(signing_keys.refresh)
+        except Exception as e:
+            logger.error(f"Scheduled JWKS refresh failed: {str(e)}")
+
+
+async def metrics_flush_loop():
+    """
+    Write this worker's metrics snapshot every METRICS_FLUSH_SECONDS, so
+    /metrics served by any worker includes it (only started with METRICS_DIR).
+    """
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            await run_in_threadpool(worker_metrics.flush)
+        except Exception as e:
+            logger.error(f"Metrics flush failed: {str(e)}")
+
+
+def _try_lock(path: str):
+    """Open `path` and take an exclusive non-blocking lock; the open file or None."""
+    import fcntl  # POSIX only; server.py sets the lock file on Linux deployments
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock_file
+    except OSError:
+        lock_file.close()
+        return None
+
+
+async def database_jobs():
+    """
+    Run the quota reset, idempotency purge and retention loops - in one worker
+    only when SCHEDULER_LOCK_FILE is set (the lock is held until the process exits).
+    """
+    if SCHEDULER_LOCK_FILE:
+        while (lock_file := _try_lock(SCHEDULER_LOCK_FILE)) is None:
+            await asyncio.sleep(SCHEDULER_LOCK_RETRY_SECONDS)
+        logger.info(f"Worker {os.getpid()} runs the scheduled database jobs")
+    else:
+        lock_file = None
+    try:
+        await asyncio.gather(quota_reset_loop(), idempotency_purge_loop(), retention_loop())
+    finally:
+        if lock_file:
+            lock_file.close()
@@ -13,41 +13,17 @@
 #     if the user is a member of the network, we can return the network id.
 #     if the user is not a member of the network, we can return an error.
 
-from fastapi import HTTPException
-from clerk_backend_api import Clerk, AuthenticateRequestOptions
-import os
-from dotenv import load_dotenv
+from .auth import get_current_user
 
-clerk_sdk = Clerk(bearer_auth=os.getenv("CLERK_SECRET_KEY"))
 
 def authenticate_and_get_user_details(request):
-    try:
-        request_state = clerk_sdk.authenticate_request(
-            request,
-            AuthenticateRequestOptions(
-                authorized_parties=[
-                    "http://localhost:5173",
-                    "http://localhost:5174",
-                    "https://intrvu-production.up.railway.app",
-                    "https://intrvu-one.vercel.app",
-                    # "https://intrvu.store",  # Your custom domain
-                    # "https://www.intrvu.store",  # Your custom domain with www
-                    "https://www.intrvu.online",
-                    "https://intrvu.online",
-                ],
-                jwt_key= os.getenv("JWT_KEY")
-            )
-        )
-        
-        if not request_state.is_signed_in:
-            raise HTTPException(status_code=401, detail="Invalid Token")
-        
-        user_id = request_state.payload.get("sub")
-        
-        return {"user_id": user_id}
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Invalid Credentials. {str(e)}")
-    
-    
+    """
+    Verified user of a request: {"user_id": str}.
+
+    Kept for callers outside the routes; routes take
+    Depends(get_current_user) instead (local JWT verification, see auth.py).
 
+    Raises:
+        HTTPException: 401 missing / invalid token, 503 verification keys unavailable
+    """
+    return get_current_user(request)
@@ -0,0 +1,100 @@
+# Warmup - Prepare a Worker Before It Accepts Traffic
+#
+# Runs in the app lifespan, BEFORE the worker starts serving (uvicorn only
+# accepts connections once startup finished), so the first requests of a new
+# or recycled worker do not pay for:
+#
+#   - connections : one pooled connection per primary and replica engine
+#   - compilation : the hot read queries (data version, quotas, first history
+#                   page, stats) are run once per shard on the engine GET
+#                   routes use (the replica, if configured), filling its
+#                   compiled statement cache
+#   - signing keys: the Clerk JWKS is fetched (without JWT_KEY)
+#
+# Every step is best effort: a failure is logged and the worker still starts.
+# The outcome is kept in warmup_state for the readiness probe (readiness.py),
+# which reports the worker NOT READY while a step has failed and retries the
+# failed steps (retry_failed_warmup) until they succeed - without signing keys
+# every authenticated request would answer 503.
+
+from sqlalchemy import text
+from .database.models import ReadSessionLocal, router
+from .database.db import get_user_quotas, get_user_history_page
+from .database.stats import get_user_stats
+from .database.versions import get_data_version
+from .auth import signing_keys
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Placeholder owner for the warmup queries (matches no rows)
+WARMUP_USER_ID = "__warmup__"
+
+# done: warm_up() finished, failed: names of the steps that raised
+warmup_state = {"done": False, "duration_ms": None, "failed": []}
+
+
+def _warm_engines():
+    for engine in [*router.engines.values(), *router.replicas.values()]:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+
+def _warm_queries():
+    for shard in router.shards:
+        db = ReadSessionLocal().bind_shard(shard)
+        try:
+            get_data_version(db, WARMUP_USER_ID)
+            get_user_quotas(db, WARMUP_USER_ID)
+            get_user_history_page(db, WARMUP_USER_ID)
+            get_user_stats(db, WARMUP_USER_ID)
+        finally:
+            db.close()
+
+
+def _warm_signing_keys():
+    # Not forced: retries by the readiness probe are spaced by AUTH_JWKS_MIN_REFRESH_SECONDS
+    signing_keys.refresh(force=False)
+
+
+def _run_steps(names=None):
+    """Run the warmup steps (only those in `names` if given); returns the names of the failed ones."""
+    steps = [("engines", _warm_engines), ("queries", _warm_queries)]
+    if signing_keys.uses_jwks:
+        steps.append(("signing keys", _warm_signing_keys))
+    failed = []
+    for name, step in steps:
+        if names is not None and name not in names:
+            continue
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Warmup step '{name}' failed: {str(e)}")
+            failed.append(name)
+    return failed
+
+
+def warm_up():
+    """Run every warmup step and log how long it took (never raises)."""
+    start = time.perf_counter()
+    failed = _run_steps()
+    duration_ms = round((time.perf_counter() - start) * 1000)
+    warmup_state.update(done=True, duration_ms=duration_ms, failed=failed)
+    logger.info(f"Worker warmed up in {duration_ms}ms")
+
+
+def retry_failed_warmup():
+    """
+    Run the warmup steps that failed again (never raises).
+
+    Returns:
+        Names of the steps still failing
+    """
+    if not warmup_state["failed"]:
+        return []
+    failed = _run_steps(set(warmup_state["failed"]))
+    if not failed:
+        logger.info(f"Warmup steps {warmup_state['failed']} succeeded on retry")
+    warmup_state["failed"] = failed
+    return failed
@@ -1,5 +1,5 @@
 import "react"
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { InterviewChallenge } from "./InterviewChallenge";
 import { ScenarioChallenge } from "./ScenarioChallenge";
 import { useApi } from "../utils/Api";
@@ -22,6 +22,12 @@ export function ChallengeGenerator() {
     const [numQuestions, setNumQuestions] = useState(5);
     const [selectedAnswers, setSelectedAnswers] = useState([]);
 
+    // MCQ answers are saved in one bulk request per quiz
+    const [savedAnswers, setSavedAnswers] = useState([]);
+    const answerTimesRef = useRef([]);
+    const pendingSubmitRef = useRef(new Set()); // question indexes sent or in flight
+    const flushAnswersRef = useRef(() => {});
+
     // Quota state
     const [quotas, setQuotas] = useState({
         interview: { quota_remaining: 0, total_daily_quota: 10 },
@@ -36,9 +42,66 @@ export function ChallengeGenerator() {
         generateChallenge, 
         ensureQuotasInitialized, 
         getAllQuotas,
-        getUserStats
+        getUserStats,
+        submitInterviewAnswers
     } = useApi();
 
+    const currentChallengesRef = useRef(currentChallenges);
+    currentChallengesRef.current = currentChallenges;
+
+    // Save every answered-but-unsaved MCQ question in one request.
+    // Indexes are claimed before the request so repeated calls never double submit.
+    const flushInterviewAnswers = async () => {
+        const indexes = selectedAnswers
+            .map((answer, index) => (answer !== null && answer !== undefined ? index : null))
+            .filter(index => index !== null && !pendingSubmitRef.current.has(index) && currentChallenges[index]);
+        if (indexes.length === 0) return;
+
+        const challenges = currentChallenges;
+        indexes.forEach(index => pendingSubmitRef.current.add(index));
+        try {
+            const response = await submitInterviewAnswers(indexes.map(index => ({
+                challengeId: challenges[index].id,
+                userAnswerId: selectedAnswers[index],
+                timeTakenSeconds: answerTimesRef.current[index]
+            })));
+            console.log('Bulk interview answer submission response:', response);
+
+            // Ignore the result if a new quiz replaced this one meanwhile
+            setSavedAnswers(prev => {
+                if (challenges !== currentChallengesRef.current) return prev;
+                const updated = [...prev];
+                indexes.forEach(index => { updated[index] = true; });
+                return updated;
+            });
+        } catch (error) {
+            console.error('Error submitting interview answers:', error);
+            if (challenges === currentChallengesRef.current) {
+                indexes.forEach(index => pendingSubmitRef.current.delete(index));
+            }
+        }
+    };
+    flushAnswersRef.current = flushInterviewAnswers;
+
+    // Submit the quiz once every question has an answer
+    useEffect(() => {
+        if (selectedAnswers.length > 0 && selectedAnswers.every(answer => answer !== null)) {
+            flushInterviewAnswers();
+        }
+    }, [selectedAnswers]);
+
+    // Save partially answered quizzes when leaving the page
+    useEffect(() => {
+        return () => flushAnswersRef.current();
+    }, []);
+
+    const startNewQuiz = (challenges) => {
+        answerTimesRef.current = [];
+        pendingSubmitRef.current = new Set();
+        setSavedAnswers(Array(challenges.length).fill(false));
+        setSelectedAnswers(Array(challenges.length).fill(null));
+    };
+
     // Initialize quotas on component mount
     useEffect(() => {
         initializeComponent();
@@ -108,6 +171,9 @@ export function ChallengeGenerator() {
             return;
         }
 
+        // Save answers to the previous quiz before replacing it
+        flushInterviewAnswers();
+
         try {
             setIsLoading(true);
             setError(null);
@@ -133,7 +199,7 @@ export function ChallengeGenerator() {
             if (result.challenges && result.challenges.length > 0) {
                 setCurrentChallenges(result.challenges);
                 setCurrentChallengeIndex(0);
-                setSelectedAnswers(Array(result.challenges.length).fill(null));
+                startNewQuiz(result.challenges);
                 
                 // Update quotas after successful generation
                 await fetchQuotas();
@@ -150,11 +216,12 @@ export function ChallengeGenerator() {
 
     const resetChallengeHandler = () => {
         console.log('Resetting challenge content and settings...');
+        flushInterviewAnswers();
         
         // Reset all challenge-related state
         setCurrentChallenges([]);
         setCurrentChallengeIndex(0);
-        setSelectedAnswers([]);
+        startNewQuiz([]);
         setError(null);
         
         // Reset form state completely
@@ -200,7 +267,8 @@ export function ChallengeGenerator() {
         }
     };
 
-    const handleSelectAnswer = (questionIndex, answerIndex) => {
+    const handleSelectAnswer = (questionIndex, answerIndex, timeTakenSeconds = null) => {
+        answerTimesRef.current[questionIndex] = timeTakenSeconds;
         setSelectedAnswers(prev => {
             const updated = [...prev];
             updated[questionIndex] = answerIndex;
@@ -330,7 +398,8 @@ export function ChallengeGenerator() {
                     numQuestions={numQuestions} 
                     difficulty={difficulty} 
                     selectedOption={selectedAnswers[currentChallengeIndex]}
-                    onSelectOption={answerIndex => handleSelectAnswer(currentChallengeIndex, answerIndex)}
+                    onSelectOption={(answerIndex, timeTaken) => handleSelectAnswer(currentChallengeIndex, answerIndex, timeTaken)}
+                    submitted={Boolean(savedAnswers[currentChallengeIndex])}
                     disabled={isQuotaDepleted}
                 />
             );
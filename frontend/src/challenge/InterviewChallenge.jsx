@@ -1,6 +1,5 @@
 import "react";
 import { useState } from "react";
-import { useApi } from "../utils/Api";
 import { ChecklistIcon, LightbulbIcon, ZapIcon } from "../ExtraComponents/icons";
 
 /**
@@ -14,9 +13,7 @@ import { ChecklistIcon, LightbulbIcon, ZapIcon } from "../ExtraComponents/icons"
  * 
  */
 
-export function InterviewChallenge({challenge, showExplanation = false, topic, numQuestions, difficulty, selectedOption, onSelectOption}) {
-  const { submitInterviewAnswer } = useApi();
-  
+export function InterviewChallenge({challenge, showExplanation = false, topic, numQuestions, difficulty, selectedOption, onSelectOption, submitted = false}) {
   // Defensive check to prevent crash if challenge or options is undefined
   if (!challenge || !challenge.options) {
     return (
@@ -35,50 +32,21 @@ export function InterviewChallenge({challenge, showExplanation = false, topic, n
   // this is the mcq challenge to answer questions about differnt ML and DL topics that often get asked in the interview.
 
   const [shouldShowExplanation, setShouldShowExplanation] = useState(showExplanation);
-  const [submitting, setSubmitting] = useState(false);
-  const [submitted, setSubmitted] = useState(false);
   const [startTime] = useState(Date.now());
 
-  // the option should be string,
-  const options = typeof challenge.options === "string" ? JSON.parse(challenge.options) : challenge.options;
+  // Options arrive as a native array (API response version 2)
+  const options = challenge.options || [];
 
-  const handleOptionSelect = async (optionIndex) => {
-    if (selectedOption !== null || submitting || submitted) {
+  // Answers are graded locally and saved by the parent in one bulk request per quiz
+  const handleOptionSelect = (optionIndex) => {
+    if (selectedOption !== null) {
       return;
     }
 
-    try {
-      setSubmitting(true);
-      onSelectOption(optionIndex);
-      
-      // Calculate time taken
-      const timeTaken = Math.round((Date.now() - startTime) / 1000);
-      
-      // Submit answer to backend
-      console.log('Submitting interview answer:', {
-        challengeId: challenge.id,
-        userAnswerId: optionIndex,
-        timeTaken: timeTaken
-      });
-
-      const response = await submitInterviewAnswer(
-        challenge.id,
-        optionIndex,
-        timeTaken
-      );
-
-      console.log('Interview answer submission response:', response);
-      
-      setSubmitted(true);
-      setShouldShowExplanation(true);
-      
-    } catch (error) {
-      console.error('Error submitting interview answer:', error);
-      // Still show explanation even if submission fails
-      setShouldShowExplanation(true);
-    } finally {
-      setSubmitting(false);
-    }
+    // Calculate time taken
+    const timeTaken = Math.round((Date.now() - startTime) / 1000);
+    onSelectOption(optionIndex, timeTaken);
+    setShouldShowExplanation(true);
   }
 
   const getOptionClass = (optionIndex) => {
@@ -127,7 +95,7 @@ export function InterviewChallenge({challenge, showExplanation = false, topic, n
               key={index}
               className={getOptionClass(index)}
               onClick={() => handleOptionSelect(index)}
-              style={{ cursor: selectedOption !== null || submitting ? 'not-allowed' : 'pointer' }}
+              style={{ cursor: selectedOption !== null ? 'not-allowed' : 'pointer' }}
             >
               <div className="option-letter">
                 {String.fromCharCode(65 + index)}
@@ -145,17 +113,10 @@ export function InterviewChallenge({challenge, showExplanation = false, topic, n
           ))}
         </div>
         
-        {submitting && (
-          <div className="submission-status">
-            <span className="submit-spinner"></span>
-            Submitting your answer...
-          </div>
-        )}
-        
         {submitted && (
           <div className="submission-status success">
             <span className="submit-checkmark">✓</span>
-            Answer submitted successfully!
+            Answer saved!
           </div>
         )}
       </div>
@@ -36,20 +36,12 @@ export function ScenarioChallenge({ challenge, topic, numQuestions, difficulty }
     );
   }
 
-  // Parse questions from JSON string
+  // Questions arrive as a native array (API response version 2)
   let questions = [];
-  try {
-    if (typeof challenge.questions === 'string') {
-      questions = JSON.parse(challenge.questions);
-    } else if (Array.isArray(challenge.questions)) {
-      questions = challenge.questions;
-    } else {
-      console.error('Invalid questions format:', challenge.questions);
-      questions = [];
-    }
-  } catch (error) {
-    console.error('Error parsing questions:', error);
-    questions = [];
+  if (Array.isArray(challenge.questions)) {
+    questions = challenge.questions;
+  } else {
+    console.error('Invalid questions format:', challenge.questions);
   }
 
   // If no questions were parsed, show error
@@ -19,13 +19,52 @@ export function HistoryPanel() {
     const [showModal, setShowModal] = useState(false);
     const [expandedDates, setExpandedDates] = useState(new Set(["Today"])); // Keep today expanded by default
     const [searchQuery, setSearchQuery] = useState("");
+    const [searchResults, setSearchResults] = useState(null); // null when not searching
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+    const [exporting, setExporting] = useState(false);
 
 
-    const { getChallengeHistory, getUserStats } = useApi();
+    const { getChallengeHistory, searchChallengeHistory, getUserStats, downloadChallengeHistory } = useApi();
+
+    const HISTORY_PAGE_SIZE = 20;
+    const SEARCH_DEBOUNCE_MS = 250;
+
+    // Type filter is applied server-side, so reload from the first page when it changes
+    const getHistoryParams = () => ({
+        limit: HISTORY_PAGE_SIZE,
+        type: filter === "all" ? undefined : filter
+    });
 
   useEffect(() => {
         loadHistoryData();
-    }, []);
+    }, [filter]);
+
+    // Search runs server-side against the full-text index, debounced while typing
+    useEffect(() => {
+        const q = searchQuery.trim();
+        if (!q) {
+            setSearchResults(null);
+            return;
+        }
+        let cancelled = false;
+        const timer = setTimeout(async () => {
+            try {
+                const data = await searchChallengeHistory({
+                    q,
+                    type: filter === "all" ? undefined : filter
+                });
+                if (!cancelled) setSearchResults(data.challenges || []);
+            } catch (error) {
+                console.error('Error searching history:', error);
+                if (!cancelled) setError('Failed to search challenge history: ' + error.message);
+            }
+        }, SEARCH_DEBOUNCE_MS);
+        return () => {
+            cancelled = true;
+            clearTimeout(timer);
+        };
+    }, [searchQuery, filter]);
 
     const loadHistoryData = async () => {
         try {
@@ -34,7 +73,7 @@ export function HistoryPanel() {
 
             // Load both history and stats
             const [historyData, statsData] = await Promise.all([
-                getChallengeHistory(),
+                getChallengeHistory(getHistoryParams()),
                 getUserStats()
             ]);
 
@@ -45,6 +84,7 @@ export function HistoryPanel() {
             ));
 
             setHistory(historyData.challenges || []);
+            setNextCursor(historyData.next_cursor || null);
             setStats(statsData);
         } catch (error) {
             console.error('Error loading history:', error);
@@ -54,7 +94,40 @@ export function HistoryPanel() {
         }
     };
 
+    const loadMoreHistory = async () => {
+        if (!nextCursor) return;
+        try {
+            setLoadingMore(true);
+            const historyData = await getChallengeHistory({ ...getHistoryParams(), cursor: nextCursor });
+            setHistory(prev => [...prev, ...(historyData.challenges || [])]);
+            setNextCursor(historyData.next_cursor || null);
+        } catch (error) {
+            console.error('Error loading more history:', error);
+            setError('Failed to load more challenges: ' + error.message);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
+    // Full history (not only the loaded pages) as a CSV download
+    const handleExport = async () => {
+        try {
+            setExporting(true);
+            await downloadChallengeHistory("csv");
+        } catch (error) {
+            console.error('Error exporting history:', error);
+            setError('Failed to export challenge history: ' + error.message);
+        } finally {
+            setExporting(false);
+        }
+    };
+
     const getFilteredAndSortedHistory = () => {
+        // Search results arrive ranked (best match first) and already type-filtered
+        if (searchResults !== null) {
+            return searchResults;
+        }
+
         let filtered = history;
 
         // Apply filter
@@ -64,16 +137,6 @@ export function HistoryPanel() {
             filtered = history.filter(challenge => challenge.type === "scenario");
         }
 
-        // Apply search filter
-        if (searchQuery.trim()) {
-            const q = searchQuery.trim().toLowerCase();
-            filtered = filtered.filter(challenge =>
-                (challenge.title && challenge.title.toLowerCase().includes(q)) ||
-                (challenge.topic && challenge.topic.toLowerCase().includes(q)) ||
-                (challenge.explanation && challenge.explanation.toLowerCase().includes(q))
-            );
-        }
-
         // Apply sorting
         filtered.sort((a, b) => {
             switch (sortBy) {
@@ -162,7 +225,8 @@ export function HistoryPanel() {
         });
     };
 
-    const todaysCount = getTodaysChallenges().length;
+    // Server-side count when available: the loaded pages may not cover all of today
+    const todaysCount = stats?.windows?.today?.challenge_count ?? getTodaysChallenges().length;
 
     const renderChallengeCard = (challenge) => {
         const isInterview = challenge.type === "interview";
@@ -240,7 +304,7 @@ export function HistoryPanel() {
                     <div className="challenge-preview">
                         {isInterview ? (
                             <div className="challenge-preview-content">
-                                <span>Multiple choice • {JSON.parse(challenge.options || '[]').length} options</span>
+                                <span>Multiple choice • {(challenge.options || []).length} options</span>
                                 {answerStatus ? (
                                     answerStatus.correct ? (
                                         <span className="user-answer-preview">
@@ -259,7 +323,7 @@ export function HistoryPanel() {
                             </div>
                         ) : (
                             <div className="challenge-preview-content">
-                                <span>Open-ended scenario • {JSON.parse(challenge.questions || '[]').length} questions</span>
+                                <span>Open-ended scenario • {(challenge.questions || []).length} questions</span>
                                 {answerStatus && (
                                     <span className="user-answer-preview">
                                         {challenge.user_answers.length} answer(s) submitted
@@ -313,7 +377,7 @@ export function HistoryPanel() {
                                 <div className="options-section">
                                     <h4>Answer Options</h4>
                                     <div className="options-list">
-                                        {JSON.parse(selectedChallenge.options || '[]').map((option, index) => {
+                                        {(selectedChallenge.options || []).map((option, index) => {
                                             const isCorrect = index === selectedChallenge.correct_answer_id;
                                             const isUserChoice = selectedChallenge.user_answer && index === selectedChallenge.user_answer.user_answer_id;
                                             const hasUserAnswer = selectedChallenge.user_answer !== null;
@@ -388,7 +452,7 @@ export function HistoryPanel() {
                                     <div className="scenario-questions">
                                         <h4>Questions & Your Answers</h4>
                                         <div className="questions-list">
-                                            {JSON.parse(selectedChallenge.questions || '[]').map((question, index) => {
+                                            {(selectedChallenge.questions || []).map((question, index) => {
                                                 const userAnswer = selectedChallenge.user_answers?.find(a => a.question_index === index);
                                                 
                                                 return (
@@ -533,11 +597,18 @@ export function HistoryPanel() {
                 >
                     {loading ? 'Refreshing...' : 'Refresh Data'}
                 </button>
+                <button
+                    className="refresh-history-btn"
+                    onClick={handleExport}
+                    disabled={exporting}
+                >
+                    {exporting ? 'Exporting...' : 'Export CSV'}
+                </button>
             </div>
 
             <HistoryStatsCard stats={stats} todaysCount={todaysCount} />
 
-            <HistoryScoreTracker history={history} />
+            <HistoryScoreTracker history={history} stats={stats} />
 
             <div className="history-layout">
                 <div className="history-main">
@@ -551,7 +622,9 @@ export function HistoryPanel() {
                       <BookIcon size={48} color="currentColor" />
                     </div>
                             <h3>No challenges found</h3>
-                            {filter === "all" ? (
+                            {searchResults !== null ? (
+                                <p>No challenges match "{searchQuery.trim()}". Try different words.</p>
+                            ) : filter === "all" ? (
                                 <div>
                                     <p>You haven't completed any challenges yet.</p>
                                     <p>Start your ML interview preparation journey today!</p>
@@ -588,6 +661,15 @@ export function HistoryPanel() {
                                     </div>
             );
           })}
+                            {nextCursor && searchResults === null && (
+                                <button
+                                    className="refresh-history-btn"
+                                    onClick={loadMoreHistory}
+                                    disabled={loadingMore}
+                                >
+                                    {loadingMore ? 'Loading...' : 'Load More'}
+                                </button>
+                            )}
         </div>
       )}
                 </div>
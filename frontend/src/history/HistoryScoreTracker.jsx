@@ -1,7 +1,7 @@
 import React from "react";
 import { TargetIcon, LightbulbIcon, BrainIcon, ZapIcon, CalendarIcon } from "../ExtraComponents/icons";
 
-export function HistoryScoreTracker({ history = [] }) {
+export function HistoryScoreTracker({ history = [], stats = null }) {
   // Helper function to get date ranges
   const getDateRanges = () => {
     const now = new Date();
@@ -66,6 +66,26 @@ export function HistoryScoreTracker({ history = [] }) {
       }
     });
 
+    // Totals and the today / this week windows come from the server-side
+    // aggregates when available, since only the loaded history pages are here
+    if (stats?.interview && stats?.scenario) {
+      interviewOverallCorrect = stats.interview.correct;
+      interviewOverallTotal = stats.interview.answered;
+      scenarioOverallCorrect = stats.scenario.challenges_passed;
+      scenarioOverallTotal = stats.scenario.challenges_evaluated;
+    }
+    if (stats?.windows?.today && stats?.windows?.week) {
+      const { today: todayStats, week: weekStats } = stats.windows;
+      interviewTodayCorrect = todayStats.interview.correct;
+      interviewTodayTotal = todayStats.interview.answered;
+      interviewWeekCorrect = weekStats.interview.correct;
+      interviewWeekTotal = weekStats.interview.answered;
+      scenarioTodayCorrect = todayStats.scenario.challenges_passed;
+      scenarioTodayTotal = todayStats.scenario.challenges_evaluated;
+      scenarioWeekCorrect = weekStats.scenario.challenges_passed;
+      scenarioWeekTotal = weekStats.scenario.challenges_evaluated;
+    }
+
     return {
       interview: {
         today: { correct: interviewTodayCorrect, total: interviewTodayTotal },
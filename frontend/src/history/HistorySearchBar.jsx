@@ -6,7 +6,7 @@ export default function HistorySearchBar({ searchQuery, setSearchQuery }) {
       <input
         type="text"
         className="history-search-input"
-        placeholder="Search questions or topics..."
+        placeholder="Search questions, options, explanations or your answers..."
         value={searchQuery}
         onChange={e => setSearchQuery(e.target.value)}
         maxLength={100}
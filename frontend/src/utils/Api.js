@@ -9,7 +9,9 @@ export const useApi = () => {
         const defaultOptions = {
             headers: {
                 "Content-Type": "application/json",
-                "Authorization": `Bearer ${token}`
+                "Authorization": `Bearer ${token}`,
+                // Response format 2: options / questions as native arrays
+                "X-API-Version": "2"
             }
         }
 
@@ -17,6 +19,7 @@ export const useApi = () => {
         const response = await fetch(`${API_BASE_URL}/api/${endpoint}`, {
           ...defaultOptions,
           ...options,
+          headers: { ...defaultOptions.headers, ...options.headers },
         });
         
         if (!response.ok) {
@@ -30,12 +33,33 @@ export const useApi = () => {
         return response.json();
     }
 
+    // POST that is safe to retry: one Idempotency-Key per user action, reused on
+    // every retry, so the server runs the (LLM-backed) request at most once.
+    // Only network failures are retried; HTTP errors are returned as usual.
+    const makeIdempotentRequest = async (endpoint, options = {}, retries = 2) => {
+        const idempotencyKey = crypto.randomUUID();
+        for (let attempt = 0; ; attempt++) {
+            try {
+                return await makeRequest(endpoint, {
+                    ...options,
+                    headers: { ...options.headers, "Idempotency-Key": idempotencyKey }
+                });
+            } catch (error) {
+                // fetch() rejects with a TypeError when the network drops
+                if (!(error instanceof TypeError) || attempt >= retries) {
+                    throw error;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000 * (attempt + 1)));
+            }
+        }
+    }
+
     // ------------------------------
     // Challenge Generation
     // ------------------------------
 
     const generateInterviewChallenge = async(difficulty, topic, numQuestions) => {
-        return await makeRequest("challenges/interview", {
+        return await makeIdempotentRequest("challenges/interview", {
             method: "POST",
             body: JSON.stringify({
                 difficulty: difficulty,
@@ -46,7 +70,7 @@ export const useApi = () => {
     };
 
     const generateScenarioChallenge = async(difficulty, topic, numQuestions) => {
-        return await makeRequest("challenges/scenario", {
+        return await makeIdempotentRequest("challenges/scenario", {
             method: "POST",
             body: JSON.stringify({
                 difficulty: difficulty,
@@ -78,8 +102,48 @@ export const useApi = () => {
     // Challenge History
     // ------------------------------
 
-    const getChallengeHistory = async() => {
-        return await makeRequest("challenges/history");
+    // params: { limit, cursor, type, topic, difficulty, answered, date_from, date_to }
+    const getChallengeHistory = async(params = {}) => {
+        const query = new URLSearchParams();
+        Object.entries(params).forEach(([key, value]) => {
+            if (value !== undefined && value !== null && value !== "") {
+                query.append(key, value);
+            }
+        });
+        const queryString = query.toString();
+        return await makeRequest(`challenges/history${queryString ? `?${queryString}` : ""}`);
+    }
+
+    // Ranked full-text search over the user's history (same item shape as history)
+    const searchChallengeHistory = async(params = {}) => {
+        const query = new URLSearchParams();
+        Object.entries(params).forEach(([key, value]) => {
+            if (value !== undefined && value !== null && value !== "") {
+                query.append(key, value);
+            }
+        });
+        return await makeRequest(`challenges/search?${query.toString()}`);
+    }
+
+    // Full history download (streamed by the server); format: "csv" or "ndjson"
+    const downloadChallengeHistory = async(format = "csv") => {
+        const token = await getToken();
+        const response = await fetch(`${API_BASE_URL}/api/challenges/export?format=${format}`, {
+            headers: { "Authorization": `Bearer ${token}` }
+        });
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => null);
+            throw new Error(errorData?.detail || "An error occurred.");
+        }
+        const disposition = response.headers.get("Content-Disposition") || "";
+        const filename = disposition.match(/filename="([^"]+)"/)?.[1] || `intrvu-history.${format}`;
+
+        const url = URL.createObjectURL(await response.blob());
+        const link = document.createElement("a");
+        link.href = url;
+        link.download = filename;
+        link.click();
+        URL.revokeObjectURL(url);
     }
 
 
@@ -88,7 +152,7 @@ export const useApi = () => {
     // Scenario Answer Submission
     // ------------------------------
     const submitScenarioAnswer = async(scenarioId, questionIndex, userAnswer) => {
-        return await makeRequest("scenario-answers", {
+        return await makeIdempotentRequest("scenario-answers", {
             method: "POST",
             body: JSON.stringify({
                 scenario_id: scenarioId,
@@ -112,6 +176,21 @@ export const useApi = () => {
         });
     };
 
+    // Grade a whole quiz in one request
+    // answers: [{ challengeId, userAnswerId, timeTakenSeconds }]
+    const submitInterviewAnswers = async(answers) => {
+        return await makeRequest("interview-answers/bulk", {
+            method: "POST",
+            body: JSON.stringify({
+                answers: answers.map(answer => ({
+                    challenge_id: answer.challengeId,
+                    user_answer_id: answer.userAnswerId,
+                    time_taken_seconds: answer.timeTakenSeconds ?? null
+                }))
+            })
+        });
+    };
+
     // ------------------------------
     // Convenience Functions
     // ------------------------------
@@ -141,29 +220,31 @@ export const useApi = () => {
         }
     }
 
+    // Aggregates are maintained server-side, so this no longer downloads the history.
+    // "Today" / "this week" use the browser's local midnight and start of week (Sunday).
     const getUserStats = async() => {
-        const history = await getChallengeHistory();
+        const now = new Date();
+        const todayStart = new Date(now.getFullYear(), now.getMonth(), now.getDate());
+        const weekStart = new Date(todayStart);
+        weekStart.setDate(todayStart.getDate() - todayStart.getDay());
+        const query = new URLSearchParams({
+            today_start: todayStart.toISOString(),
+            week_start: weekStart.toISOString()
+        });
+        const serverStats = await makeRequest(`stats?${query.toString()}`);
         const stats = {
-            totalChallenges: history.total_count, 
-            interviewChallenges: history.interview_count,
-            scenarioChallenges: history.scenario_count,
-            recentChallenges: history.challenges.slice(0, 5),
+            totalChallenges: serverStats.total_count,
+            interviewChallenges: serverStats.interview_count,
+            scenarioChallenges: serverStats.scenario_count,
             topicBreakdown: {},
-            difficultyBreakdown: { Easy: 0, Medium: 0, Hard: 0 }
+            difficultyBreakdown: serverStats.difficulty_breakdown,
+            interview: serverStats.interview,
+            scenario: serverStats.scenario,
+            windows: serverStats.windows
         };
 
-        history.challenges.forEach((challenge) => {
-            // Topic breakdown
-            if (stats.topicBreakdown[challenge.topic]) {
-                stats.topicBreakdown[challenge.topic]++;
-            } else {
-                stats.topicBreakdown[challenge.topic] = 1;
-            }
-
-            // Difficulty breakdown
-            if (stats.difficultyBreakdown[challenge.difficulty]) {
-                stats.difficultyBreakdown[challenge.difficulty]++;
-            }
+        serverStats.topics.forEach((topic) => {
+            stats.topicBreakdown[topic.topic] = topic.challenge_count;
         });
 
         return stats;
@@ -186,6 +267,8 @@ export const useApi = () => {
 
       // History and stats
       getChallengeHistory,
+      searchChallengeHistory,
+      downloadChallengeHistory,
       getUserStats,
 
 
@@ -193,5 +276,6 @@ export const useApi = () => {
       // Answer submission
       submitScenarioAnswer,
       submitInterviewAnswer,
+      submitInterviewAnswers,
     };
 }
\ No newline at end of file